@@ -23,15 +23,16 @@ def verificar_password(password: str, password_hash: str) -> bool:
 def autenticar_usuario(username, password):
     conn = get_connection()
     cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT id, username, nombre, password_hash, rol, activo, password_updated_at
-        FROM usuarios
-        WHERE username = %s
-    """, (username,))
-
-    user = cursor.fetchone()
-    conn.close()
+    try:
+        cursor.execute("""
+            SELECT id, username, nombre, password_hash, rol, activo, password_updated_at
+            FROM usuarios
+            WHERE username = %s
+        """, (username,))
+
+        user = cursor.fetchone()
+    finally:
+        conn.close()
 
     if not user:
         return None
@@ -55,12 +56,14 @@ def autenticar_usuario(username, password):
 def obtener_usuario_por_username(username):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        "SELECT username, rol FROM usuarios WHERE username = %s",
-        (username,)
-    )
-    row = cursor.fetchone()
-    conn.close()
+    try:
+        cursor.execute(
+            "SELECT username, rol FROM usuarios WHERE username = %s",
+            (username,)
+        )
+        row = cursor.fetchone()
+    finally:
+        conn.close()
 
     if row:
         return {"username": row[0], "rol": row[1]}
@@ -76,78 +79,84 @@ def validar_password(password: str):
 def cambiar_password(user_id, password_actual, password_nuevo):
     conn = get_connection()
     cur = conn.cursor()
-
-    cur.execute(
-        "SELECT password_hash FROM usuarios WHERE id = %s",
-        (user_id,)
-    )
-    row = cur.fetchone()
-
-    if not row or not verificar_password(password_actual, row[0]):
+    try:
+        cur.execute(
+            "SELECT password_hash FROM usuarios WHERE id = %s",
+            (user_id,)
+        )
+        row = cur.fetchone()
+
+        if not row or not verificar_password(password_actual, row[0]):
+            return False
+
+        nuevo_hash = hash_password(password_nuevo)
+
+        cur.execute("""
+            UPDATE usuarios
+            SET password_hash=%s,
+                password_updated_at=NOW(),
+                token_sesion=NULL
+            WHERE id=%s
+        """, (nuevo_hash, user_id))
+
+        conn.commit()
+    finally:
         conn.close()
-        return False
-
-    nuevo_hash = hash_password(password_nuevo)
-
-    cur.execute("""
-        UPDATE usuarios
-        SET password_hash=%s,
-            password_updated_at=NOW(),
-            token_sesion=NULL
-        WHERE id=%s
-    """, (nuevo_hash, user_id))
-
-    conn.commit()
-    conn.close()
     return True
 
 def crear_usuario(username, nombre, rol, password="Temp1234"):
     conn = get_connection()
     cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO usuarios (username, nombre, rol, password_hash, activo)
-        VALUES (%s, %s, %s, %s, TRUE)
-    """, (username, nombre, rol, hash_password(password)))
-
-    conn.commit()
-    conn.close()
+    try:
+        cur.execute("""
+            INSERT INTO usuarios (username, nombre, rol, password_hash, activo)
+            VALUES (%s, %s, %s, %s, TRUE)
+        """, (username, nombre, rol, hash_password(password)))
+
+        conn.commit()
+    finally:
+        conn.close()
 
 def cambiar_estado_usuario(user_id, activo):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute(
-        "UPDATE usuarios SET activo=%s WHERE id=%s",
-        (activo, user_id)
-    )
-    conn.commit()
-    conn.close()
+    try:
+        cur.execute(
+            "UPDATE usuarios SET activo=%s WHERE id=%s",
+            (activo, user_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
 
 def resetear_password_admin(user_id):
     conn = get_connection()
     cur = conn.cursor()
-
-    cur.execute("""
-        UPDATE usuarios
-        SET password_hash=%s,
-            password_updated_at=NULL,
-            token_sesion=NULL
-        WHERE id=%s
-    """, (hash_password("Temp1234"), user_id))
-
-    conn.commit()
-    conn.close()
+    try:
+        cur.execute("""
+            UPDATE usuarios
+            SET password_hash=%s,
+                password_updated_at=NULL,
+                token_sesion=NULL
+            WHERE id=%s
+        """, (hash_password("Temp1234"), user_id))
+
+        conn.commit()
+    finally:
+        conn.close()
 
 def obtener_todos_los_usuarios():
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("""
-        SELECT id, username, nombre, rol, activo
-        FROM usuarios
-        ORDER BY username
-    """)
-    rows = cur.fetchall()
-    conn.close()
+    try:
+        cur.execute("""
+            SELECT id, username, nombre, rol, activo
+            FROM usuarios
+            ORDER BY username
+        """)
+        rows = cur.fetchall()
+    finally:
+        conn.close()
 
     return [
         {
@@ -163,10 +172,12 @@ def obtener_todos_los_usuarios():
 def actualizar_nombre_usuario(user_id, nuevo_nombre):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("""
-        UPDATE usuarios
-        SET nombre = %s
-        WHERE id = %s
-    """, (nuevo_nombre, user_id))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    try:
+        cur.execute("""
+            UPDATE usuarios
+            SET nombre = %s
+            WHERE id = %s
+        """, (nuevo_nombre, user_id))
+        conn.commit()
+    finally:
+        conn.close()
\ No newline at end of file
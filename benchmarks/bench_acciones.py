@@ -0,0 +1,208 @@
+# benchmarks/bench_acciones.py
+"""
+Viajes a la BD y tiempo por acción del usuario, con la latencia de producción.
+
+Uso (contra una BD de pruebas, nunca producción; registra ventas reales):
+    python -m benchmarks.bench_acciones [--latencia 60] [--jitter 10] [--ancho-banda 20000] [--repeticiones 3]
+    python -m benchmarks.bench_acciones --pg-bin /usr/lib/postgresql/16/bin
+
+Ejecuta las páginas reales (streamlit AppTest) con la BD detrás de
+benchmarks/proxy_latencia.py y mide cada acción: abrir el POS, buscar un
+producto, agregarlo, cobrar y abrir el resumen de caja. Cada acción se corre
+primero sin latencia y luego con la red simulada; los viajes los cuenta el
+proxy (cada uno cuesta un RTT completo en producción).
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from benchmarks.proxy_latencia import ProxyLatencia, base_de_datos
+
+TIMEOUT_PAGINA = 120
+
+
+def pagina_ventas():
+    from modulos.ventas import ventas_app
+    ventas_app()
+
+
+def pagina_caja():
+    import streamlit as st
+    from modulos.caja import caja_app
+    caja_app(st.session_state["usuario"])
+
+
+def preparar(conn):
+    """Caja abierta, su usuario y un producto vendible con stock."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT u.id, u.username, u.rol, u.nombre, c.id
+        FROM caja c
+        JOIN usuarios u ON u.username = c.usuario_apertura
+        WHERE c.estado = 'ABIERTA'
+        ORDER BY c.fecha_apertura DESC
+        LIMIT 1
+    """)
+    fila = cursor.fetchone()
+    if fila is None:
+        cursor.execute("SELECT id, username, rol, nombre FROM usuarios ORDER BY id LIMIT 1")
+        fila = cursor.fetchone()
+        cursor.execute("""
+            INSERT INTO caja (fecha_apertura, monto_apertura, usuario_apertura, estado)
+            VALUES (now(), 100, %s, 'ABIERTA')
+            RETURNING id
+        """, (fila[1],))
+        fila = fila + cursor.fetchone()
+    id_usuario, username, rol, nombre, id_caja = fila
+
+    cursor.execute("""
+        SELECT id FROM producto
+        WHERE precio_venta > COALESCE(costo_promedio, 0) AND stock_actual >= 1000
+        ORDER BY id LIMIT 1
+    """)
+    fila = cursor.fetchone()
+    if fila is None:
+        cursor.execute("""
+            UPDATE producto SET stock_actual = 100000
+            WHERE id = (
+                SELECT id FROM producto
+                WHERE precio_venta > COALESCE(costo_promedio, 0)
+                ORDER BY id LIMIT 1
+            )
+            RETURNING id
+        """)
+        fila = cursor.fetchone()
+    cursor.close()
+
+    usuario = {"id": id_usuario, "username": username, "rol": rol, "nombre": nombre}
+    return id_caja, usuario, fila[0]
+
+
+def boton(at, etiqueta):
+    return next(b for b in at.button if b.label == etiqueta)
+
+
+def acciones(id_caja, usuario, id_producto):
+    """Secuencia de acciones de una caja: (nombre, función que la ejecuta)."""
+    from streamlit.testing.v1 import AppTest
+
+    estado = {}
+
+    def abrir_pos():
+        at = AppTest.from_function(pagina_ventas, default_timeout=TIMEOUT_PAGINA)
+        at.session_state["usuario"] = usuario
+        at.session_state["caja_abierta_id"] = id_caja
+        estado["pos"] = at.run()
+
+    def buscar():
+        estado["pos"].text_input(key="criterio_busqueda").input(id_producto).run()
+
+    def agregar():
+        boton(estado["pos"], "➕ Agregar a la venta").click().run()
+
+    def cobrar():
+        at = boton(estado["pos"], "💾 Guardar venta").click().run()
+        if not at.session_state["venta_guardada"]:
+            raise RuntimeError("La venta no se guardó")
+
+    def abrir_caja():
+        at = AppTest.from_function(pagina_caja, default_timeout=TIMEOUT_PAGINA)
+        at.session_state["usuario"] = usuario
+        at.session_state["caja_abierta_id"] = id_caja
+        estado["caja"] = at.run()
+
+    return [
+        ("Abrir POS", abrir_pos, lambda: estado["pos"]),
+        ("Buscar producto", buscar, lambda: estado["pos"]),
+        ("Agregar ítem", agregar, lambda: estado["pos"]),
+        ("Cobrar", cobrar, lambda: estado["pos"]),
+        ("Abrir resumen de caja", abrir_caja, lambda: estado["caja"]),
+    ]
+
+
+def medir(proxy, repeticiones, id_caja, usuario, id_producto):
+    """Por acción: listas de viajes, conexiones nuevas, bytes recibidos y ms."""
+    resultados = {}
+    for _ in range(repeticiones):
+        for nombre, accion, pagina in acciones(id_caja, usuario, id_producto):
+            proxy.reiniciar()
+            inicio = time.perf_counter()
+            accion()
+            ms = (time.perf_counter() - inicio) * 1000
+
+            errores = [e.value for e in pagina().exception]
+            if errores:
+                raise RuntimeError(f"{nombre}: {errores[0]}")
+
+            c = proxy.contadores()
+            r = resultados.setdefault(nombre, {"viajes": [], "conexiones": [], "bytes": [], "ms": []})
+            r["viajes"].append(c["viajes"])
+            r["conexiones"].append(c["conexiones"])
+            r["bytes"].append(c["bytes_bajada"])
+            r["ms"].append(ms)
+    return resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_acciones")
+    parser.add_argument("--latencia", type=float, default=60.0, metavar="MS", help="RTT simulado")
+    parser.add_argument("--jitter", type=float, default=10.0, metavar="MS")
+    parser.add_argument("--ancho-banda", type=float, default=None, metavar="KBPS")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--pg-bin", default=os.getenv("PG_BIN"),
+                        help="Binarios de PostgreSQL para levantar una BD local desechable")
+    args = parser.parse_args(argv)
+
+    from psycopg2.extensions import parse_dsn
+
+    with base_de_datos(args) as url_bd:
+        dsn = parse_dsn(url_bd)
+        with ProxyLatencia(dsn.get("host", "localhost"), dsn.get("port", 5432)) as proxy:
+            # db lee DATABASE_URL al importarse: todo el tráfico pasa por el proxy
+            os.environ["DATABASE_URL"] = proxy.url(url_bd)
+            if args.pg_bin:
+                os.environ["DB_SSLMODE"] = "disable"
+
+            from benchmarks.semilla import sembrar
+            from db import crear_conexion
+            from migraciones import asegurar_esquema
+            from services.catalogo_cache import obtener_catalogo
+
+            conn = crear_conexion()
+            try:
+                asegurar_esquema(conn)
+                sembrar(conn)
+                id_caja, usuario, id_producto = preparar(conn)
+            finally:
+                conn.close()
+
+            # Catálogo en memoria y pool calientes, como en un proceso ya en marcha
+            obtener_catalogo()
+            medir(proxy, 1, id_caja, usuario, id_producto)
+
+            local = medir(proxy, args.repeticiones, id_caja, usuario, id_producto)
+
+            proxy.latencia_ms = args.latencia
+            proxy.jitter_ms = args.jitter
+            proxy.ancho_banda_kbps = args.ancho_banda
+            con_red = medir(proxy, args.repeticiones, id_caja, usuario, id_producto)
+
+    red = f"RTT {args.latencia:.0f} ± {args.jitter / 2:.0f} ms"
+    if args.ancho_banda:
+        red += f", {args.ancho_banda:.0f} kbit/s"
+    print(f"\nMediana de {args.repeticiones} repeticiones · red simulada: {red}\n")
+    print(f"{'acción':<24}{'viajes':>7}{'conex.':>7}{'KiB ↓':>8}{'local ms':>10}{'con red ms':>12}")
+    for nombre, r in con_red.items():
+        print(
+            f"{nombre:<24}{statistics.median(r['viajes']):>7.0f}{statistics.median(r['conexiones']):>7.0f}"
+            f"{statistics.median(r['bytes']) / 1024:>8.1f}{statistics.median(local[nombre]['ms']):>10.0f}"
+            f"{statistics.median(r['ms']):>12.0f}"
+        )
+    print("\nCada viaje cuesta un RTT: reducir viajes por acción es lo que acorta la espera en producción.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+# benchmarks/bench_busqueda.py
+"""
+Latencia de la búsqueda de productos a medida que crece el catálogo.
+
+Uso (contra una BD de pruebas, nunca producción):
+    python -m benchmarks.bench_busqueda [--hasta 200000] [--paso 50000] [--repeticiones 20]
+
+En cada escalón agrega productos sintéticos y mide p50/p95 de
+buscar_productos (página + total) para criterios típicos del mostrador.
+"""
+import argparse
+import statistics
+import sys
+import time
+
+from benchmarks.semilla import agregar_productos, sembrar
+from migraciones import asegurar_esquema
+
+CRITERIOS = [
+    "filtro*aceite",
+    "pastilla*freno*delant",
+    "cat-00",
+    "hyundai*accent",
+    "p00123",
+    "bujia",
+]
+
+
+def medir(criterio, repeticiones):
+    from services.producto_service import buscar_productos
+
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        buscar_productos(criterio=criterio, limit=20)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    tiempos.sort()
+    return statistics.median(tiempos), tiempos[int(len(tiempos) * 0.95) - 1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_busqueda")
+    parser.add_argument("--hasta", type=int, default=200_000, help="Tamaño final del catálogo")
+    parser.add_argument("--paso", type=int, default=50_000, help="Productos agregados por escalón")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    from db import crear_conexion
+    conn = crear_conexion()
+    try:
+        asegurar_esquema(conn)
+        sembrar(conn)
+
+        cursor = conn.cursor()
+        while True:
+            cursor.execute("SELECT COUNT(*) FROM producto")
+            total = cursor.fetchone()[0]
+
+            print(f"\n📦 {total:,} productos")
+            for criterio in CRITERIOS:
+                p50, p95 = medir(criterio, args.repeticiones)
+                print(f"  {criterio:<24} p50 {p50:7.1f} ms   p95 {p95:7.1f} ms")
+
+            if total >= args.hasta:
+                break
+            agregar_productos(conn, min(args.paso, args.hasta - total))
+        cursor.close()
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
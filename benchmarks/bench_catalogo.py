@@ -0,0 +1,70 @@
+# benchmarks/bench_catalogo.py
+"""
+Búsqueda en el índice del catálogo en memoria vs. la misma búsqueda en la BD.
+
+Uso (contra una BD de pruebas, nunca producción):
+    python -m benchmarks.bench_catalogo [--repeticiones 200]
+
+Verifica además que ambos caminos devuelvan el mismo total y la misma página.
+"""
+import argparse
+import statistics
+import sys
+import time
+
+from benchmarks.bench_busqueda import CRITERIOS
+from benchmarks.semilla import sembrar
+from migraciones import asegurar_esquema
+
+
+def medir_us(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1_000_000)
+    return statistics.median(tiempos)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_catalogo")
+    parser.add_argument("--repeticiones", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    from db import crear_conexion
+    conn = crear_conexion()
+    try:
+        asegurar_esquema(conn)
+        sembrar(conn)
+    finally:
+        conn.close()
+
+    from services.catalogo_cache import IndiceCatalogo
+    from services.producto_service import buscar_productos
+
+    inicio = time.perf_counter()
+    indice = IndiceCatalogo()
+    print(f"📦 Índice cargado en {time.perf_counter() - inicio:.2f} s: {indice.estadisticas()}")
+
+    distintos = 0
+    for criterio in CRITERIOS:
+        en_memoria = indice.buscar(criterio)
+        en_bd = buscar_productos(criterio)
+        iguales = (
+            en_memoria["total"] == en_bd["total"]
+            and en_memoria["productos"]["id"].tolist() == en_bd["productos"]["id"].tolist()
+        )
+        distintos += not iguales
+
+        us_memoria = medir_us(lambda: indice.buscar(criterio), args.repeticiones)
+        us_bd = medir_us(lambda: buscar_productos(criterio), max(args.repeticiones // 10, 1))
+        print(
+            f"  {criterio:<24} memoria {us_memoria:9.0f} µs   BD {us_bd:9.0f} µs"
+            f"   {'✅' if iguales else '❌ resultados distintos'}"
+        )
+
+    return 1 if distintos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# benchmarks/bench_checkout.py
+"""
+Sentencias y tiempo de guardar_venta (y de anular_venta) según el tamaño del carrito.
+
+Uso (contra una BD de pruebas, nunca producción; registra ventas reales):
+    python -m benchmarks.bench_checkout [--lineas 1 5 20 50] [--repeticiones 10] [--latencia 60]
+
+Cuenta las sentencias que guardar_venta envía a la BD (cada una es un viaje
+de ida y vuelta) y falla si el número cambia con el tamaño del carrito; lo
+mismo al anular una venta de cada tamaño.
+Mide además el RTT de la conexión (SELECT 1): con la venta registrada en una
+sola llamada a registrar_venta, la latencia es un RTT más la ejecución en la BD.
+Con --latencia la BD se usa a través de benchmarks/proxy_latencia.py.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+from psycopg2 import extensions
+
+from benchmarks.proxy_latencia import agregar_argumentos, red_simulada
+from benchmarks.semilla import sembrar
+from migraciones import asegurar_esquema
+
+
+class CursorContador(extensions.cursor):
+    """
+    Cursor que cuenta cada viaje a la BD (execute_values pagina con execute).
+    La cuenta es por hilo: sirve también con varias cajas en paralelo.
+    """
+    _local = threading.local()
+
+    @classmethod
+    def reiniciar(cls):
+        cls._local.sentencias = 0
+
+    @classmethod
+    def sentencias(cls):
+        return getattr(cls._local, "sentencias", 0)
+
+    def execute(self, query, vars=None):
+        CursorContador._local.sentencias = CursorContador.sentencias() + 1
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        CursorContador._local.sentencias = CursorContador.sentencias() + 1
+        return super().executemany(query, vars_list)
+
+
+def preparar(conn, max_lineas):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id FROM caja WHERE estado = 'ABIERTA'
+        ORDER BY fecha_apertura DESC LIMIT 1
+    """)
+    fila = cursor.fetchone()
+    if fila is None:
+        cursor.execute("""
+            INSERT INTO caja (fecha_apertura, monto_apertura, usuario_apertura, estado)
+            VALUES (now(), 100, 'usuario1', 'ABIERTA')
+            RETURNING id
+        """)
+        fila = cursor.fetchone()
+    id_caja = fila[0]
+
+    cursor.execute("SELECT id, username FROM usuarios ORDER BY id LIMIT 1")
+    id_usuario, username = cursor.fetchone()
+
+    cursor.execute("""
+        SELECT id, descripcion, precio_venta
+        FROM producto
+        WHERE precio_venta > 0
+        ORDER BY id
+        LIMIT %s
+    """, (max_lineas,))
+    productos = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT COALESCE(MAX(numero), 0)
+        FROM correlativo_comprobante
+        WHERE tipo = 'TICKET' AND serie = 'TB'
+    """)
+    ultimo = cursor.fetchone()[0]
+    cursor.close()
+
+    return id_caja, {"id": id_usuario, "username": username}, productos, ultimo
+
+
+def medir_rtt(conn, repeticiones=20):
+    cursor = conn.cursor()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    cursor.close()
+    return statistics.median(tiempos)
+
+
+def carrito_de(productos, lineas):
+    return [
+        {
+            "ID Producto": id_producto,
+            "Descripción": descripcion,
+            "Cantidad": 1.0,
+            "Precio Unitario": float(precio),
+            "Subtotal": float(precio),
+        }
+        for id_producto, descripcion, precio in productos[:lineas]
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_checkout")
+    parser.add_argument("--lineas", type=int, nargs="+", default=[1, 5, 20, 50])
+    parser.add_argument("--repeticiones", type=int, default=10)
+    agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+
+    with red_simulada(args, os.getenv("DATABASE_URL")) as (url, _):
+        os.environ["DATABASE_URL"] = url
+        return medir(args)
+
+
+def medir(args):
+    from db import crear_conexion, unidad_de_trabajo
+    from services.catalogo_cache import obtener_catalogo
+    from services.venta_service import anular_venta, guardar_venta
+
+    conn = crear_conexion()
+    try:
+        asegurar_esquema(conn)
+        sembrar(conn)
+        id_caja, usuario, productos, numero = preparar(conn, max(args.lineas))
+        rtt = medir_rtt(conn)
+    finally:
+        conn.close()
+
+    # El catálogo en memoria se carga antes para no contar su carga inicial
+    obtener_catalogo()
+
+    print(f"RTT (SELECT 1) p50 {rtt:.1f} ms\n")
+
+    sentencias_por_tamano = {}
+    ultima_venta = {}
+    for lineas in args.lineas:
+        carrito = carrito_de(productos, lineas)
+        tiempos = []
+        conteos = set()
+
+        for _ in range(args.repeticiones):
+            numero += 1
+            with unidad_de_trabajo() as compartida:
+                compartida.cursor_factory = CursorContador
+                try:
+                    CursorContador.reiniciar()
+                    inicio = time.perf_counter()
+                    ultima_venta[lineas] = guardar_venta(
+                        cliente={"id": "C00000"},
+                        regimen="Régimen General",
+                        tipo_comprobante="Ticket",
+                        metodo_pago="Efectivo",
+                        nro_comprobante=f"TB-{numero:06d}",
+                        placa_vehiculo=None,
+                        pago_cliente=None,
+                        vuelto=None,
+                        carrito=carrito,
+                        usuario=usuario,
+                        id_caja=id_caja,
+                    )
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                    conteos.add(CursorContador.sentencias())
+                finally:
+                    compartida.cursor_factory = extensions.cursor
+
+        sentencias_por_tamano[lineas] = conteos
+        p50 = statistics.median(tiempos)
+        print(
+            f"{lineas:>4} líneas   sentencias {'/'.join(map(str, sorted(conteos))):>5}   "
+            f"p50 {p50:7.1f} ms (RTT + {max(p50 - rtt, 0):.1f} ms)   máx {max(tiempos):7.1f} ms"
+        )
+
+    print()
+    sentencias_anular = set()
+    for lineas, id_venta in ultima_venta.items():
+        with unidad_de_trabajo() as compartida:
+            compartida.cursor_factory = CursorContador
+            try:
+                CursorContador.reiniciar()
+                inicio = time.perf_counter()
+                anular_venta(id_venta, "bench_checkout", {"nombre": usuario["username"]})
+                ms = (time.perf_counter() - inicio) * 1000
+                sentencias_anular.add(CursorContador.sentencias())
+            finally:
+                compartida.cursor_factory = extensions.cursor
+        print(f"{lineas:>4} líneas   anular: sentencias {CursorContador.sentencias():>3}   {ms:7.1f} ms")
+
+    distintos = set().union(*sentencias_por_tamano.values())
+    if len(distintos) != 1:
+        print("\n❌ El número de sentencias depende del tamaño del carrito")
+        return 1
+    if len(sentencias_anular) != 1:
+        print("\n❌ Las sentencias al anular dependen del tamaño de la venta")
+        return 1
+
+    print(f"\n✅ {distintos.pop()} sentencias por venta y {sentencias_anular.pop()} por anulación "
+          "sin importar el tamaño del carrito")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
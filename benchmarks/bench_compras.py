@@ -0,0 +1,250 @@
+# benchmarks/bench_compras.py
+"""
+Sentencias y tiempo de registrar una compra según el número de líneas.
+
+Uso (contra una BD de pruebas, nunca producción; registra compras reales):
+    python -m benchmarks.bench_compras [--lineas 10 100 1000] [--repeticiones 3] [--latencia 60]
+
+Para cada tamaño de factura compara:
+  - anterior: el flujo que corría en modulos/compras.py, línea por línea
+    (detalle, actualizar_costo_promedio, recalcular_precios_producto,
+    registrar_historial_precio y kardex), en una transacción que se deshace;
+  - registrar_compra: services/compra_service (una llamada a la BD).
+Verifica que ambos dejen los productos igual (stock, costos, valor de
+inventario y precios) y que las sentencias de registrar_compra no dependan
+del tamaño. Con --latencia la BD se usa a través de benchmarks/proxy_latencia.py;
+--max-anterior limita el flujo anterior (con latencia, 1000 líneas son minutos).
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date
+
+from psycopg2 import extensions
+
+from benchmarks.bench_checkout import CursorContador, medir_rtt
+from benchmarks.proxy_latencia import agregar_argumentos, red_simulada
+from benchmarks.semilla import sembrar
+from migraciones import asegurar_esquema
+
+REGIMEN = "Nuevo RUS"
+TIPO_DOC = "Factura"
+
+COLUMNAS_PRODUCTO = """
+    stock_actual, costo_promedio, costo_ultima_compra, valor_inventario, valor_venta, precio_venta
+"""
+
+
+def preparar(conn, max_lineas):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, nombre FROM proveedor ORDER BY id LIMIT 1")
+    proveedor = cursor.fetchone()
+    cursor.execute("""
+        SELECT id, descripcion
+        FROM producto
+        WHERE COALESCE(margen_utilidad, 0) < 1
+        ORDER BY id
+        LIMIT %s
+    """, (max_lineas,))
+    productos = cursor.fetchall()
+    cursor.close()
+    return proveedor, productos
+
+
+def carrito_de(productos, lineas, n):
+    """Una línea por producto, con cantidades y precios que cambian en cada corrida."""
+    carrito = []
+    for i, (id_producto, descripcion) in enumerate(productos[:lineas]):
+        cantidad = float(1 + (i + n) % 5)
+        precio = round(3.10 + ((i * 7 + n) % 40) * 0.85, 2)
+        carrito.append({
+            "ID Producto": id_producto,
+            "Descripción": descripcion,
+            "Unidad Compra": "UND",
+            "Factor": 1.0,
+            "Cantidad Compra": cantidad,
+            "Cantidad Final": cantidad,
+            "Precio U. Compra": precio,
+            "Subtotal": round(cantidad * precio, 2),
+        })
+    return carrito
+
+
+def estado_productos(cursor, carrito):
+    cursor.execute(
+        f"SELECT id, {COLUMNAS_PRODUCTO} FROM producto WHERE id = ANY(%s) ORDER BY id",
+        ([item["ID Producto"] for item in carrito],)
+    )
+    return cursor.fetchall()
+
+
+def compra_anterior(cursor, proveedor, carrito):
+    """El registro tal como lo hacía compras_app (una sentencia o más por paso y línea)."""
+    from db import actualizar_costo_promedio, recalcular_precios_producto, registrar_historial_precio
+    from services.compra_service import armar_compra
+
+    compra, items = armar_compra(
+        date.today(), proveedor[0], proveedor[1], "BENCH", TIPO_DOC, "Efectivo", REGIMEN, 0, carrito
+    )
+    cursor.execute("""
+        INSERT INTO compras (
+            fecha, id_proveedor, nro_doc, tipo_doc,
+            suma_total, descuento, op_gravada, op_gratuita,
+            igv, total, metodo_pago
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING id
+    """, (
+        compra["fecha"], compra["id_proveedor"], compra["nro_doc"], compra["tipo_doc"],
+        compra["suma_total"], compra["descuento"], compra["op_gravada"], compra["op_gratuita"],
+        compra["igv"], compra["total"], compra["metodo_pago"]
+    ))
+    id_compra = cursor.fetchone()[0]
+
+    for item in items:
+        cursor.execute("""
+            INSERT INTO compras_detalle (
+                id_compra, id_producto, cantidad_compra, unidad_compra,
+                factor_conversion, cantidad_final, precio_unitario, subtotal
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (
+            id_compra, item["id_producto"], item["cantidad_compra"], item["unidad_compra"],
+            item["factor"], item["cantidad_final"], item["precio_unitario"], item["subtotal"]
+        ))
+        actualizar_costo_promedio(cursor, item["id_producto"], item["cantidad_final"], item["costo_unitario"])
+        resultado = recalcular_precios_producto(cursor, item["id_producto"])
+        if resultado:
+            registrar_historial_precio(cursor, item["id_producto"], *resultado)
+        cursor.execute("""
+            INSERT INTO public.movimientos (
+                id_producto, tipo, cantidad, fecha, motivo, referencia,
+                costo_unitario, valor_total
+            )
+            VALUES (%s, 'entrada', %s, %s, %s, %s, %s, %s)
+        """, (
+            item["id_producto"], item["cantidad_final"], compra["fecha"], compra["motivo"],
+            compra["nro_doc"], item["costo_unitario"], item["cantidad_final"] * item["costo_unitario"]
+        ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_compras")
+    parser.add_argument("--lineas", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--max-anterior", type=int, default=1000, metavar="LINEAS",
+                        help="Tamaño máximo de factura para medir el flujo anterior")
+    agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+
+    with red_simulada(args, os.getenv("DATABASE_URL")) as (url, _):
+        os.environ["DATABASE_URL"] = url
+        return medir(args)
+
+
+def medir(args):
+    from db import crear_conexion, unidad_de_trabajo
+    from services.catalogo_cache import obtener_catalogo
+    from services.compra_service import registrar_compra
+
+    conn = crear_conexion()
+    try:
+        asegurar_esquema(conn)
+        sembrar(conn)
+        proveedor, productos = preparar(conn, max(args.lineas))
+        rtt = medir_rtt(conn)
+    finally:
+        conn.close()
+
+    # El catálogo en memoria se carga antes para no contar su carga inicial
+    obtener_catalogo()
+
+    print(f"RTT (SELECT 1) p50 {rtt:.1f} ms\n")
+    print(f"{'líneas':>6}  {'anterior':>22}  {'registrar_compra':>22}")
+
+    fallos = []
+    sentencias_nuevas = set()
+    n = 0
+    for lineas in args.lineas:
+        anterior = {"sentencias": set(), "ms": []}
+        nueva = {"sentencias": set(), "ms": []}
+
+        for _ in range(args.repeticiones):
+            n += 1
+            carrito = carrito_de(productos, lineas, n)
+
+            # Flujo anterior sobre el mismo estado, deshecho al final
+            esperado = None
+            if lineas <= args.max_anterior:
+                conn = crear_conexion()
+                conn.autocommit = False
+                try:
+                    cursor = conn.cursor(cursor_factory=CursorContador)
+                    CursorContador.reiniciar()
+                    inicio = time.perf_counter()
+                    compra_anterior(cursor, proveedor, carrito)
+                    anterior["ms"].append((time.perf_counter() - inicio) * 1000)
+                    anterior["sentencias"].add(CursorContador.sentencias())
+                    esperado = estado_productos(cursor, carrito)
+                finally:
+                    conn.rollback()
+                    conn.close()
+
+            with unidad_de_trabajo() as compartida:
+                compartida.cursor_factory = CursorContador
+                try:
+                    CursorContador.reiniciar()
+                    inicio = time.perf_counter()
+                    registrar_compra(
+                        fecha=date.today(),
+                        id_proveedor=proveedor[0],
+                        nombre_proveedor=proveedor[1],
+                        nro_doc="BENCH",
+                        tipo_doc=TIPO_DOC,
+                        metodo_pago="Efectivo",
+                        regimen=REGIMEN,
+                        descuento=0,
+                        carrito=carrito,
+                    )
+                    nueva["ms"].append((time.perf_counter() - inicio) * 1000)
+                    nueva["sentencias"].add(CursorContador.sentencias())
+                finally:
+                    compartida.cursor_factory = extensions.cursor
+
+            if esperado is not None:
+                conn = crear_conexion()
+                try:
+                    obtenido = estado_productos(conn.cursor(), carrito)
+                finally:
+                    conn.close()
+                distintos = [e[0] for e, o in zip(esperado, obtenido) if e != o]
+                if distintos:
+                    fallos.append(f"{lineas} líneas: {len(distintos)} productos distintos al flujo anterior "
+                                  f"(p. ej. {distintos[0]})")
+
+        sentencias_nuevas |= nueva["sentencias"]
+
+        def resumen(r):
+            if not r["ms"]:
+                return "-"
+            return f"{'/'.join(map(str, sorted(r['sentencias'])))} sent. {statistics.median(r['ms']):8.1f} ms"
+
+        print(f"{lineas:>6}  {resumen(anterior):>22}  {resumen(nueva):>22}")
+
+    if len(sentencias_nuevas) != 1:
+        fallos.append("Las sentencias de registrar_compra dependen del tamaño de la factura")
+
+    if fallos:
+        print()
+        for f in fallos:
+            print(f"❌ {f}")
+        return 1
+
+    print(f"\n✅ {sentencias_nuevas.pop()} sentencia(s) por compra sin importar el número de líneas; "
+          "mismos stocks, costos y precios que el flujo anterior")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+# benchmarks/bench_fragmentos.py
+"""
+Costo de cada interacción del POS: página entera vs. solo su fragmento.
+
+Uso (contra una BD de pruebas, nunca producción):
+    python -m benchmarks.bench_fragmentos [--latencia 60] [--jitter 10] [--repeticiones 5]
+
+En modulos/ventas.py la búsqueda, el carrito (con el cobro) y el tablero de
+taller son st.fragment: buscar o agregar un producto vuelve a ejecutar solo
+su panel. AppTest siempre ejecuta la página entera, así que cada interacción
+se mide dos veces:
+  - página: la página completa después de la interacción (lo que costaba
+    antes, y lo que cuesta hoy si el fragmento pide st.rerun());
+  - fragmento: una página que solo llama al panel, con los mismos argumentos
+    con que lo llamó la página (capturados en la primera corrida) y el mismo
+    session_state: es lo que ejecuta el rerun del fragmento en el navegador.
+Los viajes a la BD los cuenta benchmarks/proxy_latencia.py.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from benchmarks.bench_acciones import TIMEOUT_PAGINA, boton, pagina_ventas, preparar
+from benchmarks.proxy_latencia import ProxyLatencia, base_de_datos
+
+PANELES = ("panel_busqueda", "panel_carrito")
+
+
+def capturar_paneles():
+    """
+    Envuelve los paneles de modulos.ventas: cada envoltura guarda en
+    .llamada los argumentos con que ventas_app la llamó la última vez.
+    """
+    import modulos.ventas as ventas
+
+    def envolver(original):
+        def envoltura(*args, **kwargs):
+            envoltura.llamada = (args, kwargs)
+            return original(*args, **kwargs)
+        return envoltura
+
+    for nombre in PANELES:
+        setattr(ventas, nombre, envolver(getattr(ventas, nombre)))
+
+
+def pagina_panel(nombre):
+    import modulos.ventas as ventas
+
+    panel = getattr(ventas, nombre)
+    args, kwargs = panel.llamada
+    panel(*args, **kwargs)
+
+
+def abrir(pagina, usuario, id_caja, *args, estado=None):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_function(pagina, args=args, default_timeout=TIMEOUT_PAGINA)
+    at.session_state["usuario"] = usuario
+    at.session_state["caja_abierta_id"] = id_caja
+    for clave, valor in (estado or {}).items():
+        at.session_state[clave] = valor
+    return at.run()
+
+
+def interacciones(id_producto, codigo_barras):
+    """(nombre, panel, acción sobre la AppTest ya abierta)."""
+    lista = [
+        ("Buscar producto", "panel_busqueda",
+         lambda at: at.text_input(key="criterio_busqueda").input(id_producto).run()),
+        ("Agregar ítem", "panel_carrito",
+         lambda at: boton(at, "➕ Agregar a la venta").click().run()),
+    ]
+    if codigo_barras:
+        lista.append(("Escanear código", "panel_carrito",
+                      lambda at: at.text_input(key="codigo_escaneado").input(codigo_barras).run()))
+    return lista
+
+
+def medir(proxy, repeticiones, id_caja, usuario, id_producto, codigo_barras):
+    """{(interacción, "página"|"fragmento"): {"viajes": [...], "ms": [...]}}"""
+    resultados = {}
+
+    def tomar(clave, at, accion):
+        en_carrito = len(at.session_state["carrito_ventas"])
+        proxy.reiniciar()
+        inicio = time.perf_counter()
+        accion(at)
+        ms = (time.perf_counter() - inicio) * 1000
+        errores = [e.value for e in at.exception]
+        if errores:
+            raise RuntimeError(f"{clave}: {errores[0]}")
+        if clave[0] != "Buscar producto" and len(at.session_state["carrito_ventas"]) != en_carrito + 1:
+            raise RuntimeError(f"{clave}: el producto no llegó al carrito")
+        r = resultados.setdefault(clave, {"viajes": [], "ms": []})
+        r["viajes"].append(proxy.contadores()["viajes"])
+        r["ms"].append(ms)
+
+    for _ in range(repeticiones):
+        for nombre, panel, accion in interacciones(id_producto, codigo_barras):
+            # Página con el producto ya buscado (el carrito necesita uno elegido)
+            at = abrir(pagina_ventas, usuario, id_caja)
+            if panel == "panel_carrito":
+                at.text_input(key="criterio_busqueda").input(id_producto).run()
+            estado = {
+                clave: at.session_state[clave]
+                for clave in ("producto_pos", "placa_vehiculo", "metodo_pago_select")
+                if clave in at.session_state
+            }
+            tomar((nombre, "página"), at, accion)
+
+            solo_panel = abrir(pagina_panel, usuario, id_caja, panel, estado=dict(estado, carrito_ventas=[]))
+            tomar((nombre, "fragmento"), solo_panel, accion)
+    return resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_fragmentos")
+    parser.add_argument("--latencia", type=float, default=60.0, metavar="MS", help="RTT simulado")
+    parser.add_argument("--jitter", type=float, default=10.0, metavar="MS")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--pg-bin", default=os.getenv("PG_BIN"),
+                        help="Binarios de PostgreSQL para levantar una BD local desechable")
+    args = parser.parse_args(argv)
+
+    from psycopg2.extensions import parse_dsn
+
+    with base_de_datos(args) as url_bd:
+        dsn = parse_dsn(url_bd)
+        with ProxyLatencia(dsn.get("host", "localhost"), dsn.get("port", 5432)) as proxy:
+            # db lee DATABASE_URL al importarse: todo el tráfico pasa por el proxy
+            os.environ["DATABASE_URL"] = proxy.url(url_bd)
+            if args.pg_bin:
+                os.environ["DB_SSLMODE"] = "disable"
+
+            from benchmarks.semilla import sembrar
+            from db import crear_conexion
+            from migraciones import asegurar_esquema
+            from services.catalogo_cache import obtener_catalogo
+
+            conn = crear_conexion()
+            try:
+                asegurar_esquema(conn)
+                sembrar(conn)
+                id_caja, usuario, id_producto = preparar(conn)
+                cursor = conn.cursor()
+                cursor.execute("SELECT codigo_barras FROM producto WHERE id = %s", (id_producto,))
+                codigo_barras = cursor.fetchone()[0]
+                cursor.close()
+            finally:
+                conn.close()
+
+            capturar_paneles()
+            obtener_catalogo()
+            medir(proxy, 1, id_caja, usuario, id_producto, codigo_barras)
+
+            local = medir(proxy, args.repeticiones, id_caja, usuario, id_producto, codigo_barras)
+
+            proxy.latencia_ms = args.latencia
+            proxy.jitter_ms = args.jitter
+            con_red = medir(proxy, args.repeticiones, id_caja, usuario, id_producto, codigo_barras)
+
+    print(f"\nMediana de {args.repeticiones} repeticiones · RTT {args.latencia:.0f} ± {args.jitter / 2:.0f} ms\n")
+    print(f"{'interacción':<20}{'se ejecuta':<12}{'viajes':>7}{'local ms':>10}{'con red ms':>12}")
+    for (nombre, alcance), r in con_red.items():
+        print(
+            f"{nombre:<20}{alcance:<12}{statistics.median(r['viajes']):>7.0f}"
+            f"{statistics.median(local[(nombre, alcance)]['ms']):>10.0f}"
+            f"{statistics.median(r['ms']):>12.0f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
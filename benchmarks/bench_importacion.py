@@ -0,0 +1,245 @@
+# benchmarks/bench_importacion.py
+"""
+Importar una factura de proveedor grande: leer, emparejar y registrar.
+
+Uso (contra una BD de pruebas, nunca producción; registra compras reales):
+    python -m benchmarks.bench_importacion [--lineas 500] [--desconocidas 10] [--latencia 60]
+
+Genera una factura de --lineas líneas en CSV y en XML UBL con códigos
+mezclados (código de barras, catálogo, id del producto y código propio del
+proveedor junto al código de barras) más --desconocidas códigos que no
+existen, y mide cada paso con services/importacion_compras:
+  - lectura del CSV y del XML (deben dar las mismas líneas);
+  - emparejar_lineas: viajes a la BD (no dependen del número de líneas) y
+    líneas sin emparejar (deben ser exactamente las desconocidas);
+  - registrar_compra con el carrito importado (una transacción).
+Después vuelve a importar la factura sin códigos de barras: las líneas que
+solo traen el código del proveedor deben emparejarse por ese código, que
+registrar_compra anotó en producto_proveedor.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from datetime import date
+from xml.sax.saxutils import escape
+
+from psycopg2 import extensions
+
+from benchmarks.bench_checkout import CursorContador, medir_rtt
+from benchmarks.proxy_latencia import agregar_argumentos, red_simulada
+from benchmarks.semilla import sembrar
+from migraciones import asegurar_esquema
+
+REGIMEN = "Nuevo RUS"
+
+
+def preparar(conn, lineas):
+    """Un proveedor y productos con catálogo único y margen válido."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, nombre, dni_ruc FROM proveedor ORDER BY id DESC LIMIT 1")
+    proveedor = cursor.fetchone()
+    cursor.execute("""
+        SELECT p.id, p.descripcion, p.codigo_barras, p.catalogo
+        FROM producto p
+        WHERE COALESCE(p.margen_utilidad, 0) < 1
+          AND p.codigo_barras IS NOT NULL
+          AND p.catalogo IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM producto o WHERE o.catalogo = p.catalogo AND o.id <> p.id
+          )
+        ORDER BY p.id
+        LIMIT %s
+    """, (lineas,))
+    productos = cursor.fetchall()
+    cursor.close()
+    return proveedor, productos
+
+
+def factura(productos, desconocidas, con_barras=True):
+    """
+    Líneas (codigo, codigo_barras, descripcion, unidad, cantidad, precio).
+    Cada cuarta línea trae el código propio del proveedor y, si con_barras,
+    el código de barras; las demás, el catálogo, el id o el código de barras.
+    """
+    lineas = []
+    for i, (id_producto, descripcion, codigo_barras, catalogo) in enumerate(productos):
+        # Sin ; ni comillas: el CSV de prueba se escribe sin citar
+        descripcion = descripcion.replace(";", ",").replace('"', "'")
+        cantidad = 1 + i % 6
+        precio = f"{3.10 + (i * 7 % 40) * 0.85:.2f}"
+        tipo = i % 4
+        if tipo == 0:
+            lineas.append((f"PRV-{id_producto}", codigo_barras if con_barras else "",
+                           descripcion, "UND", cantidad, precio))
+        elif tipo == 1:
+            lineas.append((catalogo, "", descripcion, "UND", cantidad, precio))
+        elif tipo == 2:
+            lineas.append((id_producto, "", descripcion, "UND", cantidad, precio))
+        else:
+            lineas.append((codigo_barras, "", descripcion, "UND", cantidad, precio))
+    for i in range(desconocidas):
+        lineas.append((f"ZZ-{i:05d}", "", f"Artículo nuevo {i}", "UND", 1, "9.90"))
+    return lineas
+
+
+def como_csv(lineas):
+    texto = io.StringIO()
+    texto.write("codigo;codigo_barras;descripcion;unidad;cantidad;precio\n")
+    for codigo, barras, descripcion, unidad, cantidad, precio in lineas:
+        texto.write(f"{codigo};{barras};{descripcion};{unidad};{cantidad};{precio.replace('.', ',')}\n")
+    return io.BytesIO(texto.getvalue().encode("utf-8"))
+
+
+def como_ubl(lineas, ruc):
+    partes = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<Invoice xmlns="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2"'
+        ' xmlns:cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2"'
+        ' xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2">',
+        "<cbc:UBLVersionID>2.1</cbc:UBLVersionID>",
+        "<cbc:ID>F001-00012345</cbc:ID>",
+        f"<cbc:IssueDate>{date.today().isoformat()}</cbc:IssueDate>",
+        '<cbc:InvoiceTypeCode listID="0101">01</cbc:InvoiceTypeCode>',
+        "<cac:AccountingSupplierParty><cac:Party><cac:PartyIdentification>"
+        f'<cbc:ID schemeID="6">{ruc}</cbc:ID>'
+        "</cac:PartyIdentification></cac:Party></cac:AccountingSupplierParty>",
+    ]
+    for n, (codigo, barras, descripcion, unidad, cantidad, precio) in enumerate(lineas, start=1):
+        estandar = (f"<cac:StandardItemIdentification><cbc:ID>{barras}</cbc:ID>"
+                    "</cac:StandardItemIdentification>") if barras else ""
+        partes.append(
+            f"<cac:InvoiceLine><cbc:ID>{n}</cbc:ID>"
+            f'<cbc:InvoicedQuantity unitCode="{unidad}">{cantidad}</cbc:InvoicedQuantity>'
+            f"<cac:Item><cbc:Description>{escape(descripcion)}</cbc:Description>"
+            f"<cac:SellersItemIdentification><cbc:ID>{escape(codigo)}</cbc:ID>"
+            f"</cac:SellersItemIdentification>{estandar}</cac:Item>"
+            f'<cac:Price><cbc:PriceAmount currencyID="PEN">{precio}</cbc:PriceAmount></cac:Price>'
+            "</cac:InvoiceLine>"
+        )
+    partes.append("</Invoice>")
+    return io.BytesIO("\n".join(partes).encode("utf-8"))
+
+
+def emparejar_contando(id_proveedor, lineas):
+    """(df, viajes a la BD, ms) de emparejar_lineas."""
+    from db import unidad_de_trabajo
+    from services.importacion_compras import emparejar_lineas
+
+    with unidad_de_trabajo() as compartida:
+        compartida.cursor_factory = CursorContador
+        try:
+            CursorContador.reiniciar()
+            inicio = time.perf_counter()
+            df = emparejar_lineas(id_proveedor, lineas)
+            ms = (time.perf_counter() - inicio) * 1000
+            # copy_expert no pasa por execute: se suma el COPY
+            viajes = CursorContador.sentencias() + 1
+        finally:
+            compartida.cursor_factory = extensions.cursor
+    return df, viajes, ms
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_importacion")
+    parser.add_argument("--lineas", type=int, default=500)
+    parser.add_argument("--desconocidas", type=int, default=10)
+    agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+
+    with red_simulada(args, os.getenv("DATABASE_URL")) as (url, _):
+        os.environ["DATABASE_URL"] = url
+        return medir(args)
+
+
+def medir(args):
+    from db import crear_conexion
+    from services.catalogo_cache import obtener_catalogo
+    from services.compra_service import registrar_compra
+    from services.importacion_compras import carrito_desde_importacion, leer_factura
+
+    conn = crear_conexion()
+    try:
+        asegurar_esquema(conn)
+        sembrar(conn)
+        proveedor, productos = preparar(conn, args.lineas)
+        rtt = medir_rtt(conn)
+    finally:
+        conn.close()
+
+    id_proveedor, nombre_proveedor, ruc = proveedor
+    obtener_catalogo()
+    fallos = []
+
+    print(f"RTT (SELECT 1) p50 {rtt:.1f} ms")
+    print(f"Factura de {len(productos)} líneas + {args.desconocidas} desconocidas, proveedor {id_proveedor}\n")
+
+    datos = factura(productos, args.desconocidas)
+
+    inicio = time.perf_counter()
+    _, lineas_csv = leer_factura("factura.csv", como_csv(datos))
+    ms_csv = (time.perf_counter() - inicio) * 1000
+    inicio = time.perf_counter()
+    cabecera, lineas_xml = leer_factura("factura.xml", como_ubl(datos, ruc))
+    ms_xml = (time.perf_counter() - inicio) * 1000
+    print(f"{'leer CSV':<28} {ms_csv:8.1f} ms")
+    print(f"{'leer XML UBL':<28} {ms_xml:8.1f} ms")
+
+    # "linea" es la fila del CSV (con el encabezado) y el ítem en el XML
+    sin_numero = lambda lineas: [{k: v for k, v in l.items() if k != "linea"} for l in lineas]
+    if sin_numero(lineas_csv) != sin_numero(lineas_xml):
+        fallos.append("El CSV y el XML de la misma factura dan líneas distintas")
+    if cabecera.get("ruc") != ruc or cabecera.get("tipo_doc") != "Factura":
+        fallos.append(f"Cabecera del XML mal leída: {cabecera}")
+
+    df, viajes, ms = emparejar_contando(id_proveedor, lineas_xml)
+    sin_emparejar = df[df["ID Producto"].isna()]
+    print(f"{'emparejar_lineas':<28} {ms:8.1f} ms  {viajes} viajes  "
+          f"{len(df) - len(sin_emparejar)} emparejadas, {len(sin_emparejar)} sin emparejar")
+    for criterio, cantidad in df["Emparejado por"].value_counts().items():
+        print(f"{'':<30}{criterio}: {cantidad}")
+
+    if sorted(sin_emparejar["Código"]) != [f"ZZ-{i:05d}" for i in range(args.desconocidas)]:
+        fallos.append("Las líneas sin emparejar no son exactamente las desconocidas")
+    esperados = [p[0] for p in productos]
+    if df["ID Producto"].dropna().tolist() != esperados:
+        fallos.append("Alguna línea se emparejó con otro producto")
+
+    carrito = carrito_desde_importacion(df)
+    inicio = time.perf_counter()
+    registrar_compra(
+        fecha=date.today(),
+        id_proveedor=id_proveedor,
+        nombre_proveedor=nombre_proveedor,
+        nro_doc=cabecera["nro_doc"],
+        tipo_doc=cabecera["tipo_doc"],
+        metodo_pago="Transferencia",
+        regimen=REGIMEN,
+        descuento=0,
+        carrito=carrito,
+    )
+    print(f"{'registrar_compra':<28} {(time.perf_counter() - inicio) * 1000:8.1f} ms  {len(carrito)} líneas")
+
+    # Segunda factura sin códigos de barras: los códigos del proveedor ya se conocen
+    _, lineas = leer_factura("factura.csv", como_csv(factura(productos, 0, con_barras=False)))
+    df, viajes, ms = emparejar_contando(id_proveedor, lineas)
+    por_codigo = df["Emparejado por"].eq("Código proveedor").sum()
+    print(f"{'emparejar (2.ª factura)':<28} {ms:8.1f} ms  {viajes} viajes  "
+          f"{por_codigo} de {len(df)} por código del proveedor")
+    if por_codigo != len(df) or df["ID Producto"].tolist() != esperados:
+        fallos.append("La segunda factura no se emparejó por los códigos anotados en la primera")
+
+    if fallos:
+        print()
+        for f in fallos:
+            print(f"❌ {f}")
+        return 1
+
+    print("\n✅ CSV y XML iguales; solo las líneas desconocidas quedan sin emparejar; "
+          "la siguiente factura se empareja por el código del proveedor")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
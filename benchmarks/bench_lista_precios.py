@@ -0,0 +1,217 @@
+# benchmarks/bench_lista_precios.py
+"""
+Cargar la lista de precios completa de un proveedor en producto_proveedor.
+
+Uso (contra una BD de pruebas, nunca producción; modifica producto_proveedor):
+    python -m benchmarks.bench_lista_precios [--filas 30000] [--latencia 60]
+
+Genera una lista de --filas filas (códigos de barras, ids y catálogos, con
+algunas filas repetidas y algunos códigos desconocidos) y la carga dos
+veces con services/lista_precios, la segunda con precios que suben o bajan
+en un porcentaje conocido. Verifica:
+  - viajes a la BD por carga (no dependen del número de filas);
+  - sin emparejar / repetidas / nuevas + actualizadas según lo generado;
+  - que resumen_variaciones cuente las subidas y bajadas generadas y que
+    producto_proveedor quede con los precios nuevos.
+Al final compara elegir productos en compras_app: una consulta por
+producto (antes) contra el mapa en memoria del proveedor.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+from psycopg2 import extensions
+
+from benchmarks.bench_checkout import CursorContador, medir_rtt
+from benchmarks.proxy_latencia import agregar_argumentos, red_simulada
+from benchmarks.semilla import sembrar
+from migraciones import asegurar_esquema
+
+UNIDAD = "CAJA"
+FACTOR = 12
+REPETIDAS = 25
+DESCONOCIDAS = 40
+ELEGIDOS = 200
+
+
+def preparar(conn, filas):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM proveedor ORDER BY id DESC OFFSET 1 LIMIT 1")
+    id_proveedor = cursor.fetchone()[0]
+    cursor.execute("""
+        SELECT p.id, p.codigo_barras, p.catalogo
+        FROM producto p
+        WHERE p.codigo_barras IS NOT NULL
+          AND p.catalogo IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM producto o WHERE o.catalogo = p.catalogo AND o.id <> p.id
+          )
+        ORDER BY p.id
+        LIMIT %s
+    """, (filas,))
+    productos = cursor.fetchall()
+    cursor.close()
+    return id_proveedor, productos
+
+
+def precio_base(i):
+    return round(5 + (i * 37 % 900) * 0.25, 2)
+
+
+def variacion(i):
+    """Cambio de la segunda lista: cada 3.ª sube 10 %, cada 5.ª baja 5 %."""
+    if i % 3 == 0:
+        return 1.10
+    if i % 5 == 0:
+        return 0.95
+    return 1.0
+
+
+def lista(productos, segunda=False):
+    texto = io.StringIO()
+    texto.write("codigo;descripcion;unidad;factor;precio;lote_min;tiempo_entrega\n")
+    for i, (id_producto, codigo_barras, catalogo) in enumerate(productos):
+        codigo = (codigo_barras, id_producto, catalogo)[i % 3]
+        precio = round(precio_base(i) * (variacion(i) if segunda else 1), 2)
+        texto.write(f"{codigo};Producto {i};{UNIDAD};{FACTOR};{precio:.2f};1;{2 + i % 5}\n")
+    # Repetidas al final con el mismo precio: vale la última
+    for i, (id_producto, _, _) in enumerate(productos[:REPETIDAS]):
+        precio = round(precio_base(i) * (variacion(i) if segunda else 1), 2)
+        texto.write(f"{id_producto};Producto {i};{UNIDAD};{FACTOR};{precio:.2f};1;3\n")
+    for i in range(DESCONOCIDAS):
+        texto.write(f"XX-{i:06d};Desconocido {i};{UNIDAD};{FACTOR};9.90;;\n")
+    return io.BytesIO(texto.getvalue().encode("utf-8"))
+
+
+def cargar_contando(id_proveedor, archivo):
+    from db import unidad_de_trabajo
+    from services.lista_precios import cargar_lista_precios
+
+    with unidad_de_trabajo() as compartida:
+        compartida.cursor_factory = CursorContador
+        try:
+            CursorContador.reiniciar()
+            inicio = time.perf_counter()
+            df = cargar_lista_precios(id_proveedor, archivo)
+            ms = (time.perf_counter() - inicio) * 1000
+            # copy_expert no pasa por execute: se suma el COPY
+            viajes = CursorContador.sentencias() + 1
+        finally:
+            compartida.cursor_factory = extensions.cursor
+    return df, viajes, ms
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_lista_precios")
+    parser.add_argument("--filas", type=int, default=30000)
+    agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+
+    with red_simulada(args, os.getenv("DATABASE_URL")) as (url, _):
+        os.environ["DATABASE_URL"] = url
+        return medir(args)
+
+
+def medir(args):
+    from db import crear_conexion, get_connection
+    from services.lista_precios import presentaciones_producto, presentaciones_proveedor, resumen_variaciones
+
+    conn = crear_conexion()
+    try:
+        asegurar_esquema(conn)
+        sembrar(conn)
+        id_proveedor, productos = preparar(conn, args.filas)
+        rtt = medir_rtt(conn)
+    finally:
+        conn.close()
+
+    n = len(productos)
+    fallos = []
+    print(f"RTT (SELECT 1) p50 {rtt:.1f} ms")
+    print(f"Lista de {n} productos + {REPETIDAS} repetidas + {DESCONOCIDAS} desconocidas, proveedor {id_proveedor}\n")
+
+    for segunda in (False, True):
+        df, viajes, ms = cargar_contando(id_proveedor, lista(productos, segunda))
+        resumen = resumen_variaciones(df)
+        print(f"{'2.ª carga' if segunda else '1.ª carga':<10} {ms:9.1f} ms  {viajes} viajes  "
+              f"nuevas {resumen['nuevas']}, actualizadas {resumen['actualizadas']}, "
+              f"repetidas {resumen['repetidas']}, sin emparejar {resumen['sin_emparejar']}")
+
+        if (resumen["sin_emparejar"], resumen["repetidas"]) != (DESCONOCIDAS, REPETIDAS):
+            fallos.append(f"Carga {2 if segunda else 1}: sin emparejar/repetidas distintas a las generadas")
+        if resumen["nuevas"] + resumen["actualizadas"] != n:
+            fallos.append(f"Carga {2 if segunda else 1}: {resumen['nuevas'] + resumen['actualizadas']} "
+                          f"presentaciones cargadas de {n}")
+
+    suben = sum(1 for i in range(n) if variacion(i) > 1)
+    bajan = sum(1 for i in range(n) if variacion(i) < 1)
+    print(f"{'':<10} suben {resumen['suben']}, bajan {resumen['bajan']}, "
+          f"mediana {resumen['variacion_mediana']:+.2f} %, p90 {resumen['variacion_p90']:+.2f} %")
+    if (resumen["actualizadas"], resumen["suben"], resumen["bajan"]) != (n, suben, bajan):
+        fallos.append(f"Variaciones: se esperaban {suben} subidas y {bajan} bajadas de {n}")
+
+    conn = crear_conexion()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id_producto, precio_compra
+            FROM producto_proveedor
+            WHERE id_proveedor = %s AND unidad_compra = %s AND id_producto = ANY(%s)
+        """, (id_proveedor, UNIDAD, [p[0] for p in productos]))
+        guardados = dict(cursor.fetchall())
+    finally:
+        conn.close()
+    distintos = [
+        p[0] for i, p in enumerate(productos)
+        if guardados.get(p[0]) is None or float(guardados[p[0]]) != round(precio_base(i) * variacion(i), 2)
+    ]
+    if distintos:
+        fallos.append(f"{len(distintos)} presentaciones con otro precio en la BD (p. ej. {distintos[0]})")
+
+    # compras_app: elegir productos del proveedor
+    elegidos = [p[0] for p in productos[:ELEGIDOS]]
+    antes = []
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        for id_producto in elegidos:
+            inicio = time.perf_counter()
+            cursor.execute("""
+                SELECT unidad_compra, factor, precio_compra
+                FROM producto_proveedor
+                WHERE id_producto=%s AND id_proveedor=%s
+            """, (id_producto, id_proveedor))
+            cursor.fetchall()
+            antes.append((time.perf_counter() - inicio) * 1000)
+    finally:
+        conn.close()
+
+    presentaciones_proveedor.clear()
+    inicio = time.perf_counter()
+    presentaciones_proveedor(id_proveedor)
+    carga_mapa = (time.perf_counter() - inicio) * 1000
+    ahora = []
+    for id_producto in elegidos:
+        inicio = time.perf_counter()
+        presentaciones_producto(id_proveedor, id_producto)
+        ahora.append((time.perf_counter() - inicio) * 1000)
+
+    print(f"\ncompras_app, presentaciones del producto elegido ({ELEGIDOS} productos):")
+    print(f"  consulta por producto   p50 {statistics.median(antes):7.2f} ms")
+    print(f"  mapa en memoria         p50 {statistics.median(ahora):7.2f} ms  (carga única {carga_mapa:.0f} ms)")
+
+    if fallos:
+        print()
+        for f in fallos:
+            print(f"❌ {f}")
+        return 1
+
+    print("\n✅ Lista cargada en una transacción con viajes fijos; variaciones y precios guardados como se generaron")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+# benchmarks/bench_recalcular_precios.py
+"""
+Recalcular los precios de venta del catálogo tras cambiar el margen global.
+
+Uso (contra una BD de pruebas; todo se deshace al final de cada medición):
+    python -m benchmarks.bench_recalcular_precios [--anterior 2000] [--latencia 60]
+
+En una transacción que se deshace sube el margen global (--delta) y:
+  - anterior: recalcular_precios_producto por cada producto, como hacía
+    recalcular_todos_los_precios (limitado a --anterior productos de la
+    categoría: con latencia, toda la categoría son minutos);
+  - recalcular_precios: la función de la BD para la categoría completa y
+    para todo el catálogo.
+Verifica que ambos caminos dejen los mismos valor_venta / precio_venta y
+que el historial tenga una fila por producto que cambió de precio.
+"""
+import argparse
+import os
+import sys
+import time
+
+from benchmarks.bench_checkout import CursorContador, medir_rtt
+from benchmarks.proxy_latencia import agregar_argumentos, red_simulada
+from benchmarks.semilla import sembrar
+from migraciones import asegurar_esquema
+
+
+def preparar(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT c.nombre
+        FROM producto p
+        JOIN categoria c ON c.id = p.id_categoria
+        WHERE p.activo = 1 AND p.costo_promedio IS NOT NULL
+        GROUP BY c.nombre
+        ORDER BY count(*) DESC, c.nombre
+        LIMIT 1
+    """)
+    categoria = cursor.fetchone()[0]
+    cursor.close()
+    return categoria
+
+
+def ids_categoria(cursor, categoria, limite=None):
+    cursor.execute("""
+        SELECT p.id
+        FROM producto p
+        JOIN categoria c ON c.id = p.id_categoria
+        WHERE c.nombre = %s AND p.activo = 1 AND p.costo_promedio IS NOT NULL
+        ORDER BY p.id
+        LIMIT %s
+    """, (categoria, limite))
+    return [r[0] for r in cursor.fetchall()]
+
+
+def precios(cursor, ids):
+    cursor.execute("""
+        SELECT id, valor_venta, precio_venta
+        FROM producto
+        WHERE id = ANY(%s)
+        ORDER BY id
+    """, (ids,))
+    return cursor.fetchall()
+
+
+def en_transaccion(delta, medir):
+    """Sube el margen global, corre medir(cursor) y deshace todo."""
+    from db import crear_conexion
+
+    conn = crear_conexion()
+    conn.autocommit = False
+    try:
+        cursor = conn.cursor(cursor_factory=CursorContador)
+        cursor.execute("UPDATE configuracion SET margen_utilidad = margen_utilidad + %s WHERE id = 1", (delta,))
+        cursor.execute("SELECT count(*) FROM historial_precios")
+        historial_antes = cursor.fetchone()[0]
+        CursorContador.reiniciar()
+        inicio = time.perf_counter()
+        resultado = medir(cursor)
+        ms = (time.perf_counter() - inicio) * 1000
+        sentencias = CursorContador.sentencias()
+        cursor.execute("SELECT count(*) FROM historial_precios")
+        historial = cursor.fetchone()[0] - historial_antes
+        return resultado, ms, sentencias, historial
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_recalcular_precios")
+    parser.add_argument("--anterior", type=int, default=2000, metavar="PRODUCTOS",
+                        help="Productos a recalcular con el camino anterior")
+    parser.add_argument("--delta", type=float, default=0.02, help="Cuánto sube el margen global")
+    agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+
+    with red_simulada(args, os.getenv("DATABASE_URL")) as (url, _):
+        os.environ["DATABASE_URL"] = url
+        return medir(args)
+
+
+def medir(args):
+    from db import crear_conexion, recalcular_precios_producto
+
+    conn = crear_conexion()
+    try:
+        asegurar_esquema(conn)
+        sembrar(conn)
+        categoria = preparar(conn)
+        cursor = conn.cursor()
+        ids_anterior = ids_categoria(cursor, categoria, args.anterior)
+        ids_todos = ids_categoria(cursor, categoria)
+        rtt = medir_rtt(conn)
+    finally:
+        conn.close()
+
+    fallos = []
+    print(f"RTT (SELECT 1) p50 {rtt:.1f} ms")
+    print(f"Margen global +{args.delta:.2f}; categoría {categoria} ({len(ids_todos)} productos)\n")
+
+    def anterior(cursor):
+        for id_producto in ids_anterior:
+            recalcular_precios_producto(cursor, id_producto)
+        return precios(cursor, ids_anterior)
+
+    esperado, ms, sentencias, historial = en_transaccion(args.delta, anterior)
+    print(f"{'anterior':<28} {len(ids_anterior):>7} productos {ms:10.1f} ms  {sentencias:>6} sentencias  "
+          f"(~{ms / len(ids_anterior) * len(ids_todos) / 1000:.1f} s la categoría)")
+
+    def nuevo(categoria_alcance):
+        def correr(cursor):
+            cursor.execute("SELECT * FROM recalcular_precios(%s, NULL, NULL)", (categoria_alcance,))
+            resumen = cursor.fetchone()
+            return resumen, precios(cursor, ids_anterior)
+        return correr
+
+    for nombre, alcance in ((f"recalcular_precios (categoría)", categoria), ("recalcular_precios (todo)", None)):
+        ((revisados, actualizados, cambios), obtenido), ms, sentencias, historial = \
+            en_transaccion(args.delta, nuevo(alcance))
+        print(f"{nombre:<28} {revisados:>7} productos {ms:10.1f} ms  {sentencias:>6} sentencias  "
+              f"{actualizados} actualizados, {cambios} con otro precio")
+
+        distintos = [e[0] for e, o in zip(esperado, obtenido) if e != o]
+        if distintos:
+            fallos.append(f"{nombre}: {len(distintos)} productos con otro precio que el camino anterior "
+                          f"(p. ej. {distintos[0]})")
+        if historial != cambios:
+            fallos.append(f"{nombre}: {historial} filas de historial para {cambios} cambios de precio")
+        if alcance is not None and revisados != len(ids_todos):
+            fallos.append(f"{nombre}: revisó {revisados} productos de {len(ids_todos)}")
+
+    if fallos:
+        print()
+        for f in fallos:
+            print(f"❌ {f}")
+        return 1
+
+    print("\n✅ Mismos precios que recalcular_precios_producto, en una sentencia; historial solo de los que cambian")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+# benchmarks/bench_simulador_precios.py
+"""
+Simulador de precios sobre todo el catálogo (services/simulador_precios.py).
+
+Uso (contra una BD de pruebas; lo que se escribe se deshace al final):
+    python -m benchmarks.bench_simulador_precios [--escenarios 20] [--latencia 60]
+
+Mide:
+  - carga: los productos activos con costo del catálogo a arreglos de NumPy;
+  - simular + impacto: un escenario completo (lo que corre en cada
+    interacción de la pantalla), promedio de --escenarios márgenes;
+  - aplicar_precios: guardar un escenario, en una transacción que se deshace.
+Verifica que los precios simulados sean idénticos a los de la BD:
+  - margen global + --delta: contra recalcular_precios;
+  - un margen fijo con 4 decimales: contra redondeo_bancario en SQL;
+y que lo guardado por aplicar_precios sea lo simulado, con historial solo
+de los que cambian de precio.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_checkout import CursorContador, medir_rtt
+from benchmarks.proxy_latencia import agregar_argumentos, red_simulada
+from benchmarks.semilla import sembrar
+from migraciones import asegurar_esquema
+
+
+def precios_bd(cursor):
+    """(valor, precio) en céntimos de los productos activos con costo, en orden de id."""
+    cursor.execute("""
+        SELECT (valor_venta * 100)::bigint, (precio_venta * 100)::bigint
+        FROM producto
+        WHERE activo = 1 AND costo_promedio IS NOT NULL
+        ORDER BY id
+    """)
+    filas = cursor.fetchall()
+    return np.array([f[0] for f in filas], dtype=np.int64), np.array([f[1] for f in filas], dtype=np.int64)
+
+
+def en_transaccion(medir):
+    """Corre medir(cursor) en una transacción que se deshace."""
+    from db import crear_conexion
+
+    conn = crear_conexion()
+    conn.autocommit = False
+    try:
+        return medir(conn.cursor(cursor_factory=CursorContador))
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def comparar(nombre, simulacion, valor, precio, fallos):
+    distintos = np.flatnonzero((simulacion["valor"] != valor) | (simulacion["precio"] != precio))
+    if distintos.size:
+        fallos.append(f"{nombre}: {distintos.size} productos con otro precio que la BD "
+                      f"(p. ej. posición {distintos[0]})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_simulador_precios")
+    parser.add_argument("--escenarios", type=int, default=20, help="Escenarios a simular para el promedio")
+    parser.add_argument("--delta", type=float, default=0.02, help="Cuánto sube el margen global")
+    parser.add_argument("--margen", type=float, default=0.3333, help="Margen fijo a comparar con SQL")
+    agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+
+    with red_simulada(args, os.getenv("DATABASE_URL")) as (url, _):
+        os.environ["DATABASE_URL"] = url
+        return medir(args)
+
+
+def medir(args):
+    from db import crear_conexion
+    from services.simulador_precios import (
+        APLICAR_PRECIOS, a_diezmilesimos, cargar_productos, impacto, parametros_aplicar, simular
+    )
+
+    conn = crear_conexion()
+    try:
+        asegurar_esquema(conn)
+        sembrar(conn)
+        rtt = medir_rtt(conn)
+    finally:
+        conn.close()
+
+    fallos = []
+    print(f"RTT (SELECT 1) p50 {rtt:.1f} ms\n")
+
+    inicio = time.perf_counter()
+    datos = cargar_productos()
+    ms = (time.perf_counter() - inicio) * 1000
+    productos = len(datos["id"])
+    print(f"{'carga':<24} {productos:>7} productos {ms:10.1f} ms")
+
+    margenes = np.linspace(0.10, 0.45, args.escenarios)
+    inicio = time.perf_counter()
+    for margen in margenes:
+        resumen = impacto(datos, simular(datos, float(margen)))
+    ms = (time.perf_counter() - inicio) * 1000 / args.escenarios
+    print(f"{'simular + impacto':<24} {productos:>7} productos {ms:10.1f} ms por escenario "
+          f"(último: {resumen['cambian']} cambian)")
+
+    # Margen global + delta: mismos precios que recalcular_precios
+    margen_global = datos["margen_global"]
+    datos["margen_global"] = margen_global + a_diezmilesimos(args.delta)
+    simulacion = simular(datos)
+    datos["margen_global"] = margen_global
+
+    def recalcular(cursor):
+        cursor.execute("UPDATE configuracion SET margen_utilidad = margen_utilidad + %s WHERE id = 1", (args.delta,))
+        cursor.execute("SELECT * FROM recalcular_precios(NULL, NULL, NULL)")
+        return precios_bd(cursor)
+
+    comparar("margen global + delta", simulacion, *en_transaccion(recalcular), fallos)
+
+    # Margen fijo: mismo redondeo que la BD
+    simulacion = simular(datos, args.margen)
+
+    def redondeo_sql(cursor):
+        cursor.execute("""
+            SELECT (redondeo_bancario(p.costo_promedio / (1 - %(m)s::numeric)) * 100)::bigint,
+                   (redondeo_bancario(p.costo_promedio / (1 - %(m)s::numeric) * (1 + c.igv) * 2, 0) / 2 * 100)::bigint
+            FROM producto p
+            CROSS JOIN configuracion c
+            WHERE c.id = 1 AND p.activo = 1 AND p.costo_promedio IS NOT NULL
+            ORDER BY p.id
+        """, {"m": args.margen})
+        filas = cursor.fetchall()
+        return np.array([f[0] for f in filas], dtype=np.int64), np.array([f[1] for f in filas], dtype=np.int64)
+
+    comparar(f"margen fijo {args.margen}", simulacion, *en_transaccion(redondeo_sql), fallos)
+
+    # Guardar el escenario de margen fijo
+    parametros = parametros_aplicar(datos, simulacion)
+    cambian = len(parametros[0])
+    cambios_esperados = int((simulacion["precio"] != datos["precio"]).sum())
+
+    def aplicar(cursor):
+        cursor.execute("SELECT count(*) FROM historial_precios")
+        historial_antes = cursor.fetchone()[0]
+        CursorContador.reiniciar()
+        inicio = time.perf_counter()
+        cursor.execute(APLICAR_PRECIOS, parametros)
+        resultado = cursor.fetchone()
+        ms = (time.perf_counter() - inicio) * 1000
+        sentencias = CursorContador.sentencias()
+        cursor.execute("SELECT count(*) FROM historial_precios")
+        historial = cursor.fetchone()[0] - historial_antes
+        return resultado, ms, sentencias, historial, precios_bd(cursor)
+
+    (actualizados, cambios, omitidos), ms, sentencias, historial, guardados = en_transaccion(aplicar)
+    print(f"{'aplicar_precios':<24} {cambian:>7} productos {ms:10.1f} ms  {sentencias:>3} sentencias  "
+          f"{actualizados} actualizados, {cambios} con otro precio, {omitidos} omitidos")
+
+    comparar("aplicar_precios", simulacion, *guardados, fallos)
+    if omitidos:
+        fallos.append(f"aplicar_precios: {omitidos} productos omitidos sin cambios de costo")
+    if cambios != cambios_esperados or historial != cambios:
+        fallos.append(f"aplicar_precios: {historial} filas de historial, {cambios} cambios de precio, "
+                      f"{cambios_esperados} esperados")
+
+    if fallos:
+        print()
+        for f in fallos:
+            print(f"❌ {f}")
+        return 1
+
+    print("\n✅ Precios simulados idénticos a los de la BD; guardados en una sentencia, historial solo de los que cambian")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,476 @@
+# benchmarks/carga_ventas.py
+"""
+Prueba de carga del circuito de ventas con varias cajas a la vez.
+
+Uso (nunca contra producción):
+    python -m benchmarks.carga_ventas --pg-bin /usr/lib/postgresql/16/bin [--cajas 8] [--segundos 30]
+    python -m benchmarks.carga_ventas                      # usa DATABASE_URL (BD de pruebas)
+    python -m benchmarks.carga_ventas --comparar benchmarks/resultados/carga_ventas-....json
+
+Con --pg-bin (o PG_BIN) levanta un PostgreSQL local desechable y lo siembra
+(benchmarks/semilla.py). Cada caja simulada abre su caja y, hasta agotar el
+tiempo, registra ventas POS y órdenes de taller (crear_venta_abierta,
+editar_carrito_taller, guardar_venta) y anula algunas (anular_venta).
+Con --latencia/--jitter/--ancho-banda la BD se usa a través de
+benchmarks/proxy_latencia.py, con el costo de red de producción.
+
+Reporta ventas por minuto, latencia p50/p95/p99 y sentencias (viajes a la BD)
+por operación, esperas por locks y deadlocks, y verifica stock, kardex,
+comprobantes y caja. Cada corrida se guarda en benchmarks/resultados/.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from benchmarks.proxy_latencia import agregar_argumentos, base_de_datos, red_simulada
+
+DIRECTORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+
+# Productos que usan las cajas: stock alto para que ninguna venta quede limitada
+PRODUCTOS_EN_JUEGO = 300
+STOCK_INICIAL = Decimal("1000000")
+
+
+# -------------------------
+# 📏 Métricas
+# -------------------------
+class Metricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tiempos = defaultdict(list)
+        self.sentencias = defaultdict(list)
+        self.errores = defaultdict(list)
+        self.ventas = 0
+
+    def medir(self, operacion, funcion, *args, **kwargs):
+        """Ejecuta la operación en su propia unidad de trabajo, contando sentencias."""
+        from benchmarks.bench_checkout import CursorContador
+        from db import unidad_de_trabajo
+        from psycopg2 import extensions
+
+        with unidad_de_trabajo() as conn:
+            conn.cursor_factory = CursorContador
+            CursorContador.reiniciar()
+            inicio = time.perf_counter()
+            try:
+                resultado = funcion(*args, **kwargs)
+            except Exception as e:
+                with self._lock:
+                    self.errores[operacion].append(str(e).splitlines()[0])
+                return None
+            finally:
+                conn.cursor_factory = extensions.cursor
+
+            ms = (time.perf_counter() - inicio) * 1000
+            with self._lock:
+                self.tiempos[operacion].append(ms)
+                self.sentencias[operacion].append(CursorContador.sentencias())
+                if operacion in ("guardar_venta", "cerrar_taller"):
+                    self.ventas += 1
+            return resultado
+
+    def resumen(self):
+        operaciones = {}
+        for operacion in sorted(set(self.tiempos) | set(self.errores)):
+            tiempos = sorted(self.tiempos[operacion])
+            operaciones[operacion] = {
+                "n": len(tiempos),
+                "errores": len(self.errores[operacion]),
+                "p50_ms": percentil(tiempos, 50),
+                "p95_ms": percentil(tiempos, 95),
+                "p99_ms": percentil(tiempos, 99),
+                "sentencias": statistics.mean(self.sentencias[operacion]) if tiempos else None,
+                "ejemplo_error": self.errores[operacion][0] if self.errores[operacion] else None,
+            }
+        return operaciones
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    indice = min(len(valores) - 1, max(0, round(p / 100 * len(valores)) - 1))
+    return round(valores[indice], 2)
+
+
+class MonitorLocks(threading.Thread):
+    """Muestrea cada 20 ms cuántas sesiones están esperando un lock."""
+
+    def __init__(self, crear_conexion):
+        super().__init__(daemon=True)
+        self.conn = crear_conexion()
+        self.detener = threading.Event()
+        self.muestras = []
+
+    def run(self):
+        cursor = self.conn.cursor()
+        while not self.detener.is_set():
+            cursor.execute("""
+                SELECT count(*)
+                FROM pg_stat_activity
+                WHERE wait_event_type = 'Lock' AND datname = current_database()
+            """)
+            self.muestras.append(cursor.fetchone()[0])
+            time.sleep(0.02)
+        cursor.close()
+        self.conn.close()
+
+    def resumen(self):
+        con_espera = [m for m in self.muestras if m]
+        return {
+            "muestras": len(self.muestras),
+            "pct_muestras_con_espera": round(100 * len(con_espera) / len(self.muestras), 1) if self.muestras else 0,
+            "max_sesiones_esperando": max(self.muestras, default=0),
+        }
+
+
+# -------------------------
+# 🧑‍💼 Cajas simuladas
+# -------------------------
+def cajero(n, args, fin, productos, usuario, metricas):
+    from services.venta_service import (
+        abrir_caja, anular_venta, cerrar_caja, crear_venta_abierta,
+        editar_carrito_taller, guardar_venta
+    )
+
+    rng = random.Random(args.semilla + n)
+    id_caja = metricas.medir("abrir_caja", abrir_caja, 100, usuario)
+    if id_caja is None:
+        return
+
+    while time.monotonic() < fin:
+        lineas = rng.sample(productos, rng.randint(1, args.max_lineas))
+        cliente = {"id": f"C{rng.randint(1, 2000):05d}"}
+        metodo_pago = rng.choice(["Efectivo", "Yape", "Tarjeta"])
+        comunes = dict(
+            cliente=cliente, regimen="Nuevo RUS", tipo_comprobante="Ticket",
+            metodo_pago=metodo_pago, nro_comprobante=None, serie="T",
+            pago_cliente=None, vuelto=None, usuario=usuario, id_caja=id_caja,
+        )
+
+        if rng.random() < args.pct_taller:
+            id_orden = metricas.medir(
+                "crear_venta_abierta", crear_venta_abierta,
+                cliente["id"], f"CAR-{n:03d}", usuario["id"], id_caja
+            )
+            if id_orden is None:
+                continue
+            # Todo lo que anota el mecánico se guarda en un solo lote
+            cambios = [
+                {"accion": "agregar", "id_producto": id_producto,
+                 "cantidad": float(rng.randint(1, 3)), "precio_unitario": float(precio)}
+                for id_producto, precio in lineas
+            ]
+            if len(lineas) > 1 and rng.random() < 0.3:
+                cambios.append({"accion": "quitar", "id_producto": lineas[0][0]})
+            if rng.random() < 0.3:
+                cambios.append({"accion": "cantidad", "id_producto": lineas[-1][0], "cantidad": 2.0})
+            metricas.medir("editar_carrito_taller", editar_carrito_taller, id_orden, cambios)
+            id_venta = metricas.medir(
+                "cerrar_taller", guardar_venta,
+                placa_vehiculo=f"CAR-{n:03d}", carrito=None, id_venta_existente=id_orden, **comunes
+            )
+        else:
+            carrito = []
+            for id_producto, precio in lineas:
+                cantidad = float(rng.randint(1, 3))
+                carrito.append({
+                    "ID Producto": id_producto,
+                    "Cantidad": cantidad,
+                    "Precio Unitario": float(precio),
+                    "Subtotal": round(cantidad * float(precio), 2),
+                })
+            id_venta = metricas.medir(
+                "guardar_venta", guardar_venta, placa_vehiculo=None, carrito=carrito, **comunes
+            )
+
+        if id_venta is not None and rng.random() < args.pct_anular:
+            metricas.medir("anular_venta", anular_venta, id_venta, "Prueba de carga", usuario)
+
+    metricas.medir("cerrar_caja", cerrar_caja, id_caja, 100, usuario)
+
+
+# -------------------------
+# ✅ Verificaciones
+# -------------------------
+VERIFICACIONES = {
+    "stock_igual_a_ventas_emitidas": """
+        SELECT count(*)
+        FROM producto p
+        LEFT JOIN (
+            SELECT d.id_producto, SUM(d.cantidad) AS vendido
+            FROM venta_detalle d
+            JOIN venta v ON v.id = d.id_venta
+            WHERE v.id > %(venta)s AND v.estado = 'EMITIDA'
+            GROUP BY d.id_producto
+        ) s ON s.id_producto = p.id
+        WHERE p.id = ANY(%(productos)s)
+          AND p.stock_actual <> %(stock)s - COALESCE(s.vendido, 0)
+    """,
+    "kardex_igual_a_stock": """
+        SELECT count(*)
+        FROM producto p
+        LEFT JOIN (
+            SELECT m.id_producto,
+                   SUM(CASE WHEN m.tipo = 'salida' THEN m.cantidad ELSE -m.cantidad END) AS neto
+            FROM movimientos m
+            WHERE m.id > %(movimiento)s
+            GROUP BY m.id_producto
+        ) k ON k.id_producto = p.id
+        WHERE p.id = ANY(%(productos)s)
+          AND p.stock_actual <> %(stock)s - COALESCE(k.neto, 0)
+    """,
+    "totales_taller_igual_a_detalle": """
+        SELECT count(*)
+        FROM venta v
+        LEFT JOIN (
+            SELECT id_venta, SUM(sub_total) AS total, COUNT(*) AS lineas
+            FROM venta_detalle
+            GROUP BY id_venta
+        ) d ON d.id_venta = v.id
+        WHERE v.id > %(venta)s
+          AND (v.suma_total <> COALESCE(d.total, 0) OR v.nro_lineas <> COALESCE(d.lineas, 0))
+    """,
+    "comprobantes_unicos": """
+        SELECT count(*) FROM (
+            SELECT nro_comprobante
+            FROM venta
+            WHERE id > %(venta)s AND nro_comprobante IS NOT NULL
+            GROUP BY nro_comprobante
+            HAVING count(*) > 1
+        ) d
+    """,
+    "comprobantes_sin_huecos": """
+        SELECT CASE WHEN count(*) = 0 THEN 0 ELSE max(numero) - min(numero) + 1 - count(*) END
+        FROM correlativo_comprobante c
+        JOIN venta v ON v.id = c.id_venta
+        WHERE v.id > %(venta)s AND c.tipo = 'TICKET' AND c.serie = 'T'
+    """,
+    "caja_igual_a_ventas_en_efectivo": """
+        SELECT count(*)
+        FROM caja c
+        LEFT JOIN (
+            SELECT id_caja, SUM(total) AS total
+            FROM venta
+            WHERE estado = 'EMITIDA' AND metodo_pago = 'Efectivo'
+            GROUP BY id_caja
+        ) v ON v.id_caja = c.id
+        LEFT JOIN (
+            SELECT id_caja,
+                   SUM(CASE WHEN tipo = 'INGRESO' THEN monto ELSE -monto END) AS neto
+            FROM caja_movimiento
+            WHERE metodo_pago = 'Efectivo' AND id_venta IS NOT NULL
+            GROUP BY id_caja
+        ) m ON m.id_caja = c.id
+        WHERE c.id > %(caja)s
+          AND COALESCE(v.total, 0) <> COALESCE(m.neto, 0)
+    """,
+}
+
+
+def marcas(cursor):
+    """Últimos ids antes de la corrida: todo lo posterior es de la prueba."""
+    cursor.execute("""
+        SELECT (SELECT COALESCE(MAX(id), 0) FROM venta),
+               (SELECT COALESCE(MAX(id), 0) FROM movimientos),
+               (SELECT COALESCE(MAX(id), 0) FROM caja),
+               (SELECT deadlocks FROM pg_stat_database WHERE datname = current_database())
+    """)
+    venta, movimiento, caja, deadlocks = cursor.fetchone()
+    return {"venta": venta, "movimiento": movimiento, "caja": caja, "deadlocks": deadlocks}
+
+
+def verificar(cursor, inicio, productos):
+    params = dict(inicio, productos=[p for p, _ in productos], stock=STOCK_INICIAL)
+    resultado = {}
+    for nombre, sql in VERIFICACIONES.items():
+        cursor.execute(sql, params)
+        resultado[nombre] = cursor.fetchone()[0] == 0
+    return resultado
+
+
+# -------------------------
+# 🗂️ Resultados
+# -------------------------
+def commit_actual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(DIRECTORIO_RESULTADOS)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def guardar_resultado(resultado):
+    os.makedirs(DIRECTORIO_RESULTADOS, exist_ok=True)
+    ruta = os.path.join(
+        DIRECTORIO_RESULTADOS,
+        f"carga_ventas-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    return ruta
+
+
+def imprimir(resultado, anterior=None):
+    def delta(actual, previo):
+        if actual is None or not previo:
+            return ""
+        return f" ({(actual - previo) / previo * 100:+.0f}%)"
+
+    r = resultado["resultados"]
+    ventas_min = r["ventas_por_minuto"]
+    previo = anterior["resultados"] if anterior else {}
+    print(f"\n🛒 {r['ventas']} ventas · {ventas_min:.0f} ventas/min"
+          f"{delta(ventas_min, previo.get('ventas_por_minuto'))}")
+
+    print(f"\n{'operación':<22}{'n':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'sent.':>7}")
+    for operacion, m in r["operaciones"].items():
+        p = previo.get("operaciones", {}).get(operacion, {})
+        fmt = lambda v: f"{v:10.1f}" if v is not None else f"{'-':>10}"
+        print(f"{operacion:<22}{m['n']:>6}{m['errores']:>5}{fmt(m['p50_ms'])}{fmt(m['p95_ms'])}"
+              f"{fmt(m['p99_ms'])}{m['sentencias'] or 0:>7.1f}{delta(m['p95_ms'], p.get('p95_ms'))}")
+        if m["ejemplo_error"]:
+            print(f"    ⚠️ {m['ejemplo_error']}")
+
+    locks = r["locks"]
+    print(f"\n🔒 Esperas por lock en {locks['pct_muestras_con_espera']}% de las muestras "
+          f"(máx. {locks['max_sesiones_esperando']} sesiones) · deadlocks: {r['deadlocks']}")
+    for nombre, ok in r["verificaciones"].items():
+        print(f"{'✅' if ok else '❌'} {nombre}")
+
+
+# -------------------------
+# ▶️ Corrida
+# -------------------------
+def correr(args):
+    from benchmarks.semilla import sembrar
+    from db import crear_conexion
+    from migraciones import asegurar_esquema
+    from services.catalogo_cache import obtener_catalogo
+
+    conn = crear_conexion()
+    cursor = conn.cursor()
+    asegurar_esquema(conn)
+    if sembrar(conn):
+        print("🌱 BD sembrada con datos de prueba")
+
+    cursor.execute("UPDATE configuracion SET politica_stock = 'LIMITAR' WHERE id = 1")
+    cursor.execute("""
+        UPDATE producto p
+        SET stock_actual = %s, valor_inventario = round(%s * COALESCE(p.costo_promedio, 0), 2)
+        FROM (SELECT id FROM producto WHERE precio_venta > 0 ORDER BY id LIMIT %s) s
+        WHERE p.id = s.id
+        RETURNING p.id, p.precio_venta
+    """, (STOCK_INICIAL, STOCK_INICIAL, PRODUCTOS_EN_JUEGO))
+    productos = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT id, username, nombre FROM usuarios
+        WHERE activo ORDER BY id LIMIT %s
+    """, (args.cajas,))
+    usuarios = [{"id": i, "username": u, "nombre": n} for i, u, n in cursor.fetchall()]
+    if len(usuarios) < args.cajas:
+        raise RuntimeError(f"Se necesitan {args.cajas} usuarios activos en la BD")
+
+    inicio = marcas(cursor)
+    obtener_catalogo()
+
+    metricas = Metricas()
+    monitor = MonitorLocks(crear_conexion)
+    monitor.start()
+
+    fin = time.monotonic() + args.segundos
+    hilos = [
+        threading.Thread(target=cajero, args=(n, args, fin, productos, usuarios[n], metricas))
+        for n in range(args.cajas)
+    ]
+    arranque = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    duracion = time.perf_counter() - arranque
+
+    monitor.detener.set()
+    monitor.join()
+
+    final = marcas(cursor)
+    verificaciones = verificar(cursor, inicio, productos)
+    cursor.close()
+    conn.close()
+
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit_actual(),
+        "parametros": {
+            "cajas": args.cajas,
+            "segundos": args.segundos,
+            "max_lineas": args.max_lineas,
+            "pct_taller": args.pct_taller,
+            "pct_anular": args.pct_anular,
+            "semilla": args.semilla,
+            "bd": "local desechable" if args.pg_bin else "DATABASE_URL",
+            "latencia_ms": args.latencia,
+            "jitter_ms": args.jitter,
+            "ancho_banda_kbps": args.ancho_banda,
+        },
+        "resultados": {
+            "ventas": metricas.ventas,
+            "ventas_por_minuto": metricas.ventas / duracion * 60,
+            "operaciones": metricas.resumen(),
+            "locks": monitor.resumen(),
+            "deadlocks": final["deadlocks"] - inicio["deadlocks"],
+            "verificaciones": verificaciones,
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.carga_ventas")
+    parser.add_argument("--cajas", type=int, default=8, help="Cajas simuladas en paralelo")
+    parser.add_argument("--segundos", type=float, default=30)
+    parser.add_argument("--max-lineas", type=int, default=8, help="Líneas máximas por venta")
+    parser.add_argument("--pct-taller", type=float, default=0.2, help="Fracción de órdenes de taller")
+    parser.add_argument("--pct-anular", type=float, default=0.05, help="Fracción de ventas anuladas")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--pg-bin", default=os.getenv("PG_BIN"),
+                        help="Binarios de PostgreSQL para levantar una BD local desechable")
+    parser.add_argument("--comparar", metavar="JSON", help="Corrida anterior para comparar")
+    parser.add_argument("--no-guardar", action="store_true")
+    agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anterior = json.load(f)
+
+    # El pool toma su tamaño del entorno al importar db
+    os.environ.setdefault("DB_POOL_MAX", str(args.cajas + 2))
+
+    with base_de_datos(args) as url_bd, red_simulada(args, url_bd) as (url, _):
+        os.environ["DATABASE_URL"] = url
+        if args.pg_bin:
+            os.environ["DB_SSLMODE"] = "disable"
+        resultado = correr(args)
+
+    imprimir(resultado, anterior)
+    if not args.no_guardar:
+        print(f"\n💾 {guardar_resultado(resultado)}")
+
+    return 0 if all(resultado["resultados"]["verificaciones"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+# benchmarks/pg_local.py
+"""
+PostgreSQL local y desechable para los benchmarks (nada de nube): initdb en un
+directorio temporal, arranque en un puerto libre y borrado al terminar.
+
+    with postgres_local("/usr/lib/postgresql/16/bin") as url:
+        ...
+
+Necesita los binarios del servidor (initdb, pg_ctl) con la extensión pg_trgm
+(paquete contrib) y no puede correr como root (initdb se niega).
+"""
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+from contextlib import contextmanager
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _binario(directorio_bin, nombre):
+    ruta = os.path.join(directorio_bin, nombre) if directorio_bin else shutil.which(nombre)
+    if not ruta or not os.path.exists(ruta):
+        raise RuntimeError(f"No se encontró {nombre} (indicar el directorio con --pg-bin o PG_BIN)")
+    return ruta
+
+
+@contextmanager
+def postgres_local(directorio_bin=None, base="koreano_bench", log=print):
+    """Levanta un cluster temporal y entrega el DATABASE_URL de `base` (sin TLS)."""
+    if hasattr(os, "geteuid") and os.geteuid() == 0:
+        raise RuntimeError("initdb no corre como root: usar un usuario sin privilegios")
+
+    directorio_bin = directorio_bin or os.getenv("PG_BIN")
+    initdb = _binario(directorio_bin, "initdb")
+    pg_ctl = _binario(directorio_bin, "pg_ctl")
+
+    datos = tempfile.mkdtemp(prefix="koreano_pg_")
+    puerto = puerto_libre()
+    iniciado = False
+    try:
+        subprocess.run(
+            [initdb, "-D", datos, "-U", "postgres", "--auth=trust", "-E", "UTF8", "--no-sync"],
+            check=True, capture_output=True
+        )
+        subprocess.run(
+            [
+                pg_ctl, "-D", datos, "-w", "-l", os.path.join(datos, "postgres.log"),
+                "-o", f"-p {puerto} -k {datos} -c listen_addresses=127.0.0.1 -c max_connections=200",
+                "start",
+            ],
+            check=True, capture_output=True
+        )
+        iniciado = True
+
+        import psycopg2
+        conn = psycopg2.connect(host="127.0.0.1", port=puerto, user="postgres", dbname="postgres")
+        conn.autocommit = True
+        conn.cursor().execute(f'CREATE DATABASE "{base}"')
+        conn.close()
+
+        log(f"🐘 PostgreSQL local en el puerto {puerto} ({datos})")
+        yield f"postgresql://postgres@127.0.0.1:{puerto}/{base}"
+    finally:
+        if iniciado:
+            subprocess.run([pg_ctl, "-D", datos, "-m", "fast", "-w", "stop"], capture_output=True)
+        shutil.rmtree(datos, ignore_errors=True)
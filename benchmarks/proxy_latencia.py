@@ -0,0 +1,270 @@
+# benchmarks/proxy_latencia.py
+"""
+Proxy TCP que simula la red entre la app y la BD (latencia, jitter y ancho
+de banda), para medir contra un PostgreSQL local con el costo de viajes que
+tiene producción (pooler en la nube).
+
+Uso suelto, para abrir la app a través del proxy:
+    python -m benchmarks.proxy_latencia --destino localhost:5432 --latencia 60 --jitter 10
+    DATABASE_URL=postgresql://...@127.0.0.1:<puerto>/... streamlit run main.py
+
+Dentro de un benchmark:
+    with ProxyLatencia("localhost", 5432, latencia_ms=60) as proxy:
+        url = proxy.url(DATABASE_URL)
+        ...
+        proxy.reiniciar(); <acción>; proxy.viajes
+
+--latencia es el RTT base (la mitad en cada sentido). Cada paquete suma un
+jitter uniforme de ±jitter/2 por sentido sin reordenarse, y --ancho-banda
+(kbit/s, por sentido) agrega el tiempo de transmisión según su tamaño.
+
+Cuenta viajes de ida y vuelta: cada vez que el cliente envía después de haber
+recibido una respuesta (incluye handshakes de conexiones nuevas, BEGIN/COMMIT
+y fetch que el contador de sentencias no ve). cortar()/restablecer() simulan
+una caída del enlace.
+"""
+import argparse
+import queue
+import random
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from psycopg2.extensions import make_dsn, parse_dsn
+
+TAMANO_LECTURA = 65536
+
+
+class ProxyLatencia:
+    def __init__(self, host_destino, puerto_destino, latencia_ms=0.0, jitter_ms=0.0,
+                 ancho_banda_kbps=None, puerto=0):
+        self.destino = (host_destino, int(puerto_destino))
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.ancho_banda_kbps = ancho_banda_kbps
+
+        self._servidor = socket.create_server(("127.0.0.1", puerto))
+        self.puerto = self._servidor.getsockname()[1]
+        self._lock = threading.Lock()
+        self._activo = False
+        self._cortado = False
+        self._sockets = set()
+        self.reiniciar()
+
+    # -------------------------
+    # Contadores
+    # -------------------------
+    def reiniciar(self):
+        with self._lock:
+            self.viajes = 0
+            self.conexiones = 0
+            self.bytes_subida = 0
+            self.bytes_bajada = 0
+
+    def contadores(self):
+        with self._lock:
+            return {
+                "viajes": self.viajes,
+                "conexiones": self.conexiones,
+                "bytes_subida": self.bytes_subida,
+                "bytes_bajada": self.bytes_bajada,
+            }
+
+    def url(self, database_url):
+        """El mismo DSN, apuntando al proxy."""
+        return make_dsn(database_url, host="127.0.0.1", port=self.puerto)
+
+    # -------------------------
+    # Ciclo de vida
+    # -------------------------
+    def iniciar(self):
+        self._activo = True
+        threading.Thread(target=self._aceptar, daemon=True).start()
+        return self
+
+    def detener(self):
+        self._activo = False
+        self._servidor.close()
+
+    def cortar(self):
+        """Simula la caída del enlace: corta las conexiones abiertas y rechaza las nuevas."""
+        with self._lock:
+            self._cortado = True
+            abiertos, self._sockets = self._sockets, set()
+        for s in abiertos:
+            try:
+                s.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            s.close()
+
+    def restablecer(self):
+        with self._lock:
+            self._cortado = False
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.detener()
+        return False
+
+    def _aceptar(self):
+        while self._activo:
+            try:
+                cliente, _ = self._servidor.accept()
+            except OSError:
+                return
+            if self._cortado:
+                cliente.close()
+                continue
+            try:
+                servidor = socket.create_connection(self.destino)
+            except OSError:
+                cliente.close()
+                continue
+            for s in (cliente, servidor):
+                s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            with self._lock:
+                self.conexiones += 1
+                self._sockets.update((cliente, servidor))
+            estado = {"ultimo": "servidor"}
+            self._sentido(cliente, servidor, estado, "cliente")
+            self._sentido(servidor, cliente, estado, "servidor")
+
+    # -------------------------
+    # Un sentido de la conexión: lector → cola con hora de entrega → escritor
+    # -------------------------
+    def _sentido(self, origen, destino, estado, lado):
+        cola = queue.Queue()
+        threading.Thread(target=self._leer, args=(origen, cola, estado, lado), daemon=True).start()
+        threading.Thread(target=self._escribir, args=(destino, cola), daemon=True).start()
+
+    def _leer(self, origen, cola, estado, lado):
+        enlace_libre = 0.0  # cuándo termina de transmitirse lo anterior
+        ultima_entrega = 0.0
+        while True:
+            try:
+                datos = origen.recv(TAMANO_LECTURA)
+            except OSError:
+                datos = b""
+            if not datos:
+                cola.put(None)
+                return
+
+            ahora = time.monotonic()
+            with self._lock:
+                if lado == "cliente":
+                    self.bytes_subida += len(datos)
+                    if estado["ultimo"] != "cliente":
+                        self.viajes += 1
+                else:
+                    self.bytes_bajada += len(datos)
+                estado["ultimo"] = lado
+
+            salida = ahora
+            if self.ancho_banda_kbps:
+                salida = max(ahora, enlace_libre) + len(datos) * 8 / (self.ancho_banda_kbps * 1000)
+                enlace_libre = salida
+
+            retardo = self.latencia_ms / 2 + random.uniform(-self.jitter_ms / 2, self.jitter_ms / 2)
+            # TCP no reordena: nunca se entrega antes que el paquete anterior
+            ultima_entrega = max(salida + max(retardo, 0) / 1000, ultima_entrega)
+            cola.put((ultima_entrega, datos))
+
+    @staticmethod
+    def _escribir(destino, cola):
+        while True:
+            item = cola.get()
+            if item is None:
+                try:
+                    destino.shutdown(socket.SHUT_WR)
+                except OSError:
+                    pass
+                return
+            entrega, datos = item
+            espera = entrega - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            try:
+                destino.sendall(datos)
+            except OSError:
+                return
+
+
+# -------------------------
+# Uso desde los benchmarks
+# -------------------------
+def agregar_argumentos(parser):
+    grupo = parser.add_argument_group("red simulada (proxy_latencia)")
+    grupo.add_argument("--latencia", type=float, default=None, metavar="MS",
+                       help="RTT simulado hacia la BD (sin valor: conexión directa)")
+    grupo.add_argument("--jitter", type=float, default=0.0, metavar="MS")
+    grupo.add_argument("--ancho-banda", type=float, default=None, metavar="KBPS",
+                       help="Ancho de banda por sentido en kbit/s")
+
+
+@contextmanager
+def red_simulada(args, database_url):
+    """Entrega (url, proxy): la URL pasa por el proxy si se pidió --latencia."""
+    if args.latencia is None and args.ancho_banda is None:
+        yield database_url, None
+        return
+
+    dsn = parse_dsn(database_url)
+    with ProxyLatencia(
+        dsn.get("host", "localhost"), dsn.get("port", 5432),
+        latencia_ms=args.latencia or 0.0,
+        jitter_ms=args.jitter,
+        ancho_banda_kbps=args.ancho_banda
+    ) as proxy:
+        yield proxy.url(database_url), proxy
+
+
+def base_de_datos(args, log=print):
+    """Contexto con el DATABASE_URL de prueba: PostgreSQL local (--pg-bin) o el del entorno."""
+    import os
+
+    if getattr(args, "pg_bin", None):
+        from benchmarks.pg_local import postgres_local
+        return postgres_local(args.pg_bin, log=log)
+
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        raise RuntimeError("DATABASE_URL no está definida (o indicar --pg-bin)")
+    return nullcontext(url)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.proxy_latencia")
+    parser.add_argument("--destino", required=True, metavar="HOST:PUERTO")
+    parser.add_argument("--puerto", type=int, default=0, help="Puerto local (0 = uno libre)")
+    parser.add_argument("--latencia", type=float, default=60.0, metavar="MS", help="RTT simulado")
+    parser.add_argument("--jitter", type=float, default=0.0, metavar="MS")
+    parser.add_argument("--ancho-banda", type=float, default=None, metavar="KBPS")
+    args = parser.parse_args(argv)
+
+    host, _, puerto = args.destino.rpartition(":")
+    proxy = ProxyLatencia(
+        host or "localhost", puerto, args.latencia, args.jitter, args.ancho_banda, args.puerto
+    )
+    with proxy:
+        print(f"🌐 127.0.0.1:{proxy.puerto} → {args.destino} "
+              f"(RTT {args.latencia:.0f} ms ± {args.jitter / 2:.0f} ms"
+              f"{f', {args.ancho_banda:.0f} kbit/s' if args.ancho_banda else ''}) · Ctrl+C para salir")
+        try:
+            while True:
+                time.sleep(5)
+                c = proxy.contadores()
+                print(f"   {c['viajes']} viajes · {c['conexiones']} conexiones · "
+                      f"↑{c['bytes_subida'] / 1024:.0f} KiB ↓{c['bytes_bajada'] / 1024:.0f} KiB", flush=True)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+# benchmarks/semilla.py
+"""
+Datos de prueba realistas generados del lado del servidor (generate_series),
+para verificar planes y correr benchmarks contra un PostgreSQL local.
+Nunca siembra una BD que ya tenga productos.
+"""
+
+TAMANOS = {
+    "categorias": 40,
+    "clientes": 2_000,
+    "productos": 20_000,
+    "cajas": 300,
+    "ventas": 50_000,
+    "items_por_venta": 3,
+    "usuarios": 20,
+}
+
+SQL_PRODUCTOS = """
+INSERT INTO producto (
+    id, descripcion, id_categoria, catalogo, marca, modelo, ubicacion, unidad_base,
+    stock_actual, precio_venta, activo, costo_promedio, costo_ultima_compra,
+    valor_inventario, codigo_barras
+)
+SELECT
+    'P' || lpad(g::text, greatest(5, length(g::text)), '0'),
+    (ARRAY['FILTRO','PASTILLA','BUJIA','FAJA','AMORTIGUADOR','RODAJE','EMPAQUE',
+           'BOMBA','SENSOR','FARO','ESPEJO','RETEN'])[1 + g %% 12]
+        || ' ' ||
+    (ARRAY['ACEITE','AIRE','FRENO','DISTRIBUCION','DELANTERO','POSTERIOR','AGUA',
+           'GASOLINA','OXIGENO','IZQUIERDO','DERECHO','CULATA'])[1 + (g / 12) %% 12]
+        || ' ' || g,
+    c.id,
+    'CAT-' || lpad((g * 7919 %% 1000000)::text, 6, '0'),
+    (ARRAY['HYUNDAI','KIA','TOYOTA','NISSAN','MOBIS','BOSCH','NGK','DENSO'])[1 + g %% 8],
+    (ARRAY['ACCENT','RIO','YARIS','SENTRA','TUCSON','SPORTAGE','ELANTRA','PICANTO'])[1 + (g / 8) %% 8],
+    'A' || (g %% 40),
+    'UND',
+    (random() * 50)::numeric(12,4),
+    0,
+    1,
+    (5 + random() * 300)::numeric(12,4),
+    NULL,
+    0,
+    '775' || lpad(g::text, 10, '0')
+FROM generate_series(%(desde)s, %(hasta)s) g
+JOIN categoria c ON c.nombre = 'CATEGORIA ' || (1 + g %% %(categorias)s)
+ON CONFLICT (id) DO NOTHING;
+
+UPDATE producto
+SET precio_venta = round(costo_promedio / 0.75 * 1.18 * 2) / 2,
+    valor_inventario = round(stock_actual * costo_promedio, 2)
+WHERE precio_venta = 0;
+"""
+
+SQL_CATALOGOS = """
+SELECT setseed(0.42);
+
+INSERT INTO categoria (nombre)
+SELECT 'CATEGORIA ' || g FROM generate_series(1, %(categorias)s) g
+ON CONFLICT (nombre) DO NOTHING;
+
+INSERT INTO cliente (id, nombre, dni_ruc, telefono, direccion)
+VALUES ('C00000', 'CLIENTE VARIOS', '99999999', NULL, NULL)
+ON CONFLICT (id) DO NOTHING;
+
+INSERT INTO cliente (id, nombre, dni_ruc, telefono, direccion)
+SELECT 'C' || lpad(g::text, 5, '0'), 'CLIENTE ' || g, (10000000 + g)::text, '9' || lpad(g::text, 8, '0'), 'AV. PRINCIPAL ' || g
+FROM generate_series(1, %(clientes)s) g
+ON CONFLICT (id) DO NOTHING;
+
+INSERT INTO proveedor (id, nombre, dni_ruc)
+SELECT 'PR' || lpad(g::text, 4, '0'), 'PROVEEDOR ' || g, (20100000000 + g)::text
+FROM generate_series(1, 30) g
+ON CONFLICT (id) DO NOTHING;
+
+INSERT INTO usuarios (username, nombre, password_hash, rol, activo, token_sesion, login_time)
+SELECT 'usuario' || g, 'USUARIO ' || g, 'x', CASE WHEN g = 1 THEN 'admin' ELSE 'vendedor' END, TRUE,
+       md5(g::text), extract(epoch FROM now())
+FROM generate_series(1, %(usuarios)s) g
+ON CONFLICT (username) DO NOTHING;
+
+INSERT INTO caja (fecha_apertura, fecha_cierre, monto_apertura, monto_cierre, usuario_apertura, usuario_cierre, estado)
+SELECT now() - (g || ' days')::interval,
+       now() - (g || ' days')::interval + interval '10 hours',
+       100, 100, 'usuario1', 'usuario1', 'CERRADA'
+FROM generate_series(1, %(cajas)s) g;
+
+INSERT INTO caja (fecha_apertura, monto_apertura, usuario_apertura, estado)
+VALUES (now(), 100, 'usuario1', 'ABIERTA');
+"""
+
+SQL_MOVIMIENTOS = """
+INSERT INTO venta (
+    fecha, id_cliente, suma_total, op_gravada, igv, total, tipo_comprobante,
+    nro_comprobante, metodo_pago, pago_cliente, vuelto, id_usuario, estado, id_caja
+)
+SELECT
+    now() - (random() * 365 || ' days')::interval,
+    'C' || lpad((1 + g %% %(clientes)s)::text, 5, '0'),
+    0, 0, 0, 0,
+    'Ticket',
+    'T-' || lpad(g::text, 6, '0'),
+    (ARRAY['Efectivo','Yape','Plin','Tarjeta','Transferencia'])[1 + g %% 5],
+    NULL, NULL, 1,
+    CASE WHEN g %% 50 = 0 THEN 'ANULADA' WHEN g %% 997 = 0 THEN 'ABIERTA' ELSE 'EMITIDA' END,
+    1 + g %% %(cajas)s
+FROM generate_series(1, %(ventas)s) g;
+
+INSERT INTO venta_detalle (id_venta, id_producto, cantidad, precio_unitario, sub_total, precio_final)
+SELECT v.id, p.id, 1 + (i %% 3), p.precio_venta, p.precio_venta * (1 + (i %% 3)), p.precio_venta * (1 + (i %% 3))
+FROM venta v
+CROSS JOIN generate_series(1, %(items_por_venta)s) i
+JOIN producto p ON p.id = 'P' || lpad((1 + (v.id * 31 + i * 17) %% %(productos)s)::text,
+                                     greatest(5, length((1 + (v.id * 31 + i * 17) %% %(productos)s)::text)), '0');
+
+UPDATE venta v
+SET suma_total = d.total, op_gravada = d.total, total = d.total
+FROM (SELECT id_venta, SUM(sub_total) total FROM venta_detalle GROUP BY id_venta) d
+WHERE d.id_venta = v.id;
+
+INSERT INTO correlativo_comprobante (tipo, serie, numero, estado, fecha, id_venta)
+SELECT 'TICKET', 'T', v.id, CASE WHEN v.estado = 'ANULADA' THEN 'ANULADO' ELSE 'EMITIDO' END, v.fecha, v.id
+FROM venta v
+WHERE v.estado <> 'ABIERTA'
+ON CONFLICT (tipo, serie, numero) DO NOTHING;
+
+INSERT INTO caja_movimiento (id_caja, fecha, tipo, metodo_pago, monto, referencia, id_venta, usuario)
+SELECT v.id_caja, v.fecha, 'INGRESO', 'Efectivo', v.total, 'Venta ' || v.nro_comprobante, v.id, 'usuario1'
+FROM venta v
+WHERE v.metodo_pago = 'Efectivo' AND v.estado = 'EMITIDA';
+
+INSERT INTO historial_precios (producto_id, precio_anterior, precio_nuevo, margen_usado, costo_promedio, fecha)
+SELECT p.id, p.precio_venta - 1, p.precio_venta, 0.25, p.costo_promedio, now() - (k || ' days')::interval
+FROM producto p
+CROSS JOIN generate_series(1, 2) k;
+
+INSERT INTO producto_proveedor (id_producto, id_proveedor, unidad_compra, factor, precio_compra, lote_min, tiempo_entrega)
+SELECT p.id, 'PR' || lpad((1 + row_number() OVER () %% 30)::text, 4, '0'), 'CAJA', 10, p.costo_promedio * 10, 1, 3
+FROM producto p;
+"""
+
+
+def base_vacia(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT NOT EXISTS (SELECT 1 FROM producto)")
+    vacia = cursor.fetchone()[0]
+    cursor.close()
+    return vacia
+
+
+def sembrar(conn, **tamanos):
+    """
+    Siembra la BD (debe estar migrada y sin productos) y corre ANALYZE.
+    Devuelve False si la BD ya tenía datos y no se tocó.
+    """
+    if not base_vacia(conn):
+        return False
+
+    params = dict(TAMANOS)
+    params.update(tamanos)
+    params.update(desde=1, hasta=params["productos"])
+
+    conn.autocommit = False
+    try:
+        cursor = conn.cursor()
+        cursor.execute(SQL_CATALOGOS, params)
+        cursor.execute(SQL_PRODUCTOS, params)
+        cursor.execute(SQL_MOVIMIENTOS, params)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+    cursor = conn.cursor()
+    cursor.execute("ANALYZE")
+    cursor.close()
+    return True
+
+
+def agregar_productos(conn, cantidad):
+    """Hace crecer el catálogo en `cantidad` productos sintéticos más (para benchmarks de escala)."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM producto")
+    actual = cursor.fetchone()[0]
+    cursor.execute(SQL_PRODUCTOS, {
+        "desde": actual + 1,
+        "hasta": actual + cantidad,
+        "categorias": TAMANOS["categorias"],
+    })
+    cursor.execute("ANALYZE producto")
+    cursor.close()
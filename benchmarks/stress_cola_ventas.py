@@ -0,0 +1,194 @@
+# benchmarks/stress_cola_ventas.py
+"""
+Cola local de ventas (services/cola_ventas.py) con la red lenta y caída.
+
+Uso (contra una BD de pruebas, nunca producción; registra ventas reales):
+    python -m benchmarks.stress_cola_ventas [--latencia 60] [--ventas 40]
+
+1. Cobro con cola vs. guardar_venta directo, ambos con la red simulada:
+   la cola confirma en disco local.
+2. Enlace caído (proxy cortado): las ventas se siguen confirmando y quedan
+   pendientes; al volver la red se sincronizan solas, en orden.
+3. Una venta que la BD rechaza (producto inexistente, comprobante ya
+   emitido) queda en CONFLICTO sin frenar a las demás.
+4. Reenviar una venta ya sincronizada devuelve la misma (idempotente).
+Al final verifica que cada venta encolada esté una sola vez en la BD con el
+número que se le dio en la caja.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.proxy_latencia import ProxyLatencia
+
+TIPO = "Ticket"
+SERIE = "TQ"
+
+
+def cobrar(funcion, productos, id_caja, usuario, n, extra=None, nro_comprobante=None):
+    from benchmarks.bench_checkout import carrito_de
+
+    carrito = carrito_de(productos, 1 + n % len(productos)) + (extra or [])
+    inicio = time.perf_counter()
+    resultado = funcion(
+        cliente={"id": "C00000"},
+        regimen="Nuevo RUS",
+        tipo_comprobante=TIPO,
+        metodo_pago="Efectivo",
+        nro_comprobante=nro_comprobante,
+        serie=SERIE,
+        placa_vehiculo=None,
+        pago_cliente=None,
+        vuelto=None,
+        carrito=carrito,
+        usuario=usuario,
+        id_caja=id_caja,
+    )
+    return resultado, (time.perf_counter() - inicio) * 1000
+
+
+def esperar(condicion, segundos):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        if condicion():
+            return True
+        time.sleep(0.2)
+    return condicion()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.stress_cola_ventas")
+    parser.add_argument("--latencia", type=float, default=60.0, metavar="MS", help="RTT simulado")
+    parser.add_argument("--ventas", type=int, default=40, help="Ventas por fase")
+    args = parser.parse_args(argv)
+
+    from psycopg2.extensions import parse_dsn
+
+    url_bd = os.getenv("DATABASE_URL")
+    if not url_bd:
+        raise RuntimeError("DATABASE_URL no está definida")
+    dsn = parse_dsn(url_bd)
+    directorio = tempfile.mkdtemp(prefix="cola_ventas_")
+
+    with ProxyLatencia(dsn.get("host", "localhost"), dsn.get("port", 5432), args.latencia) as proxy:
+        # db y la cola leen el entorno al importarse
+        os.environ["DATABASE_URL"] = proxy.url(url_bd)
+        os.environ["COLA_VENTAS_DB"] = os.path.join(directorio, "cola.sqlite3")
+        os.environ["COLA_VENTAS_INTERVALO_SEG"] = "0.5"
+
+        from benchmarks.bench_checkout import preparar
+        from benchmarks.semilla import sembrar
+        from db import crear_conexion
+        from migraciones import asegurar_esquema
+        from services.catalogo_cache import obtener_catalogo
+        from services.cola_ventas import encolar_venta, obtener_cola
+        from services.venta_service import guardar_venta, registrar_venta_en_bd
+
+        conn = crear_conexion()
+        try:
+            asegurar_esquema(conn)
+            sembrar(conn)
+            id_caja, usuario, productos, _ = preparar(conn, 5)
+        finally:
+            conn.close()
+        obtener_catalogo()
+
+        cola = obtener_cola()
+        fallos = []
+
+        # La primera venta de la serie no tiene bloque: lo reserva el sincronizador
+        cobrar(encolar_venta, productos, id_caja, usuario, 0)
+        esperar(lambda: cola.siguiente_comprobante(TIPO, SERIE), 10)
+
+        # 1. Cobro con la red lenta
+        directo = [cobrar(guardar_venta, productos, id_caja, usuario, n)[1] for n in range(args.ventas)]
+        local = [cobrar(encolar_venta, productos, id_caja, usuario, n)[1] for n in range(args.ventas)]
+        print(f"RTT simulado {args.latencia:.0f} ms")
+        print(f"  guardar_venta directo   p50 {statistics.median(directo):6.1f} ms   máx {max(directo):6.1f} ms")
+        print(f"  encolar_venta (local)   p50 {statistics.median(local):6.1f} ms   máx {max(local):6.1f} ms")
+        if not esperar(lambda: cola.resumen()["pendientes"] == 0, 60):
+            fallos.append("La cola no se vació con la red disponible")
+
+        # 2. Enlace caído
+        proxy.cortar()
+        sin_red = [cobrar(encolar_venta, productos, id_caja, usuario, n)[1] for n in range(args.ventas)]
+        time.sleep(1)
+        pendientes = cola.resumen()["pendientes"]
+        print(f"\nEnlace caído: {args.ventas} ventas confirmadas (p50 {statistics.median(sin_red):.1f} ms), "
+              f"{pendientes} pendientes · último error: {cola.resumen()['ultimo_error']}")
+        if pendientes != args.ventas:
+            fallos.append(f"Con el enlace caído quedaron {pendientes} pendientes, no {args.ventas}")
+
+        proxy.restablecer()
+        cola.despertar()
+        inicio = time.perf_counter()
+        if esperar(lambda: cola.resumen()["pendientes"] == 0, 120):
+            print(f"Red restablecida: cola vacía en {time.perf_counter() - inicio:.1f} s")
+        else:
+            fallos.append("La cola no se vació al volver la red")
+
+        # 3. Conflictos: producto inexistente y comprobante ya emitido
+        no_existe = [{"ID Producto": "NO-EXISTE", "Cantidad": 1.0, "Precio Unitario": 1.0, "Subtotal": 1.0}]
+        emitido = cola.listar(("SINCRONIZADA",))["nro_comprobante"].dropna().iloc[-1]
+        cobrar(encolar_venta, productos, id_caja, usuario, 0, extra=no_existe)
+        cobrar(encolar_venta, productos, id_caja, usuario, 1, nro_comprobante=emitido)
+        cobrar(encolar_venta, productos, id_caja, usuario, 2)
+        esperar(lambda: cola.resumen()["pendientes"] == 0, 30)
+        conflictos = cola.listar(("CONFLICTO",))
+        print(f"\nConflictos: {len(conflictos)}")
+        for error in conflictos["error"]:
+            print(f"  · {error}")
+        if len(conflictos) != 2 or cola.resumen()["pendientes"]:
+            fallos.append("Las ventas rechazadas no quedaron en CONFLICTO (o frenaron a las demás)")
+        for id_local in conflictos["id"]:
+            cola.descartar(id_local)
+
+        # 4. Reenvío idempotente y verificación contra la BD
+        sincronizadas = cola.listar(("SINCRONIZADA",))
+        with cola._sqlite() as lite:
+            filas = lite.execute("""
+                SELECT id_externo, nro_comprobante, id_venta, venta, items
+                FROM venta_pendiente WHERE estado = 'SINCRONIZADA'
+            """).fetchall()
+        id_externo, nro, id_venta, venta, items = filas[-1]
+        repetida, _ = registrar_venta_en_bd(json.loads(venta), json.loads(items))
+        if repetida != id_venta:
+            fallos.append("Reenviar una venta sincronizada creó otra venta")
+
+        conn = crear_conexion()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id_externo::text, nro_comprobante
+                FROM venta
+                WHERE id_externo = ANY(%s::uuid[])
+            """, ([f[0] for f in filas],))
+            en_bd = dict(cursor.fetchall())
+            cursor.close()
+        finally:
+            conn.close()
+
+        if len(en_bd) != len(filas):
+            fallos.append(f"{len(filas)} ventas sincronizadas, {len(en_bd)} en la BD")
+        distintos = [f[0] for f in filas if f[1] and en_bd.get(f[0]) != f[1]]
+        if distintos:
+            fallos.append(f"{len(distintos)} ventas con un número distinto al de la caja")
+        if len(set(en_bd.values())) != len(en_bd):
+            fallos.append("Números de comprobante repetidos")
+        print(f"\n{len(sincronizadas)} ventas sincronizadas, cada una una vez en la BD")
+
+    if fallos:
+        for f in fallos:
+            print(f"❌ {f}")
+        return 1
+
+    print("✅ Ninguna venta perdida ni duplicada")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# benchmarks/stress_comprobantes.py
+"""
+Muchas cajas cobrando a la vez: verifica que los números de comprobante
+asignados por registrar_venta no se repitan ni dejen huecos.
+
+Uso (contra una BD de pruebas, nunca producción; registra ventas reales):
+    python -m benchmarks.stress_comprobantes [--cajas 8] [--ventas 25] [--fallar-cada 7]
+
+Cada hilo simula una caja. Una de cada --fallar-cada ventas falla a propósito
+dentro de la transacción (producto inexistente): su número debe liberarse.
+"""
+import argparse
+import sys
+import threading
+import time
+
+from benchmarks.bench_checkout import carrito_de, preparar
+from benchmarks.semilla import sembrar
+from migraciones import asegurar_esquema
+
+TIPO = "Ticket"
+SERIE = "TS"
+
+
+def caja(n, ventas, fallar_cada, id_caja, usuario, productos, resultados, errores):
+    from services.venta_service import guardar_venta
+
+    for i in range(ventas):
+        carrito = carrito_de(productos, 1 + (n + i) % len(productos))
+        falla = fallar_cada and (n * ventas + i) % fallar_cada == 0
+        if falla:
+            carrito.append({
+                "ID Producto": "NO-EXISTE", "Cantidad": 1.0,
+                "Precio Unitario": 1.0, "Subtotal": 1.0,
+            })
+        try:
+            id_venta = guardar_venta(
+                cliente={"id": "C00000"},
+                regimen="Nuevo RUS",
+                tipo_comprobante=TIPO,
+                metodo_pago="Yape",
+                nro_comprobante=None,
+                serie=SERIE,
+                placa_vehiculo=None,
+                pago_cliente=None,
+                vuelto=None,
+                carrito=carrito,
+                usuario=usuario,
+                id_caja=id_caja,
+            )
+            resultados.append(id_venta)
+        except Exception as e:
+            if not falla:
+                errores.append(f"caja {n}: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.stress_comprobantes")
+    parser.add_argument("--cajas", type=int, default=8, help="Hilos cobrando a la vez (≤ DB_POOL_MAX)")
+    parser.add_argument("--ventas", type=int, default=25, help="Ventas por caja")
+    parser.add_argument("--fallar-cada", type=int, default=7, help="Una venta fallida cada N (0 = ninguna)")
+    args = parser.parse_args(argv)
+
+    from db import crear_conexion
+    from services.catalogo_cache import obtener_catalogo
+    from services.comprobante_service import obtener_siguiente_correlativo
+
+    conn = crear_conexion()
+    try:
+        asegurar_esquema(conn)
+        sembrar(conn)
+        id_caja, usuario, productos, _ = preparar(conn, 5)
+    finally:
+        conn.close()
+
+    obtener_catalogo()
+    _, primero = obtener_siguiente_correlativo(TIPO.upper(), SERIE)
+
+    resultados, errores = [], []
+    hilos = [
+        threading.Thread(
+            target=caja,
+            args=(n, args.ventas, args.fallar_cada, id_caja, usuario, productos, resultados, errores)
+        )
+        for n in range(args.cajas)
+    ]
+    inicio = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    segundos = time.perf_counter() - inicio
+
+    conn = crear_conexion()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT c.numero, v.nro_comprobante
+            FROM correlativo_comprobante c
+            JOIN venta v ON v.id = c.id_venta
+            WHERE c.tipo = %s AND c.serie = %s AND c.numero >= %s
+            ORDER BY c.numero
+        """, (TIPO.upper(), SERIE, primero))
+        filas = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+    numeros = [numero for numero, _ in filas]
+    esperados = list(range(primero, primero + len(resultados)))
+    fallos = list(errores)
+    if numeros != esperados:
+        fallos.append(f"Números {numeros[:5]}... no son {primero}..{primero + len(resultados) - 1} sin huecos")
+    if any(nro != f"{SERIE}-{numero:06d}" for numero, nro in filas):
+        fallos.append("Hay ventas cuyo nro_comprobante no coincide con su correlativo")
+
+    print(
+        f"{args.cajas} cajas · {len(resultados)} ventas confirmadas en {segundos:.1f} s "
+        f"({len(resultados) / segundos:.0f} ventas/s) · números {primero}..{primero + len(resultados) - 1}"
+    )
+    if fallos:
+        for f in fallos:
+            print(f"❌ {f}")
+        return 1
+
+    print("✅ Sin números repetidos ni huecos")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
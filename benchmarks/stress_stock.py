@@ -0,0 +1,201 @@
+# benchmarks/stress_stock.py
+"""
+Cajas vendiendo y un almacenero comprando el mismo producto a la vez:
+verifica que no se pierdan actualizaciones de stock ni de costo promedio.
+
+Uso (contra una BD de pruebas, nunca producción; modifica stock y kardex):
+    python -m benchmarks.stress_stock [--vendedores 6] [--compradores 2] [--operaciones 100]
+
+1. LIMITAR: ventas y compras concurrentes; el stock final debe ser exactamente
+   inicial - vendido + comprado y valor_inventario = stock × costo_promedio.
+2. RECHAZAR: el doble de ventas que de stock; deben confirmarse exactamente
+   tantas como unidades había y el stock debe quedar en 0.
+Con --comparar repite (1) con el leer-modificar-escribir de antes, para
+mostrar las actualizaciones perdidas.
+"""
+import argparse
+import sys
+import threading
+from datetime import date
+from decimal import Decimal
+
+from benchmarks.semilla import sembrar
+from migraciones import asegurar_esquema
+
+REFERENCIA = "stress_stock"
+PROVEEDOR = "PR0001"  # de benchmarks/semilla.py
+
+
+def en_hilos(funciones):
+    hilos = [threading.Thread(target=f) for f in funciones]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+
+def preparar_producto(stock, costo):
+    from db import get_connection
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM producto ORDER BY id LIMIT 1")
+    id_producto = cursor.fetchone()[0]
+    cursor.execute("""
+        UPDATE producto
+        SET stock_actual = %s, costo_promedio = %s, valor_inventario = %s
+        WHERE id = %s
+    """, (stock, costo, stock * costo, id_producto))
+    conn.close()
+    return id_producto
+
+
+def leer_producto(id_producto):
+    from db import get_connection
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT stock_actual, costo_promedio, valor_inventario FROM producto WHERE id = %s",
+        (id_producto,)
+    )
+    fila = cursor.fetchone()
+    conn.close()
+    return fila
+
+
+def fijar_politica(politica):
+    from db import actualizar_configuracion, obtener_configuracion
+
+    anterior = obtener_configuracion().get("politica_stock", "LIMITAR")
+    actualizar_configuracion(politica_stock=politica)
+    return anterior
+
+
+def vender(id_producto, veces, errores, confirmadas=None):
+    from db import get_connection, obtener_fecha_lima, registrar_salidas_por_venta
+
+    for _ in range(veces):
+        conn = get_connection()
+        try:
+            registrar_salidas_por_venta(
+                conn.cursor(), [(id_producto, 1)], obtener_fecha_lima(), REFERENCIA
+            )
+            if confirmadas is not None:
+                confirmadas.append(1)
+        except Exception as e:
+            if confirmadas is None or "Stock insuficiente" not in str(e):
+                errores.append(str(e))
+        finally:
+            conn.close()
+
+
+def comprar(id_producto, veces, costo):
+    """Compras de 1 unidad por registrar_compra (el mismo camino que compras_app)."""
+    from services.compra_service import armar_compra, registrar_compra_en_bd
+
+    carrito = [{
+        "ID Producto": id_producto,
+        "Unidad Compra": "UND",
+        "Factor": 1,
+        "Cantidad Compra": 1,
+        "Cantidad Final": 1,
+        "Precio U. Compra": costo,
+        "Subtotal": costo,
+    }]
+    for _ in range(veces):
+        registrar_compra_en_bd(*armar_compra(
+            date.today(), PROVEEDOR, PROVEEDOR, REFERENCIA, "Nota", "Efectivo",
+            "Régimen General", 0, carrito
+        ))
+
+
+def vender_leer_escribir(id_producto, veces):
+    """La salida de antes: SELECT, cálculo en Python y UPDATE con el valor absoluto."""
+    from db import get_connection
+
+    for _ in range(veces):
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT stock_actual FROM producto WHERE id = %s", (id_producto,))
+        stock = cursor.fetchone()[0]
+        cursor.execute(
+            "UPDATE producto SET stock_actual = %s WHERE id = %s",
+            (max(stock - 1, 0), id_producto)
+        )
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.stress_stock")
+    parser.add_argument("--vendedores", type=int, default=6)
+    parser.add_argument("--compradores", type=int, default=2)
+    parser.add_argument("--operaciones", type=int, default=100, help="Operaciones por hilo")
+    parser.add_argument("--comparar", action="store_true",
+                        help="Repetir con el leer-modificar-escribir anterior")
+    args = parser.parse_args(argv)
+
+    from db import crear_conexion
+
+    conn = crear_conexion()
+    try:
+        asegurar_esquema(conn)
+        sembrar(conn)
+    finally:
+        conn.close()
+
+    fallos, errores = [], []
+    politica_original = fijar_politica("LIMITAR")
+    try:
+        # 1. LIMITAR: ventas y compras concurrentes
+        vendido = args.vendedores * args.operaciones
+        comprado = args.compradores * args.operaciones
+        inicial = Decimal(vendido * 2)
+        id_producto = preparar_producto(inicial, Decimal("10"))
+
+        en_hilos(
+            [lambda: vender(id_producto, args.operaciones, errores)] * args.vendedores
+            + [lambda: comprar(id_producto, args.operaciones, Decimal("14"))] * args.compradores
+        )
+        stock, costo, valor = leer_producto(id_producto)
+        esperado = inicial - vendido + comprado
+        print(f"LIMITAR   stock final {stock:.0f} (esperado {esperado:.0f}) · costo {costo} · valor {valor}")
+        if stock != esperado:
+            fallos.append(f"Se perdieron {abs(esperado - stock):.0f} actualizaciones de stock")
+        if valor != (stock * costo).quantize(Decimal("0.01")):
+            fallos.append("valor_inventario no coincide con stock × costo_promedio")
+
+        # 2. RECHAZAR: nunca se vende más de lo que hay
+        fijar_politica("RECHAZAR")
+        unidades = args.vendedores * args.operaciones // 2
+        id_producto = preparar_producto(Decimal(unidades), Decimal("10"))
+        confirmadas = []
+        en_hilos([lambda: vender(id_producto, args.operaciones, errores, confirmadas)] * args.vendedores)
+        stock, _, _ = leer_producto(id_producto)
+        print(f"RECHAZAR  {len(confirmadas)} ventas confirmadas de {unidades} unidades · stock final {stock:.0f}")
+        if len(confirmadas) != unidades or stock != 0:
+            fallos.append("Con RECHAZAR se vendió más (o menos) de lo que había")
+
+        # Comparación con el método anterior
+        if args.comparar:
+            id_producto = preparar_producto(inicial, Decimal("10"))
+            en_hilos([lambda: vender_leer_escribir(id_producto, args.operaciones)] * args.vendedores)
+            stock, _, _ = leer_producto(id_producto)
+            perdidas = stock - (inicial - vendido)
+            print(f"ANTES     stock final {stock:.0f} (esperado {inicial - vendido:.0f}) · "
+                  f"{perdidas:.0f} ventas perdidas")
+    finally:
+        fijar_politica(politica_original)
+
+    fallos.extend(errores[:5])
+    if fallos:
+        for f in fallos:
+            print(f"❌ {f}")
+        return 1
+
+    print("✅ Sin actualizaciones perdidas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
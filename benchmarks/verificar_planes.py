@@ -0,0 +1,182 @@
+# benchmarks/verificar_planes.py
+"""
+Corre EXPLAIN sobre cada consulta caliente contra una BD migrada y sembrada,
+y falla si alguna cae en un Seq Scan sobre sus tablas vigiladas.
+
+Uso (contra una BD de pruebas, nunca producción):
+    python -m benchmarks.verificar_planes [--sin-semilla]
+
+Se ejecuta con enable_seqscan = off: si aun así el planner elige Seq Scan es
+porque no existe un índice que sirva para esa consulta.
+"""
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta
+
+from benchmarks.semilla import sembrar
+from migraciones import asegurar_esquema
+
+# -------------------------
+# 🔥 Consultas calientes
+# -------------------------
+# El SQL sale de los servicios (constantes SQL_* o la función que arma la
+# consulta): si cambia allá, se explica la versión nueva.
+def consultas():
+    """[(nombre, sql, params, tablas que no deben recorrerse completas)]"""
+    from modulos.precios import SQL_HISTORIAL_PRECIOS
+    from modulos.ventas import SQL_CONSULTAR_VENTAS
+    from services.caja_service import (
+        SQL_HISTORIAL_CAJAS, SQL_MOVIMIENTOS_EFECTIVO, SQL_VENTAS_POR_METODO
+    )
+    from services.catalogo_cache import SQL_CAMBIOS
+    from services.comprobante_service import SQL_COMPROBANTE_EXACTO, SQL_SIGUIENTE_CORRELATIVO
+    from services.importacion_compras import SQL_EMPAREJAR
+    from services.lista_precios import SQL_PRESENTACIONES_PROVEEDOR
+    from services.producto_service import SQL_POR_CODIGO_BARRAS, consulta_buscar_productos
+    from services.venta_service import (
+        SQL_CAJA_ABIERTA, SQL_DETALLE_VENTA, SQL_VENTA_POR_ID_EXTERNO, SQL_VENTAS_ABIERTAS
+    )
+    from session_manager import SQL_USUARIO_POR_TOKEN
+
+    ahora = datetime.now()
+    return [
+        ("caja_service.obtener_resumen_caja (ventas por método)",
+         SQL_VENTAS_POR_METODO, (1,), ["venta"]),
+        ("caja_service.obtener_resumen_caja (movimientos en efectivo)",
+         SQL_MOVIMIENTOS_EFECTIVO, (1, "INGRESO"), ["caja_movimiento"]),
+        ("caja_service.obtener_historial_cajas",
+         SQL_HISTORIAL_CAJAS, (ahora - timedelta(days=7), ahora), ["caja", "venta"]),
+        ("venta_service.obtener_caja_abierta",
+         SQL_CAJA_ABIERTA, (), ["caja"]),
+        ("venta_service.obtener_ventas_abiertas",
+         SQL_VENTAS_ABIERTAS, (), ["venta", "cliente"]),
+        ("venta_service.obtener_detalle_venta",
+         SQL_DETALLE_VENTA, (100,), ["venta", "venta_detalle", "producto"]),
+        ("venta_service.venta_por_id_externo (venta de la cola local ya recibida)",
+         SQL_VENTA_POR_ID_EXTERNO, ("00000000-0000-0000-0000-000000000000",), ["venta"]),
+        ("ventas_app: Consultar ventas (rango de fechas)",
+         SQL_CONSULTAR_VENTAS + " ORDER BY v.fecha DESC", (ahora - timedelta(days=30), ahora), ["venta"]),
+        ("comprobante_service.buscar_comprobantes (exacto)",
+         SQL_COMPROBANTE_EXACTO, ("T-000100",), ["venta"]),
+        ("comprobante_service.obtener_siguiente_correlativo",
+         SQL_SIGUIENTE_CORRELATIVO, ("TICKET", "T", "TICKET", "T"),
+         ["correlativo_comprobante", "serie_comprobante"]),
+        # Sentencia de la función anular_ventas (migración 0009): el SQL de
+        # plpgsql no se puede importar, mantener esta copia al día
+        ("anular_ventas (correlativo de las ventas)",
+         "UPDATE correlativo_comprobante SET estado = 'ANULADO' WHERE id_venta = ANY(%s)",
+         ([100],), ["correlativo_comprobante"]),
+        ("precios_app: historial de precios",
+         SQL_HISTORIAL_PRECIOS, ("P00100",), ["historial_precios", "producto"]),
+        ("session_manager.obtener_usuario_sesion",
+         SQL_USUARIO_POR_TOKEN, ("c4ca4238a0b923820dcc509a6f75849b",), ["usuarios"]),
+        ("producto_service.buscar_productos (criterio)",
+         *consulta_buscar_productos("filtro acei"), ["producto"]),
+        ("producto_service.buscar_por_codigo_barras (escaneo)",
+         SQL_POR_CODIGO_BARRAS, ("7750000000100",), ["producto"]),
+        ("catalogo_cache.refrescar (cambios desde la última sincronización)",
+         SQL_CAMBIOS, (ahora - timedelta(minutes=1),), ["producto"]),
+        ("lista_precios.presentaciones_proveedor (mapa en memoria)",
+         SQL_PRESENTACIONES_PROVEEDOR, ("PR0002",), ["producto_proveedor"]),
+        ("importacion_compras.emparejar_lineas",
+         SQL_EMPAREJAR, {"proveedor": "PR0002"}, ["producto_proveedor", "producto"]),
+    ]
+
+
+def _nodos(plan):
+    yield plan
+    for hijo in plan.get("Plans", []):
+        yield from _nodos(hijo)
+
+
+def explicar(cursor, sql, params):
+    cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    return cursor.fetchone()[0][0]["Plan"]
+
+
+def seq_scans(plan, tablas):
+    return [
+        n["Relation Name"] for n in _nodos(plan)
+        if n["Node Type"] == "Seq Scan" and n.get("Relation Name") in tablas
+    ]
+
+
+def indices_invalidos(cursor):
+    """Índices que quedaron INVALID (p. ej. un CREATE INDEX CONCURRENTLY que falló)."""
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE NOT i.indisvalid
+          AND n.nspname = current_schema()
+    """)
+    return [r[0] for r in cursor.fetchall()]
+
+
+def verificar(conn, log=print):
+    """
+    Devuelve la lista de fallos (vacía si todo usa índices). Corre en una
+    transacción que se deshace: la tabla temporal de la importación de
+    compras solo existe mientras tanto.
+    """
+    from services.importacion_compras import SQL_TABLA_IMPORTACION
+
+    autocommit = conn.autocommit
+    conn.autocommit = False
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SQL_TABLA_IMPORTACION)
+        cursor.execute("SET LOCAL enable_seqscan = off")
+
+        fallos = []
+        for nombre, sql, params, tablas in consultas():
+            plan = explicar(cursor, sql, params)
+            scans = seq_scans(plan, tablas)
+            if scans:
+                fallos.append(f"{nombre}: Seq Scan en {', '.join(sorted(set(scans)))}")
+                log(f"❌ {nombre}")
+                log(json.dumps(plan, indent=2))
+            else:
+                log(f"✅ {nombre}")
+
+        invalidos = indices_invalidos(cursor)
+        for indice in invalidos:
+            fallos.append(f"Índice inválido: {indice} (recrearlo con REINDEX o DROP/CREATE)")
+            log(f"❌ Índice inválido: {indice}")
+    finally:
+        cursor.close()
+        conn.rollback()
+        conn.autocommit = autocommit
+    return fallos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.verificar_planes")
+    parser.add_argument("--sin-semilla", action="store_true",
+                        help="No sembrar datos (usar los que ya tiene la BD)")
+    args = parser.parse_args(argv)
+
+    from db import crear_conexion
+    conn = crear_conexion()
+    try:
+        asegurar_esquema(conn)
+        if not args.sin_semilla and sembrar(conn):
+            print("🌱 BD sembrada con datos de prueba")
+        fallos = verificar(conn)
+    finally:
+        conn.close()
+
+    if fallos:
+        print(f"\n{len(fallos)} consulta(s) sin índice:")
+        for f in fallos:
+            print(f"  - {f}")
+        return 1
+
+    print(f"\n✅ Las {len(consultas())} consultas calientes usan índices")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,8 +5,12 @@ from datetime import datetime, date
 import os
 import streamlit as st
 import pytz
+from contextlib import contextmanager
+from contextvars import ContextVar
 
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
+
+from db_pool import PoolConexiones, UnidadDeTrabajo
 
 if os.getenv("STREAMLIT_ENV") != "cloud":
     from dotenv import load_dotenv
@@ -17,289 +21,122 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL no está definida")
 
-def get_connection():
+# "disable" para un PostgreSQL local sin TLS (benchmarks, pruebas)
+DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
+
+# Tamaño y tiempos del pool de conexiones (configurables por entorno)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_VERIFICAR_CADA = float(os.getenv("DB_POOL_VERIFICAR_CADA", "30"))
+
+def crear_conexion():
+    """Abre una conexión nueva (TCP + TLS + auth). Solo la usa el pool."""
     conn = psycopg2.connect(
         DATABASE_URL,
-        sslmode="require"
+        sslmode=DB_SSLMODE
     )
     conn.autocommit = True
     cur = conn.cursor()
     cur.execute("SET search_path TO public;")
     cur.close()
     return conn
-# -------------------------
-# Inicialización de la BD
-# -------------------------
-def init_db():
-    """Crea las tablas necesarias si no existen."""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # Tabla de categorias
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS categoria (
-        id SERIAL PRIMARY KEY,
-        nombre TEXT UNIQUE
-    )
-    ''')
-
-    # Tabla de cliente
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS cliente (
-        id TEXT PRIMARY KEY,
-        nombre TEXT,
-        dni_ruc TEXT,
-        telefono TEXT,
-        direccion TEXT
-    )
-    ''')
-    
-    # Tabla de proveedor
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS proveedor (
-        id TEXT PRIMARY KEY,
-        nombre TEXT,
-        dni_ruc TEXT,
-        telefono TEXT,
-        direccion TEXT
-    )
-    ''')
-
-    # Tabla de producto
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS producto (
-        id TEXT PRIMARY KEY,
-        descripcion TEXT,
-        id_categoria INTEGER,
-        catalogo TEXT,
-        marca TEXT,
-        modelo TEXT,
-        ubicacion TEXT,
-        unidad_base TEXT,
-        stock_actual NUMERIC(12,4),
-        precio_venta NUMERIC(12,2),
-        imagen TEXT,
-        activo INTEGER DEFAULT 1,
-        costo_promedio NUMERIC(12,4),
-        costo_ultima_compra NUMERIC(12,4),
-        valor_inventario NUMERIC(14,2),
-        margen_utilidad NUMERIC(5,4) DEFAULT NULL,
-        valor_venta NUMERIC(12,2) DEFAULT NULL,
-        codigo_barras TEXT UNIQUE,
-        FOREIGN KEY (id_categoria) REFERENCES categoria(id)
-    )
-    ''')
-
-    # Tabla de venta
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS venta (
-        id SERIAL PRIMARY KEY,
-        fecha TIMESTAMP,
-        id_cliente TEXT,
-        suma_total NUMERIC(14,2),
-        descuento NUMERIC(14,2),
-        op_gravada NUMERIC(14,2),
-        op_gratuita NUMERIC(14,2),
-        igv NUMERIC(14,2),       
-        total NUMERIC(14,2),
-        tipo_comprobante TEXT,
-        nro_comprobante TEXT,
-        metodo_pago TEXT,
-        placa_vehiculo TEXT,
-        pago_cliente NUMERIC(14,2),
-        vuelto NUMERIC(14,2),
-        id_usuario integer null,          
-        estado TEXT DEFAULT 'EMITIDA',
-        motivo_anulacion TEXT,
-        fecha_anulacion TIMESTAMP,
-        usuario_anulacion TEXT,
-        reimpresiones INTEGER DEFAULT 0,
-        id_caja INTEGER,
-        FOREIGN KEY (id_cliente) REFERENCES cliente(id)
-    )
-    ''')
-
-    # Tabla de venta_detalle
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS venta_detalle (
-        id SERIAL PRIMARY KEY,
-        id_venta INTEGER,
-        id_producto TEXT,
-        cantidad NUMERIC(12,4),
-        precio_unitario NUMERIC(12,2),
-        sub_total NUMERIC(14,2),
-        precio_final NUMERIC(14,2),
-        FOREIGN KEY (id_venta) REFERENCES venta(id),
-        FOREIGN KEY (id_producto) REFERENCES producto(id)
-    )
-    ''')
-
-    # Tabla de compras
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS compras (
-        id SERIAL PRIMARY KEY,
-        fecha TIMESTAMP,
-        id_proveedor TEXT,
-        nro_doc TEXT,
-        tipo_doc TEXT,
-        suma_total NUMERIC(12,2),
-        descuento NUMERIC(12,2),
-        op_gravada NUMERIC(12,2),
-        op_gratuita NUMERIC(12,2),
-        igv NUMERIC(12,2),       
-        total NUMERIC(14,2),
-        metodo_pago TEXT,
-        FOREIGN KEY (id_proveedor) REFERENCES proveedor(id)
-    )
-    ''')
-
-    # Tabla de compras_detalle
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS compras_detalle (
-        id SERIAL PRIMARY KEY,
-        id_compra INTEGER,
-        id_producto TEXT,
-        cantidad_compra NUMERIC(12,4),
-        unidad_compra TEXT,
-        factor_conversion NUMERIC(12,4),
-        cantidad_final NUMERIC(12,4),
-        precio_unitario NUMERIC(12,4),
-        subtotal NUMERIC(14,2),
-        FOREIGN KEY (id_compra) REFERENCES compras(id),
-        FOREIGN KEY (id_producto) REFERENCES producto(id)
-    )
-    ''')
-
-    # Tabla de producto_proveedor
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS producto_proveedor (
-        id SERIAL PRIMARY KEY,
-        id_producto TEXT,
-        id_proveedor TEXT,
-        unidad_compra TEXT,
-        factor NUMERIC(12,4),
-        precio_compra NUMERIC(12,4),
-        lote_min NUMERIC(12,4),
-        tiempo_entrega NUMERIC(12,4),
-        FOREIGN KEY (id_producto) REFERENCES producto(id),
-        FOREIGN KEY (id_proveedor) REFERENCES proveedor(id)
-    )
-    ''')
-
-    # Tabla de movimientos
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS movimientos (
-        id SERIAL PRIMARY KEY,
-        id_producto TEXT,
-        tipo TEXT,            -- 'entrada' o 'salida'
-        cantidad NUMERIC(12,4),
-        fecha TIMESTAMP,
-        motivo TEXT,
-        referencia TEXT,
-        costo_unitario NUMERIC(12,4),
-        valor_total NUMERIC(14,2), 
-        FOREIGN KEY (id_producto) REFERENCES producto(id)
-    )
-    ''')
-
-    # Tabla de configuración del sistema
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS configuracion (
-        id INTEGER PRIMARY KEY CHECK (id = 1),
-        tipo_regimen TEXT DEFAULT 'Régimen General',
-        igv NUMERIC(5,4) DEFAULT 0.18,
-        margen_utilidad NUMERIC(5,4) DEFAULT 0.25,
-        incluir_igv_en_precio INTEGER DEFAULT 1,
-        -- Datos de la empresa
-        razon_social TEXT,
-        nombre_comercial TEXT,
-        ruc TEXT,
-        direccion TEXT,
-        celular TEXT,
-        -- Control
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP
-    )
-    ''')
 
-    # Insertar registro inicial si no existe
-    cursor.execute('''
-    INSERT INTO configuracion (id, tipo_regimen, igv, margen_utilidad, incluir_igv_en_precio)
-    VALUES (1, 'Régimen General', 0.18, 0.25, 1)
-    ON CONFLICT (id) DO NOTHING
-    ''')
-
-    # Tabla de historial_precios
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS historial_precios (
-        id SERIAL PRIMARY KEY,
-        producto_id TEXT,
-        precio_anterior NUMERIC(12,2),
-        precio_nuevo NUMERIC(12,2),
-        margen_usado NUMERIC(5,4),
-        costo_promedio NUMERIC(12,4),
-        fecha TIMESTAMP,
-        FOREIGN KEY (producto_id) REFERENCES producto(id)
+@st.cache_resource
+def obtener_pool():
+    """Pool único por proceso, compartido entre todas las sesiones."""
+    return PoolConexiones(
+        crear_conexion,
+        minimo=DB_POOL_MIN,
+        maximo=DB_POOL_MAX,
+        timeout=DB_POOL_TIMEOUT,
+        verificar_cada=DB_POOL_VERIFICAR_CADA
     )
-    """)
 
-    # Tabla de historial_precios
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS caja (
-        id SERIAL PRIMARY KEY,
-        fecha_apertura TIMESTAMP,
-        fecha_cierre TIMESTAMP,
-        monto_apertura NUMERIC(14,2),
-        monto_cierre NUMERIC(14,2),
-        usuario_apertura TEXT,
-        usuario_cierre TEXT,
-        estado TEXT
-    )
-    """)
+# Unidad de trabajo activa en el rerun (hilo) actual
+_unidad_actual = ContextVar("unidad_de_trabajo", default=None)
 
-    # Tabla de correlativo_comprobante
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS correlativo_comprobante (
-        id SERIAL PRIMARY KEY,
-        tipo TEXT NOT NULL,              -- TICKET, BOLETA, FACTURA
-        serie TEXT NOT NULL,
-        numero INTEGER NOT NULL,
-        estado TEXT NOT NULL,            -- EMITIDO / ANULADO
-        fecha TIMESTAMP NOT NULL,
-        id_venta INTEGER,
-        UNIQUE (tipo, serie, numero)
-    )
-    """)
+def get_connection():
+    """
+    Presta una conexión del pool. conn.close() la devuelve al pool;
+    también se puede usar como `with get_connection() as conn:`.
+    Dentro de una unidad de trabajo devuelve la conexión de la unidad.
+    """
+    unidad = _unidad_actual.get()
+    if unidad is not None:
+        return unidad.vista()
+    return obtener_pool().obtener()
+
+@contextmanager
+def unidad_de_trabajo(solo_lectura=False):
+    """
+    Todos los helpers de db/services llamados dentro del bloque usan una
+    misma conexión. Sirve como decorador de los módulos: @unidad_de_trabajo().
+
+    Con solo_lectura=True el bloque corre en un único snapshot
+    REPEATABLE READ READ ONLY (no llamar helpers que escriben dentro).
+    Las unidades anidadas reutilizan la conexión de la externa.
+    """
+    unidad = _unidad_actual.get()
+    propia = unidad is None
+    if propia:
+        unidad = UnidadDeTrabajo(obtener_pool().obtener())
+        token = _unidad_actual.set(unidad)
+
+    abre_snapshot = solo_lectura and not unidad.en_snapshot
+    ok = False
+    try:
+        if abre_snapshot:
+            unidad.iniciar_snapshot()
+        yield unidad.vista()
+        ok = True
+    finally:
+        try:
+            if abre_snapshot:
+                unidad.terminar_snapshot(confirmar=ok)
+        finally:
+            if propia:
+                _unidad_actual.reset(token)
+                unidad.conexion.close()
+
+@contextmanager
+def transaccion(conn):
+    """
+    BEGIN/COMMIT explícitos sobre una conexión del pool (que trabaja en
+    autocommit): todo lo del bloque se confirma junto o nada.
+    """
+    conn.autocommit = False
+    try:
+        yield conn.cursor()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
 
-    # Tabla de venta_evento
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS venta_evento (
-        id SERIAL PRIMARY KEY,
-        id_venta INTEGER,
-        tipo TEXT,          -- REIMPRESION / ANULACION
-        fecha TIMESTAMP,
-        usuario TEXT,
-        observacion TEXT
-    )
-    """)
+def estadisticas_pool():
+    return obtener_pool().estadisticas()
 
-    # Tabla de caja_movimiento
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS caja_movimiento (
-        id SERIAL PRIMARY KEY,
-        id_caja INTEGER NOT NULL,
-        fecha TIMESTAMP NOT NULL,
-        tipo TEXT CHECK (tipo IN ('INGRESO','EGRESO')),
-        metodo_pago TEXT,
-        monto NUMERIC(14,2),
-        referencia TEXT,
-        id_venta INTEGER,
-        usuario TEXT
-    )
-    """)
+def contadores_pool_sesion():
+    """Conexiones creadas / reutilizadas por la sesión (hilo) actual."""
+    return obtener_pool().contadores_hilo()
+# -------------------------
+# Inicialización de la BD
+# -------------------------
+@st.cache_resource
+def init_db():
+    """
+    Verifica la versión del esquema una vez por proceso (una sola consulta)
+    y aplica las migraciones pendientes de la carpeta migraciones/.
+    """
+    from migraciones import asegurar_esquema
 
-    conn.commit()
-    conn.close()
+    conn = obtener_pool().obtener()
+    try:
+        return asegurar_esquema(conn)
+    finally:
+        conn.close()
 
 # -------------------------
 # Funciones auxiliares
@@ -308,9 +145,11 @@ def generar_codigo_correlativo(tabla, prefijo):
     """Genera código correlativo con prefijo + 5 dígitos"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute(f"SELECT id FROM {tabla} ORDER BY id DESC LIMIT 1")
-    ultimo = cursor.fetchone()
-    conn.close()
+    try:
+        cursor.execute(f"SELECT id FROM {tabla} ORDER BY id DESC LIMIT 1")
+        ultimo = cursor.fetchone()
+    finally:
+        conn.close()
 
     if ultimo and ultimo[0]:
         ultimo_num = int(ultimo[0].replace(prefijo, ""))
@@ -324,8 +163,10 @@ def generar_codigo_correlativo(tabla, prefijo):
 # -------------------------
 def obtener_categorias():
     conn = get_connection()
-    df = pd.read_sql("SELECT id, nombre FROM categoria ORDER BY id ASC", conn)
-    conn.close()
+    try:
+        df = pd.read_sql("SELECT id, nombre FROM categoria ORDER BY id ASC", conn)
+    finally:
+        conn.close()
     return df
 
 def agregar_categoria(nombre):
@@ -346,16 +187,20 @@ def agregar_categoria(nombre):
 def editar_categoria(id_cat, nuevo_nombre):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("UPDATE categoria SET nombre=%s WHERE id=%s", (nuevo_nombre, id_cat))
-    conn.commit()
-    conn.close()
+    try:
+        cursor.execute("UPDATE categoria SET nombre=%s WHERE id=%s", (nuevo_nombre, id_cat))
+        conn.commit()
+    finally:
+        conn.close()
 
 def eliminar_categoria(id_cat):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("DELETE FROM categoria WHERE id=%s", (id_cat,))
-    conn.commit()
-    conn.close()
+    try:
+        cursor.execute("DELETE FROM categoria WHERE id=%s", (id_cat,))
+        conn.commit()
+    finally:
+        conn.close()
 
 
 # -------------------------
@@ -364,161 +209,138 @@ def eliminar_categoria(id_cat):
 def insertar_producto(data):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('''
-    INSERT INTO producto (
-            id, descripcion, id_categoria, catalogo, marca, modelo,
-            ubicacion, unidad_base , stock_actual, precio_venta, imagen, activo
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    ''', data)
-    conn.commit()
-    conn.close()
+    try:
+        cursor.execute('''
+        INSERT INTO producto (
+                id, descripcion, id_categoria, catalogo, marca, modelo,
+                ubicacion, unidad_base , stock_actual, precio_venta, imagen, activo
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ''', data)
+        conn.commit()
+    finally:
+        conn.close()
 
 def mostrar_todos():
     conn = get_connection()
-    df = pd.read_sql_query("SELECT * FROM producto", conn)
-    conn.close()
+    try:
+        df = pd.read_sql_query("SELECT * FROM producto", conn)
+    finally:
+        conn.close()
     return df
 
 def existe_codigo(id):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM producto WHERE id = %s", (id,))
-    fila = cursor.fetchone()
-    conn.close()
+    try:
+        cursor.execute("SELECT * FROM producto WHERE id = %s", (id,))
+        fila = cursor.fetchone()
+    finally:
+        conn.close()
     return fila
 
 def actualizar_producto(data):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('''
-    UPDATE public.producto SET
-        descripcion = %s,
-        id_categoria = %s,
-        catalogo = %s,
-        marca = %s,
-        modelo = %s,
-        ubicacion = %s,
-        unidad_base = %s,
-        stock_actual = %s,
-        precio_venta = %s,
-        imagen = %s,
-        activo = %s          
-    WHERE id = %s
-    ''', data)
-
-    # 🔥 Recalcular precio y valor_venta CON el margen recién actualizado
-    producto_id = data[-1]
-
-    # 🔒 Recalcular precios (blindado)
-    resultado = recalcular_precios_producto(cursor, producto_id)
-
-    if resultado and resultado[0] is not None:
-        precio_anterior, precio_nuevo, margen_usado, costo_prom = resultado
-
-        registrar_historial_precio(
-            cursor,
-            producto_id,
-            precio_anterior,
-            precio_nuevo,
-            margen_usado,
-            costo_prom
-        )
-
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-def actualizar_costo_promedio(cursor, id_producto, cantidad_entrada, costo_unitario_entrada):
-    
-    # 🔹 Convertimos entradas a Decimal
-    cantidad_entrada = Decimal(str(cantidad_entrada))
-    costo_unitario_entrada = Decimal(str(costo_unitario_entrada))
+    try:
+        cursor.execute('''
+        UPDATE public.producto SET
+            descripcion = %s,
+            id_categoria = %s,
+            catalogo = %s,
+            marca = %s,
+            modelo = %s,
+            ubicacion = %s,
+            unidad_base = %s,
+            stock_actual = %s,
+            precio_venta = %s,
+            imagen = %s,
+            activo = %s          
+        WHERE id = %s
+        ''', data)
 
-    cursor.execute("SELECT stock_actual, costo_promedio FROM producto WHERE id = %s", (id_producto,))
-    fila = cursor.fetchone()
-    if not fila:
-        return
+        # 🔥 Recalcular precio y valor_venta CON el margen recién actualizado
+        producto_id = data[-1]
 
-    stock_actual, costo_promedio_actual = fila
+        # 🔒 Recalcular precios (blindado)
+        resultado = recalcular_precios_producto(cursor, producto_id)
 
-    stock_actual = Decimal(stock_actual or 0)
-    costo_promedio_actual = Decimal(costo_promedio_actual or 0)
+        if resultado and resultado[0] is not None:
+            precio_anterior, precio_nuevo, margen_usado, costo_prom = resultado
 
-    # 🔹 Si el producto es nuevo o no tiene costo previo
-    if costo_promedio_actual == 0 or stock_actual == 0:
-        nuevo_costo_promedio = costo_unitario_entrada
-    else:
-        total_valor_anterior = stock_actual * costo_promedio_actual
-        total_valor_nuevo = cantidad_entrada * costo_unitario_entrada
-        nuevo_costo_promedio = (total_valor_anterior + total_valor_nuevo) / (stock_actual + cantidad_entrada)
+            registrar_historial_precio(
+                cursor,
+                producto_id,
+                precio_anterior,
+                precio_nuevo,
+                margen_usado,
+                costo_prom
+            )
 
-    nuevo_stock = stock_actual + cantidad_entrada
-    valor_inventario = nuevo_stock * nuevo_costo_promedio
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
 
+def actualizar_costo_promedio(cursor, id_producto, cantidad_entrada, costo_unitario_entrada):
+    """
+    Entrada de stock con costo promedio ponderado, en un solo UPDATE atómico
+    (sin leer y reescribir desde Python: dos compras a la vez no se pisan).
+    Con stock en cero o negativo el costo promedio pasa a ser el de la entrada.
+    """
     cursor.execute("""
-        UPDATE public.producto
-        SET 
-            stock_actual = %s, 
-            costo_promedio = %s, 
-            costo_ultima_compra = %s,
-            valor_inventario = %s
-        WHERE id = %s
-    """, (
-        nuevo_stock,
-        nuevo_costo_promedio.quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP),
-        costo_unitario_entrada.quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP),
-        valor_inventario.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
-        id_producto
-    ))
-
-    return round(nuevo_costo_promedio, 4)
-
-def registrar_salida_por_venta(cursor, id_producto, cantidad_salida, fecha, referencia):
-    """Registra una salida por venta y actualiza el inventario."""
-    # Obtener datos actuales del producto
-    cursor.execute("SELECT stock_actual, costo_promedio FROM producto WHERE id = %s", (id_producto,))
+        UPDATE public.producto p
+        SET
+            stock_actual = COALESCE(p.stock_actual, 0) + %(cantidad)s,
+            costo_promedio = round(
+                CASE
+                    WHEN COALESCE(p.costo_promedio, 0) = 0 OR COALESCE(p.stock_actual, 0) <= 0 THEN %(costo)s
+                    ELSE (p.stock_actual * p.costo_promedio + %(cantidad)s * %(costo)s)
+                         / (p.stock_actual + %(cantidad)s)
+                END, 4),
+            costo_ultima_compra = round(%(costo)s, 4),
+            valor_inventario = round(
+                (COALESCE(p.stock_actual, 0) + %(cantidad)s) *
+                CASE
+                    WHEN COALESCE(p.costo_promedio, 0) = 0 OR COALESCE(p.stock_actual, 0) <= 0 THEN %(costo)s
+                    ELSE (p.stock_actual * p.costo_promedio + %(cantidad)s * %(costo)s)
+                         / (p.stock_actual + %(cantidad)s)
+                END, 2)
+        WHERE p.id = %(id)s
+        RETURNING p.costo_promedio
+    """, {
+        "id": id_producto,
+        "cantidad": Decimal(str(cantidad_entrada)),
+        "costo": Decimal(str(costo_unitario_entrada)),
+    })
     fila = cursor.fetchone()
     if not fila:
         return
 
-    stock_actual, costo_promedio = fila
-
-    stock_actual = Decimal(stock_actual or 0)
-    costo_promedio = Decimal(costo_promedio or 0)
-    cantidad_salida = Decimal(str(cantidad_salida))
+    return fila[0]
 
-    nuevo_stock = stock_actual - cantidad_salida
-    if nuevo_stock < 0:
-        nuevo_stock = Decimal("0")
-
-    valor_total = (cantidad_salida * costo_promedio).quantize(Decimal("0.01"))
-
-    # Actualizar producto
-    cursor.execute("""
-        UPDATE public.producto
-        SET stock_actual = %s, valor_inventario = %s
-        WHERE id = %s
-    """, (
-        nuevo_stock,
-        (nuevo_stock * costo_promedio).quantize(Decimal("0.01")),
-        id_producto
-    ))
+def registrar_salida_por_venta(cursor, id_producto, cantidad_salida, fecha, referencia):
+    """Registra una salida por venta y actualiza el inventario."""
+    registrar_salidas_por_venta(cursor, [(id_producto, cantidad_salida)], fecha, referencia)
+
+def registrar_salidas_por_venta(cursor, items, fecha, referencia):
+    """
+    Salidas de todas las líneas de una venta: items = [(id_producto, cantidad)].
+    Una sola llamada a registrar_salidas_stock (migración 0007): descuenta en
+    SQL según configuracion.politica_stock y escribe el kardex, un movimiento
+    por línea. Con la política RECHAZAR lanza error si falta stock.
+    """
+    if not items:
+        return
 
-    # Registrar movimiento
-    cursor.execute("""
-        INSERT INTO public.movimientos (
-            id_producto, tipo, cantidad, fecha, motivo, referencia, costo_unitario, valor_total
+    cursor.execute(
+        "SELECT registrar_salidas_stock(%s::text[], %s::numeric[], %s, 'Venta', %s)",
+        (
+            [id_producto for id_producto, _ in items],
+            [Decimal(str(cantidad)) for _, cantidad in items],
+            fecha,
+            referencia
         )
-        VALUES (%s, 'salida', %s, %s, %s, %s, %s, %s)
-    """, (
-        id_producto,
-        cantidad_salida,
-        fecha,
-        "Venta",
-        referencia,
-        costo_promedio,
-        valor_total
-    ))
+    )
 
 def redondear_050(valor):
     """Redondea hacia el múltiplo más cercano de 0.50."""
@@ -568,42 +390,62 @@ def recalcular_precios_producto(cursor, id_producto):
     return precio_anterior, precio_nuevo, margen, costo_promedio
 
 
-def recalcular_todos_los_precios():
+def recalcular_todos_los_precios(categoria=None, marca=None):
+    """
+    Precios de venta de los productos activos (de una categoría y/o marca si
+    se indican) con la función recalcular_precios de la BD: una sentencia y
+    una transacción, con historial de los que cambian de precio.
+    Devuelve {"revisados", "actualizados", "cambios_precio"}.
+    """
     conn = get_connection()
     cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT * FROM recalcular_precios(%s, %s, %s)",
+            (categoria, marca, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        )
+        revisados, actualizados, cambios_precio = cursor.fetchone()
+        conn.commit()
+    except psycopg2.errors.RaiseException as e:
+        raise ValueError(e.diag.message_primary) from None
+    finally:
+        conn.close()
 
-    cursor.execute("SELECT id FROM producto WHERE activo = 1")
-    productos = cursor.fetchall()
-
-    for (id_prod,) in productos:
-        recalcular_precios_producto(cursor, id_prod)
-
-    conn.commit()
-    conn.close()
+    return {"revisados": revisados, "actualizados": actualizados, "cambios_precio": cambios_precio}
 
 
 # -------------------------
 # Configuración del sistema
 # -------------------------
+# configuracion.politica_stock: qué hacer al vender más de lo que hay en stock
+POLITICAS_STOCK = {
+    "LIMITAR": "Permitir y dejar el stock en 0",
+    "NEGATIVO": "Permitir y dejar el stock negativo",
+    "RECHAZAR": "Rechazar la venta",
+}
+
 def obtener_configuracion():
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT
-            tipo_regimen,
-            igv,
-            margen_utilidad,
-            incluir_igv_en_precio,
-            razon_social,
-            nombre_comercial,
-            ruc,
-            direccion,
-            celular
-        FROM configuracion
-        WHERE id = 1
-    """)
-    fila = cursor.fetchone()
-    conn.close()
+    try:
+        cursor.execute("""
+            SELECT
+                tipo_regimen,
+                igv,
+                margen_utilidad,
+                incluir_igv_en_precio,
+                razon_social,
+                nombre_comercial,
+                ruc,
+                direccion,
+                celular,
+                politica_stock
+            FROM configuracion
+            WHERE id = 1
+        """)
+        fila = cursor.fetchone()
+    finally:
+        conn.close()
 
     if not fila:
         return {}
@@ -618,6 +460,7 @@ def obtener_configuracion():
         "ruc": fila[6],
         "direccion": fila[7],
         "celular": fila[8],
+        "politica_stock": fila[9],
     }
 
 
@@ -630,39 +473,43 @@ def actualizar_configuracion(
     nombre_comercial=None,
     ruc=None,
     direccion=None,
-    celular=None
+    celular=None,
+    politica_stock=None
 ):
     conn = get_connection()
     cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE configuracion
+            SET
+                tipo_regimen = COALESCE(%s, tipo_regimen),
+                igv = COALESCE(%s, igv),
+                margen_utilidad = COALESCE(%s, margen_utilidad),
+                incluir_igv_en_precio = COALESCE(%s, incluir_igv_en_precio),
+                razon_social = COALESCE(%s, razon_social),
+                nombre_comercial = COALESCE(%s, nombre_comercial),
+                ruc = COALESCE(%s, ruc),
+                direccion = COALESCE(%s, direccion),
+                celular = COALESCE(%s, celular),
+                politica_stock = COALESCE(%s, politica_stock),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = 1
+        """, (
+            nuevo_regimen,
+            nuevo_igv,
+            nuevo_margen,
+            1 if incluir_igv else None if incluir_igv is None else 0,
+            razon_social,
+            nombre_comercial,
+            ruc,
+            direccion,
+            celular,
+            politica_stock
+        ))
 
-    cursor.execute("""
-        UPDATE configuracion
-        SET
-            tipo_regimen = COALESCE(%s, tipo_regimen),
-            igv = COALESCE(%s, igv),
-            margen_utilidad = COALESCE(%s, margen_utilidad),
-            incluir_igv_en_precio = COALESCE(%s, incluir_igv_en_precio),
-            razon_social = COALESCE(%s, razon_social),
-            nombre_comercial = COALESCE(%s, nombre_comercial),
-            ruc = COALESCE(%s, ruc),
-            direccion = COALESCE(%s, direccion),
-            celular = COALESCE(%s, celular),
-            updated_at = CURRENT_TIMESTAMP
-        WHERE id = 1
-    """, (
-        nuevo_regimen,
-        nuevo_igv,
-        nuevo_margen,
-        1 if incluir_igv else None if incluir_igv is None else 0,
-        razon_social,
-        nombre_comercial,
-        ruc,
-        direccion,
-        celular
-    ))
-
-    conn.commit()
-    conn.close()
+        conn.commit()
+    finally:
+        conn.close()
 
 def registrar_historial_precio(cursor, producto_id, precio_anterior, precio_nuevo, margen_usado, costo_promedio):
     fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -673,14 +520,18 @@ def registrar_historial_precio(cursor, producto_id, precio_anterior, precio_nuev
 
 def backup_productos_csv():
     conn = get_connection()
-    df = pd.read_sql("SELECT * FROM producto", conn)
-    conn.close()
+    try:
+        df = pd.read_sql("SELECT * FROM producto", conn)
+    finally:
+        conn.close()
     df.to_csv("backup_productos.csv", index=False)
 
 def query_df(sql, params=None):
     conn = get_connection()
-    df = pd.read_sql_query(sql, conn, params=params)
-    conn.close()
+    try:
+        df = pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
     return df
 
 def to_float(value, default=0.0):
@@ -713,23 +564,24 @@ def obtener_cliente_por_id(cliente_id):
 def obtener_venta_por_id(id_venta):
     conn = get_connection()
     cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT
-            v.id,
-            v.fecha,
-            c.nombre,
-            c.dni_ruc,
-            v.total,
-            v.metodo_pago,
-            v.tipo_comprobante
-        FROM public.venta v
-        LEFT JOIN public.cliente c ON c.id = v.id_cliente
-        WHERE v.id = %s
-    """, (id_venta,))
-
-    row = cursor.fetchone()
-    conn.close()
+    try:
+        cursor.execute("""
+            SELECT
+                v.id,
+                v.fecha,
+                c.nombre,
+                c.dni_ruc,
+                v.total,
+                v.metodo_pago,
+                v.tipo_comprobante
+            FROM public.venta v
+            LEFT JOIN public.cliente c ON c.id = v.id_cliente
+            WHERE v.id = %s
+        """, (id_venta,))
+
+        row = cursor.fetchone()
+    finally:
+        conn.close()
 
     if not row:
         return None
@@ -0,0 +1,334 @@
+# db_pool.py
+import threading
+import time
+import weakref
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolAgotadoError(Exception):
+    """No se obtuvo una conexión libre dentro del tiempo de espera."""
+
+
+class ConexionPool:
+    """
+    Conexión prestada por el pool.
+    Se comporta como la conexión psycopg2, pero close() la devuelve al pool.
+    Si nadie la devuelve (una excepción antes de close()), al recolectarse la
+    conexión psycopg2 se cierra sola y el finalizador libera su lugar.
+    """
+
+    def __init__(self, pool, conn):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_devuelta", False)
+        # Sobre la conexión real y no sobre este envoltorio: un cursor puede
+        # seguir usándola después de que el envoltorio se recolecte
+        finalizador = weakref.finalize(conn, pool._perdida)
+        finalizador.atexit = False
+        object.__setattr__(self, "_finalizador", finalizador)
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+    def __setattr__(self, nombre, valor):
+        # conn.autocommit = False debe llegar a la conexión real
+        setattr(self._conn, nombre, valor)
+
+    @property
+    def closed(self):
+        return 1 if self._devuelta else self._conn.closed
+
+    def close(self):
+        if self._devuelta:
+            return
+        object.__setattr__(self, "_devuelta", True)
+        self._finalizador.detach()
+        self._pool.devolver(self._conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if (
+            exc_type is None
+            and not self._conn.closed
+            and self._conn.info.transaction_status == extensions.TRANSACTION_STATUS_INTRANS
+        ):
+            self._conn.commit()
+        self.close()
+        return False
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones compartido por todas las sesiones del proceso.
+
+    - Entrega conexiones ya configuradas (search_path) y verificadas.
+    - Reutiliza la última conexión devuelta (LIFO) para mantenerla caliente.
+    - Lleva estadísticas globales y por hilo (cada rerun de Streamlit corre
+      en el hilo de su sesión).
+    """
+
+    def __init__(self, crear_conexion, minimo=1, maximo=10, timeout=10.0, verificar_cada=30.0):
+        if minimo < 0 or maximo < 1 or minimo > maximo:
+            raise ValueError("Tamaño de pool inválido (0 <= mínimo <= máximo, máximo >= 1)")
+
+        self._crear_conexion = crear_conexion
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.verificar_cada = verificar_cada
+
+        self._libres = deque()  # (conexión, último uso)
+        self._total = 0
+        self._en_uso = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+        self._stats = {
+            "conexiones_creadas": 0,
+            "ms_handshake_total": 0.0,
+            "prestamos": 0,
+            "reutilizadas": 0,
+            "descartadas": 0,
+            "esperas": 0,
+            "ms_espera_total": 0.0,
+            "timeouts": 0,
+            "perdidas": 0,
+        }
+
+        for _ in range(minimo):
+            conn = self._nueva_conexion()
+            with self._cond:
+                self._total += 1
+                self._libres.append((conn, time.monotonic()))
+
+    # -------------------------
+    # Préstamo / devolución
+    # -------------------------
+    def obtener(self, timeout=None):
+        """Presta una conexión; lanza PoolAgotadoError si no hay ninguna a tiempo."""
+        timeout = self.timeout if timeout is None else timeout
+        inicio = time.monotonic()
+        limite = inicio + timeout
+        conn = None
+        ultimo_uso = None
+
+        with self._cond:
+            while True:
+                if self._libres:
+                    conn, ultimo_uso = self._libres.pop()
+                    break
+                if self._total < self.maximo:
+                    self._total += 1
+                    break
+
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolAgotadoError(
+                        f"No hay conexiones libres (máximo {self.maximo}) tras {timeout:.1f} s"
+                    )
+                self._stats["esperas"] += 1
+                self._cond.wait(restante)
+
+            self._en_uso += 1
+            self._stats["prestamos"] += 1
+            self._stats["ms_espera_total"] += (time.monotonic() - inicio) * 1000
+
+        try:
+            if conn is not None and not self._sana(conn, ultimo_uso):
+                self._descartar(conn)
+                conn = None
+
+            if conn is None:
+                conn = self._nueva_conexion()
+            else:
+                self._contar("reutilizadas")
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._en_uso -= 1
+                self._cond.notify()
+            raise
+
+        return ConexionPool(self, conn)
+
+    def devolver(self, conn):
+        sana = not conn.closed
+
+        if sana:
+            try:
+                estado = conn.info.transaction_status
+                if estado == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    sana = False
+                elif estado != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if sana and not conn.autocommit:
+                    conn.autocommit = True
+            except psycopg2.Error:
+                sana = False
+
+        with self._cond:
+            self._en_uso -= 1
+            if sana:
+                self._libres.append((conn, time.monotonic()))
+            else:
+                self._total -= 1
+            self._cond.notify()
+
+        if not sana:
+            self._descartar(conn)
+
+    def _perdida(self):
+        """Una conexión prestada se recolectó sin devolverse: su lugar queda libre."""
+        with self._cond:
+            self._total -= 1
+            self._en_uso -= 1
+            self._stats["perdidas"] += 1
+            self._cond.notify()
+
+    def cerrar(self):
+        """Cierra las conexiones libres (las prestadas se cierran al devolverse)."""
+        with self._cond:
+            libres = list(self._libres)
+            self._libres.clear()
+            self._total -= len(libres)
+        for conn, _ in libres:
+            self._descartar(conn)
+
+    # -------------------------
+    # Estadísticas
+    # -------------------------
+    def estadisticas(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "minimo": self.minimo,
+                "maximo": self.maximo,
+                "tamano": self._total,
+                "en_uso": self._en_uso,
+                "libres": len(self._libres),
+            })
+
+        creadas = stats["conexiones_creadas"]
+        promedio = stats["ms_handshake_total"] / creadas if creadas else 0.0
+        stats["ms_handshake_promedio"] = promedio
+        stats["ms_ahorrados"] = stats["reutilizadas"] * promedio
+        return stats
+
+    def contadores_hilo(self):
+        """Contadores acumulados del hilo actual (una sesión de Streamlit)."""
+        return {
+            "conexiones_creadas": getattr(self._local, "conexiones_creadas", 0),
+            "reutilizadas": getattr(self._local, "reutilizadas", 0),
+        }
+
+    # -------------------------
+    # Internos
+    # -------------------------
+    def _nueva_conexion(self):
+        inicio = time.perf_counter()
+        conn = self._crear_conexion()
+        ms = (time.perf_counter() - inicio) * 1000
+
+        with self._cond:
+            self._stats["conexiones_creadas"] += 1
+            self._stats["ms_handshake_total"] += ms
+        self._local.conexiones_creadas = getattr(self._local, "conexiones_creadas", 0) + 1
+        return conn
+
+    def _contar(self, clave):
+        with self._cond:
+            self._stats[clave] += 1
+        setattr(self._local, clave, getattr(self._local, clave, 0) + 1)
+
+    def _sana(self, conn, ultimo_uso):
+        if conn.closed:
+            return False
+        if time.monotonic() - ultimo_uso < self.verificar_cada:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _descartar(self, conn):
+        with self._cond:
+            self._stats["descartadas"] += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+
+class UnidadDeTrabajo:
+    """
+    Una conexión del pool compartida por todo un rerun.
+    Opcionalmente mantiene un snapshot REPEATABLE READ de solo lectura.
+    """
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.en_snapshot = False
+
+    def iniciar_snapshot(self):
+        cur = self.conexion.cursor()
+        cur.execute("BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        cur.close()
+        self.en_snapshot = True
+
+    def terminar_snapshot(self, confirmar=True):
+        self.en_snapshot = False
+        if self.conexion.closed:
+            return
+        cur = self.conexion.cursor()
+        cur.execute("COMMIT" if confirmar else "ROLLBACK")
+        cur.close()
+
+    def vista(self):
+        return ConexionCompartida(self)
+
+
+class ConexionCompartida:
+    """
+    Lo que get_connection() entrega dentro de una unidad de trabajo.
+    close() no libera la conexión (lo hace la unidad al terminar) y
+    commit()/rollback() no cortan el snapshot de la unidad.
+    """
+
+    def __init__(self, unidad):
+        object.__setattr__(self, "_unidad", unidad)
+
+    def __getattr__(self, nombre):
+        return getattr(self._unidad.conexion, nombre)
+
+    def __setattr__(self, nombre, valor):
+        setattr(self._unidad.conexion, nombre, valor)
+
+    @property
+    def closed(self):
+        return self._unidad.conexion.closed
+
+    def close(self):
+        pass
+
+    def commit(self):
+        if not self._unidad.en_snapshot:
+            self._unidad.conexion.commit()
+
+    def rollback(self):
+        if not self._unidad.en_snapshot:
+            self._unidad.conexion.rollback()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
@@ -2,11 +2,13 @@
 import streamlit as st
 import os
 import time
-from db import init_db
+from db import init_db, contadores_pool_sesion, estadisticas_pool
+from migraciones import MigracionEnCursoError
 from auth import autenticar_usuario, obtener_usuario_por_username
 from session_manager import iniciar_sesion, obtener_usuario_sesion, cerrar_sesion
 from streamlit_cookies_manager import CookieManager
 from services.venta_service import obtener_caja_abierta
+from services.cola_ventas import obtener_cola
 
 # Configuración de la página
 st.set_page_config(page_title="Sistema de Gestión", layout="wide")
@@ -48,6 +50,17 @@ button[kind="primary"] {
 </style>
 """, unsafe_allow_html=True)
 
+# Conexiones usadas por esta carga de página (para medir el ahorro del pool)
+contadores_inicio = contadores_pool_sesion()
+
+# Esquema de BD al día: una verificación de versión por proceso (antes del login,
+# que necesita la tabla usuarios)
+try:
+    init_db()
+except MigracionEnCursoError as e:
+    st.warning(f"⏳ {e}")
+    st.stop()
+
 cookies = CookieManager(prefix="koreano_")
 
 if not cookies.ready():
@@ -137,11 +150,6 @@ from modulos.caja import caja_app
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
-# Inicializar BD
-if "db_initialized" not in st.session_state:
-    init_db()
-    st.session_state.db_initialized = True
-
 # -------------------------
 # Sidebar con LOGO y BOTONES
 # -------------------------
@@ -153,6 +161,15 @@ if usuario:
     st.sidebar.write(f"👤 Usuario: {usuario['username']}")
     st.sidebar.write(f"🔑 Rol: {usuario['rol']}")
 
+    # Ventas de la cola local aún no registradas en la BD
+    cola_ventas = obtener_cola()
+    if cola_ventas:
+        resumen_cola = cola_ventas.resumen()
+        if resumen_cola["pendientes"]:
+            st.sidebar.info(f"🔄 {resumen_cola['pendientes']} venta(s) por sincronizar")
+        if resumen_cola["conflictos"]:
+            st.sidebar.error(f"⚠️ {resumen_cola['conflictos']} venta(s) con conflicto (ver Caja)")
+
 # Estado del módulo actual
 if "modulo" not in st.session_state:
     st.session_state.modulo = "🏠 Inicio"
@@ -256,6 +273,19 @@ if st.sidebar.button("Cerrar sesión", width='stretch'):
     cerrar_sesion(usuario["id"], cookies)
     st.rerun()
 
+# -------------------------
+# Métricas del pool de conexiones (solo admin)
+# -------------------------
+if usuario["rol"] == "admin":
+    contadores = contadores_pool_sesion()
+    reutilizadas = contadores["reutilizadas"] - contadores_inicio["reutilizadas"]
+    nuevas = contadores["conexiones_creadas"] - contadores_inicio["conexiones_creadas"]
+    ahorro_ms = reutilizadas * estadisticas_pool()["ms_handshake_promedio"]
+    st.sidebar.caption(
+        f"⚡ Conexiones: {reutilizadas} reutilizadas / {nuevas} nuevas · "
+        f"~{ahorro_ms:,.0f} ms de handshake ahorrados en esta carga"
+    )
+
 # -------------------------
 # Pie de página
 # -------------------------
@@ -0,0 +1,245 @@
+-- Esquema base del sistema (antes creado por db.init_db en cada sesión).
+-- Idempotente: en bases existentes solo agrega lo que falte (p. ej. usuarios).
+
+-- Tabla de categorias
+CREATE TABLE IF NOT EXISTS categoria (
+    id SERIAL PRIMARY KEY,
+    nombre TEXT UNIQUE
+);
+
+-- Tabla de cliente
+CREATE TABLE IF NOT EXISTS cliente (
+    id TEXT PRIMARY KEY,
+    nombre TEXT,
+    dni_ruc TEXT,
+    telefono TEXT,
+    direccion TEXT
+);
+
+-- Tabla de proveedor
+CREATE TABLE IF NOT EXISTS proveedor (
+    id TEXT PRIMARY KEY,
+    nombre TEXT,
+    dni_ruc TEXT,
+    telefono TEXT,
+    direccion TEXT
+);
+
+-- Tabla de producto
+CREATE TABLE IF NOT EXISTS producto (
+    id TEXT PRIMARY KEY,
+    descripcion TEXT,
+    id_categoria INTEGER,
+    catalogo TEXT,
+    marca TEXT,
+    modelo TEXT,
+    ubicacion TEXT,
+    unidad_base TEXT,
+    stock_actual NUMERIC(12,4),
+    precio_venta NUMERIC(12,2),
+    imagen TEXT,
+    activo INTEGER DEFAULT 1,
+    costo_promedio NUMERIC(12,4),
+    costo_ultima_compra NUMERIC(12,4),
+    valor_inventario NUMERIC(14,2),
+    margen_utilidad NUMERIC(5,4) DEFAULT NULL,
+    valor_venta NUMERIC(12,2) DEFAULT NULL,
+    codigo_barras TEXT UNIQUE,
+    FOREIGN KEY (id_categoria) REFERENCES categoria(id)
+);
+
+-- Tabla de usuarios (auth.py / session_manager.py)
+CREATE TABLE IF NOT EXISTS usuarios (
+    id SERIAL PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    nombre TEXT,
+    password_hash TEXT NOT NULL,
+    rol TEXT NOT NULL,
+    activo BOOLEAN DEFAULT TRUE,
+    password_updated_at TIMESTAMP,
+    token_sesion TEXT,
+    login_time DOUBLE PRECISION,   -- time.time() del login
+    last_login TIMESTAMP
+);
+
+-- Tabla de venta
+CREATE TABLE IF NOT EXISTS venta (
+    id SERIAL PRIMARY KEY,
+    fecha TIMESTAMP,
+    id_cliente TEXT,
+    suma_total NUMERIC(14,2),
+    descuento NUMERIC(14,2),
+    op_gravada NUMERIC(14,2),
+    op_gratuita NUMERIC(14,2),
+    igv NUMERIC(14,2),
+    total NUMERIC(14,2),
+    tipo_comprobante TEXT,
+    nro_comprobante TEXT,
+    metodo_pago TEXT,
+    placa_vehiculo TEXT,
+    pago_cliente NUMERIC(14,2),
+    vuelto NUMERIC(14,2),
+    id_usuario integer null,
+    estado TEXT DEFAULT 'EMITIDA',
+    motivo_anulacion TEXT,
+    fecha_anulacion TIMESTAMP,
+    usuario_anulacion TEXT,
+    reimpresiones INTEGER DEFAULT 0,
+    id_caja INTEGER,
+    FOREIGN KEY (id_cliente) REFERENCES cliente(id)
+);
+
+-- Tabla de venta_detalle
+CREATE TABLE IF NOT EXISTS venta_detalle (
+    id SERIAL PRIMARY KEY,
+    id_venta INTEGER,
+    id_producto TEXT,
+    cantidad NUMERIC(12,4),
+    precio_unitario NUMERIC(12,2),
+    sub_total NUMERIC(14,2),
+    precio_final NUMERIC(14,2),
+    FOREIGN KEY (id_venta) REFERENCES venta(id),
+    FOREIGN KEY (id_producto) REFERENCES producto(id)
+);
+
+-- Tabla de compras
+CREATE TABLE IF NOT EXISTS compras (
+    id SERIAL PRIMARY KEY,
+    fecha TIMESTAMP,
+    id_proveedor TEXT,
+    nro_doc TEXT,
+    tipo_doc TEXT,
+    suma_total NUMERIC(12,2),
+    descuento NUMERIC(12,2),
+    op_gravada NUMERIC(12,2),
+    op_gratuita NUMERIC(12,2),
+    igv NUMERIC(12,2),
+    total NUMERIC(14,2),
+    metodo_pago TEXT,
+    FOREIGN KEY (id_proveedor) REFERENCES proveedor(id)
+);
+
+-- Tabla de compras_detalle
+CREATE TABLE IF NOT EXISTS compras_detalle (
+    id SERIAL PRIMARY KEY,
+    id_compra INTEGER,
+    id_producto TEXT,
+    cantidad_compra NUMERIC(12,4),
+    unidad_compra TEXT,
+    factor_conversion NUMERIC(12,4),
+    cantidad_final NUMERIC(12,4),
+    precio_unitario NUMERIC(12,4),
+    subtotal NUMERIC(14,2),
+    FOREIGN KEY (id_compra) REFERENCES compras(id),
+    FOREIGN KEY (id_producto) REFERENCES producto(id)
+);
+
+-- Tabla de producto_proveedor
+CREATE TABLE IF NOT EXISTS producto_proveedor (
+    id SERIAL PRIMARY KEY,
+    id_producto TEXT,
+    id_proveedor TEXT,
+    unidad_compra TEXT,
+    factor NUMERIC(12,4),
+    precio_compra NUMERIC(12,4),
+    lote_min NUMERIC(12,4),
+    tiempo_entrega NUMERIC(12,4),
+    FOREIGN KEY (id_producto) REFERENCES producto(id),
+    FOREIGN KEY (id_proveedor) REFERENCES proveedor(id)
+);
+
+-- Tabla de movimientos
+CREATE TABLE IF NOT EXISTS movimientos (
+    id SERIAL PRIMARY KEY,
+    id_producto TEXT,
+    tipo TEXT,            -- 'entrada' o 'salida'
+    cantidad NUMERIC(12,4),
+    fecha TIMESTAMP,
+    motivo TEXT,
+    referencia TEXT,
+    costo_unitario NUMERIC(12,4),
+    valor_total NUMERIC(14,2),
+    FOREIGN KEY (id_producto) REFERENCES producto(id)
+);
+
+-- Tabla de configuración del sistema
+CREATE TABLE IF NOT EXISTS configuracion (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    tipo_regimen TEXT DEFAULT 'Régimen General',
+    igv NUMERIC(5,4) DEFAULT 0.18,
+    margen_utilidad NUMERIC(5,4) DEFAULT 0.25,
+    incluir_igv_en_precio INTEGER DEFAULT 1,
+    -- Datos de la empresa
+    razon_social TEXT,
+    nombre_comercial TEXT,
+    ruc TEXT,
+    direccion TEXT,
+    celular TEXT,
+    -- Control
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP
+);
+
+-- Registro inicial de configuración
+INSERT INTO configuracion (id, tipo_regimen, igv, margen_utilidad, incluir_igv_en_precio)
+VALUES (1, 'Régimen General', 0.18, 0.25, 1)
+ON CONFLICT (id) DO NOTHING;
+
+-- Tabla de historial_precios
+CREATE TABLE IF NOT EXISTS historial_precios (
+    id SERIAL PRIMARY KEY,
+    producto_id TEXT,
+    precio_anterior NUMERIC(12,2),
+    precio_nuevo NUMERIC(12,2),
+    margen_usado NUMERIC(5,4),
+    costo_promedio NUMERIC(12,4),
+    fecha TIMESTAMP,
+    FOREIGN KEY (producto_id) REFERENCES producto(id)
+);
+
+-- Tabla de caja
+CREATE TABLE IF NOT EXISTS caja (
+    id SERIAL PRIMARY KEY,
+    fecha_apertura TIMESTAMP,
+    fecha_cierre TIMESTAMP,
+    monto_apertura NUMERIC(14,2),
+    monto_cierre NUMERIC(14,2),
+    usuario_apertura TEXT,
+    usuario_cierre TEXT,
+    estado TEXT
+);
+
+-- Tabla de correlativo_comprobante
+CREATE TABLE IF NOT EXISTS correlativo_comprobante (
+    id SERIAL PRIMARY KEY,
+    tipo TEXT NOT NULL,              -- TICKET, BOLETA, FACTURA
+    serie TEXT NOT NULL,
+    numero INTEGER NOT NULL,
+    estado TEXT NOT NULL,            -- EMITIDO / ANULADO
+    fecha TIMESTAMP NOT NULL,
+    id_venta INTEGER,
+    UNIQUE (tipo, serie, numero)
+);
+
+-- Tabla de venta_evento
+CREATE TABLE IF NOT EXISTS venta_evento (
+    id SERIAL PRIMARY KEY,
+    id_venta INTEGER,
+    tipo TEXT,          -- REIMPRESION / ANULACION
+    fecha TIMESTAMP,
+    usuario TEXT,
+    observacion TEXT
+);
+
+-- Tabla de caja_movimiento
+CREATE TABLE IF NOT EXISTS caja_movimiento (
+    id SERIAL PRIMARY KEY,
+    id_caja INTEGER NOT NULL,
+    fecha TIMESTAMP NOT NULL,
+    tipo TEXT CHECK (tipo IN ('INGRESO','EGRESO')),
+    metodo_pago TEXT,
+    monto NUMERIC(14,2),
+    referencia TEXT,
+    id_venta INTEGER,
+    usuario TEXT
+);
@@ -0,0 +1,51 @@
+-- migracion: sin_transaccion
+-- Índices para las consultas calientes (ver benchmarks/verificar_planes.py).
+-- CONCURRENTLY: se construyen sin bloquear las escrituras del POS.
+
+-- Resumen de caja: ventas EMITIDAS de una caja (caja_service.obtener_resumen_caja)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_venta_caja_estado
+    ON venta (id_caja, estado);
+
+-- Consultar Ventas / reportes: rango de fechas de ventas emitidas
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_venta_emitida_fecha
+    ON venta (fecha) WHERE estado = 'EMITIDA';
+
+-- Órdenes de taller en curso (obtener_ventas_abiertas)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_venta_abierta_fecha
+    ON venta (fecha) WHERE estado = 'ABIERTA';
+
+-- Búsqueda de comprobantes por número exacto
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_venta_nro_comprobante
+    ON venta (nro_comprobante);
+
+-- Detalle de una venta (obtener_detalle_venta, ticket, anulación)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_venta_detalle_venta
+    ON venta_detalle (id_venta);
+
+-- Anulación: correlativo de una venta
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_correlativo_venta
+    ON correlativo_comprobante (id_venta);
+
+-- Movimientos manuales de caja
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_caja_movimiento_caja
+    ON caja_movimiento (id_caja, tipo);
+
+-- Caja abierta (obtener_caja_abierta)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_caja_abierta
+    ON caja (fecha_apertura DESC) WHERE estado = 'ABIERTA';
+
+-- Historial de cajas cerradas por fecha de cierre
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_caja_fecha_cierre
+    ON caja (fecha_cierre) WHERE fecha_cierre IS NOT NULL;
+
+-- Historial de precios de un producto (precios_app)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_historial_precios_producto
+    ON historial_precios (producto_id, fecha DESC);
+
+-- Sesión por token (obtener_usuario_sesion)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_usuarios_token_sesion
+    ON usuarios (token_sesion) WHERE token_sesion IS NOT NULL;
+
+-- Presentaciones de compra de un producto con un proveedor (compras_app)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_producto_proveedor_producto
+    ON producto_proveedor (id_producto, id_proveedor);
@@ -0,0 +1,78 @@
+-- migracion: sin_transaccion
+-- Motor de búsqueda de productos: columna `busqueda` (id, descripción,
+-- catálogo, marca y modelo en minúsculas) mantenida por un trigger e
+-- indexada con trigramas. Un `busqueda LIKE '%palabra%'` usa el índice GIN
+-- en vez de recorrer toda la tabla producto (palabras de 3+ caracteres).
+--
+-- Locks: ninguna sentencia reescribe producto ni frena las ventas más que
+-- un instante. Una columna GENERATED ... STORED reescribía la tabla entera
+-- con ACCESS EXCLUSIVE (ni ventas ni búsquedas mientras tanto).
+--   - ADD COLUMN sin default: solo el catálogo de la BD (ACCESS EXCLUSIVE
+--     por milisegundos, acotado por lock_timeout).
+--   - CREATE TRIGGER: SHARE ROW EXCLUSIVE por milisegundos.
+--   - Relleno por lotes de 5 000 filas, cada lote en su transacción: solo
+--     bloquea las filas del lote.
+--   - Índice con CONCURRENTLY.
+-- Cada sentencia es idempotente: la migración se puede reintentar.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- El separador evita que una palabra calce entre dos campos
+CREATE OR REPLACE FUNCTION texto_busqueda_producto(
+    p_id text, p_descripcion text, p_catalogo text, p_marca text, p_modelo text
+)
+RETURNS text
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT lower(
+        coalesce(p_id, '') || ' | ' ||
+        coalesce(p_descripcion, '') || ' | ' ||
+        coalesce(p_catalogo, '') || ' | ' ||
+        coalesce(p_marca, '') || ' | ' ||
+        coalesce(p_modelo, '')
+    )
+$$;
+
+ALTER TABLE producto ADD COLUMN IF NOT EXISTS busqueda TEXT;
+
+-- Se recalcula en cada INSERT y en cada UPDATE de los campos que la forman
+CREATE OR REPLACE FUNCTION producto_calcular_busqueda() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.busqueda := texto_busqueda_producto(NEW.id, NEW.descripcion, NEW.catalogo, NEW.marca, NEW.modelo);
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_producto_busqueda ON producto;
+
+CREATE TRIGGER trg_producto_busqueda
+    BEFORE INSERT OR UPDATE OF id, descripcion, catalogo, marca, modelo ON producto
+    FOR EACH ROW EXECUTE FUNCTION producto_calcular_busqueda();
+
+-- Productos que ya existían, por lotes en orden de id
+DO $$
+DECLARE
+    v_ultimo text := '';
+BEGIN
+    LOOP
+        WITH lote AS (
+            SELECT p.id FROM producto p
+            WHERE p.id > v_ultimo
+            ORDER BY p.id
+            LIMIT 5000
+        ),
+        rellenos AS (
+            UPDATE producto p
+            SET busqueda = texto_busqueda_producto(p.id, p.descripcion, p.catalogo, p.marca, p.modelo)
+            FROM lote
+            WHERE p.id = lote.id AND p.busqueda IS NULL
+        )
+        SELECT max(lote.id) INTO v_ultimo FROM lote;
+        EXIT WHEN v_ultimo IS NULL;
+        COMMIT;
+    END LOOP;
+END
+$$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_producto_busqueda_trgm
+    ON producto USING gin (busqueda gin_trgm_ops);
@@ -0,0 +1,22 @@
+-- migracion: sin_transaccion
+-- producto.updated_at: marca de la última modificación de cada producto,
+-- para que el índice del catálogo en memoria (services/catalogo_cache.py)
+-- pida solo las filas cambiadas desde su última sincronización.
+-- Cada sentencia es idempotente: la migración se puede reintentar.
+
+-- Default no volátil: no reescribe la tabla
+ALTER TABLE producto ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+CREATE OR REPLACE FUNCTION producto_marcar_actualizado() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN NEW.updated_at := clock_timestamp(); RETURN NEW; END
+$$;
+
+DROP TRIGGER IF EXISTS trg_producto_updated_at ON producto;
+
+CREATE TRIGGER trg_producto_updated_at
+    BEFORE INSERT OR UPDATE ON producto
+    FOR EACH ROW EXECUTE FUNCTION producto_marcar_actualizado();
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_producto_updated_at
+    ON producto (updated_at);
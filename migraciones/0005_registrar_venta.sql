@@ -0,0 +1,195 @@
+-- registrar_venta: todo el registro de una venta en una sola llamada a la BD
+-- (services/venta_service.guardar_venta es un envoltorio delgado).
+-- Ventas POS y cierre de órdenes de taller.
+
+-- Redondeo "mitad al par", igual que Decimal.quantize() en Python, para que
+-- los montos calculados aquí coincidan con los que calculaba la app.
+CREATE OR REPLACE FUNCTION redondeo_bancario(valor numeric, decimales integer DEFAULT 2)
+RETURNS numeric
+LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+    escala numeric := power(10::numeric, decimales);
+    x numeric := valor * escala;
+    t numeric := trunc(x);
+BEGIN
+    IF abs(x - t) = 0.5 THEN
+        IF abs(t % 2) = 1 THEN
+            t := t + sign(x);
+        END IF;
+        RETURN round(t / escala, decimales);
+    END IF;
+    RETURN round(x / escala, decimales);
+END
+$$;
+
+-- p_venta: {id_venta (orden de taller a cerrar, o null), fecha, id_cliente,
+--           id_usuario, usuario, id_caja, incluye_igv, tipo_comprobante,
+--           serie, numero, nro_comprobante, metodo_pago, placa_vehiculo,
+--           pago_cliente, vuelto}
+-- p_items: [{id_producto, cantidad, precio_unitario, subtotal}] (solo POS;
+--           una orden de taller ya tiene su detalle en venta_detalle)
+CREATE OR REPLACE FUNCTION registrar_venta(p_venta jsonb, p_items jsonb DEFAULT '[]'::jsonb)
+RETURNS TABLE (id_venta integer, nro_comprobante text)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_id_venta   integer := (p_venta->>'id_venta')::integer;
+    v_fecha      timestamp := COALESCE((p_venta->>'fecha')::timestamp, now() AT TIME ZONE 'America/Lima');
+    v_nro        text := p_venta->>'nro_comprobante';
+    v_referencia text := 'Venta ' || (p_venta->>'nro_comprobante');
+    v_incluye_igv boolean := COALESCE((p_venta->>'incluye_igv')::boolean, true);
+    v_efectivo   boolean := (p_venta->>'metodo_pago') = 'Efectivo';
+    v_estado     text;
+    v_valor      numeric;
+    v_op_gravada numeric;
+    v_igv        numeric;
+    v_total      numeric;
+BEGIN
+    -- Validar caja abierta
+    SELECT c.estado INTO v_estado FROM caja c WHERE c.id = (p_venta->>'id_caja')::integer;
+    IF v_estado IS DISTINCT FROM 'ABIERTA' THEN
+        RAISE EXCEPTION 'No hay caja abierta';
+    END IF;
+
+    -- Valor de venta: carrito POS o detalle ya guardado de la orden de taller
+    IF v_id_venta IS NOT NULL THEN
+        SELECT v.estado INTO v_estado FROM venta v WHERE v.id = v_id_venta FOR UPDATE;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Venta no encontrada';
+        END IF;
+        IF v_estado IN ('EMITIDA', 'CERRADA') THEN
+            RAISE EXCEPTION 'La venta ya fue cerrada previamente';
+        END IF;
+
+        SELECT COALESCE(SUM(d.sub_total), 0) INTO v_valor
+        FROM venta_detalle d
+        WHERE d.id_venta = v_id_venta;
+    ELSE
+        SELECT COALESCE(SUM((i->>'subtotal')::numeric), 0) INTO v_valor
+        FROM jsonb_array_elements(p_items) i;
+    END IF;
+
+    -- Totales (mismo cálculo que venta_service.calcular_totales)
+    IF v_incluye_igv THEN
+        v_op_gravada := redondeo_bancario(v_valor / 1.18);
+        v_igv := redondeo_bancario(v_op_gravada * 0.18);
+        v_total := redondeo_bancario(v_op_gravada + v_igv);
+    ELSE
+        v_op_gravada := v_valor;
+        v_igv := 0;
+        v_total := v_valor;
+    END IF;
+
+    -- Insertar venta / cerrar orden de taller
+    IF v_id_venta IS NOT NULL THEN
+        UPDATE venta
+        SET suma_total = v_valor,
+            op_gravada = v_op_gravada,
+            igv = v_igv,
+            total = v_total,
+            tipo_comprobante = p_venta->>'tipo_comprobante',
+            metodo_pago = p_venta->>'metodo_pago',
+            nro_comprobante = v_nro,
+            pago_cliente = CASE WHEN v_efectivo THEN (p_venta->>'pago_cliente')::numeric END,
+            vuelto = CASE WHEN v_efectivo THEN (p_venta->>'vuelto')::numeric END,
+            estado = 'EMITIDA'
+        WHERE id = v_id_venta;
+    ELSE
+        INSERT INTO venta (
+            fecha, id_cliente, id_usuario,
+            suma_total, op_gravada, igv, total,
+            tipo_comprobante, metodo_pago, nro_comprobante,
+            placa_vehiculo, pago_cliente, vuelto, id_caja, estado
+        )
+        VALUES (
+            v_fecha, p_venta->>'id_cliente', (p_venta->>'id_usuario')::integer,
+            v_valor, v_op_gravada, v_igv, v_total,
+            p_venta->>'tipo_comprobante', p_venta->>'metodo_pago', v_nro,
+            p_venta->>'placa_vehiculo',
+            CASE WHEN v_efectivo THEN (p_venta->>'pago_cliente')::numeric END,
+            CASE WHEN v_efectivo THEN (p_venta->>'vuelto')::numeric END,
+            (p_venta->>'id_caja')::integer, 'EMITIDA'
+        )
+        RETURNING id INTO v_id_venta;
+
+        INSERT INTO venta_detalle (id_venta, id_producto, cantidad, precio_unitario, sub_total, precio_final)
+        SELECT v_id_venta, l.id_producto, l.cantidad, l.precio,
+               redondeo_bancario(l.precio * l.cantidad), redondeo_bancario(l.precio * l.cantidad)
+        FROM (
+            SELECT i.orden,
+                   i.item->>'id_producto' AS id_producto,
+                   (i.item->>'cantidad')::numeric AS cantidad,
+                   CASE WHEN v_incluye_igv
+                        THEN redondeo_bancario((i.item->>'precio_unitario')::numeric / 1.18)
+                        ELSE (i.item->>'precio_unitario')::numeric
+                   END AS precio
+            FROM jsonb_array_elements(p_items) WITH ORDINALITY AS i(item, orden)
+        ) l
+        ORDER BY l.orden;
+    END IF;
+
+    -- Correlativo
+    INSERT INTO correlativo_comprobante (tipo, serie, numero, estado, fecha, id_venta)
+    VALUES (
+        upper(p_venta->>'tipo_comprobante'), p_venta->>'serie', (p_venta->>'numero')::integer,
+        'EMITIDO', v_fecha, v_id_venta
+    )
+    ON CONFLICT (tipo, serie, numero)
+    DO UPDATE SET
+        id_venta = EXCLUDED.id_venta,
+        estado = 'EMITIDO',
+        fecha = EXCLUDED.fecha;
+
+    -- Salidas de inventario y kardex, también al cerrar una orden de taller.
+    -- Los productos se bloquean en orden de id para no cruzarse con otra caja.
+    PERFORM 1
+    FROM producto p
+    WHERE p.id IN (SELECT d.id_producto FROM venta_detalle d WHERE d.id_venta = v_id_venta)
+    ORDER BY p.id
+    FOR UPDATE;
+
+    WITH lineas AS (
+        SELECT d.id, d.id_producto, d.cantidad
+        FROM venta_detalle d
+        WHERE d.id_venta = v_id_venta
+    ),
+    por_producto AS (
+        SELECT l.id_producto, SUM(l.cantidad) AS cantidad
+        FROM lineas l
+        GROUP BY l.id_producto
+    ),
+    actualizados AS (
+        UPDATE producto p
+        SET stock_actual = GREATEST(COALESCE(p.stock_actual, 0) - pp.cantidad, 0),
+            valor_inventario = round(
+                GREATEST(COALESCE(p.stock_actual, 0) - pp.cantidad, 0) * COALESCE(p.costo_promedio, 0), 2
+            )
+        FROM por_producto pp
+        WHERE p.id = pp.id_producto
+        RETURNING p.id, COALESCE(p.costo_promedio, 0) AS costo
+    )
+    INSERT INTO movimientos (
+        id_producto, tipo, cantidad, fecha, motivo, referencia, costo_unitario, valor_total
+    )
+    SELECT l.id_producto, 'salida', l.cantidad, v_fecha, 'Venta', v_referencia,
+           a.costo, redondeo_bancario(l.cantidad * a.costo)
+    FROM lineas l
+    JOIN actualizados a ON a.id = l.id_producto
+    ORDER BY l.id;
+
+    -- Ingreso en caja
+    IF v_efectivo THEN
+        INSERT INTO caja_movimiento (
+            id_caja, fecha, tipo, metodo_pago, monto, referencia, id_venta, usuario
+        )
+        VALUES (
+            (p_venta->>'id_caja')::integer, v_fecha, 'INGRESO', 'Efectivo',
+            v_total, v_referencia, v_id_venta, p_venta->>'usuario'
+        );
+    END IF;
+
+    id_venta := v_id_venta;
+    nro_comprobante := v_nro;
+    RETURN NEXT;
+END
+$$;
@@ -0,0 +1,121 @@
+-- Anulación de ventas en una sola llamada (una o varias ventas a la vez).
+-- Devuelve el stock de todas las líneas en un solo UPDATE, recalcula
+-- valor_inventario (antes quedaba desfasado) y escribe el kardex de reversión
+-- en un solo INSERT: anular una orden de taller grande cuesta lo mismo que un
+-- ticket de una línea.
+
+-- Devuelve lo repuesto por producto (para el catálogo en memoria)
+CREATE OR REPLACE FUNCTION anular_ventas(
+    p_ids integer[],
+    p_motivo text,
+    p_usuario text,
+    p_fecha timestamp
+)
+RETURNS TABLE (id_producto text, cantidad numeric)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_ids text;
+BEGIN
+    -- Bloquear las ventas en orden de id (dos anulaciones no se cruzan)
+    PERFORM 1 FROM venta v WHERE v.id = ANY(p_ids) ORDER BY v.id FOR UPDATE;
+
+    SELECT string_agg(x.id::text, ', ' ORDER BY x.id) INTO v_ids
+    FROM unnest(p_ids) AS x(id)
+    WHERE NOT EXISTS (SELECT 1 FROM venta v WHERE v.id = x.id);
+    IF v_ids IS NOT NULL THEN
+        RAISE EXCEPTION 'Venta no encontrada: %', v_ids;
+    END IF;
+
+    SELECT string_agg(v.id::text, ', ' ORDER BY v.id) INTO v_ids
+    FROM venta v WHERE v.id = ANY(p_ids) AND v.estado = 'ANULADA';
+    IF v_ids IS NOT NULL THEN
+        RAISE EXCEPTION 'La venta ya está anulada: %', v_ids;
+    END IF;
+
+    SELECT string_agg(v.id::text, ', ' ORDER BY v.id) INTO v_ids
+    FROM venta v WHERE v.id = ANY(p_ids) AND v.reimpresiones > 0;
+    IF v_ids IS NOT NULL THEN
+        RAISE EXCEPTION 'No se puede anular una venta reimpresa: %', v_ids;
+    END IF;
+
+    -- Una orden abierta aún no descontó stock: se elimina desde Taller
+    SELECT string_agg(v.id::text, ', ' ORDER BY v.id) INTO v_ids
+    FROM venta v WHERE v.id = ANY(p_ids) AND v.estado = 'ABIERTA';
+    IF v_ids IS NOT NULL THEN
+        RAISE EXCEPTION 'La orden de taller sigue abierta (elimínela desde Taller): %', v_ids;
+    END IF;
+
+    -- Bloquear los productos en orden de id (evita deadlocks con las cajas)
+    PERFORM 1
+    FROM producto p
+    WHERE p.id IN (SELECT d.id_producto FROM venta_detalle d WHERE d.id_venta = ANY(p_ids))
+    ORDER BY p.id
+    FOR UPDATE;
+
+    UPDATE venta
+    SET estado = 'ANULADA',
+        motivo_anulacion = p_motivo,
+        fecha_anulacion = p_fecha,
+        usuario_anulacion = p_usuario
+    WHERE id = ANY(p_ids);
+
+    -- Stock, valor de inventario y kardex de todas las líneas en una sentencia.
+    -- La entrada vuelve al costo promedio vigente (no lo cambia).
+    WITH lineas AS (
+        SELECT d.id, d.id_venta, d.id_producto, d.cantidad, v.nro_comprobante
+        FROM venta_detalle d
+        JOIN venta v ON v.id = d.id_venta
+        WHERE d.id_venta = ANY(p_ids)
+    ),
+    por_producto AS (
+        SELECT l.id_producto, SUM(l.cantidad) AS cantidad
+        FROM lineas l
+        GROUP BY l.id_producto
+    ),
+    actualizados AS (
+        UPDATE producto p
+        SET stock_actual = COALESCE(p.stock_actual, 0) + pp.cantidad,
+            valor_inventario = round(
+                (COALESCE(p.stock_actual, 0) + pp.cantidad) * COALESCE(p.costo_promedio, 0), 2
+            )
+        FROM por_producto pp
+        WHERE p.id = pp.id_producto
+        RETURNING p.id, COALESCE(p.costo_promedio, 0) AS costo
+    )
+    INSERT INTO movimientos (
+        id_producto, tipo, cantidad, fecha, motivo, referencia, costo_unitario, valor_total
+    )
+    SELECT l.id_producto, 'entrada', l.cantidad, p_fecha, 'Anulación de venta',
+           'Venta ' || l.nro_comprobante, a.costo, redondeo_bancario(l.cantidad * a.costo)
+    FROM lineas l
+    JOIN actualizados a ON a.id = l.id_producto
+    ORDER BY l.id_venta, l.id;
+
+    UPDATE correlativo_comprobante
+    SET estado = 'ANULADO'
+    WHERE id_venta = ANY(p_ids);
+
+    INSERT INTO venta_evento (id_venta, tipo, fecha, usuario, observacion)
+    SELECT v.id, 'ANULACION', p_fecha, p_usuario, p_motivo
+    FROM venta v
+    WHERE v.id = ANY(p_ids)
+    ORDER BY v.id;
+
+    -- Caja: EGRESO de las ventas en efectivo
+    INSERT INTO caja_movimiento (
+        id_caja, fecha, tipo, metodo_pago, monto, referencia, id_venta, usuario
+    )
+    SELECT v.id_caja, p_fecha, 'EGRESO', 'Efectivo', v.total,
+           'Anulación ' || v.nro_comprobante, v.id, p_usuario
+    FROM venta v
+    WHERE v.id = ANY(p_ids) AND v.metodo_pago = 'Efectivo'
+    ORDER BY v.id;
+
+    RETURN QUERY
+    SELECT d.id_producto, SUM(d.cantidad)
+    FROM venta_detalle d
+    WHERE d.id_venta = ANY(p_ids)
+    GROUP BY d.id_producto;
+END
+$$;
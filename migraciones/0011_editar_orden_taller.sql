@@ -0,0 +1,155 @@
+-- Edición de una orden de taller por lotes: altas, bajas y cambios de
+-- cantidad en una sola llamada y una sola transacción, en el orden en que se
+-- hicieron en la pantalla. Agregar un producto que ya está en la orden con el
+-- mismo precio suma a su línea (igual que el carrito POS). Devuelve el detalle
+-- completo de la orden con el total y la versión nuevos.
+
+-- p_cambios: [{accion: agregar|quitar|cantidad, id_producto, cantidad, precio_unitario}]
+--   agregar:  suma `cantidad` a la línea del producto con ese precio (o la crea)
+--   quitar:   elimina todas las líneas del producto
+--   cantidad: deja una sola línea del producto con `cantidad` (0 = quitar)
+CREATE OR REPLACE FUNCTION editar_orden_taller(p_id_venta integer, p_cambios jsonb)
+RETURNS TABLE (
+    id_detalle integer,
+    id_producto text,
+    descripcion text,
+    cantidad numeric,
+    precio_unitario numeric,
+    sub_total numeric,
+    suma_total numeric,
+    version_detalle integer
+)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_estado text;
+    c record;
+    v_id integer;
+    v_delta numeric;
+    v_lineas integer;
+    v_total numeric := 0;
+    v_nro_lineas integer := 0;
+BEGIN
+    -- Bloquea la orden: los lotes de dos cajas y el cierre no se cruzan
+    SELECT v.estado INTO v_estado FROM venta v WHERE v.id = p_id_venta FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Venta no encontrada';
+    END IF;
+    IF v_estado <> 'ABIERTA' THEN
+        RAISE EXCEPTION 'La orden ya no está abierta';
+    END IF;
+
+    FOR c IN
+        SELECT x.accion, x.id_producto, x.cantidad, x.precio_unitario
+        FROM ROWS FROM (
+            jsonb_to_recordset(p_cambios)
+                AS (accion text, id_producto text, cantidad numeric, precio_unitario numeric)
+        ) WITH ORDINALITY AS x(accion, id_producto, cantidad, precio_unitario, n)
+        ORDER BY x.n
+    LOOP
+        IF c.accion = 'cantidad' AND COALESCE(c.cantidad, 0) <= 0 THEN
+            c.accion := 'quitar';
+        END IF;
+        -- Como se guarda en venta_detalle: así se encuentra la línea a sumar
+        c.precio_unitario := round(c.precio_unitario, 2);
+
+        IF c.accion = 'agregar' THEN
+            IF COALESCE(c.cantidad, 0) <= 0 OR c.precio_unitario IS NULL THEN
+                RAISE EXCEPTION 'Cantidad o precio inválido para %', c.id_producto;
+            END IF;
+
+            WITH linea AS (
+                SELECT d.id, d.sub_total
+                FROM venta_detalle d
+                WHERE d.id_venta = p_id_venta
+                  AND d.id_producto = c.id_producto
+                  AND d.precio_unitario = c.precio_unitario
+                ORDER BY d.id
+                LIMIT 1
+            )
+            UPDATE venta_detalle d
+            SET cantidad = d.cantidad + c.cantidad,
+                sub_total = (d.cantidad + c.cantidad) * d.precio_unitario,
+                precio_final = (d.cantidad + c.cantidad) * d.precio_unitario
+            FROM linea l
+            WHERE d.id = l.id
+            RETURNING d.sub_total - l.sub_total INTO v_delta;
+
+            IF NOT FOUND THEN
+                INSERT INTO venta_detalle
+                    (id_venta, id_producto, cantidad, precio_unitario, sub_total, precio_final)
+                VALUES (
+                    p_id_venta, c.id_producto, c.cantidad, c.precio_unitario,
+                    c.cantidad * c.precio_unitario, c.cantidad * c.precio_unitario
+                )
+                RETURNING sub_total INTO v_delta;
+                v_nro_lineas := v_nro_lineas + 1;
+            END IF;
+            v_total := v_total + v_delta;
+
+        ELSIF c.accion = 'quitar' THEN
+            WITH borradas AS (
+                DELETE FROM venta_detalle d
+                WHERE d.id_venta = p_id_venta AND d.id_producto = c.id_producto
+                RETURNING d.sub_total
+            )
+            SELECT COALESCE(SUM(b.sub_total), 0), COUNT(*) INTO v_delta, v_lineas
+            FROM borradas b;
+            v_total := v_total - v_delta;
+            v_nro_lineas := v_nro_lineas - v_lineas;
+
+        ELSIF c.accion = 'cantidad' THEN
+            SELECT d.id INTO v_id
+            FROM venta_detalle d
+            WHERE d.id_venta = p_id_venta AND d.id_producto = c.id_producto
+            ORDER BY d.id
+            LIMIT 1;
+            IF v_id IS NULL THEN
+                RAISE EXCEPTION 'El producto % no está en la orden', c.id_producto;
+            END IF;
+
+            -- Las demás líneas del producto se juntan en la primera
+            WITH borradas AS (
+                DELETE FROM venta_detalle d
+                WHERE d.id_venta = p_id_venta AND d.id_producto = c.id_producto AND d.id <> v_id
+                RETURNING d.sub_total
+            )
+            SELECT COALESCE(SUM(b.sub_total), 0), COUNT(*) INTO v_delta, v_lineas
+            FROM borradas b;
+            v_total := v_total - v_delta;
+            v_nro_lineas := v_nro_lineas - v_lineas;
+
+            WITH linea AS (
+                SELECT d.id, d.sub_total FROM venta_detalle d WHERE d.id = v_id
+            )
+            UPDATE venta_detalle d
+            SET cantidad = c.cantidad,
+                sub_total = c.cantidad * d.precio_unitario,
+                precio_final = c.cantidad * d.precio_unitario
+            FROM linea l
+            WHERE d.id = l.id
+            RETURNING d.sub_total - l.sub_total INTO v_delta;
+            v_total := v_total + v_delta;
+
+        ELSE
+            RAISE EXCEPTION 'Acción no válida: %', c.accion;
+        END IF;
+    END LOOP;
+
+    UPDATE venta v
+    SET suma_total = v.suma_total + v_total,
+        nro_lineas = v.nro_lineas + v_nro_lineas,
+        version_detalle = v.version_detalle + 1
+    WHERE v.id = p_id_venta;
+
+    RETURN QUERY
+    SELECT d.id, d.id_producto::text, p.descripcion::text, d.cantidad::numeric,
+           d.precio_unitario::numeric, d.sub_total::numeric, v.suma_total::numeric,
+           v.version_detalle
+    FROM venta v
+    LEFT JOIN venta_detalle d ON d.id_venta = v.id
+    LEFT JOIN producto p ON p.id = d.id_producto
+    WHERE v.id = p_id_venta
+    ORDER BY d.id;
+END
+$$;
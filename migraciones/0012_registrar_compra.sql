@@ -0,0 +1,158 @@
+-- registrar_compra: todo el registro de una compra en una sola llamada a la BD
+-- (services/compra_service.registrar_compra es un envoltorio delgado).
+-- Antes cada línea costaba ~7 sentencias (detalle, costo promedio, leer
+-- configuración y producto, precios, historial, kardex): una factura de 60
+-- líneas eran ~400 viajes. Aquí cada paso es una sola sentencia para todas
+-- las líneas, y todo se confirma junto o nada.
+
+-- p_compra: {fecha, id_proveedor, nro_doc, tipo_doc, suma_total, descuento,
+--            op_gravada, op_gratuita, igv, total, metodo_pago, motivo,
+--            fecha_historial}
+-- p_items:  [{id_producto, cantidad_compra, unidad_compra, factor,
+--             cantidad_final, precio_unitario, subtotal, costo_unitario}]
+--   costo_unitario: costo de entrada por unidad base (ya con IGV si corresponde)
+CREATE OR REPLACE FUNCTION registrar_compra(p_compra jsonb, p_items jsonb)
+RETURNS integer
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_id_compra integer;
+    v_fecha     timestamp := (p_compra->>'fecha')::timestamp;
+    v_faltantes text;
+BEGIN
+    -- Bloquear los productos en orden de id (evita deadlocks con las cajas)
+    PERFORM 1
+    FROM producto p
+    WHERE p.id IN (SELECT i->>'id_producto' FROM jsonb_array_elements(p_items) i)
+    ORDER BY p.id
+    FOR UPDATE;
+
+    SELECT string_agg(DISTINCT i->>'id_producto', ', ') INTO v_faltantes
+    FROM jsonb_array_elements(p_items) i
+    WHERE NOT EXISTS (SELECT 1 FROM producto p WHERE p.id = i->>'id_producto');
+    IF v_faltantes IS NOT NULL THEN
+        RAISE EXCEPTION 'Producto no encontrado: %', v_faltantes;
+    END IF;
+
+    -- Mismo control que recalcular_precios_producto
+    IF EXISTS (
+        SELECT 1
+        FROM producto p
+        LEFT JOIN configuracion c ON c.id = 1
+        WHERE p.id IN (SELECT i->>'id_producto' FROM jsonb_array_elements(p_items) i)
+          AND COALESCE(NULLIF(p.margen_utilidad, 0), c.margen_utilidad) >= 1
+    ) THEN
+        RAISE EXCEPTION 'El margen debe ser decimal (ej 0.20 para 20%%)';
+    END IF;
+
+    INSERT INTO compras (
+        fecha, id_proveedor, nro_doc, tipo_doc,
+        suma_total, descuento, op_gravada, op_gratuita,
+        igv, total, metodo_pago
+    )
+    VALUES (
+        v_fecha, p_compra->>'id_proveedor', p_compra->>'nro_doc', p_compra->>'tipo_doc',
+        (p_compra->>'suma_total')::numeric, (p_compra->>'descuento')::numeric,
+        (p_compra->>'op_gravada')::numeric, (p_compra->>'op_gratuita')::numeric,
+        (p_compra->>'igv')::numeric, (p_compra->>'total')::numeric, p_compra->>'metodo_pago'
+    )
+    RETURNING id INTO v_id_compra;
+
+    INSERT INTO compras_detalle (
+        id_compra, id_producto, cantidad_compra, unidad_compra,
+        factor_conversion, cantidad_final, precio_unitario, subtotal
+    )
+    SELECT v_id_compra, l.id_producto, l.cantidad_compra, l.unidad_compra,
+           l.factor, l.cantidad_final, l.precio_unitario, l.subtotal
+    FROM ROWS FROM (
+        jsonb_to_recordset(p_items) AS (
+            id_producto text, cantidad_compra numeric, unidad_compra text, factor numeric,
+            cantidad_final numeric, precio_unitario numeric, subtotal numeric
+        )
+    ) WITH ORDINALITY AS l(
+        id_producto, cantidad_compra, unidad_compra, factor,
+        cantidad_final, precio_unitario, subtotal, orden
+    )
+    ORDER BY l.orden;
+
+    -- Stock, costo promedio ponderado, precios e historial de todos los
+    -- productos en una sentencia. Varias líneas del mismo producto entran
+    -- juntas: el promedio es el mismo que aplicándolas una tras otra (sin el
+    -- redondeo intermedio) y queda una fila de historial por producto.
+    WITH lineas AS (
+        SELECT l.id_producto, l.cantidad_final AS cantidad, l.costo_unitario AS costo, l.orden
+        FROM ROWS FROM (
+            jsonb_to_recordset(p_items) AS (id_producto text, cantidad_final numeric, costo_unitario numeric)
+        ) WITH ORDINALITY AS l(id_producto, cantidad_final, costo_unitario, orden)
+    ),
+    por_producto AS (
+        SELECT l.id_producto,
+               SUM(l.cantidad) AS cantidad,
+               SUM(l.cantidad * l.costo) AS valor,
+               (array_agg(l.costo ORDER BY l.orden DESC))[1] AS costo_ultimo
+        FROM lineas l
+        GROUP BY l.id_producto
+    ),
+    costos AS (
+        -- Con stock en cero o negativo el costo promedio pasa a ser el de la entrada
+        SELECT p.id,
+               p.precio_venta AS precio_anterior,
+               COALESCE(p.stock_actual, 0) + pp.cantidad AS stock,
+               CASE
+                   WHEN COALESCE(p.costo_promedio, 0) = 0 OR COALESCE(p.stock_actual, 0) <= 0
+                       THEN pp.valor / pp.cantidad
+                   ELSE (p.stock_actual * p.costo_promedio + pp.valor) / (p.stock_actual + pp.cantidad)
+               END AS costo,
+               pp.costo_ultimo,
+               COALESCE(NULLIF(p.margen_utilidad, 0), c.margen_utilidad) AS margen,
+               c.igv
+        FROM por_producto pp
+        JOIN producto p ON p.id = pp.id_producto
+        LEFT JOIN configuracion c ON c.id = 1
+    ),
+    nuevos AS (
+        -- Precios: mismo cálculo que recalcular_precios_producto (sobre el
+        -- costo promedio ya redondeado, como quedaba guardado)
+        SELECT k.*,
+               round(k.costo, 4) / (1 - k.margen) AS valor_venta
+        FROM costos k
+    ),
+    actualizados AS (
+        UPDATE producto p
+        SET stock_actual = n.stock,
+            costo_promedio = round(n.costo, 4),
+            costo_ultima_compra = round(n.costo_ultimo, 4),
+            valor_inventario = round(n.stock * n.costo, 2),
+            valor_venta = CASE WHEN n.igv IS NULL THEN p.valor_venta
+                               ELSE redondeo_bancario(n.valor_venta) END,
+            precio_venta = CASE WHEN n.igv IS NULL THEN p.precio_venta
+                                ELSE redondeo_bancario(n.valor_venta * (1 + n.igv) * 2, 0) / 2 END
+        FROM nuevos n
+        WHERE p.id = n.id
+        RETURNING p.id, p.precio_venta, p.costo_promedio
+    )
+    INSERT INTO historial_precios (
+        producto_id, precio_anterior, precio_nuevo, margen_usado, costo_promedio, fecha
+    )
+    SELECT a.id, n.precio_anterior, a.precio_venta, n.margen, a.costo_promedio,
+           (p_compra->>'fecha_historial')::timestamp
+    FROM actualizados a
+    JOIN nuevos n ON n.id = a.id
+    WHERE n.igv IS NOT NULL
+    ORDER BY a.id;
+
+    -- Kardex: una entrada por línea, al costo de entrada
+    INSERT INTO movimientos (
+        id_producto, tipo, cantidad, fecha, motivo, referencia, costo_unitario, valor_total
+    )
+    SELECT l.id_producto, 'entrada', l.cantidad_final, v_fecha,
+           p_compra->>'motivo', p_compra->>'nro_doc',
+           l.costo_unitario, l.cantidad_final * l.costo_unitario
+    FROM ROWS FROM (
+        jsonb_to_recordset(p_items) AS (id_producto text, cantidad_final numeric, costo_unitario numeric)
+    ) WITH ORDINALITY AS l(id_producto, cantidad_final, costo_unitario, orden)
+    ORDER BY l.orden;
+
+    RETURN v_id_compra;
+END
+$$;
@@ -0,0 +1,18 @@
+-- migracion: sin_transaccion
+-- Importación de facturas de proveedor (services/importacion_compras.py):
+-- cada línea del archivo se empareja con un producto por el código del
+-- proveedor, el código de barras, el id o el número de catálogo.
+-- Cada sentencia es idempotente: la migración se puede reintentar.
+
+-- Código con que el proveedor identifica el producto en sus facturas
+ALTER TABLE producto_proveedor ADD COLUMN IF NOT EXISTS codigo_proveedor TEXT;
+
+-- Emparejar por código del proveedor
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_producto_proveedor_codigo
+    ON producto_proveedor (id_proveedor, codigo_proveedor)
+    WHERE codigo_proveedor IS NOT NULL;
+
+-- Emparejar por número de catálogo (del fabricante)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_producto_catalogo
+    ON producto (catalogo)
+    WHERE catalogo IS NOT NULL;
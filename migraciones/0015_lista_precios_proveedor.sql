@@ -0,0 +1,7 @@
+-- migracion: sin_transaccion
+-- Listas de precios de proveedor (services/lista_precios.py): cargar todas
+-- las presentaciones de un proveedor y actualizarlas por (producto, unidad).
+-- Cada sentencia es idempotente: la migración se puede reintentar.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_producto_proveedor_proveedor
+    ON producto_proveedor (id_proveedor, id_producto, unidad_compra);
@@ -0,0 +1,95 @@
+-- recalcular_precios: precios de venta de todo el catálogo (o de una
+-- categoría / marca) en una sola sentencia y una transacción
+-- (db.recalcular_todos_los_precios es un envoltorio delgado).
+-- Antes se llamaba a recalcular_precios_producto por cada producto: tres
+-- viajes por producto y ninguna fila de historial.
+--
+-- Mismo cálculo que recalcular_precios_producto: margen del producto o el
+-- global, valor_venta = costo_promedio / (1 - margen) redondeado a 2
+-- decimales, precio_venta = valor_venta * (1 + igv) al múltiplo de 0.50
+-- (redondear_050: mitad al par, como round() de Python).
+-- Los productos sin costo promedio no se tocan. Solo se escriben los que
+-- cambian, y el historial solo registra los que cambian de precio.
+CREATE OR REPLACE FUNCTION recalcular_precios(
+    p_categoria text DEFAULT NULL,
+    p_marca     text DEFAULT NULL,
+    p_fecha     timestamp DEFAULT NULL
+)
+RETURNS TABLE (revisados integer, actualizados integer, cambios_precio integer)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_igv       numeric;
+    v_margen    numeric;
+    v_revisados integer;
+    v_invalido  boolean;
+BEGIN
+    SELECT c.igv, c.margen_utilidad INTO v_igv, v_margen
+    FROM configuracion c
+    WHERE c.id = 1;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 0, 0, 0;
+        RETURN;
+    END IF;
+
+    -- Bloquear los productos del alcance en orden de id (evita deadlocks con las cajas)
+    SELECT count(*), COALESCE(bool_or(s.margen >= 1), false) INTO v_revisados, v_invalido
+    FROM (
+        SELECT COALESCE(NULLIF(p.margen_utilidad, 0), v_margen) AS margen
+        FROM producto p
+        LEFT JOIN categoria c ON c.id = p.id_categoria
+        WHERE p.activo = 1
+          AND p.costo_promedio IS NOT NULL
+          AND (p_categoria IS NULL OR c.nombre = p_categoria)
+          AND (p_marca IS NULL OR p.marca = p_marca)
+        ORDER BY p.id
+        FOR UPDATE OF p
+    ) s;
+
+    IF v_invalido THEN
+        RAISE EXCEPTION 'El margen debe ser decimal (ej 0.20 para 20%%)';
+    END IF;
+
+    RETURN QUERY
+    WITH alcance AS (
+        SELECT p.id, p.precio_venta AS precio_anterior, p.valor_venta AS valor_anterior,
+               p.costo_promedio AS costo,
+               COALESCE(NULLIF(p.margen_utilidad, 0), v_margen) AS margen
+        FROM producto p
+        LEFT JOIN categoria c ON c.id = p.id_categoria
+        WHERE p.activo = 1
+          AND p.costo_promedio IS NOT NULL
+          AND (p_categoria IS NULL OR c.nombre = p_categoria)
+          AND (p_marca IS NULL OR p.marca = p_marca)
+    ),
+    nuevos AS (
+        SELECT a.*,
+               redondeo_bancario(a.costo / (1 - a.margen)) AS valor_venta,
+               redondeo_bancario(a.costo / (1 - a.margen) * (1 + v_igv) * 2, 0) / 2 AS precio_venta
+        FROM alcance a
+    ),
+    escritos AS (
+        UPDATE producto p
+        SET valor_venta = n.valor_venta,
+            precio_venta = n.precio_venta
+        FROM nuevos n
+        WHERE p.id = n.id
+          AND (n.valor_anterior, n.precio_anterior) IS DISTINCT FROM (n.valor_venta, n.precio_venta)
+        RETURNING p.id
+    ),
+    historial AS (
+        INSERT INTO historial_precios (
+            producto_id, precio_anterior, precio_nuevo, margen_usado, costo_promedio, fecha
+        )
+        SELECT n.id, n.precio_anterior, n.precio_venta, n.margen, n.costo,
+               COALESCE(p_fecha, localtimestamp(0))
+        FROM nuevos n
+        WHERE n.precio_anterior IS DISTINCT FROM n.precio_venta
+        ORDER BY n.id
+        RETURNING 1
+    )
+    SELECT v_revisados,
+           (SELECT count(*)::integer FROM escritos),
+           (SELECT count(*)::integer FROM historial);
+END
+$$;
@@ -0,0 +1,80 @@
+-- aplicar_precios: guarda de una vez los precios que propuso el simulador
+-- de precios (services/simulador_precios.py), para miles de productos en
+-- una sentencia y una transacción.
+--
+-- Arreglos paralelos, una posición por producto:
+--   p_ids           productos
+--   p_costos        costo_promedio con que se simuló: si cambió desde
+--                   entonces (una compra), el producto se omite
+--   p_margenes      margen a guardar en el producto (NULL: no se cambia)
+--   p_margenes_uso  margen con que se calculó el precio (historial)
+--   p_valores       valor_venta (sin IGV)
+--   p_precios       precio_venta
+-- El historial solo registra los productos que cambian de precio.
+CREATE OR REPLACE FUNCTION aplicar_precios(
+    p_ids          text[],
+    p_costos       numeric[],
+    p_margenes     numeric[],
+    p_margenes_uso numeric[],
+    p_valores      numeric[],
+    p_precios      numeric[],
+    p_fecha        timestamp DEFAULT NULL
+)
+RETURNS TABLE (actualizados integer, cambios_precio integer, omitidos integer)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_vigentes integer;
+BEGIN
+    -- Bloquear en orden de id (evita deadlocks con las cajas); solo los que
+    -- siguen activos y con el mismo costo que en la simulación
+    SELECT count(*) INTO v_vigentes
+    FROM (
+        SELECT p.id
+        FROM producto p
+        JOIN unnest(p_ids, p_costos) AS s(id, costo) ON s.id = p.id
+        WHERE p.activo = 1
+          AND p.costo_promedio = s.costo
+        ORDER BY p.id
+        FOR UPDATE OF p
+    ) b;
+
+    RETURN QUERY
+    WITH propuestos AS (
+        SELECT s.id, s.costo, s.margen, s.margen_uso, s.valor, s.precio,
+               p.precio_venta AS precio_anterior,
+               p.valor_venta AS valor_anterior,
+               p.margen_utilidad AS margen_anterior
+        FROM unnest(p_ids, p_costos, p_margenes, p_margenes_uso, p_valores, p_precios)
+             AS s(id, costo, margen, margen_uso, valor, precio)
+        JOIN producto p ON p.id = s.id
+        WHERE p.activo = 1
+          AND p.costo_promedio = s.costo
+    ),
+    escritos AS (
+        UPDATE producto p
+        SET valor_venta = n.valor,
+            precio_venta = n.precio,
+            margen_utilidad = COALESCE(n.margen, p.margen_utilidad)
+        FROM propuestos n
+        WHERE p.id = n.id
+          AND (n.valor_anterior, n.precio_anterior, n.margen_anterior)
+              IS DISTINCT FROM (n.valor, n.precio, COALESCE(n.margen, n.margen_anterior))
+        RETURNING p.id
+    ),
+    historial AS (
+        INSERT INTO historial_precios (
+            producto_id, precio_anterior, precio_nuevo, margen_usado, costo_promedio, fecha
+        )
+        SELECT n.id, n.precio_anterior, n.precio, n.margen_uso, n.costo,
+               COALESCE(p_fecha, localtimestamp(0))
+        FROM propuestos n
+        WHERE n.precio_anterior IS DISTINCT FROM n.precio
+        ORDER BY n.id
+        RETURNING 1
+    )
+    SELECT (SELECT count(*)::integer FROM escritos),
+           (SELECT count(*)::integer FROM historial),
+           cardinality(p_ids) - v_vigentes;
+END
+$$;
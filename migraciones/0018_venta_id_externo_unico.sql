@@ -0,0 +1,11 @@
+-- migracion: sin_transaccion
+-- Índice único de venta.id_externo (cola de ventas, migración 0008).
+-- CONCURRENTLY: se construye sin bloquear las ventas del POS; dentro de la
+-- transacción de 0008 tomaba ACCESS EXCLUSIVE sobre venta todo el tiempo.
+-- Lleva el nombre del constraint UNIQUE que creaba antes 0008: en las BD
+-- que ya lo tienen, IF NOT EXISTS no hace nada. Si la construcción falla
+-- queda un índice INVALID con ese nombre: al reintentar, el runner lo borra
+-- y lo vuelve a construir (migraciones/__init__.py).
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS venta_id_externo_key
+    ON venta (id_externo);
@@ -0,0 +1,306 @@
+# migraciones/__init__.py
+"""
+Migraciones versionadas del esquema.
+
+Cada archivo NNNN_nombre.sql de esta carpeta es una migración. Se aplican en
+orden y cada una queda registrada en la tabla schema_version.
+
+- Por defecto una migración corre dentro de una transacción.
+- Si la primera línea es `-- migracion: sin_transaccion`, cada sentencia
+  (separadas por `;` al final de línea, fuera de los cuerpos $$ ... $$) se
+  ejecuta por separado en autocommit. Es lo necesario para CREATE INDEX
+  CONCURRENTLY y para rellenar por lotes (un DO con COMMIT por lote).
+- Un CREATE INDEX CONCURRENTLY que falla (p. ej. por lock_timeout) deja el
+  índice INVALID. Al reintentar, el runner lo borra antes de construirlo de
+  nuevo, y no registra la migración si alguno de sus índices quedó INVALID.
+- Toda migración corre con lock_timeout (DB_MIGRACION_LOCK_TIMEOUT): si el
+  DDL no consigue su lock a tiempo falla en vez de quedar en cola
+  bloqueando a las cajas. Para constraints nuevos usar
+  ADD CONSTRAINT ... NOT VALID y luego VALIDATE CONSTRAINT.
+- Se guarda el checksum de cada migración aplicada: si el archivo cambió
+  después, no se aplica nada más hasta revisarlo y registrarlo con
+  `python -m migraciones aceptar <versión>`.
+- Un advisory lock evita que dos procesos migren a la vez. Al arrancar la
+  app (asegurar_esquema) se espera como mucho DB_MIGRACION_ESPERA segundos y
+  luego se lanza MigracionEnCursoError, en vez de colgar la página.
+"""
+import hashlib
+import logging
+import os
+import re
+import time
+
+import psycopg2
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+PATRON_ARCHIVO = re.compile(r"^(\d{4})_(\w+)\.sql$")
+DIRECTIVA_SIN_TRANSACCION = "-- migracion: sin_transaccion"
+PATRON_INDICE_CONCURRENTE = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)",
+    re.IGNORECASE
+)
+
+LOCK_TIMEOUT = os.getenv("DB_MIGRACION_LOCK_TIMEOUT", "5s")
+
+# Segundos que el arranque de la app espera a que otro proceso termine de migrar
+ESPERA_ARRANQUE = float(os.getenv("DB_MIGRACION_ESPERA", "10"))
+
+# Clave del advisory lock que serializa migraciones entre procesos
+CLAVE_LOCK = 7_351_001
+
+logger = logging.getLogger(__name__)
+
+
+class MigracionEnCursoError(Exception):
+    """Otro proceso está aplicando migraciones y no terminó a tiempo."""
+
+
+class Migracion:
+    def __init__(self, version, nombre, ruta):
+        self.version = version
+        self.nombre = nombre
+        self.ruta = ruta
+
+        with open(ruta, encoding="utf-8") as f:
+            self.sql = f.read()
+
+        self.transaccional = not self.sql.lstrip().startswith(DIRECTIVA_SIN_TRANSACCION)
+        self.checksum = hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+    def sentencias(self):
+        """
+        Sentencias individuales (solo migraciones sin transacción). Un `;` al
+        final de línea dentro de un cuerpo $$ ... $$ no corta la sentencia.
+        """
+        sentencias = []
+        lineas = []
+        en_cuerpo = False
+        for linea in self.sql.splitlines():
+            if not linea.strip() or linea.strip().startswith("--"):
+                continue
+            if linea.count("$$") % 2:
+                en_cuerpo = not en_cuerpo
+            if not en_cuerpo and re.search(r";\s*$", linea):
+                lineas.append(re.sub(r";\s*$", "", linea))
+                sentencias.append("\n".join(l for l in lineas if l.strip()))
+                lineas = []
+            else:
+                lineas.append(linea)
+        if any(l.strip() for l in lineas):
+            sentencias.append("\n".join(lineas))
+        return sentencias
+
+
+def indice_concurrente(sentencia):
+    """Nombre del índice de un CREATE INDEX CONCURRENTLY, o None."""
+    m = PATRON_INDICE_CONCURRENTE.match(sentencia.strip())
+    return m.group(1) if m else None
+
+
+def indice_invalido(cursor, nombre):
+    """True si el índice existe y quedó INVALID (una construcción que falló)."""
+    cursor.execute("""
+        SELECT NOT i.indisvalid
+        FROM pg_index i
+        WHERE i.indexrelid = to_regclass(%s)
+    """, (nombre,))
+    fila = cursor.fetchone()
+    return bool(fila and fila[0])
+
+
+def listar_migraciones():
+    migraciones = []
+    for archivo in sorted(os.listdir(DIRECTORIO)):
+        m = PATRON_ARCHIVO.match(archivo)
+        if m:
+            migraciones.append(
+                Migracion(int(m.group(1)), m.group(2), os.path.join(DIRECTORIO, archivo))
+            )
+
+    versiones = [m.version for m in migraciones]
+    if len(versiones) != len(set(versiones)):
+        raise RuntimeError("Hay dos migraciones con el mismo número de versión")
+    return migraciones
+
+
+def version_objetivo():
+    migraciones = listar_migraciones()
+    return migraciones[-1].version if migraciones else 0
+
+
+def version_actual(conn):
+    """Versión aplicada en la BD (0 si schema_version aún no existe). Una sola consulta."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        return cursor.fetchone()[0]
+    except psycopg2.errors.UndefinedTable:
+        if not conn.autocommit:
+            conn.rollback()
+        return 0
+    finally:
+        cursor.close()
+
+
+def migraciones_aplicadas(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT version, nombre, checksum, aplicada_en, duracion_ms
+        FROM schema_version
+        ORDER BY version
+    """)
+    filas = cursor.fetchall()
+    cursor.close()
+    return filas
+
+
+def modificadas(conn, migraciones):
+    """Migraciones aplicadas cuyo archivo ya no tiene el checksum registrado."""
+    registradas = {version: checksum for version, _, checksum, _, _ in migraciones_aplicadas(conn)}
+    return [
+        m for m in migraciones
+        if m.version in registradas and registradas[m.version] != m.checksum
+    ]
+
+
+def aceptar_checksum(conn, version):
+    """Registra el checksum actual del archivo de una migración ya aplicada."""
+    migracion = next((m for m in listar_migraciones() if m.version == version), None)
+    if migracion is None:
+        raise ValueError(f"No existe la migración {version:04d}")
+
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE schema_version SET checksum = %s WHERE version = %s",
+        (migracion.checksum, version)
+    )
+    actualizada = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    if not actualizada:
+        raise ValueError(f"La migración {version:04d} no está aplicada")
+
+
+def _tomar_lock(cursor, espera):
+    """Advisory lock de migraciones; espera=None bloquea hasta obtenerlo."""
+    if espera is None:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (CLAVE_LOCK,))
+        return
+
+    limite = time.monotonic() + espera
+    while True:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (CLAVE_LOCK,))
+        if cursor.fetchone()[0]:
+            return
+        if time.monotonic() >= limite:
+            raise MigracionEnCursoError(
+                "Otro proceso está migrando la base de datos; reintenta en unos minutos"
+            )
+        time.sleep(0.5)
+
+
+def aplicar_migraciones(conn, hasta=None, log=logger.info, espera=None):
+    """
+    Aplica las migraciones pendientes en orden. Devuelve las versiones aplicadas.
+    Usa un advisory lock para que dos procesos no migren a la vez: con
+    `espera` (segundos) lanza MigracionEnCursoError si no lo obtiene a tiempo.
+    Lanza RuntimeError si una migración aplicada cambió después.
+    """
+    conn.autocommit = True
+    cursor = conn.cursor()
+    _tomar_lock(cursor, espera)
+
+    aplicadas = []
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                nombre TEXT NOT NULL,
+                checksum TEXT NOT NULL,
+                aplicada_en TIMESTAMP NOT NULL DEFAULT now(),
+                duracion_ms INTEGER
+            )
+        """)
+        actual = version_actual(conn)
+        migraciones = listar_migraciones()
+
+        cambiadas = modificadas(conn, migraciones)
+        if cambiadas:
+            nombres = ", ".join(f"{m.version:04d}_{m.nombre}" for m in cambiadas)
+            raise RuntimeError(
+                f"Migraciones modificadas después de aplicarse: {nombres}. Revisa el cambio "
+                "y regístralo con `python -m migraciones aceptar <versión>`"
+            )
+
+        for m in migraciones:
+            if m.version <= actual or (hasta is not None and m.version > hasta):
+                continue
+
+            log(f"→ {m.version:04d}_{m.nombre}")
+            inicio = time.perf_counter()
+
+            if m.transaccional:
+                conn.autocommit = False
+                try:
+                    cursor.execute("SET LOCAL lock_timeout = %s", (LOCK_TIMEOUT,))
+                    cursor.execute(m.sql)
+                    _registrar(cursor, m, inicio)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.autocommit = True
+            else:
+                cursor.execute("SET lock_timeout = %s", (LOCK_TIMEOUT,))
+                try:
+                    indices = []
+                    for sentencia in m.sentencias():
+                        indice = indice_concurrente(sentencia)
+                        if indice:
+                            indices.append(indice)
+                            # IF NOT EXISTS saltaría el índice INVALID de un intento fallido
+                            if indice_invalido(cursor, indice):
+                                log(f"  {indice} quedó INVALID en un intento anterior: se reconstruye")
+                                cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {indice}")
+                        cursor.execute(sentencia)
+
+                    invalidos = [i for i in indices if indice_invalido(cursor, i)]
+                    if invalidos:
+                        raise RuntimeError(
+                            f"Migración {m.version:04d}: índices INVALID ({', '.join(invalidos)}); "
+                            "vuelve a aplicarla para reconstruirlos"
+                        )
+                    _registrar(cursor, m, inicio)
+                finally:
+                    cursor.execute("RESET lock_timeout")
+
+            aplicadas.append(m.version)
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (CLAVE_LOCK,))
+        cursor.close()
+
+    return aplicadas
+
+
+def _registrar(cursor, migracion, inicio):
+    cursor.execute("""
+        INSERT INTO schema_version (version, nombre, checksum, duracion_ms)
+        VALUES (%s, %s, %s, %s)
+    """, (
+        migracion.version,
+        migracion.nombre,
+        migracion.checksum,
+        int((time.perf_counter() - inicio) * 1000)
+    ))
+
+
+def asegurar_esquema(conn, log=logger.info, espera=ESPERA_ARRANQUE):
+    """
+    Chequeo de arranque: una consulta de versión; solo si la BD está atrasada
+    se aplican las migraciones pendientes. Si otro proceso está migrando se
+    espera como mucho `espera` segundos (MigracionEnCursoError).
+    """
+    if version_actual(conn) >= version_objetivo():
+        return []
+    return aplicar_migraciones(conn, log=log, espera=espera)
@@ -0,0 +1,101 @@
+# migraciones/__main__.py
+"""
+Uso:
+    python -m migraciones estado
+    python -m migraciones aplicar [--hasta N]
+    python -m migraciones aceptar <versión>
+    python -m migraciones nueva <nombre>
+"""
+import argparse
+import os
+import sys
+
+from migraciones import (
+    DIRECTORIO, aceptar_checksum, aplicar_migraciones, listar_migraciones,
+    migraciones_aplicadas, version_actual
+)
+
+
+def _conexion():
+    from db import crear_conexion
+    return crear_conexion()
+
+
+def cmd_estado(args):
+    conn = _conexion()
+    try:
+        actual = version_actual(conn)
+        registradas = {}
+        if actual:
+            registradas = {v: (checksum, fecha) for v, _, checksum, fecha, _ in migraciones_aplicadas(conn)}
+    finally:
+        conn.close()
+
+    print(f"Versión de la BD: {actual}")
+    for m in listar_migraciones():
+        if m.version in registradas:
+            checksum, fecha = registradas[m.version]
+            marca = "aplicada " + fecha.strftime("%Y-%m-%d %H:%M")
+            if checksum != m.checksum:
+                marca += f"  ⚠️ el archivo cambió después de aplicarse (revisar y `aceptar {m.version}`)"
+        else:
+            marca = "PENDIENTE"
+        print(f"  {m.version:04d}_{m.nombre:<40} {marca}")
+
+
+def cmd_aplicar(args):
+    conn = _conexion()
+    try:
+        aplicadas = aplicar_migraciones(conn, hasta=args.hasta, log=print)
+    finally:
+        conn.close()
+
+    if aplicadas:
+        print(f"✅ {len(aplicadas)} migración(es) aplicada(s)")
+    else:
+        print("✅ El esquema ya está al día")
+
+
+def cmd_aceptar(args):
+    conn = _conexion()
+    try:
+        aceptar_checksum(conn, args.version)
+    finally:
+        conn.close()
+    print(f"✅ Checksum de la migración {args.version:04d} actualizado")
+
+
+def cmd_nueva(args):
+    migraciones = listar_migraciones()
+    version = (migraciones[-1].version if migraciones else 0) + 1
+    nombre = args.nombre.strip().lower().replace(" ", "_")
+    ruta = os.path.join(DIRECTORIO, f"{version:04d}_{nombre}.sql")
+
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write(f"-- {nombre}\n")
+    print(f"Creada {ruta}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m migraciones")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    sub.add_parser("estado", help="Muestra la versión de la BD y las migraciones pendientes")
+
+    p_aplicar = sub.add_parser("aplicar", help="Aplica las migraciones pendientes")
+    p_aplicar.add_argument("--hasta", type=int, default=None, help="Versión máxima a aplicar")
+
+    p_aceptar = sub.add_parser(
+        "aceptar", help="Registra el archivo actual de una migración ya aplicada (tras revisar el cambio)"
+    )
+    p_aceptar.add_argument("version", type=int)
+
+    p_nueva = sub.add_parser("nueva", help="Crea el archivo de la siguiente migración")
+    p_nueva.add_argument("nombre")
+
+    args = parser.parse_args(argv)
+    {"estado": cmd_estado, "aplicar": cmd_aplicar, "aceptar": cmd_aceptar, "nueva": cmd_nueva}[args.comando](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,8 +10,11 @@ from services.venta_service import (
 from services.caja_service import (
     obtener_resumen_caja, obtener_historial_cajas
 )
+from services.cola_ventas import obtener_cola
+from db import unidad_de_trabajo
 
 
+@unidad_de_trabajo()
 def caja_app(usuario):
     st.title("💵 Gestión de Caja")
 
@@ -24,7 +27,10 @@ def caja_app(usuario):
     # TAB 1 – CAJA ACTUAL
     # =========================
     with tab_actual:
-        caja_abierta = obtener_caja_abierta()
+        # Caja y resumen leídos en un mismo snapshot (cuadran entre sí)
+        with unidad_de_trabajo(solo_lectura=True):
+            caja_abierta = obtener_caja_abierta()
+            resumen = obtener_resumen_caja(caja_abierta["id"]) if caja_abierta else None
 
         if caja_abierta:
             st.success(f"✅ Caja ABIERTA (ID: {caja_abierta['id']})")
@@ -34,8 +40,6 @@ def caja_app(usuario):
             )
             st.subheader("📊 Resumen de Caja")
 
-            resumen = obtener_resumen_caja(caja_abierta["id"])
-
             df = pd.DataFrame(
                 resumen["por_metodo"],
                 columns=["Método de pago", "Total"]
@@ -71,7 +75,16 @@ def caja_app(usuario):
                 else:
                     st.error(f"❌ Faltante: S/. {abs(diferencia):,.2f}")
 
-            if st.button("🔒 Cerrar caja", type="primary"):
+            # Ventas de la cola local de esta caja que aún no están en la BD
+            cola = obtener_cola()
+            en_cola = cola.pendientes_de_caja(caja_abierta["id"]) if cola else 0
+            if en_cola:
+                st.warning(
+                    f"⏳ {en_cola} venta(s) de esta caja aún no llegan a la BD: "
+                    "el resumen no las incluye y la caja no se puede cerrar"
+                )
+
+            if st.button("🔒 Cerrar caja", type="primary", disabled=bool(en_cola)):
                 cerrar_caja(
                     caja_abierta["id"],   # 👈 SOLO el ID
                     monto_cierre,
@@ -97,6 +110,10 @@ def caja_app(usuario):
                 st.success(f"Caja abierta (ID: {caja_id})")
                 st.rerun()
 
+        cola = obtener_cola()
+        if cola:
+            mostrar_cola_ventas(cola)
+
     # =========================
     # TAB 2 – HISTORIAL
     # =========================
@@ -143,4 +160,52 @@ def caja_app(usuario):
         col3.metric("📱 Total Plin", f"S/. {df['Plin'].sum():,.2f}")
         col4.metric("📱 Total Transferencia", f"S/. {df['Transferencia'].sum():,.2f}")
         col5.metric("💳 Total Tarjeta", f"S/. {df['Tarjeta'].sum():,.2f}")
-        col6.metric("🧾 Total General", f"S/. {df['Total Vendido'].sum():,.2f}")
\ No newline at end of file
+        col6.metric("🧾 Total General", f"S/. {df['Total Vendido'].sum():,.2f}")
+
+def mostrar_cola_ventas(cola):
+    st.subheader("🔄 Sincronización de ventas")
+    resumen = cola.resumen()
+
+    col1, col2 = st.columns(2)
+    col1.metric("Por sincronizar", resumen["pendientes"])
+    col2.metric("Con conflicto", resumen["conflictos"])
+
+    if resumen["ultimo_error"]:
+        st.error(f"Sin conexión con la BD, se reintenta solo: {resumen['ultimo_error']}")
+    if resumen["mas_antigua"]:
+        st.caption(f"Pendiente más antigua: {resumen['mas_antigua']}")
+
+    if st.button("🔄 Sincronizar ahora"):
+        cola.despertar()
+        st.rerun()
+
+    df = cola.listar()
+    if df.empty:
+        st.success("✅ Todas las ventas están en la BD")
+        return
+
+    st.dataframe(df, hide_index=True, width='stretch')
+
+    conflictos = df[df["estado"] == "CONFLICTO"]
+    if conflictos.empty:
+        return
+
+    st.markdown("**Resolver conflicto**")
+    col_sel, col_reintentar, col_descartar = st.columns([2, 1, 1])
+    with col_sel:
+        id_local = st.selectbox(
+            "Venta",
+            conflictos["id"].tolist(),
+            format_func=lambda x: (
+                f"#{x} · {conflictos.loc[conflictos['id'] == x, 'nro_comprobante'].iloc[0] or 'sin N°'}"
+            ),
+            label_visibility="collapsed"
+        )
+    with col_reintentar:
+        if st.button("🔁 Reintentar"):
+            cola.reintentar(id_local)
+            st.rerun()
+    with col_descartar:
+        if st.button("🗑 Descartar"):
+            cola.descartar(id_local)
+            st.rerun()
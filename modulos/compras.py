@@ -4,23 +4,24 @@ import pandas as pd
 from datetime import datetime
 from decimal import Decimal
 
-from db import (
-    get_connection, actualizar_costo_promedio, obtener_configuracion,
-    recalcular_precios_producto, registrar_historial_precio
-)
+from db import get_connection, obtener_configuracion, unidad_de_trabajo
 
 from services.producto_service import (
-    buscar_producto_avanzado, contar_productos,
+    buscar_productos, listar_productos_pagina,
     obtener_filtros_productos, to_float 
 )
+from services.compra_service import calcular_totales_compra, registrar_compra
+from services.importacion_compras import carrito_desde_importacion, emparejar_lineas, leer_factura
+from services.lista_precios import presentaciones_producto
+from ui.paginacion import paginador
 
+@unidad_de_trabajo()
 def compras_app():
     conn = get_connection()
     # Leer configuración general
     configuracion = obtener_configuracion()
     regimen = configuracion.get("regimen", "Nuevo RUS")  # Valor por defecto
 
-    cursor = conn.cursor()
     st.title("📦 Registro y Consulta de Compras")
 
     tabs = st.tabs(["📝 Registrar Compra", "📋 Consultar Compras", "📊 Reportes"])
@@ -29,7 +30,7 @@ def compras_app():
     # TAB 1: Registrar Compra
     # ========================
     with tabs[0]:
-        df_prov = pd.read_sql_query("SELECT id, nombre FROM proveedor ORDER BY nombre", conn)
+        df_prov = pd.read_sql_query("SELECT id, nombre, dni_ruc FROM proveedor ORDER BY nombre", conn)
         df_prod = pd.read_sql_query("SELECT id, descripcion, unidad_base, stock_actual FROM producto ORDER BY descripcion", conn)
 
         if df_prov.empty:
@@ -40,9 +41,19 @@ def compras_app():
             if "carrito_compras" not in st.session_state:
                 st.session_state.carrito_compras = []
 
+            # Cabecera de una factura importada: se aplica antes de crear los widgets
+            cabecera_importada = st.session_state.pop("_cabecera_importada", None)
+            if cabecera_importada:
+                if cabecera_importada.get("fecha"):
+                    st.session_state.compra_fecha = datetime.strptime(cabecera_importada["fecha"], "%Y-%m-%d").date()
+                if cabecera_importada.get("nro_doc"):
+                    st.session_state.compra_nro_doc = cabecera_importada["nro_doc"]
+                if cabecera_importada.get("tipo_doc"):
+                    st.session_state.compra_tipo_doc = cabecera_importada["tipo_doc"]
+
             col1, col2, col3 = st.columns(3)
             with col1:
-                fecha = st.date_input("📅 Fecha", datetime.today())
+                fecha = st.date_input("📅 Fecha", key="compra_fecha")
             with col2:
                 proveedor_sel = st.selectbox(
                     "🏢 Proveedor",
@@ -50,12 +61,12 @@ def compras_app():
                 )
                 id_proveedor, nombre_proveedor = proveedor_sel.split(" | ")
             with col3:
-                nro_doc = st.text_input("📑 N° Documento")
+                nro_doc = st.text_input("📑 N° Documento", key="compra_nro_doc")
 
             
             col1, col2, col3 = st.columns(3)
             with col1:
-                tipo_doc = st.selectbox("📄 Tipo de Documento", ["Factura", "Boleta", "Nota"])
+                tipo_doc = st.selectbox("📄 Tipo de Documento", ["Factura", "Boleta", "Nota"], key="compra_tipo_doc")
             with col2:
                 metodo_pago = st.selectbox(
                     "💳 Método de pago",
@@ -74,6 +85,70 @@ def compras_app():
                     st.info("📄 Nota: no incluye IGV.")
                     tipo_igv = "NOTA"
 
+            # ==============================
+            # IMPORTAR FACTURA DEL PROVEEDOR
+            # ==============================
+            with st.expander("📥 Importar factura del proveedor (CSV o XML UBL)"):
+                st.caption(
+                    "CSV con columnas codigo, descripcion, cantidad, precio (y opcionales "
+                    "codigo_barras, unidad), o el XML de la factura electrónica."
+                )
+                archivo = st.file_uploader("Archivo", type=["csv", "xml"], key="archivo_factura_compra")
+                if archivo is not None and st.button("🔎 Leer y emparejar"):
+                    try:
+                        archivo.seek(0)
+                        cabecera, lineas = leer_factura(archivo.name, archivo)
+                        st.session_state.importacion_compra = {
+                            "proveedor": id_proveedor,
+                            "cabecera": cabecera,
+                            "lineas": emparejar_lineas(id_proveedor, lineas),
+                        }
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+
+                importacion = st.session_state.get("importacion_compra")
+                if importacion and importacion["proveedor"] != id_proveedor:
+                    # Los códigos del proveedor son de otro proveedor: hay que volver a emparejar
+                    del st.session_state.importacion_compra
+                    importacion = None
+
+                if importacion:
+                    df_importacion = importacion["lineas"]
+                    emparejadas = df_importacion[df_importacion["ID Producto"].notna()]
+                    sin_emparejar = df_importacion[df_importacion["ID Producto"].isna()]
+
+                    ruc_factura = importacion["cabecera"].get("ruc")
+                    ruc_proveedor = df_prov.loc[df_prov["id"] == id_proveedor, "dni_ruc"].iloc[0]
+                    if ruc_factura and ruc_proveedor and ruc_factura != ruc_proveedor:
+                        st.warning(f"⚠️ La factura es del RUC {ruc_factura}, no de {nombre_proveedor} ({ruc_proveedor}).")
+
+                    st.markdown(f"**{len(emparejadas)} de {len(df_importacion)} líneas emparejadas**")
+                    st.dataframe(
+                        emparejadas[[
+                            "Línea", "Código", "Descripción Factura", "ID Producto", "Producto",
+                            "Emparejado por", "Unidad Compra", "Factor", "Cantidad", "Precio"
+                        ]],
+                        width='stretch', hide_index=True
+                    )
+                    if not sin_emparejar.empty:
+                        st.warning(
+                            f"⚠️ {len(sin_emparejar)} línea(s) sin producto: agrégalas a mano "
+                            "abajo (o crea el producto) y quedarán fuera del carrito importado."
+                        )
+                        st.dataframe(
+                            sin_emparejar[[
+                                "Línea", "Código", "Código Barras", "Descripción Factura",
+                                "Unidad", "Cantidad", "Precio"
+                            ]],
+                            width='stretch', hide_index=True
+                        )
+
+                    if not emparejadas.empty and st.button(f"➕ Agregar {len(emparejadas)} línea(s) al carrito"):
+                        st.session_state.carrito_compras.extend(carrito_desde_importacion(emparejadas))
+                        st.session_state._cabecera_importada = importacion["cabecera"]
+                        del st.session_state.importacion_compra
+                        st.rerun()
+
             st.markdown("### ➕ Agregar producto a la compra")
 
             df_filtros = obtener_filtros_productos()
@@ -121,24 +196,34 @@ def compras_app():
             total_productos = 0
 
             if hay_filtros:
-                total_productos = contar_productos(
+                resultado = buscar_productos(
                     criterio,
                     filtro_marca,
                     filtro_categoria,
-                    filtro_stock
+                    filtro_stock,
+                    limit=LIMITE_INICIAL
                 )
+                total_productos = resultado["total"]
+                df_prod = resultado["productos"]
 
                 ver_todos = st.checkbox(f"📄 Ver todos los resultados ({total_productos})")
 
-                limite = total_productos if ver_todos else LIMITE_INICIAL
-
-                df_prod = buscar_producto_avanzado(
-                    criterio,
-                    filtro_marca,
-                    filtro_categoria,
-                    filtro_stock,
-                    limit=limite
-                )
+                if ver_todos:
+                    # Páginas por id (keyset): cada página cuesta lo mismo sin importar el total
+                    df_prod = paginador(
+                        "paginas_productos_compras",
+                        (criterio, filtro_marca, filtro_categoria, filtro_stock),
+                        lambda despues_de, tamano: listar_productos_pagina(
+                            criterio,
+                            filtro_marca,
+                            filtro_categoria,
+                            filtro_stock,
+                            despues_de=despues_de,
+                            tamano=tamano
+                        ),
+                        total=total_productos,
+                        tamano=LIMITE_INICIAL
+                    )
 
             if df_prod.empty: 
                 st.warning("⚠️ No hay productos disponibles con esos filtros.")
@@ -173,11 +258,8 @@ def compras_app():
                 # ==============================
                 # RELACIÓN PRODUCTO–PROVEEDOR
                 # ==============================
-                df_rel = pd.read_sql_query("""
-                    SELECT unidad_compra, factor, precio_compra 
-                    FROM producto_proveedor 
-                    WHERE id_producto=%s AND id_proveedor=%s
-                """, conn, params=[id_producto, id_proveedor])
+                # Del mapa en memoria del proveedor: sin consulta por producto elegido
+                df_rel = presentaciones_producto(id_proveedor, id_producto)
 
                 # ==============================
                 # UNIDAD DE COMPRA
@@ -253,24 +335,12 @@ def compras_app():
                 suma_total_float = to_float(df_carrito["Subtotal"].sum())
                 suma_total = Decimal(str(suma_total_float))
                 descuento = Decimal(str(st.number_input("🔻 Descuento", min_value=0.0, step=0.10)))
-                op_gratuita = 0.0
-
-            
-                # === CÁLCULO GLOBAL SEGÚN TIPO DE DOCUMENTO ===                
-                if tipo_doc == "Factura":
-                    op_gravada = suma_total - descuento
-                    igv = (op_gravada * Decimal("0.18")).quantize(Decimal("0.01"))
-                    total = op_gravada + igv
 
-                elif tipo_doc == "Boleta":
-                    op_gravada = (suma_total / Decimal("1.18")).quantize(Decimal("0.01"))
-                    igv = (op_gravada * Decimal("0.18")).quantize(Decimal("0.01"))
-                    total = suma_total
-
-                else:
-                    op_gravada = suma_total
-                    igv = Decimal("0.00")
-                    total = suma_total
+                # === CÁLCULO GLOBAL SEGÚN TIPO DE DOCUMENTO ===
+                totales = calcular_totales_compra(suma_total, descuento, tipo_doc)
+                op_gravada = totales["op_gravada"]
+                igv = totales["igv"]
+                total = totales["total"]
 
                 # Mostrar resumen
                 st.markdown("### 💰 Resumen de la Compra")
@@ -294,77 +364,23 @@ def compras_app():
                         st.session_state.carrito_compras = []
                 with col2:
                     if st.button("💾 Guardar compra"):
-                        
-                        cursor.execute("""
-                            INSERT INTO compras (
-                                fecha, id_proveedor, nro_doc, tipo_doc,
-                                suma_total, descuento, op_gravada, op_gratuita,
-                                igv, total, metodo_pago
+                        # Todo el registro en una llamada a la BD (todo o nada)
+                        try:
+                            registrar_compra(
+                                fecha=fecha,
+                                id_proveedor=id_proveedor,
+                                nombre_proveedor=nombre_proveedor,
+                                nro_doc=nro_doc,
+                                tipo_doc=tipo_doc,
+                                metodo_pago=metodo_pago,
+                                regimen=regimen,
+                                descuento=descuento,
+                                carrito=st.session_state.carrito_compras
                             )
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                            RETURNING id
-                        """, (
-                            fecha, id_proveedor, nro_doc, tipo_doc,
-                            float(suma_total), float(descuento), float(op_gravada), float(op_gratuita),
-                            float(igv), float(total), metodo_pago
-                        ))
-
-                        id_compra = cursor.fetchone()[0]
-
-                        for item in st.session_state.carrito_compras:
-                            cursor.execute("""
-                                INSERT INTO compras_detalle (
-                                    id_compra, id_producto, cantidad_compra, unidad_compra, 
-                                    factor_conversion, cantidad_final, precio_unitario, subtotal
-                                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                            """, (
-                                id_compra, item["ID Producto"], item["Cantidad Compra"], item["Unidad Compra"],
-                                item["Factor"], item["Cantidad Final"], item["Precio U. Compra"], item["Subtotal"]
-                            ))
-
-                            # 🔹 Costo unitario de entrada 
-                            if regimen == "Nuevo RUS":
-                                if tipo_doc == "Factura":   
-                                    costo_unitario_entrada = item["Precio U. Compra"] * 1.18
-                                else:
-                                    costo_unitario_entrada = item["Precio U. Compra"]
-                            else:
-                                costo_unitario_entrada = item["Precio U. Compra"]
-
-
-                            # 🔹 Actualizar stock y costo promedio (reemplaza el UPDATE producto)
-                            actualizar_costo_promedio(cursor, item["ID Producto"], item["Cantidad Final"], costo_unitario_entrada)
-                            resultado = recalcular_precios_producto(cursor, item["ID Producto"])
-                            if resultado:
-                                precio_anterior, precio_nuevo, margen, costo_promedio = resultado
-
-                                registrar_historial_precio(
-                                    cursor,
-                                    item["ID Producto"],
-                                    precio_anterior,
-                                    precio_nuevo,
-                                    margen,
-                                    costo_promedio
-                                )
-
-                            # 🔹 Registrar movimiento de entrada con costos
-                            cursor.execute("""
-                                INSERT INTO public.movimientos (
-                                    id_producto, tipo, cantidad, fecha, motivo, referencia, 
-                                    costo_unitario, valor_total
-                                )
-                                VALUES (%s, 'entrada', %s, %s, %s, %s, %s, %s)
-                            """, (
-                                item["ID Producto"],
-                                item["Cantidad Final"],
-                                fecha,
-                                f"Compra {nombre_proveedor}",
-                                nro_doc,
-                                costo_unitario_entrada,
-                                item["Cantidad Final"] * costo_unitario_entrada
-                            ))
-
-                        conn.commit()
+                        except Exception as e:
+                            st.error(f"❌ Error al guardar la compra: {e}")
+                            st.stop()
+
                         st.success("✅ Compra registrada correctamente")
                         st.session_state.carrito_compras = []
                         st.rerun()
@@ -1,7 +1,7 @@
 # configuracion_app.py
 import streamlit as st
 
-from db import obtener_configuracion, actualizar_configuracion
+from db import obtener_configuracion, actualizar_configuracion, POLITICAS_STOCK
 from auth import (
     obtener_todos_los_usuarios,
     cambiar_estado_usuario,
@@ -45,6 +45,21 @@ def configuracion_app():
     direccion = st.text_input("Dirección", value=config.get("direccion", ""))
     celular = st.text_input("Celular", value=config.get("celular", ""))
 
+    # -------------------------
+    # Inventario
+    # -------------------------
+    st.markdown("---")
+    st.subheader("📦 Inventario")
+
+    politicas = list(POLITICAS_STOCK)
+    politica_actual = config.get("politica_stock", "LIMITAR")
+    politica_stock = st.selectbox(
+        "Al vender más de lo que hay en stock:",
+        politicas,
+        index=politicas.index(politica_actual) if politica_actual in politicas else 0,
+        format_func=POLITICAS_STOCK.get
+    )
+
     if st.button("💾 Guardar Cambios"):
         actualizar_configuracion(
             nuevo_regimen=nuevo_regimen,
@@ -52,7 +67,8 @@ def configuracion_app():
             nombre_comercial=nombre_comercial,
             ruc=ruc,
             direccion=direccion,
-            celular=celular
+            celular=celular,
+            politica_stock=politica_stock
         )
         st.success("✅ Configuración actualizada correctamente")
 
@@ -3,7 +3,11 @@ import streamlit as st
 
 from db import get_connection
 from datetime import datetime
-from db import obtener_configuracion
+from db import obtener_configuracion, recalcular_todos_los_precios, unidad_de_trabajo
+from services.producto_service import obtener_filtros_productos
+from services.simulador_precios import (
+    a_diezmilesimos, aplicar_simulacion, cargar_productos, impacto, precios_propuestos, simular
+)
 
 # ------------------------------------------------------
 # LÓGICA PRECIO
@@ -11,91 +15,285 @@ from db import obtener_configuracion
 def get_margen_producto(producto_id):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT margen_utilidad FROM producto WHERE id = %s", (producto_id,))
-    fila = cursor.fetchone()
-    conn.close()
+    try:
+        cursor.execute("SELECT margen_utilidad FROM producto WHERE id = %s", (producto_id,))
+        fila = cursor.fetchone()
+    finally:
+        conn.close()
     return fila[0] if fila and fila[0] is not None else None
 
 
-def calcular_precio_venta(costo, margen):
+def calcular_precio_venta(costo, margen, igv):
     # Validaciones para evitar NaN
     if costo is None or pd.isna(costo) or costo == 0:
         return None
     if margen is None or pd.isna(margen) or margen >= 1:
         return None
 
-    base = costo / (1 - margen)
-    final = base * (1 + 0.18)
-
-    # Redondeo profesional
-    final = round(final * 2) / 2
-    return final
+    # Mismo cálculo y redondeo que la BD (IGV de configuración, múltiplo de 0.50)
+    _, precio = precios_propuestos([a_diezmilesimos(costo)], [a_diezmilesimos(margen)], a_diezmilesimos(igv))
+    return int(precio[0]) / 100
 
 
 
 def guardar_historial(producto_id, precio_anterior, precio_nuevo, margen, costo_promedio):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO historial_precios(producto_id, precio_anterior, precio_nuevo, margen_usado, costo_promedio, fecha)
-        VALUES (%s, %s, %s, %s, %s, %s)
-    """, (producto_id, precio_anterior, precio_nuevo, margen, costo_promedio, datetime.now()))
-    conn.commit()
-    conn.close()
+    try:
+        cursor.execute("""
+            INSERT INTO historial_precios(producto_id, precio_anterior, precio_nuevo, margen_usado, costo_promedio, fecha)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (producto_id, precio_anterior, precio_nuevo, margen, costo_promedio, datetime.now()))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+SQL_HISTORIAL_PRECIOS = """
+    SELECT h.fecha,
+        h.costo_promedio,
+        h.precio_anterior,
+        h.precio_nuevo,
+        (h.precio_nuevo - h.precio_anterior) AS variacion,
+        h.margen_usado,
+        p.descripcion
+    FROM historial_precios h
+    JOIN producto p ON p.id = h.producto_id
+    WHERE h.producto_id = %s
+    ORDER BY h.fecha DESC
+"""
 
 
 def actualizar_precio_producto(producto_id, nuevo_precio):
     conn = get_connection()
     cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT precio_venta FROM producto WHERE id = %s", (producto_id,))
+        fila = cursor.fetchone()
+        precio_anterior = fila[0] if fila and fila[0] is not None else None
 
-    cursor.execute("SELECT precio_venta FROM producto WHERE id = %s", (producto_id,))
-    fila = cursor.fetchone()
-    precio_anterior = fila[0] if fila and fila[0] is not None else None
+        cursor.execute("UPDATE public.producto SET precio_venta = %s WHERE id = %s", (nuevo_precio, producto_id))
 
-    cursor.execute("UPDATE public.producto SET precio_venta = %s WHERE id = %s", (nuevo_precio, producto_id))
-
-    conn.commit()
-    conn.close()
+        conn.commit()
+    finally:
+        conn.close()
 
     return precio_anterior
 
 def actualizar_margen_producto(producto_id, nuevo_margen):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("UPDATE public.producto SET margen_utilidad = %s WHERE id = %s", (nuevo_margen, producto_id))
-    conn.commit()
-    conn.close()
+    try:
+        cursor.execute("UPDATE public.producto SET margen_utilidad = %s WHERE id = %s", (nuevo_margen, producto_id))
+        conn.commit()
+    finally:
+        conn.close()
 
-def actualizar_valor_venta(pid, precio_venta):
+def actualizar_valor_venta(pid, precio_venta, igv):
     conn = get_connection()
     cursor = conn.cursor()
+    try:
+        valor_venta = precio_venta / (1 + float(igv))
 
-    valor_venta = precio_venta / 1.18  # cálculo solicitado
-
-    cursor.execute("""
-        UPDATE public.producto
-        SET valor_venta = %s
-        WHERE id = %s
-    """, (valor_venta, pid))
+        cursor.execute("""
+            UPDATE public.producto
+            SET valor_venta = %s
+            WHERE id = %s
+        """, (valor_venta, pid))
 
-    conn.commit()
-    conn.close()
+        conn.commit()
+    finally:
+        conn.close()
 
     return valor_venta
 
 
+# -----------------------------
+# SIMULADOR (categoría, marca o catálogo)
+# -----------------------------
+@st.fragment
+def panel_simulador(margen_global, df_filtros):
+    """
+    Precios propuestos para todo un alcance y su impacto, antes de guardar.
+    Fragmento: cambiar el margen recalcula solo este panel.
+    """
+    st.caption(
+        "Carga los productos activos con costo del alcance y calcula los precios "
+        "con el margen elegido (mismo redondeo que la BD), sin guardar nada. "
+        "El impacto en ingresos y utilidad usa las unidades vendidas del período."
+    )
+    col1, col2, col3 = st.columns([3, 3, 2])
+    with col1:
+        categoria_sim = st.selectbox(
+            "Categoría",
+            ["Todas"] + sorted(df_filtros["categoria"].dropna().unique().tolist()),
+            key="categoria_simulador"
+        )
+    with col2:
+        marca_sim = st.selectbox(
+            "Marca",
+            ["Todas"] + sorted(df_filtros["marca"].dropna().unique().tolist()),
+            key="marca_simulador"
+        )
+    with col3:
+        dias_sim = st.number_input(
+            "Ventas de los últimos (días)", min_value=1, value=90, step=30, key="dias_simulador"
+        )
+
+    alcance = (
+        None if categoria_sim == "Todas" else categoria_sim,
+        None if marca_sim == "Todas" else marca_sim,
+        int(dias_sim)
+    )
+    if st.button("📥 Cargar productos"):
+        try:
+            st.session_state.simulador_precios = {
+                "alcance": alcance,
+                "datos": cargar_productos(*alcance)
+            }
+        except ValueError as e:
+            st.error(f"❌ {e}")
+
+    cargado = st.session_state.get("simulador_precios")
+    if cargado and cargado["alcance"] == alcance:
+        datos = cargado["datos"]
+
+        modo = st.radio(
+            "Margen a aplicar",
+            ["El de cada producto (o el global)", "Un nuevo margen para todos"],
+            horizontal=True,
+            key="modo_simulador"
+        )
+        margen_sim = None
+        if modo == "Un nuevo margen para todos":
+            margen_sim = st.number_input(
+                "Nuevo margen (%)",
+                value=margen_global * 100,
+                min_value=1.0,
+                max_value=99.0,
+                key="margen_simulador"
+            ) / 100
+
+        simulacion = simular(datos, margen_sim)
+        resumen = impacto(datos, simulacion)
+
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("📦 Productos", f"{resumen['productos']:,}")
+        with col2:
+            st.metric("🔁 A guardar", f"{resumen['cambian']:,}")
+        with col3:
+            st.metric("⬆️ Suben", f"{resumen['suben']:,}")
+        with col4:
+            st.metric("⬇️ Bajan", f"{resumen['bajan']:,}")
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("📊 Variación mediana", f"{resumen['variacion_mediana']:.2f}%")
+        with col2:
+            st.metric(
+                "💵 Ingresos del período",
+                f"S/. {resumen['ingresos_nuevos']:,.2f}",
+                f"{resumen['ingresos_nuevos'] - resumen['ingresos_actuales']:,.2f}"
+            )
+        with col3:
+            st.metric(
+                "💰 Utilidad del período (sin IGV)",
+                f"S/. {resumen['utilidad_nueva']:,.2f}",
+                f"{resumen['utilidad_nueva'] - resumen['utilidad_actual']:,.2f}"
+            )
+
+        if resumen["margen_invalido"]:
+            st.warning(f"⚠️ {resumen['margen_invalido']} productos con margen ≥ 100% no se tocan.")
+
+        col1, col2 = st.columns([3, 2])
+        with col1:
+            st.caption("Productos por variación de precio")
+            st.bar_chart(resumen["distribucion"])
+        with col2:
+            st.caption("Margen sobre el precio sin IGV")
+            st.dataframe(resumen["margenes"], width='stretch')
+
+        if not resumen["mayores"].empty:
+            st.caption("Mayores variaciones")
+            st.dataframe(resumen["mayores"], width='stretch', hide_index=True)
+
+        if st.button(f"💾 Aplicar {resumen['cambian']:,} precios", disabled=not resumen["cambian"]):
+            try:
+                aplicado = aplicar_simulacion(datos, simulacion)
+            except ValueError as e:
+                st.error(f"❌ {e}")
+            else:
+                del st.session_state.simulador_precios
+                st.success(
+                    f"✅ {aplicado['actualizados']} productos actualizados, "
+                    f"{aplicado['cambios_precio']} cambiaron de precio"
+                )
+                if aplicado["omitidos"]:
+                    st.warning(
+                        f"⚠️ {aplicado['omitidos']} productos omitidos: cambió su costo "
+                        "o se desactivaron desde la carga. Vuelve a cargar y simular."
+                    )
+
+
 # -----------------------------
 # MÓDULO STREAMLIT (UI)
 # -----------------------------
+@unidad_de_trabajo()
 def precios_app():
 
     st.title("💲 Módulo Profesional de Precios")
 
     config = obtener_configuracion()
-    margen_global = config.get("margen_utilidad", 0.30)  # 30% por defecto
+    margen_global = float(config.get("margen_utilidad", 0.30))  # 30% por defecto
+    igv = float(config.get("igv", 0.18))
 
     conn = get_connection()
 
+    # ============================================================
+    # RECÁLCULO DEL CATÁLOGO (costo promedio + margen vigente)
+    # ============================================================
+    with st.expander("🔄 Recalcular precios del catálogo"):
+        st.caption(
+            f"Aplica a cada producto activo su margen (o el global, {margen_global * 100:.2f}%) "
+            "sobre el costo promedio, con IGV y redondeo a S/. 0.50. Los productos sin "
+            "costo no se tocan; los que cambian de precio quedan en el historial."
+        )
+        df_filtros = obtener_filtros_productos()
+        col1, col2 = st.columns(2)
+        with col1:
+            categoria_recalculo = st.selectbox(
+                "Categoría",
+                ["Todas"] + sorted(df_filtros["categoria"].dropna().unique().tolist()),
+                key="categoria_recalculo"
+            )
+        with col2:
+            marca_recalculo = st.selectbox(
+                "Marca",
+                ["Todas"] + sorted(df_filtros["marca"].dropna().unique().tolist()),
+                key="marca_recalculo"
+            )
+
+        if st.button("🔄 Recalcular precios"):
+            try:
+                resumen = recalcular_todos_los_precios(
+                    categoria=None if categoria_recalculo == "Todas" else categoria_recalculo,
+                    marca=None if marca_recalculo == "Todas" else marca_recalculo
+                )
+            except ValueError as e:
+                st.error(f"❌ {e}")
+            else:
+                st.success(
+                    f"✅ {resumen['revisados']} productos revisados: "
+                    f"{resumen['cambios_precio']} cambiaron de precio"
+                )
+
+    # ============================================================
+    # SIMULADOR (categoría, marca o catálogo, antes de guardar)
+    # ============================================================
+    with st.expander("🧪 Simulador de precios por categoría / marca"):
+        panel_simulador(margen_global, df_filtros)
+
     # ============================================================
     # 0. FILTROS - Igual al módulo de ventas
     # ============================================================
@@ -160,7 +358,7 @@ def precios_app():
 
     costo = float(row["costo_promedio"]) if row["costo_promedio"] else 0
     precio_actual = float(row["precio_venta"]) if row["precio_venta"] else 0
-    margen_actual = row["margen_utilidad"] if row["margen_utilidad"] else margen_global
+    margen_actual = float(row["margen_utilidad"]) if row["margen_utilidad"] else margen_global
 
     # Mostrar
     col1, col2, col3, col4 = st.columns(4)
@@ -197,7 +395,7 @@ def precios_app():
         # Botón: SIMULAR
         # --------------------------
         if st.button("Simular"):
-            st.session_state.precio_sim = calcular_precio_venta(costo, nuevo_margen)
+            st.session_state.precio_sim = calcular_precio_venta(costo, nuevo_margen, igv)
 
             if st.session_state.precio_sim is None:
                 st.error("❌ No se pudo calcular el precio. Verifica costo y margen.")
@@ -210,7 +408,7 @@ def precios_app():
                 st.error("⚠ Primero debes simular el precio.")
             else:
                 precio_anterior = actualizar_precio_producto(pid, st.session_state.precio_sim)
-                actualizar_valor_venta(pid, st.session_state.precio_sim)
+                actualizar_valor_venta(pid, st.session_state.precio_sim, igv)
                 actualizar_margen_producto(pid, nuevo_margen)
                 guardar_historial(pid, precio_anterior, st.session_state.precio_sim, nuevo_margen, costo)
 
@@ -228,19 +426,7 @@ def precios_app():
     # ============================================================
     st.subheader("📜 Historial de cambios")
 
-    df_hist = pd.read_sql_query("""
-        SELECT h.fecha,
-            h.costo_promedio,                    
-            h.precio_anterior,
-            h.precio_nuevo,
-            (h.precio_nuevo - h.precio_anterior) AS variacion,
-            h.margen_usado,
-            p.descripcion
-        FROM historial_precios h
-        JOIN producto p ON p.id = h.producto_id
-        WHERE h.producto_id = %s
-        ORDER BY h.fecha DESC
-    """, conn, params=[pid])
+    df_hist = pd.read_sql_query(SQL_HISTORIAL_PRECIOS, conn, params=[pid])
 
     # ========================
     # Ordenar columnas
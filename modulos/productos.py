@@ -2,6 +2,7 @@
 import streamlit as st
 import pandas as pd
 import os
+import re
 
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -15,9 +16,12 @@ from db import (
 
 from services.producto_service import (
     obtener_valores_unicos,
-    buscar_producto_avanzado,
-    contar_productos
+    buscar_productos,
+    listar_productos_pagina,
+    asignar_codigos_barras
 )
+from services.catalogo_cache import obtener_catalogo
+from ui.paginacion import paginador
 
 @st.cache_data(ttl=300)
 def cargar_categorias():
@@ -27,14 +31,29 @@ def cargar_categorias():
     return categorias.sort_values("id", ascending=True)
 
 
+def leer_pares_codigos(texto):
+    """Líneas 'ID<sep>CODIGO' (tab, coma o punto y coma) -> [(id, codigo)]."""
+    pares = []
+    for linea in (texto or "").splitlines():
+        if not linea.strip():
+            continue
+        partes = re.split(r"[\t;,]", linea, maxsplit=1)
+        id_producto = partes[0].strip()
+        codigo = partes[1].strip() if len(partes) > 1 else ""
+        if id_producto:
+            pares.append((id_producto, codigo))
+    return pares
+
+
 def productos_app():
     st.title("📦 Gestión de Productos")
 
-    tab_search, tab_add, tab_inv, tab_cat = st.tabs([
+    tab_search, tab_add, tab_inv, tab_cat, tab_barras = st.tabs([
         "🔍 Buscar Producto",
         "➕ Agregar Producto",
         "📊 Inventario",
-        "📂 Categorías"
+        "📂 Categorías",
+        "🏷️ Códigos de barras"
     ])
     # ------------------------
     # SUBMENÚ: BUSCAR PRODUCTO
@@ -69,24 +88,39 @@ def productos_app():
         df = pd.DataFrame()
         total = 0
 
+        facetas = None
+
         if hay_filtros:
-            total = contar_productos(
+            resultado = buscar_productos(
                 criterio,
                 filtro_marca,
                 filtro_categoria,
-                filtro_stock
+                filtro_stock,
+                limit=LIMITE_INICIAL,
+                facetas=True
             )
-            
+            total = resultado["total"]
+            df = resultado["productos"]
+            facetas = resultado["facetas"]
+
             ver_mas = st.checkbox(f"📄 Ver todos los resultados ({total})")
-            limite = total if ver_mas else LIMITE_INICIAL
 
-            df = buscar_producto_avanzado(
-                criterio,
-                filtro_marca,
-                filtro_categoria,
-                filtro_stock,
-                limit=limite
-            )
+            if ver_mas:
+                # Páginas por id (keyset): cada página cuesta lo mismo sin importar el total
+                df = paginador(
+                    "paginas_productos",
+                    (criterio, filtro_marca, filtro_categoria, filtro_stock),
+                    lambda despues_de, tamano: listar_productos_pagina(
+                        criterio,
+                        filtro_marca,
+                        filtro_categoria,
+                        filtro_stock,
+                        despues_de=despues_de,
+                        tamano=tamano
+                    ),
+                    total=total,
+                    tamano=LIMITE_INICIAL
+                )
 
         if total > 0:
             if total > len(df):
@@ -94,6 +128,12 @@ def productos_app():
             else:
                 st.info(f"🔎 Resultados encontrados: {total}")
 
+            # Conteo por marca / categoría dentro de los resultados
+            for campo, titulo in (("marca", "Por marca"), ("categoria", "Por categoría")):
+                conteo = sorted(facetas[campo].items(), key=lambda x: -x[1])
+                if len(conteo) > 1:
+                    st.caption(f"{titulo}: " + " · ".join(f"{k} ({n})" for k, n in conteo[:8]))
+
         if not df.empty:
             st.markdown("### 🧾 Resultados")
             df_filtrado = df[["id", "descripcion", "marca", "modelo", "catalogo", "categoria", "stock_actual"]].copy()
@@ -298,6 +338,42 @@ def productos_app():
             else:
                 st.info("No hay producto en el inventario.")
 
+    # ------------------------
+    # SUBMENÚ: CÓDIGOS DE BARRAS
+    # ------------------------
+    with tab_barras:
+        st.subheader("🏷️ Asignar códigos de barras")
+        st.caption(
+            "Una línea por producto: código del producto y código de barras separados por "
+            "tabulación, coma o punto y coma (se puede pegar desde Excel). "
+            "Dejar el código de barras vacío lo quita."
+        )
+
+        texto_codigos = st.text_area(
+            "Productos y códigos",
+            height=200,
+            placeholder="P00001\t7750000000017\nP00002\t7750000000024"
+        )
+        pares = leer_pares_codigos(texto_codigos)
+
+        if pares:
+            st.dataframe(
+                pd.DataFrame(pares, columns=["ID Producto", "Código de barras"]),
+                hide_index=True,
+                width='stretch'
+            )
+
+            if st.button(f"💾 Asignar {len(pares)} código(s)", key="btn_asignar_codigos"):
+                try:
+                    actualizados, inexistentes = asignar_codigos_barras(pares)
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+                else:
+                    obtener_catalogo().refrescar()
+                    st.success(f"✅ {actualizados} producto(s) actualizados")
+                    if inexistentes:
+                        st.warning("⚠️ Productos no encontrados: " + ", ".join(inexistentes))
+
     # ------------------------
     # SUBMENÚ: CATEGORÍAS
     # ------------------------
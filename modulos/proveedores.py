@@ -3,11 +3,12 @@ import streamlit as st
 import pandas as pd
 
 from db import generar_codigo_correlativo, get_connection
+from services.lista_precios import cargar_lista_precios, resumen_variaciones
 
 def proveedores_app():
     st.title("📇 Gestión de Proveedores")
 
-    tab1, tab2, tab3 = st.tabs(["➕ Agregar", "✏️ Modificar / Eliminar", "📊 Listado"])
+    tab1, tab2, tab3, tab4 = st.tabs(["➕ Agregar", "✏️ Modificar / Eliminar", "📊 Listado", "📥 Lista de precios"])
 
     # ------------------------
     # TAB 1 - AGREGAR
@@ -116,6 +117,74 @@ def proveedores_app():
         else:
             st.info("No hay proveedores en la base de datos.")
 
+    # ------------------------
+    # TAB 4 - LISTA DE PRECIOS
+    # ------------------------
+    with tab4:
+        st.subheader("📥 Cargar lista de precios del proveedor")
+        st.caption(
+            "CSV con columnas codigo (o codigo_barras) y precio; opcionales descripcion, "
+            "unidad, factor, lote_min y tiempo_entrega. Actualiza las presentaciones "
+            "(producto y unidad) del proveedor y agrega las nuevas."
+        )
+
+        if not df_prov.empty:
+            proveedor_lista = st.selectbox(
+                "🏢 Proveedor",
+                [f"{row['id']} | {row['nombre']}" for _, row in df_prov.iterrows()],
+                key="proveedor_lista_precios"
+            )
+            id_proveedor = proveedor_lista.split(" | ")[0]
+            archivo = st.file_uploader("Lista de precios (CSV)", type=["csv"], key="archivo_lista_precios")
+
+            if archivo is not None and st.button("📥 Cargar lista"):
+                try:
+                    archivo.seek(0)
+                    df_lista = cargar_lista_precios(id_proveedor, archivo)
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+                else:
+                    st.session_state.lista_precios_cargada = {
+                        "proveedor": proveedor_lista,
+                        "resumen": resumen_variaciones(df_lista),
+                        "lineas": df_lista,
+                    }
+
+            cargada = st.session_state.get("lista_precios_cargada")
+            if cargada:
+                resumen = cargada["resumen"]
+                df_lista = cargada["lineas"]
+                st.success(f"✅ Lista de {cargada['proveedor']} cargada: {resumen['filas']} filas")
+
+                col1, col2, col3, col4, col5 = st.columns(5)
+                col1.metric("🆕 Nuevas", resumen["nuevas"])
+                col2.metric("✏️ Actualizadas", resumen["actualizadas"])
+                col3.metric("📈 Suben", resumen["suben"])
+                col4.metric("📉 Bajan", resumen["bajan"])
+                col5.metric("Variación mediana", f"{resumen['variacion_mediana']:+.2f} %")
+                st.caption(
+                    f"Promedio {resumen['variacion_promedio']:+.2f} % · p90 {resumen['variacion_p90']:+.2f} % · "
+                    f"sin cambio {resumen['sin_cambio']} · repetidas {resumen['repetidas']}"
+                )
+
+                cambios = df_lista[df_lista["Variación"].fillna(0) != 0]
+                if not cambios.empty:
+                    st.markdown("**Mayores variaciones**")
+                    st.dataframe(
+                        cambios.reindex(cambios["Variación %"].abs().sort_values(ascending=False).index).head(200),
+                        width='stretch', hide_index=True
+                    )
+
+                sin_emparejar = df_lista[df_lista["Estado"] == "Sin emparejar"]
+                if not sin_emparejar.empty:
+                    st.warning(f"⚠️ {len(sin_emparejar)} fila(s) sin producto (no se cargaron)")
+                    st.dataframe(
+                        sin_emparejar[["Línea", "Código", "Descripción Lista", "Precio Nuevo"]],
+                        width='stretch', hide_index=True
+                    )
+        else:
+            st.info("No hay proveedores en la base de datos.")
+
     conn.close()
 
 
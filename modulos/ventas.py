@@ -8,27 +8,32 @@ from decimal import Decimal
 
 from db import (
     query_df, select_cliente, obtener_cliente_por_id,
-    obtener_configuracion, obtener_fecha_lima
+    obtener_configuracion, obtener_fecha_lima, unidad_de_trabajo
 )
 
 from services.producto_service import (
-    buscar_producto_avanzado, contar_productos,
     obtener_filtros_productos, to_float
 )
+from services.catalogo_cache import obtener_catalogo
+from services.cola_ventas import encolar_venta, obtener_cola
 from services.venta_service import (
-    calcular_totales, guardar_venta, agregar_item_venta, obtener_valor_venta, obtener_detalle_venta,
+    calcular_totales, guardar_venta, obtener_valor_venta, obtener_detalle_venta,
     inicializar_estado_venta, precio_valido, obtener_ventas_abiertas, crear_venta_abierta, 
-    puede_guardar_venta, eliminar_item_servicio, eliminar_items_servicio, eliminar_venta_abierta, placa_a_mayusculas,
-    resetear_modulo_ventas, vaciar_carrito_pos
+    puede_guardar_venta, eliminar_items_servicio, eliminar_venta_abierta, placa_a_mayusculas,
+    procesar_codigo_escaneado, resetear_modulo_ventas, vaciar_carrito_pos,
+    cambios_taller, anotar_cambio_taller, guardar_cambios_taller, descartar_cambios_taller
 )
+from services.carrito_taller import proyectar_cambios
 from services.comprobante_service import (
     generar_ticket_html, obtener_siguiente_correlativo, buscar_comprobantes,
     generar_ticket_pdf, registrar_reimpresion
 )
 from ui.styles import (
     aplicar_estilos_input_busqueda, aplicar_estilos_selectbox
-)   
+)
+from ui.paginacion import paginador   
 
+@unidad_de_trabajo()
 def ventas_app():
 
     aplicar_estilos_input_busqueda()
@@ -52,7 +57,12 @@ def ventas_app():
     st.session_state.setdefault("venta_abierta_id", None)
 
     inicializar_estado_venta(st.session_state)
-    tabs = st.tabs(["📝 Registrar Venta", "📋 Consultar Ventas", "📄 Comprobante", "📊 Reportes"])
+    # Solo corre la pestaña abierta: registrar una venta no ejecuta los reportes
+    tabs = st.tabs(
+        ["📝 Registrar Venta", "📋 Consultar Ventas", "📄 Comprobante", "📊 Reportes"],
+        key="pestana_ventas",
+        on_change="rerun"
+    )
 
     # =======================
     # TAB 1: Registrar Venta
@@ -94,59 +104,12 @@ def ventas_app():
 
         st.session_state["tipo_venta_anterior"] = tipo_venta
 
-        # ===============================
-        # SERVICIOS / VENTAS EN CURSO
-        # ===============================
-        #df_abiertas = pd.DataFrame()  # ← CLAVE 
+        # Cola local (COLA_VENTAS_DB): el cobro POS se confirma en disco y la
+        # BD lo recibe en segundo plano
+        cola = obtener_cola() if tipo_venta == "POS" else None
 
         if tipo_venta == "Taller":
-            df_abiertas = obtener_ventas_abiertas()
-
-            if not df_abiertas.empty:
-                df_abiertas["fecha"] = pd.to_datetime(df_abiertas["fecha"]).dt.strftime("%d/%m %H:%M")
-                
-                st.subheader("🛠 En proceso")
-                st.dataframe(df_abiertas, hide_index=True, width='stretch')
-
-                st.markdown("Selección de orden")
-                col_sel, col_del, col_space = st.columns([2, 1, 6])               
-
-                with col_sel:
-                    venta_sel = st.selectbox(
-                        "",
-                        df_abiertas["orden"].tolist(),
-                        format_func=lambda x: f"#{x}",
-                        key="select_orden",
-                        label_visibility="collapsed"
-                    )
-
-                    # Si cambia la orden, actualizar placa
-                    if st.session_state.get("venta_abierta_id") != venta_sel:
-                        st.session_state["venta_abierta_id"] = venta_sel
-
-                        placa = df_abiertas.loc[
-                            df_abiertas["orden"] == venta_sel, "placa"
-                        ].values[0]
-
-                        st.session_state["placa_vehiculo"] = placa
-
-                with col_del:
-                    if st.button("❌ Eliminar", key="eliminar_venta"):
-                        try:
-                            eliminar_venta_abierta(st.session_state["venta_abierta_id"])
-                            st.success(f"Orden #{st.session_state['venta_abierta_id']} eliminada correctamente")
-                            st.session_state.pop("venta_abierta_id", None)
-                            st.session_state["placa_vehiculo"] = ""
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"No se pudo eliminar la orden: {str(e)}")
-
-                df_detalle = obtener_detalle_venta(venta_sel)
-
-                # Convertir a carrito visual (solo para mostrar)
-                df_carrito_taller = df_detalle.copy()
-            else:
-                st.info("No hay servicios en curso")
+            tablero_taller()
 
         col1, col2 = st.columns([3, 1])
         with col1:
@@ -155,6 +118,7 @@ def ventas_app():
             # Leer configuración general
             configuracion = obtener_configuracion()
             regimen = configuracion.get("regimen", "Nuevo RUS")  # Valor por defecto
+            permite_negativo = configuracion.get("politica_stock") == "NEGATIVO"
 
         # --- Datos del comprobante --
         col1, col2, col3 = st.columns(3)
@@ -182,10 +146,23 @@ def ventas_app():
                 serie = "B" if tipo_comprobante == "Boleta" else "F"
         with col3:
             if "Nuevo RUS" in regimen:
-                nro_comprobante, numero_correlativo = obtener_siguiente_correlativo(tipo_comprobante.upper(), serie)
-                st.text_input("📑 N° Comprobante", value=nro_comprobante, disabled=True)
+                # Solo vista previa: el número se asigna al guardar
+                if cola:
+                    siguiente = cola.siguiente_comprobante(tipo_comprobante, serie) or "Al sincronizar"
+                else:
+                    siguiente, _ = obtener_siguiente_correlativo(tipo_comprobante.upper(), serie)
+                st.text_input(
+                    "📑 N° Comprobante",
+                    value=siguiente,
+                    disabled=True,
+                    help="Se confirma al guardar la venta"
+                )
             else:
-                nro_comprobante = st.text_input("📑 N° Comprobante")
+                nro_comprobante = st.text_input(
+                    "📑 N° Comprobante",
+                    placeholder="Automático",
+                    help="Vacío: se asigna el siguiente número de la serie al guardar"
+                )
 
         # --- Cliente, Régimen y Método de Pago ---
         col1, col2, col3 = st.columns([5, 2, 2])
@@ -237,646 +214,919 @@ def ventas_app():
                 st.session_state["venta_abierta_id"] = id_venta
                 st.success(f"Orden de servicio #{id_venta} creada")
 
-        # --- Carrito en sesión --
-        st.markdown("### ➕ Agregar productos")
+        # Búsqueda, carrito y cobro son fragmentos: buscar o agregar un producto
+        # solo vuelve a ejecutar su panel, no la página (configuración,
+        # correlativo, clientes, órdenes abiertas)
+        panel_busqueda(permite_negativo)
+        panel_carrito(tipo_venta, permite_negativo, {
+            "regimen": regimen,
+            "tipo_comprobante": tipo_comprobante,
+            "serie": serie,
+            "nro_comprobante": nro_comprobante,
+            "metodo_pago": metodo_pago,
+            "cliente": cliente,
+            "usuario": usuario,
+            "cola": cola,
+        })
+
+        # -------- LIMPIAR BANDERA DE RESET VISUAL --------
+        if st.session_state.get("reset_en_progreso"):
+            st.session_state.pop("reset_en_progreso")
 
-        with st.expander("Filtros de productos"):
-            df_filtros = obtener_filtros_productos()
+    with tabs[1]:
+        if tabs[1].open:
+            consultar_ventas(usuario)
 
-            # Crear columnas para los tres filtros
-            col_marca, col_categoria, col_stock = st.columns([1,1,1])  # proporciones ajustables
+    with tabs[2]:
+        if tabs[2].open:
+            ver_comprobante(usuario)
 
-            # --- MARCA ---
-            with col_marca:
-                marcas = ["Todos"] + sorted(df_filtros["marca"].dropna().unique().tolist())
-                filtro_marca = st.selectbox("Marca", marcas, key="filtro_marca")
+    with tabs[3]:
+        if tabs[3].open:
+            reportes_ventas()
+
+
+# ===============================
+# SERVICIOS / VENTAS EN CURSO
+# ===============================
+@st.fragment
+def tablero_taller():
+    df_abiertas = obtener_ventas_abiertas()
+    # Versión del detalle de cada orden: el carrito se lee de memoria si no cambió
+    st.session_state["versiones_orden"] = dict(zip(df_abiertas["orden"], df_abiertas["version"]))
+
+    if not df_abiertas.empty:
+        df_abiertas["fecha"] = pd.to_datetime(df_abiertas["fecha"]).dt.strftime("%d/%m %H:%M")
+
+        st.subheader("🛠 En proceso")
+        st.dataframe(df_abiertas.drop(columns="version"), hide_index=True, width='stretch')
+
+        st.markdown("Selección de orden")
+        col_sel, col_del, col_space = st.columns([2, 1, 6])               
+
+        with col_sel:
+            venta_sel = st.selectbox(
+                "",
+                df_abiertas["orden"].tolist(),
+                format_func=lambda x: f"#{x}",
+                key="select_orden",
+                label_visibility="collapsed",
+                on_change=lambda: st.session_state.update(_orden_elegida=True)
+            )
 
-                if filtro_marca != "Todos":
-                    df_filtros = df_filtros[df_filtros["marca"] == filtro_marca]
+            # Si cambia la orden, actualizar placa
+            if st.session_state.get("venta_abierta_id") != venta_sel:
+                st.session_state["venta_abierta_id"] = venta_sel
 
-            # --- CATEGORÍA ---
-            with col_categoria:
-                categorias = ["Todos"] + sorted(df_filtros["categoria"].dropna().unique().tolist())
-                filtro_categoria = st.selectbox("Categoría", categorias, key="filtro_categoria")
+                placa = df_abiertas.loc[
+                    df_abiertas["orden"] == venta_sel, "placa"
+                ].values[0]
 
-                if filtro_categoria != "Todos":
-                    df_filtros = df_filtros[df_filtros["categoria"] == filtro_categoria]
+                st.session_state["placa_vehiculo"] = placa
 
-            # --- STOCK ---
-            with col_stock:
-                filtro_stock = st.selectbox("Stock", ["Todos", "Con stock", "Sin stock"], key="filtro_stock")
+            # La placa y el carrito están fuera de este fragmento
+            if st.session_state.pop("_orden_elegida", False):
+                st.rerun()
 
-        criterio = st.text_input(
-            "Buscar por palabra clave (código, descripción, modelo, etc.)",
-            key="criterio_busqueda"
+        with col_del:
+            if st.button("❌ Eliminar", key="eliminar_venta"):
+                try:
+                    eliminar_venta_abierta(st.session_state["venta_abierta_id"])
+                    descartar_cambios_taller(st.session_state["venta_abierta_id"])
+                    st.success(f"Orden #{st.session_state['venta_abierta_id']} eliminada correctamente")
+                    st.session_state.pop("venta_abierta_id", None)
+                    st.session_state["placa_vehiculo"] = ""
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"No se pudo eliminar la orden: {str(e)}")
+    else:
+        st.info("No hay servicios en curso")
+
+
+# ===============================
+# BÚSQUEDA DE PRODUCTOS
+# ===============================
+@st.fragment
+def panel_busqueda(permite_negativo):
+    """
+    Filtros, búsqueda en el catálogo en memoria y datos del producto elegido.
+    Deja la selección en session_state["producto_pos"] para el carrito.
+    """
+    st.markdown("### ➕ Agregar productos")
+
+    with st.expander("Filtros de productos"):
+        df_filtros = obtener_filtros_productos()
+
+        # Crear columnas para los tres filtros
+        col_marca, col_categoria, col_stock = st.columns([1,1,1])  # proporciones ajustables
+
+        # --- MARCA ---
+        with col_marca:
+            marcas = ["Todos"] + sorted(df_filtros["marca"].dropna().unique().tolist())
+            filtro_marca = st.selectbox("Marca", marcas, key="filtro_marca")
+
+            if filtro_marca != "Todos":
+                df_filtros = df_filtros[df_filtros["marca"] == filtro_marca]
+
+        # --- CATEGORÍA ---
+        with col_categoria:
+            categorias = ["Todos"] + sorted(df_filtros["categoria"].dropna().unique().tolist())
+            filtro_categoria = st.selectbox("Categoría", categorias, key="filtro_categoria")
+
+            if filtro_categoria != "Todos":
+                df_filtros = df_filtros[df_filtros["categoria"] == filtro_categoria]
+
+        # --- STOCK ---
+        with col_stock:
+            filtro_stock = st.selectbox("Stock", ["Todos", "Con stock", "Sin stock"], key="filtro_stock")
+
+    criterio = st.text_input(
+        "Buscar por palabra clave (código, descripción, modelo, etc.)",
+        key="criterio_busqueda"
+    )
+
+    LIMITE_INICIAL = 20
+
+    hay_filtros = any([
+        bool(criterio),
+        filtro_marca != "Todos",
+        filtro_categoria != "Todos",
+        filtro_stock != "Todos"
+    ])
+
+    df_prod = pd.DataFrame()
+    total_productos = 0
+
+    if hay_filtros:
+        # Búsqueda en el índice del catálogo en memoria (sin ir a la BD)
+        catalogo = obtener_catalogo()
+        resultado = catalogo.buscar(
+            criterio,
+            filtro_marca,
+            filtro_categoria,
+            filtro_stock,
+            limit=LIMITE_INICIAL
         )
+        total_productos = resultado["total"]
+        df_prod = resultado["productos"]
 
-        LIMITE_INICIAL = 20
-
-        hay_filtros = any([
-            bool(criterio),
-            filtro_marca != "Todos",
-            filtro_categoria != "Todos",
-            filtro_stock != "Todos"
-        ])
-
-        df_prod = pd.DataFrame()
-        total_productos = 0
-
-        if hay_filtros:
-            total_productos = contar_productos(
-                criterio,
-                filtro_marca,
-                filtro_categoria,
-                filtro_stock
-            )
+        ver_todos = st.checkbox(
+            f"📄 Ver todos los resultados ({total_productos})"
+        )
 
-            ver_todos = st.checkbox(
-                f"📄 Ver todos los resultados ({total_productos})"
+        if ver_todos:
+            # Páginas por id (keyset): cada página cuesta lo mismo sin importar el total
+            df_prod = paginador(
+                "paginas_productos_pos",
+                (criterio, filtro_marca, filtro_categoria, filtro_stock),
+                lambda despues_de, tamano: catalogo.listar_pagina(
+                    criterio,
+                    filtro_marca,
+                    filtro_categoria,
+                    filtro_stock,
+                    despues_de=despues_de,
+                    tamano=tamano
+                ),
+                total=total_productos,
+                tamano=LIMITE_INICIAL
             )
 
-            limite = total_productos if ver_todos else LIMITE_INICIAL
+    if df_prod.empty: 
+        st.warning("⚠️ No hay productos disponibles con esos filtros.")
+        publicar_producto_pos(None)
+    else:
+        productos_dict = {}
+        for row in df_prod.itertuples():
+            stock = to_float(row.stock_actual, 0.0)
 
-            df_prod = buscar_producto_avanzado(
-                criterio,
-                filtro_marca,
-                filtro_categoria,
-                filtro_stock,
-                limit=limite
-            )
+            stock_label = f"{stock:.2f}" if stock > 0 else "SIN STOCK"
 
-        if df_prod.empty: 
-            st.warning("⚠️ No hay productos disponibles con esos filtros.")
-        else:
-            productos_dict = {}
-            for row in df_prod.itertuples():
-                stock = to_float(row.stock_actual, 0.0)
+            label = f"{row.id} | {row.descripcion} | Stock: {stock_label}"
+            productos_dict[label] = row
 
-                stock_label = f"{stock:.2f}" if stock > 0 else "SIN STOCK"
+        opciones = list(productos_dict.keys())
 
-                label = f"{row.id} | {row.descripcion} | Stock: {stock_label}"
-                productos_dict[label] = row
-            
-            opciones = list(productos_dict.keys())
+        producto_sel = st.selectbox(
+            "📦 Selecciona un producto",
+            opciones,
+            index=0 if opciones else None
+        )
 
-            producto_sel = st.selectbox(
-                "📦 Selecciona un producto",
-                opciones,
-                index=0 if opciones else None
+        if producto_sel not in productos_dict:
+            st.warning("🔄 La selección cambió, vuelve a elegir el producto.")
+            publicar_producto_pos(None)
+            return
+
+        row = productos_dict[producto_sel]
+        id_producto = row.id
+        desc_producto = row.descripcion
+        stock_disp = to_float(row.stock_actual)
+        costo = to_float(row.costo_promedio)
+        margen = to_float(row.margen_utilidad) * 100
+
+        st.write("### 📋 Detalles del producto")
+        st.write(f"🔢 Código: {id_producto}")
+        st.write(f"🧾 Descripción: {desc_producto}")
+        st.write(f"🏭 Marca: {row.marca}")
+        st.write(f"📖 Catálogo: {row.catalogo}")
+
+        # --- Validar y asegurar precio base correcto ---
+        try:
+            precio_base = max(to_float(row.precio_venta, 0.0), 0.0)
+        except (ValueError, TypeError):
+            precio_base = 0.01
+
+        # --- Mostrar datos de precio y stock ---
+        st.write(f"💲 Precio base: {precio_base:.2f} - Costo promedio: {costo:.2f} - Margen: {margen:.1f}%")
+        st.write(f"📦 Stock disponible: {stock_disp:.2f}")
+
+        # --- Cantidad y precio en la misma fila ---
+        col_cant, col_prec = st.columns([1, 1])
+
+        with col_cant:
+            if stock_disp > 0 or permite_negativo:
+                cantidad = st.number_input(
+                    "📌 Cantidad",
+                    min_value=1.0,
+                    max_value=None if permite_negativo else stock_disp,
+                    step=1.0,        # ← SOLO controla + / -
+                    value=1.0,
+                    format="%.2f"
+                )
+            else:
+                st.error("❌ No hay stock disponible para este producto.")
+                cantidad = 0.0
+
+        with col_prec:
+            precio_unit = st.number_input(
+                "💰 Precio de venta unitario",
+                min_value=0.0,
+                step=0.10,
+                value=precio_base,
+                format="%.2f"
             )
 
-            if producto_sel not in productos_dict:
-                st.warning("🔄 La selección cambió, vuelve a elegir el producto.")
-                st.stop()
-
-            row = productos_dict[producto_sel]
-            id_producto = row.id
-            desc_producto = row.descripcion
-            stock_disp = to_float(row.stock_actual)
-            costo = to_float(row.costo_promedio)
-            margen = to_float(row.margen_utilidad) * 100
+        # --- Validación del precio respecto al costo ---
+        if not precio_valido(precio_unit, costo):
+            st.warning(f"⚠️ El precio ingresado ({precio_unit:.2f}) es menor al costo ({costo:.2f}).")
+
+        # Lo que "Agregar a la venta" (en el panel del carrito) lleva
+        publicar_producto_pos({
+            "id": id_producto,
+            "descripcion": desc_producto,
+            "cantidad": cantidad,
+            "precio": precio_unit,
+            "costo": costo,
+        })
+
+
+def publicar_producto_pos(producto):
+    """
+    Deja el producto elegido en session_state["producto_pos"]. El botón
+    "Agregar a la venta" está en otro fragmento (el carrito), que no se
+    vuelve a dibujar cuando solo corre la búsqueda: si el producto aparece
+    o desaparece, se vuelve a ejecutar la página para habilitar o
+    deshabilitar el botón.
+    """
+    st.session_state["producto_pos"] = producto
+    habilitado = st.session_state.get("_agregar_habilitado")
+    if habilitado is not None and habilitado != (producto is not None):
+        st.session_state["_agregar_habilitado"] = producto is not None
+        st.rerun(scope="app")
+
+
+# ===============================
+# CARRITO
+# ===============================
+@st.fragment
+def panel_carrito(tipo_venta, permite_negativo, datos_cobro):
+    """
+    Agregar el producto elegido en la búsqueda, lector de código de barras y
+    carrito (POS en sesión; Taller desde la copia en memoria de la orden).
+    Agregar o escanear solo vuelve a ejecutar este panel y el de cobro.
+    """
+    producto = st.session_state.get("producto_pos")
+    st.session_state["_agregar_habilitado"] = producto is not None
+
+    if st.button("➕ Agregar a la venta", disabled=producto is None):
+        if producto is None:
+            st.warning("⚠️ Primero selecciona un producto.")
+        elif producto["cantidad"] <= 0:
+            st.error("❌ No hay stock disponible para este producto.")
+        elif not precio_valido(producto["precio"], producto["costo"]):
+            st.warning(f"⚠️ El precio ingresado ({producto['precio']:.2f}) es menor al costo ({producto['costo']:.2f}).")
+        elif tipo_venta == "Taller" and not st.session_state.get("venta_abierta_id"):
+            st.error("❌ Primero debes abrir una orden de servicio")
+        else:
+            if tipo_venta == "Taller":
+                # Se anota en la sesión: la orden se actualiza en un solo
+                # viaje con "Guardar cambios"
+                anotar_cambio_taller(
+                    st.session_state["venta_abierta_id"], "agregar", producto["id"],
+                    cantidad=producto["cantidad"], precio_unitario=producto["precio"],
+                    descripcion=producto["descripcion"]
+                )
 
-            st.write("### 📋 Detalles del producto")
-            st.write(f"🔢 Código: {id_producto}")
-            st.write(f"🧾 Descripción: {desc_producto}")
-            st.write(f"🏭 Marca: {row.marca}")
-            st.write(f"📖 Catálogo: {row.catalogo}")
+            else:  # POS
+                st.session_state.carrito_ventas.append({
+                    "ID Producto": producto["id"],
+                    "Descripción": producto["descripcion"],
+                    "Cantidad": producto["cantidad"],
+                    "Precio Unitario": producto["precio"],
+                    "Subtotal": round(producto["cantidad"] * producto["precio"], 2)
+                })
+
+            st.success("Producto agregado correctamente")
+
+    # --- Lector de código de barras: Enter agrega 1 unidad ---
+    st.text_input(
+        "📷 Código de barras",
+        key="codigo_escaneado",
+        placeholder="Escanee o escriba el código y presione Enter",
+        on_change=procesar_codigo_escaneado,
+        args=(tipo_venta, permite_negativo)
+    )
+    mensaje_escaneo = st.session_state.pop("_mensaje_escaneo", None)
+    if mensaje_escaneo:
+        tipo_mensaje, texto_mensaje = mensaje_escaneo
+        if tipo_mensaje == "ok":
+            st.success(texto_mensaje)
+        else:
+            st.error(texto_mensaje)
 
-            # --- Validar y asegurar precio base correcto ---
-            try:
-                precio_base = max(to_float(row.precio_venta, 0.0), 0.0)
-            except (ValueError, TypeError):
-                precio_base = 0.01
+    # --- Mostrar carrito ---
+    st.subheader("🛒 Carrito de Venta")
+    pendientes = []  # cambios de la orden de taller sin guardar
 
-            # --- Mostrar datos de precio y stock ---
-            st.write(f"💲 Precio base: {precio_base:.2f} - Costo promedio: {costo:.2f} - Margen: {margen:.1f}%")
-            st.write(f"📦 Stock disponible: {stock_disp:.2f}")
+    if tipo_venta == "POS":
+        if st.session_state.pop("_carrito_vaciado", False):
+            df_carrito = pd.DataFrame()
+        else:
+            df_carrito = pd.DataFrame(st.session_state.carrito_ventas)
+    else:
+        if "venta_abierta_id" not in st.session_state:
+            st.info("Abra o seleccione una orden de servicio")
+            df_carrito = pd.DataFrame()
+        else:
+            df_carrito = obtener_detalle_venta(
+                st.session_state["venta_abierta_id"],
+                version=st.session_state.get("versiones_orden", {}).get(st.session_state["venta_abierta_id"])
+            )
+            pendientes = cambios_taller(st.session_state["venta_abierta_id"])
+            if pendientes:
+                # La orden como quedará al guardar los cambios anotados
+                df_carrito = proyectar_cambios(df_carrito, pendientes)
+
+    if df_carrito.empty:
+        st.info("🧹 Carrito vacío")
+    else:
+        # 🔹 RENOMBRAR COLUMNAS PARA MOSTRAR
+        columnas_cortas = {
+            "ID Producto": "ID",
+            "Cantidad": "Cant.",
+            "Precio Unitario": "P.U.",
+            "Descripción": "Descripción",
+            "Subtotal": "Subt.",
+            "Por guardar": "🕓"
+        }
+        df_mostrar = df_carrito.rename(columns=columnas_cortas)
+
+        st.dataframe(df_mostrar, hide_index=True, width='stretch')
+
+    # --- Cambios de la orden (SOLO TALLER): se anotan y se guardan juntos ---
+    if tipo_venta == "Taller" and "venta_abierta_id" in st.session_state:
+        id_orden = st.session_state["venta_abierta_id"]
 
-            # --- Cantidad y precio en la misma fila ---
-            col_cant, col_prec = st.columns([1, 1])
+        if not df_carrito.empty:
+            col_sel, col_cant, col_cambiar, col_btn = st.columns([3, 1.2, 1.2, 1])
 
+            with col_sel:
+                producto_editar = st.selectbox(
+                    "Código",
+                    df_carrito["ID Producto"].unique().tolist(),
+                    help="Seleccione el código del producto a modificar o eliminar",
+                    label_visibility="collapsed"
+                )
             with col_cant:
-                if stock_disp > 0:
-                    cantidad = st.number_input(
-                        "📌 Cantidad",
-                        min_value=1.0,
-                        max_value=stock_disp,
-                        step=1.0,        # ← SOLO controla + / -
-                        value=1.0,
-                        format="%.2f"
-                    )
-                else:
-                    st.error("❌ No hay stock disponible para este producto.")
-                    cantidad = 0.0
-
-            with col_prec:
-                precio_unit = st.number_input(
-                    "💰 Precio de venta unitario",
+                cantidad_nueva = st.number_input(
+                    "Cantidad",
                     min_value=0.0,
-                    step=0.10,
-                    value=precio_base,
-                    format="%.2f"
+                    step=1.0,
+                    value=float(df_carrito.loc[
+                        df_carrito["ID Producto"] == producto_editar, "Cantidad"
+                    ].sum()),
+                    key=f"cantidad_orden_{producto_editar}",
+                    label_visibility="collapsed"
+                )
+            # Callbacks: corren antes que el panel, que se redibuja ya con el cambio
+            with col_cambiar:
+                st.button(
+                    "✏️ Cambiar cantidad",
+                    key=f"cambiar_producto_{producto_editar}",
+                    on_click=lambda: anotar_cambio_taller(
+                        id_orden, "cantidad", producto_editar,
+                        cantidad=st.session_state[f"cantidad_orden_{producto_editar}"]
+                    )
+                )
+            with col_btn:
+                st.button(
+                    "❌ Eliminar",
+                    key=f"eliminar_producto_{producto_editar}",
+                    type="secondary",
+                    on_click=anotar_cambio_taller,
+                    args=(id_orden, "quitar", producto_editar)
                 )
 
-            # --- Validación del precio respecto al costo ---
-            # Validación para agregar al carrito
-            boton_carrito = True
-            if not precio_valido(precio_unit, costo):
-                st.warning(f"⚠️ El precio ingresado ({precio_unit:.2f}) es menor al costo ({costo:.2f}).")
-                boton_carrito = False
-            else:
-                boton_carrito = True
+        if pendientes:
+            col_aviso, col_guardar, col_descartar = st.columns([3, 1.2, 1])
+            with col_aviso:
+                st.warning(f"🕓 {len(pendientes)} cambio(s) sin guardar en la orden #{id_orden}")
+            with col_guardar:
+                if st.button("💾 Guardar cambios", type="primary", key="guardar_cambios_orden"):
+                    try:
+                        guardar_cambios_taller(id_orden)
+                        # El tablero de órdenes muestra el total nuevo
+                        st.rerun()
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+            with col_descartar:
+                st.button(
+                    "↩️ Descartar",
+                    key="descartar_cambios_orden",
+                    on_click=descartar_cambios_taller,
+                    args=(id_orden,)
+                )
 
-            if st.button("➕ Agregar a la venta", disabled=not boton_carrito):
-                if tipo_venta == "Taller":
-                    df_abiertas = obtener_ventas_abiertas()
-                    if "venta_abierta_id" not in st.session_state:
-                        st.error("❌ Primero debes abrir una orden de servicio")
-                        st.stop()
+    panel_cobro(tipo_venta, df_carrito, pendientes, **datos_cobro)
 
-                    agregar_item_venta(
-                        id_venta=st.session_state["venta_abierta_id"],
-                        id_producto=id_producto,
-                        cantidad=cantidad,
-                        precio_unit=precio_unit
-                    )
 
-                else:  # POS
-                    st.session_state.carrito_ventas.append({
-                        "ID Producto": id_producto,
-                        "Descripción": desc_producto,
-                        "Cantidad": cantidad,
-                        "Precio Unitario": precio_unit,
-                        "Subtotal": round(cantidad * precio_unit, 2)
-                    })
-            
-                st.success("Producto agregado correctamente")
+# ===============================
+# COBRO
+# ===============================
+@st.fragment
+def panel_cobro(tipo_venta, df_carrito, pendientes, regimen, tipo_comprobante, serie,
+                nro_comprobante, metodo_pago, cliente, usuario, cola):
+    """Totales, vuelto y botones de guardar / imprimir / finalizar."""
 
-        # --- Mostrar carrito ---
-        st.subheader("🛒 Carrito de Venta")
+    valor_venta_dec = Decimal("0.00")
 
+    if not df_carrito.empty:
         if tipo_venta == "POS":
-            if st.session_state.pop("_carrito_vaciado", False):
-                df_carrito = pd.DataFrame()
-            else:
-                df_carrito = pd.DataFrame(st.session_state.carrito_ventas)
+            valor_venta_dec = obtener_valor_venta(
+                carrito=st.session_state.carrito_ventas
+            )
+        elif pendientes:
+            valor_venta_dec = obtener_valor_venta(carrito=df_carrito.to_dict("records"))
         else:
-            if "venta_abierta_id" not in st.session_state:
-                st.info("Abra o seleccione una orden de servicio")
-                df_carrito = pd.DataFrame()
-            else:
-                df_carrito = obtener_detalle_venta(st.session_state["venta_abierta_id"])
+            valor_venta_dec = obtener_valor_venta(
+                id_venta=st.session_state["venta_abierta_id"]
+            )
 
-        if df_carrito.empty:
-            st.info("🧹 Carrito vacío")
-        else:
-            # 🔹 RENOMBRAR COLUMNAS PARA MOSTRAR
-            columnas_cortas = {
-                "ID Producto": "ID",
-                "Cantidad": "Cant.",
-                "Precio Unitario": "P.U.",
-                "Descripción": "Descripción",
-                "Subtotal": "Subt."
-            }
-            df_mostrar = df_carrito.rename(columns=columnas_cortas)
-
-            st.dataframe(df_mostrar, hide_index=True, width='stretch')
-        
-        # --- Eliminar producto del servicio (SOLO TALLER) ---
-        if tipo_venta == "Taller" and not df_carrito.empty:
+        totales = calcular_totales(valor_venta_dec, regimen)
 
-            col_sel, col_btn = st.columns([3, 1])
+        op_gravada = float(totales["op_gravada"])
+        igv = float(totales["igv"])
+        total = float(totales["total"])
 
-            with col_sel:
-                producto_eliminar = st.selectbox(
-                    "Código",
-                    df_carrito["ID Producto"].tolist(),
-                    help="Seleccione el código del producto a eliminar",
-                    label_visibility="collapsed"
-                )
+        # Expander para detalles de la venta
+        with st.expander("Detalle Venta"):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("💵 Valor Venta", f"S/. {valor_venta_dec:,.2f}")
+            with col2:
+                st.metric("💰 Op. Gravada", f"S/. {op_gravada:,.2f}")
+            with col3:
+                st.metric("💸 IGV (18%)", f"S/. {igv:,.2f}")
+
+        # Mostrar solo el total de forma principal
+        st.metric("🧾 Total", f"S/. {total:,.2f}")
+
+        # ============================
+        # Calculadora de cambio (solo efectivo)
+        # ============================
+        pago_cliente = 0.0
+        vuelto = 0.0
+
+        if metodo_pago == "Efectivo":
+            pago_cliente = st.number_input(
+                "💰 Monto entregado por el cliente",
+                min_value=0.0,
+                step=0.1,
+                format="%.2f",
+                key="pago_cliente"
+            )
 
-            with col_btn:
-                if st.button("❌ Eliminar", key=f"eliminar_producto_{producto_eliminar}", type="secondary"):
-                    eliminar_item_servicio(
-                        st.session_state["venta_abierta_id"],
-                        producto_eliminar
-                    )
-                    st.success("Producto eliminado")
-                    st.rerun()
+            if pago_cliente > 0:
+                if pago_cliente >= total:
+                    vuelto = round(pago_cliente - total, 2)
+                    st.success(f"💸 Vuelto: S/. {vuelto:,.2f}")
+                else:
+                    st.warning("⚠️ El pago es menor al total")
 
-        valor_venta_dec = Decimal("0.00")
+        st.session_state.setdefault("venta_guardada", False)
+        st.session_state.setdefault("pdf_generado", False)
+        st.session_state.setdefault("ruta_pdf", None)
 
-        if not df_carrito.empty:
-            if tipo_venta == "POS":
-                valor_venta_dec = obtener_valor_venta(
-                    carrito=st.session_state.carrito_ventas
-                )
-            else:
-                valor_venta_dec = obtener_valor_venta(
-                    id_venta=st.session_state["venta_abierta_id"]
-                )
+        carrito_validacion = (
+            st.session_state.carrito_ventas
+            if tipo_venta == "POS"
+            else df_carrito.to_dict("records")
+        )
 
-            totales = calcular_totales(valor_venta_dec, regimen)
+        puede_guardar, motivo = puede_guardar_venta(
+            carrito=carrito_validacion, 
+            metodo_pago=metodo_pago, 
+            total=total, 
+            pago_cliente=pago_cliente
+        )
 
-            op_gravada = float(totales["op_gravada"])
-            igv = float(totales["igv"])
-            total = float(totales["total"])
-        
-            # Expander para detalles de la venta
-            with st.expander("Detalle Venta"):
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("💵 Valor Venta", f"S/. {valor_venta_dec:,.2f}")
-                with col2:
-                    st.metric("💰 Op. Gravada", f"S/. {op_gravada:,.2f}")
-                with col3:
-                    st.metric("💸 IGV (18%)", f"S/. {igv:,.2f}")
-
-            # Mostrar solo el total de forma principal
-            st.metric("🧾 Total", f"S/. {total:,.2f}")
-
-            # ============================
-            # Calculadora de cambio (solo efectivo)
-            # ============================
-            pago_cliente = 0.0
-            vuelto = 0.0
-            
-            if metodo_pago == "Efectivo":
-                pago_cliente = st.number_input(
-                    "💰 Monto entregado por el cliente",
-                    min_value=0.0,
-                    step=0.1,
-                    format="%.2f",
-                    key="pago_cliente"
-                )
+        # ============================
+        # VALIDACIÓN DE CAJA ABIERTA
+        # ============================
+        hay_caja_abierta = "caja_abierta_id" in st.session_state
 
-                if pago_cliente > 0:
-                    if pago_cliente >= total:
-                        vuelto = round(pago_cliente - total, 2)
-                        st.success(f"💸 Vuelto: S/. {vuelto:,.2f}")
-                    else:
-                        st.warning("⚠️ El pago es menor al total")
-            
-            st.session_state.setdefault("venta_guardada", False)
-            st.session_state.setdefault("pdf_generado", False)
-            st.session_state.setdefault("ruta_pdf", None)
-
-            carrito_validacion = (
-                st.session_state.carrito_ventas
-                if tipo_venta == "POS"
-                else df_carrito.to_dict("records")
-            )
+        if pendientes:
+            st.info("ℹ️ Guarde los cambios de la orden antes de cobrar")
 
-            puede_guardar, motivo = puede_guardar_venta(
-                carrito=carrito_validacion, 
-                metodo_pago=metodo_pago, 
-                total=total, 
-                pago_cliente=pago_cliente
-            )
+        disabled_guardar = (
+            not puede_guardar
+            or bool(pendientes)
+            or not hay_caja_abierta
+            or st.session_state.get("venta_guardada", False)
+        )
 
-            # ============================
-            # VALIDACIÓN DE CAJA ABIERTA
-            # ============================
-            hay_caja_abierta = "caja_abierta_id" in st.session_state
+        # 🔒 Lock para evitar doble guardado
+        st.session_state.setdefault("guardando_venta", False)
 
-            disabled_guardar = (
-                not puede_guardar
-                or not hay_caja_abierta
-                or st.session_state.get("venta_guardada", False)
-            )
+        # ℹ️ Feedback de validación (NO es error)
+        if not puede_guardar and motivo:
+            st.info(f"ℹ️ {motivo}")
 
-            # 🔒 Lock para evitar doble guardado
-            st.session_state.setdefault("guardando_venta", False)
+        if st.session_state["guardando_venta"]:
+            st.info("⏳ Guardando venta, por favor espere...")
+        # Venta de la cola local: el ticket sale de la BD cuando ya llegó
+        if st.session_state.get("venta_encolada") and "venta_actual_id" not in st.session_state:
+            id_sincronizada = obtener_cola().id_venta(st.session_state["venta_encolada"])
+            if id_sincronizada:
+                st.session_state["venta_actual_id"] = id_sincronizada
 
-            # ℹ️ Feedback de validación (NO es error)
-            if not puede_guardar and motivo:
-                st.info(f"ℹ️ {motivo}")
+        # ============================
+        # BOTONES EN UNA SOLA FILA
+        # ============================
+        col1, col2, col3, col4, col5, col6 = st.columns([1, 1.4, 1.4, 1.4, 1.4, 1])
 
-            if st.session_state["guardando_venta"]:
-                st.info("⏳ Guardando venta, por favor espere...")
-            # ============================
-            # BOTONES EN UNA SOLA FILA
-            # ============================
-            col1, col2, col3, col4, col5, col6 = st.columns([1, 1.4, 1.4, 1.4, 1.4, 1])
+        with col1:
+            if tipo_venta == "POS":
+                if st.button("🗑 Vaciar carrito", disabled=st.session_state.get("venta_guardada", False),
+                    on_click=vaciar_carrito_pos,
+                    key="vaciar_pos"
+                ):
+                    # El carrito está en otro panel
+                    st.rerun()
 
-            with col1:
-                if tipo_venta == "POS":
-                    st.button("🗑 Vaciar carrito", disabled=st.session_state.get("venta_guardada", False),
-                        on_click=vaciar_carrito_pos,
-                        key="vaciar_pos"
-                    )
+            if tipo_venta == "Taller":
+                if st.button("🗑 Vaciar carrito"):
+                    eliminar_items_servicio(st.session_state["venta_abierta_id"])
+                    descartar_cambios_taller(st.session_state["venta_abierta_id"])
+                    st.success("Se limpio correctamente")
+                    st.rerun() 
+        with col2:    
+            if st.button(
+                "💾 Guardar venta",
+                type="primary",
+                disabled=disabled_guardar or st.session_state["guardando_venta"]
+            ):
+                # 🔒 ACTIVAR LOCK INMEDIATO
+                st.session_state["guardando_venta"] = True
 
-                if tipo_venta == "Taller":
-                    if st.button("🗑 Vaciar carrito"):
-                        eliminar_items_servicio(st.session_state["venta_abierta_id"])
-                        st.success("Se limpio correctamente")
-                        st.rerun() 
-            with col2:    
-                if st.button(
-                    "💾 Guardar venta",
-                    type="primary",
-                    disabled=disabled_guardar or st.session_state["guardando_venta"]
-                ):
-                    # 🔒 ACTIVAR LOCK INMEDIATO
-                    st.session_state["guardando_venta"] = True
+                try:
+                    if "caja_abierta_id" not in st.session_state:
+                        st.error("❌ No hay caja abierta")
+                        st.stop()
 
-                    try:
-                        if "caja_abierta_id" not in st.session_state:
-                            st.error("❌ No hay caja abierta")
-                            st.stop()
+                    if tipo_venta == "Taller" and not st.session_state["placa_vehiculo"]:
+                        st.error("❌ La orden de taller debe tener placa")
+                        st.stop()
 
-                        if tipo_venta == "Taller" and not st.session_state["placa_vehiculo"]:
-                            st.error("❌ La orden de taller debe tener placa")
-                            st.stop()
+                    #fecha = obtener_fecha_lima()
 
-                        #fecha = obtener_fecha_lima()
+                    carrito_guardar = (
+                        st.session_state.carrito_ventas
+                        if tipo_venta == "POS"
+                        else None  # Taller se guarda desde BD
+                    )
 
-                        carrito_guardar = (
-                            st.session_state.carrito_ventas
-                            if tipo_venta == "POS"
-                            else None  # Taller se guarda desde BD
-                        )
+                    if st.session_state.get("venta_guardada"):
+                        st.warning("⚠️ Esta venta ya fue guardada")
+                        st.stop()
 
-                        if st.session_state.get("venta_guardada"):
-                            st.warning("⚠️ Esta venta ya fue guardada")
-                            st.stop()
-                            
-                        id_venta = guardar_venta(
+                    if cola:
+                        id_externo, nro_encolado = encolar_venta(
                             cliente=cliente,
                             regimen=regimen,
                             tipo_comprobante=tipo_comprobante,
                             metodo_pago=metodo_pago,
                             nro_comprobante=nro_comprobante,
+                            serie=serie,
                             placa_vehiculo=st.session_state["placa_vehiculo"],
                             pago_cliente=pago_cliente,
                             vuelto=vuelto,
                             carrito=carrito_guardar,
                             usuario=usuario,
-                            id_caja=st.session_state["caja_abierta_id"],
-                            id_venta_existente=st.session_state.get("venta_abierta_id")
+                            id_caja=st.session_state["caja_abierta_id"]
                         )
-                        st.session_state["venta_actual_id"] = id_venta
+                        st.session_state["venta_encolada"] = id_externo
                         st.session_state["venta_guardada"] = True
                         st.session_state["guardando_venta"] = False
-                        st.success(f"✅ Venta registrada (ID {id_venta})")
+                        st.success(f"✅ Venta registrada ({nro_encolado or 'N° al sincronizar'})")
                         st.rerun()
-                    except Exception as e:
-                        # 🔓 LIBERAR LOCK SI FALLA
-                        st.session_state["guardando_venta"] = False
-                        st.error(f"❌ Error al guardar la venta: {e}")
-
-            with col3:
-                if st.button("🧾 Imprimir", disabled=not st.session_state.get("venta_guardada", False)):
-                    if "venta_actual_id" in st.session_state:
-                        html = generar_ticket_html(
-                            st.session_state["venta_actual_id"]
-                        )
 
-                        auto_print_html = f"""
-                        <iframe id="printFrame" style="display:none;"></iframe>
-                        <script>
-                            const frame = document.getElementById("printFrame");
-                            frame.contentDocument.open();
-                            frame.contentDocument.write(`{html}`);
-                            frame.contentDocument.close();
-                            frame.onload = function () {{
-                                frame.contentWindow.focus();
-                                frame.contentWindow.print();
-                            }};
-                        </script>
-                        """
-                        components.html(auto_print_html, height=0)
-            with col4:
-                if st.button("🔁 Reimprimir", disabled=not st.session_state.get("venta_guardada", False)):
-                    if "venta_actual_id" in st.session_state:
-                        registrar_reimpresion(st.session_state["venta_actual_id"], usuario)
-                        html = generar_ticket_html(st.session_state["venta_actual_id"])
-                        components.html(html, height=600)
-            with col5:
-                if not st.session_state["pdf_generado"]:
-                    if st.button(
-                        "📄 Generar PDF",
-                        disabled=not st.session_state["venta_guardada"]
-                    ):
-                        if "venta_actual_id" in st.session_state:
-                            ruta_pdf = f"ticket_{st.session_state['venta_actual_id']}.pdf"
-                            generar_ticket_pdf(st.session_state["venta_actual_id"], ruta_pdf)
-
-                            st.session_state["ruta_pdf"] = ruta_pdf
-                            st.session_state["pdf_generado"] = True
-                        else:
-                            st.warning("Primero guarda la venta")
-                else:
-                    with open(st.session_state["ruta_pdf"], "rb") as f:
-                        st.download_button(
-                            "⬇️ Descargar PDF",
-                            f,
-                            file_name=st.session_state["ruta_pdf"],
-                            mime="application/pdf"
-                        )
-            with col6:
-                if st.button("✔️ Finalizar", disabled=not st.session_state.get("venta_guardada", False)):
-                    resetear_modulo_ventas()
+                    id_venta = guardar_venta(
+                        cliente=cliente,
+                        regimen=regimen,
+                        tipo_comprobante=tipo_comprobante,
+                        metodo_pago=metodo_pago,
+                        nro_comprobante=nro_comprobante,
+                        serie=serie,
+                        placa_vehiculo=st.session_state["placa_vehiculo"],
+                        pago_cliente=pago_cliente,
+                        vuelto=vuelto,
+                        carrito=carrito_guardar,
+                        usuario=usuario,
+                        id_caja=st.session_state["caja_abierta_id"],
+                        id_venta_existente=st.session_state.get("venta_abierta_id")
+                    )
+                    st.session_state["venta_actual_id"] = id_venta
+                    st.session_state["venta_guardada"] = True
+                    st.session_state["guardando_venta"] = False
+                    st.success(f"✅ Venta registrada (ID {id_venta})")
                     st.rerun()
+                except Exception as e:
+                    # 🔓 LIBERAR LOCK SI FALLA
+                    st.session_state["guardando_venta"] = False
+                    st.error(f"❌ Error al guardar la venta: {e}")
 
-            # -------- LIMPIAR BANDERA DE RESET VISUAL --------
-            if st.session_state.get("reset_en_progreso"):
-                st.session_state.pop("reset_en_progreso")
-
-    # ========================
-    # TAB 2: Consultar Ventas
-    # =======================
-    with tabs[1]:
-        st.subheader("📋 Consultar ventas")
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            fecha_ini = st.date_input("Desde", datetime.today().replace(day=1))
-        with col2:
-            fecha_fin = st.date_input("Hasta", datetime.today())
         with col3:
-            comprobante_filtro = st.text_input("N° Comprobante", placeholder="Ej: T-000123")
+            if st.button("🧾 Imprimir", disabled=not st.session_state.get("venta_guardada", False)):
+                if "venta_actual_id" in st.session_state:
+                    html = generar_ticket_html(
+                        st.session_state["venta_actual_id"]
+                    )
 
-        fecha_fin = fecha_fin + timedelta(days=1)
+                    auto_print_html = f"""
+                    <iframe id="printFrame" style="display:none;"></iframe>
+                    <script>
+                        const frame = document.getElementById("printFrame");
+                        frame.contentDocument.open();
+                        frame.contentDocument.write(`{html}`);
+                        frame.contentDocument.close();
+                        frame.onload = function () {{
+                            frame.contentWindow.focus();
+                            frame.contentWindow.print();
+                        }};
+                    </script>
+                    """
+                    components.html(auto_print_html, height=0)
+                else:
+                    st.info("⏳ La venta aún se está sincronizando, intente en unos segundos")
+        with col4:
+            if st.button("🔁 Reimprimir", disabled=not st.session_state.get("venta_guardada", False)):
+                if "venta_actual_id" in st.session_state:
+                    registrar_reimpresion(st.session_state["venta_actual_id"], usuario)
+                    html = generar_ticket_html(st.session_state["venta_actual_id"])
+                    components.html(html, height=600)
+                else:
+                    st.info("⏳ La venta aún se está sincronizando, intente en unos segundos")
+        with col5:
+            if not st.session_state["pdf_generado"]:
+                if st.button(
+                    "📄 Generar PDF",
+                    disabled=not st.session_state["venta_guardada"]
+                ):
+                    if "venta_actual_id" in st.session_state:
+                        ruta_pdf = f"ticket_{st.session_state['venta_actual_id']}.pdf"
+                        generar_ticket_pdf(st.session_state["venta_actual_id"], ruta_pdf)
 
-        query = """
-            SELECT v.id, v.fecha, c.nombre AS cliente, v.nro_comprobante, v.tipo_comprobante, v.metodo_pago, v.total
-            FROM venta v
-            LEFT JOIN cliente c ON v.id_cliente = c.id
-            WHERE v.estado = 'EMITIDA'
-            AND v.fecha >= %s
-            AND v.fecha < %s
-        """
-        params: list[Any] = [fecha_ini, fecha_fin]
-        
-        if comprobante_filtro.strip():
-            query += " AND v.nro_comprobante ILIKE %s"
-            params.append(f"%{comprobante_filtro.strip()}%")
-        
-        query += " ORDER BY v.fecha DESC"
-        df_ventas = query_df(query, params)
+                        st.session_state["ruta_pdf"] = ruta_pdf
+                        st.session_state["pdf_generado"] = True
+                    else:
+                        st.warning("Primero guarda la venta")
+            else:
+                with open(st.session_state["ruta_pdf"], "rb") as f:
+                    st.download_button(
+                        "⬇️ Descargar PDF",
+                        f,
+                        file_name=st.session_state["ruta_pdf"],
+                        mime="application/pdf"
+                    )
+        with col6:
+            if st.button("✔️ Finalizar", disabled=not st.session_state.get("venta_guardada", False)):
+                resetear_modulo_ventas()
+                st.rerun()
+
+
+# ========================
+# TAB 2: Consultar Ventas
+# =======================
+SQL_CONSULTAR_VENTAS = """
+    SELECT v.id, v.fecha, c.nombre AS cliente, v.nro_comprobante, v.tipo_comprobante, v.metodo_pago, v.total
+    FROM venta v
+    LEFT JOIN cliente c ON v.id_cliente = c.id
+    WHERE v.estado = 'EMITIDA'
+    AND v.fecha >= %s
+    AND v.fecha < %s
+"""
+
+def consultar_ventas(usuario):
+    st.subheader("📋 Consultar ventas")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        fecha_ini = st.date_input("Desde", datetime.today().replace(day=1))
+    with col2:
+        fecha_fin = st.date_input("Hasta", datetime.today())
+    with col3:
+        comprobante_filtro = st.text_input("N° Comprobante", placeholder="Ej: T-000123")
+
+    fecha_fin = fecha_fin + timedelta(days=1)
+
+    query = SQL_CONSULTAR_VENTAS
+    params: list[Any] = [fecha_ini, fecha_fin]
+
+    if comprobante_filtro.strip():
+        query += " AND v.nro_comprobante ILIKE %s"
+        params.append(f"%{comprobante_filtro.strip()}%")
+
+    query += " ORDER BY v.fecha DESC"
+    df_ventas = query_df(query, params)
+
+    st.dataframe(df_ventas, width='stretch', hide_index=True)
+
+    # Una o varias (correcciones de fin de día): se anulan todas o ninguna
+    comprobantes = dict(zip(df_ventas["id"], df_ventas["nro_comprobante"]))
+    ventas_anular = st.multiselect(
+        "Ventas a anular",
+        list(comprobantes),
+        format_func=lambda x: f"#{x} · {comprobantes[x] or 'sin N°'}"
+    )
+
+    motivo = st.text_area("Motivo de anulación (obligatorio)")
+
+    if st.button("❌ Anular venta", disabled=not ventas_anular):
+        if not motivo.strip():
+            st.error("Debe ingresar un motivo")
+        else:
+            try:
+                from services.venta_service import anular_ventas
+                anular_ventas(ventas_anular, motivo, usuario)
+                st.success(f"{len(ventas_anular)} venta(s) anulada(s) correctamente")
+                st.rerun()
+            except Exception as e:
+                st.error(str(e))
 
-        st.dataframe(df_ventas, width='stretch', hide_index=True)
 
-        venta_id_anular = st.number_input(
-            "ID de venta a anular",
-            min_value=1,
-            step=1
-        )
+# =======================
+# TAB 3: Comprobante
+# =======================
+def ver_comprobante(usuario):
+    st.subheader("📄 Comprobante")
 
-        motivo = st.text_area("Motivo de anulación (obligatorio)")
+    nro_comprobante = st.text_input(
+        "Número de comprobante",
+        placeholder="Ej: T-00005, T*05, T*05*"
+    ).strip()
 
-        if st.button("❌ Anular venta"):
-            if not motivo.strip():
-                st.error("Debe ingresar un motivo")
-            else:
-                try:
-                    from services.venta_service import anular_venta
-                    anular_venta(venta_id_anular, motivo, usuario)
-                    st.success("Venta anulada correctamente")
-                    st.rerun()
-                except Exception as e:
-                    st.error(str(e))
-    # =======================
-    # TAB 3: Comprobante
-    # =======================
-    with tabs[2]:
-        st.subheader("📄 Comprobante")
+    if nro_comprobante:
+        resultados = buscar_comprobantes(nro_comprobante)
 
-        nro_comprobante = st.text_input(
-            "Número de comprobante",
-            placeholder="Ej: T-00005, T*05, T*05*"
-        ).strip()
+        if not resultados:
+            st.session_state.pop("ver_comprobante_id", None)
+            st.session_state["resultados_comprobantes"] = []
+            st.error("❌ Comprobante no encontrado")
 
-        if nro_comprobante:
-            resultados = buscar_comprobantes(nro_comprobante)
+        elif len(resultados) == 1:
+            st.session_state["ver_comprobante_id"] = resultados[0][0]
+            st.session_state["resultados_comprobantes"] = []
 
-            if not resultados:
-                st.session_state.pop("ver_comprobante_id", None)
-                st.session_state["resultados_comprobantes"] = []
-                st.error("❌ Comprobante no encontrado")
+        else:
+            st.session_state.pop("ver_comprobante_id", None)
+            st.session_state["resultados_comprobantes"] = resultados
 
-            elif len(resultados) == 1:
-                st.session_state["ver_comprobante_id"] = resultados[0][0]
-                st.session_state["resultados_comprobantes"] = []
+    # --- TABLA DE RESULTADOS (cuando hay varios) ---
+    if st.session_state.get("resultados_comprobantes"):
+        st.info("🔎 Se encontraron varios comprobantes")
 
-            else:
-                st.session_state.pop("ver_comprobante_id", None)
-                st.session_state["resultados_comprobantes"] = resultados
+        df = pd.DataFrame(
+            st.session_state["resultados_comprobantes"],
+            columns=["ID", "Comprobante", "Fecha", "Total"]
+        )
 
-        # --- TABLA DE RESULTADOS (cuando hay varios) ---
-        if st.session_state.get("resultados_comprobantes"):
-            st.info("🔎 Se encontraron varios comprobantes")
+        seleccion = st.dataframe(
+            df,
+            hide_index=True,
+            width='stretch',
+            on_select="rerun",
+            selection_mode="single-row"
+        )
 
-            df = pd.DataFrame(
-                st.session_state["resultados_comprobantes"],
-                columns=["ID", "Comprobante", "Fecha", "Total"]
-            )
+        if seleccion and seleccion["selection"]["rows"]:
+            fila = seleccion["selection"]["rows"][0]
+            vid = df.iloc[fila]["ID"]
+            st.session_state["ver_comprobante_id"] = vid
+            st.session_state["resultados_comprobantes"] = []
 
-            seleccion = st.dataframe(
-                df,
-                hide_index=True,
-                width='stretch',
-                on_select="rerun",
-                selection_mode="single-row"
-            )
+    # --- MOSTRAR COMPROBANTE ---
+    if "ver_comprobante_id" in st.session_state:
+        vid = st.session_state["ver_comprobante_id"]
 
-            if seleccion and seleccion["selection"]["rows"]:
-                fila = seleccion["selection"]["rows"][0]
-                vid = df.iloc[fila]["ID"]
-                st.session_state["ver_comprobante_id"] = vid
-                st.session_state["resultados_comprobantes"] = []
+        html = generar_ticket_html(vid)
+        components.html(html, height=600)
 
-        # --- MOSTRAR COMPROBANTE ---
-        if "ver_comprobante_id" in st.session_state:
-            vid = st.session_state["ver_comprobante_id"]
+        col1, col2 = st.columns(2)
 
-            html = generar_ticket_html(vid)
-            components.html(html, height=600)
+        with col1:
+            if st.button("🖨 Reimprimir"):
+                registrar_reimpresion(vid, usuario)
+                st.success("Reimpresión registrada")
+                st.rerun()
 
-            col1, col2 = st.columns(2)
+        with col2:
+            ruta = f"ticket_{vid}.pdf"
+            generar_ticket_pdf(vid, ruta)
+
+            with open(ruta, "rb") as f:
+                st.download_button(
+                    "⬇️ Descargar PDF",
+                    f,
+                    file_name=ruta,
+                    mime="application/pdf"
+                )
 
-            with col1:
-                if st.button("🖨 Reimprimir"):
-                    registrar_reimpresion(vid, usuario)
-                    st.success("Reimpresión registrada")
-                    st.rerun()
 
-            with col2:
-                ruta = f"ticket_{vid}.pdf"
-                generar_ticket_pdf(vid, ruta)
+# =======================
+# TAB 4: Reportes
+# =======================
+def reportes_ventas():
+    st.subheader("📊 Reportes de Ventas")
+    tipo_reporte = st.selectbox("Selecciona reporte", ["Por cliente", "Por producto", "Diario", "Mensual"])
 
-                with open(ruta, "rb") as f:
-                    st.download_button(
-                        "⬇️ Descargar PDF",
-                        f,
-                        file_name=ruta,
-                        mime="application/pdf"
-                    )
-    # =======================
-    # TAB 4: Reportes
-    # =======================
-    with tabs[3]:
-        st.subheader("📊 Reportes de Ventas")
-        tipo_reporte = st.selectbox("Selecciona reporte", ["Por cliente", "Por producto", "Diario", "Mensual"])
-
-        if tipo_reporte == "Por cliente":
-            df = query_df("""
-                SELECT c.nombre AS cliente, SUM(v.total) AS total_ventas
-                FROM venta v
-                LEFT JOIN cliente c ON v.id_cliente = c.id
-                WHERE v.estado = 'EMITIDA'
-                GROUP BY c.nombre
-                ORDER BY total_ventas DESC
-            """)
-            if not df.empty:
-                st.bar_chart(df.set_index("cliente"))
-            else:
-                st.warning("⚠️ No hay datos para mostrar en este reporte")
-
-        elif tipo_reporte == "Por producto":
-            df = query_df("""
-                SELECT p.descripcion, SUM(d.cantidad * d.precio_unitario) AS total_ventas
-                FROM venta_detalle d
-                JOIN venta v ON v.id = d.id_venta
-                JOIN producto p ON d.id_producto = p.id
-                WHERE v.estado = 'EMITIDA'
-                GROUP BY p.descripcion
-                ORDER BY total_ventas DESC
-            """)
-            if not df.empty:
-                st.bar_chart(df.set_index("descripcion"))
-            else:
-                st.warning("⚠️ No hay datos para mostrar en este reporte")
-
-        elif tipo_reporte == "Diario":
-            df = query_df("""
-                SELECT
-                    DATE(fecha) AS dia,
-                    COUNT(*) FILTER (WHERE estado='EMITIDA') AS ventas_emitidas,
-                    COUNT(*) FILTER (WHERE estado='ANULADA') AS ventas_anuladas,
-                    SUM(total) FILTER (WHERE estado='EMITIDA') AS total_vendido
-                FROM venta
-                GROUP BY dia
-                ORDER BY dia
-            """)
-
-            if not df.empty:
-                st.metric("Ventas emitidas", int(df.iloc[-1]["ventas_emitidas"]))
-                st.metric("Ventas anuladas", int(df.iloc[-1]["ventas_anuladas"]))
-                st.metric("Total vendido", f"S/. {df.iloc[-1]['total_vendido'] or 0:,.2f}")
-                st.line_chart(df.set_index("dia"))
-            else:
-                st.warning("⚠️ No hay datos")
-
-        elif tipo_reporte == "Mensual":
-            df = query_df("""
-                SELECT to_char(fecha, 'YYYY-MM') AS mes, SUM(total) AS total_mes
-                FROM venta
-                WHERE estado = 'EMITIDA'
-                GROUP BY mes
-                ORDER BY mes
-            """)
-            if not df.empty:
-                st.line_chart(df.set_index("mes"))
-            else:
-                st.warning("⚠️ No hay datos para mostrar en este reporte")
+    if tipo_reporte == "Por cliente":
+        df = query_df("""
+            SELECT c.nombre AS cliente, SUM(v.total) AS total_ventas
+            FROM venta v
+            LEFT JOIN cliente c ON v.id_cliente = c.id
+            WHERE v.estado = 'EMITIDA'
+            GROUP BY c.nombre
+            ORDER BY total_ventas DESC
+        """)
+        if not df.empty:
+            st.bar_chart(df.set_index("cliente"))
+        else:
+            st.warning("⚠️ No hay datos para mostrar en este reporte")
+
+    elif tipo_reporte == "Por producto":
+        df = query_df("""
+            SELECT p.descripcion, SUM(d.cantidad * d.precio_unitario) AS total_ventas
+            FROM venta_detalle d
+            JOIN venta v ON v.id = d.id_venta
+            JOIN producto p ON d.id_producto = p.id
+            WHERE v.estado = 'EMITIDA'
+            GROUP BY p.descripcion
+            ORDER BY total_ventas DESC
+        """)
+        if not df.empty:
+            st.bar_chart(df.set_index("descripcion"))
+        else:
+            st.warning("⚠️ No hay datos para mostrar en este reporte")
+
+    elif tipo_reporte == "Diario":
+        df = query_df("""
+            SELECT
+                DATE(fecha) AS dia,
+                COUNT(*) FILTER (WHERE estado='EMITIDA') AS ventas_emitidas,
+                COUNT(*) FILTER (WHERE estado='ANULADA') AS ventas_anuladas,
+                SUM(total) FILTER (WHERE estado='EMITIDA') AS total_vendido
+            FROM venta
+            GROUP BY dia
+            ORDER BY dia
+        """)
+
+        if not df.empty:
+            st.metric("Ventas emitidas", int(df.iloc[-1]["ventas_emitidas"]))
+            st.metric("Ventas anuladas", int(df.iloc[-1]["ventas_anuladas"]))
+            st.metric("Total vendido", f"S/. {df.iloc[-1]['total_vendido'] or 0:,.2f}")
+            st.line_chart(df.set_index("dia"))
+        else:
+            st.warning("⚠️ No hay datos")
+
+    elif tipo_reporte == "Mensual":
+        df = query_df("""
+            SELECT to_char(fecha, 'YYYY-MM') AS mes, SUM(total) AS total_mes
+            FROM venta
+            WHERE estado = 'EMITIDA'
+            GROUP BY mes
+            ORDER BY mes
+        """)
+        if not df.empty:
+            st.line_chart(df.set_index("mes"))
+        else:
+            st.warning("⚠️ No hay datos para mostrar en este reporte")
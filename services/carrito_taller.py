@@ -0,0 +1,124 @@
+# services/carrito_taller.py
+"""
+Carrito de cada orden de taller abierta en memoria, compartido por todas las
+sesiones del proceso (st.cache_resource).
+
+Cada orden guarda sus líneas, el total y venta.version_detalle. Quien pide
+el detalle pasa la versión que leyó de la BD (obtener_ventas_abiertas): si
+la copia está al día se responde sin ir a la BD. Las funciones que modifican
+el detalle (agregar_item_venta, eliminar_item_servicio...) aplican su cambio
+aquí con la versión que devolvió la BD (write-through); si la copia no estaba
+en la versión anterior (otro proceso tocó la orden), se descarta y la
+próxima lectura la recarga entera.
+"""
+import threading
+
+import pandas as pd
+import streamlit as st
+
+COLUMNAS_DETALLE = ["ID Producto", "Descripción", "Cantidad", "Precio Unitario", "Subtotal"]
+
+
+def dataframe_detalle(lineas):
+    """lineas sin id_detalle → DataFrame como el de query_df (numéricos en float)."""
+    df = pd.DataFrame(lineas, columns=COLUMNAS_DETALLE)
+    return df.astype({"Cantidad": float, "Precio Unitario": float, "Subtotal": float})
+
+
+def proyectar_cambios(df_detalle, cambios):
+    """
+    El detalle como quedará al guardar `cambios` (misma regla que
+    editar_orden_taller en la BD). Agrega la columna "Por guardar".
+    """
+    filas = [dict(r, **{"Por guardar": False}) for r in df_detalle.to_dict("records")]
+    for c in cambios:
+        accion = c["accion"]
+        if accion == "cantidad" and float(c["cantidad"]) <= 0:
+            accion = "quitar"
+        del_producto = [r for r in filas if r["ID Producto"] == c["id_producto"]]
+
+        if accion == "quitar":
+            filas = [r for r in filas if r["ID Producto"] != c["id_producto"]]
+        elif accion == "agregar":
+            precio = round(float(c["precio_unitario"]), 2)
+            linea = next((r for r in del_producto if r["Precio Unitario"] == precio), None)
+            if linea is None:
+                linea = {
+                    "ID Producto": c["id_producto"],
+                    "Descripción": c.get("descripcion"),
+                    "Cantidad": 0.0,
+                    "Precio Unitario": precio,
+                }
+                filas.append(linea)
+            linea["Cantidad"] += float(c["cantidad"])
+            linea["Subtotal"] = round(linea["Cantidad"] * precio, 2)
+            linea["Por guardar"] = True
+        elif accion == "cantidad" and del_producto:
+            # Las demás líneas del producto se juntan en la primera
+            linea = del_producto[0]
+            filas = [r for r in filas if r["ID Producto"] != c["id_producto"] or r is linea]
+            linea["Cantidad"] = float(c["cantidad"])
+            linea["Subtotal"] = round(linea["Cantidad"] * linea["Precio Unitario"], 2)
+            linea["Por guardar"] = True
+    return pd.DataFrame(filas, columns=COLUMNAS_DETALLE + ["Por guardar"])
+
+
+class CarritosTaller:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # id_venta → {"version", "total", "lineas": {id_detalle: (fila)}}
+        self._ordenes = {}
+
+    def obtener(self, id_venta, version=None):
+        """(DataFrame, total) si la copia está en `version` o posterior; si no, None."""
+        with self._lock:
+            orden = self._ordenes.get(id_venta)
+            if orden is None or (version is not None and orden["version"] < version):
+                return None
+            lineas = list(orden["lineas"].values())
+            total = orden["total"]
+        return dataframe_detalle(lineas), total
+
+    def guardar(self, id_venta, version, lineas, total):
+        """lineas: [(id_detalle, id_producto, descripcion, cantidad, precio, subtotal)]"""
+        with self._lock:
+            actual = self._ordenes.get(id_venta)
+            if actual is not None and actual["version"] > version:
+                return
+            self._ordenes[id_venta] = {
+                "version": version,
+                "total": total,
+                "lineas": {l[0]: l[1:] for l in lineas},
+            }
+
+    def _aplicar(self, id_venta, version, total, cambio):
+        with self._lock:
+            orden = self._ordenes.get(id_venta)
+            if orden is None:
+                return
+            if orden["version"] != version - 1:
+                del self._ordenes[id_venta]
+                return
+            cambio(orden["lineas"])
+            orden["version"] = version
+            orden["total"] = total
+
+    def agregar_linea(self, id_venta, version, total, linea):
+        self._aplicar(id_venta, version, total, lambda l: l.__setitem__(linea[0], linea[1:]))
+
+    def quitar_linea(self, id_venta, version, total, id_detalle):
+        self._aplicar(id_venta, version, total, lambda l: l.pop(id_detalle, None))
+
+    def vaciar(self, id_venta, version, total):
+        self._aplicar(id_venta, version, total, lambda l: l.clear())
+
+    def invalidar(self, id_venta):
+        """La orden se cerró o eliminó (o cambió fuera de estas funciones)."""
+        with self._lock:
+            self._ordenes.pop(id_venta, None)
+
+
+@st.cache_resource
+def obtener_carritos_taller():
+    """Una sola copia por proceso, compartida por todas las sesiones."""
+    return CarritosTaller()
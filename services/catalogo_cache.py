@@ -0,0 +1,447 @@
+# services/catalogo_cache.py
+"""
+Índice del catálogo en memoria, compartido por todas las sesiones del
+proceso (st.cache_resource). Responde las búsquedas del POS sin ir a la BD.
+
+- Columnas del producto en listas paralelas (una posición por producto).
+- Índice invertido de tokens: cada palabra de `busqueda` apunta a las
+  posiciones que la contienen. Una palabra del criterio se busca como
+  subcadena dentro del vocabulario (mucho más chico que el catálogo), así
+  la semántica es la misma que `busqueda LIKE '%palabra%'` en SQL.
+- Frescura: cada REFRESCO_SEGUNDOS se piden solo las filas con
+  updated_at posterior a la última sincronización (y, si el total de
+  productos no cuadra, los ids, para quitar los eliminados); además
+  guardar_venta y compras aplican sus deltas de stock al momento.
+"""
+import bisect
+import heapq
+import os
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import pandas as pd
+import streamlit as st
+
+from db import get_connection
+from services.producto_service import (
+    COLUMNAS_PRODUCTO, buscar_por_codigo_barras, normalizar_codigo_barras,
+    procesar_criterio_comodin
+)
+
+REFRESCO_SEGUNDOS = float(os.getenv("CATALOGO_REFRESCO_SEG", "15"))
+RECARGA_COMPLETA_SEGUNDOS = float(os.getenv("CATALOGO_RECARGA_SEG", "3600"))
+
+# Se vuelven a pedir los cambios de este margen anterior a la última
+# sincronización: cubre transacciones que confirmaron tarde
+SOLAPE = timedelta(seconds=30)
+
+COLUMNAS = [
+    "id", "descripcion", "id_categoria", "categoria", "catalogo", "marca",
+    "modelo", "ubicacion", "precio_venta", "costo_promedio",
+    "margen_utilidad", "stock_actual", "imagen", "activo", "unidad_base",
+    "codigo_barras"
+]
+
+# Marca de sincronización, total de productos y política de stock, en un viaje
+SQL_ESTADO = """
+    SELECT now(),
+           (SELECT count(*) FROM producto),
+           (SELECT politica_stock FROM configuracion WHERE id = 1)
+"""
+
+SQL_PRODUCTOS = f"""
+    SELECT {COLUMNAS_PRODUCTO}, p.busqueda
+    FROM producto p
+    LEFT JOIN categoria c ON p.id_categoria = c.id
+"""
+
+SQL_CAMBIOS = SQL_PRODUCTOS + " WHERE p.updated_at > %s"
+
+
+class IndiceCatalogo:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._lock_refresco = threading.Lock()
+        self._cargar_todo()
+
+    # -------------------------
+    # 🔄 Carga y sincronización
+    # -------------------------
+    def _cargar_todo(self):
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(SQL_ESTADO)
+            inicio_sync, _, politica_stock = cursor.fetchone()
+            cursor.execute(SQL_PRODUCTOS)
+            filas = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+
+        with self._lock:
+            self.columnas = {c: [] for c in COLUMNAS}
+            self.textos = []
+            self.vivo = []
+            self.posicion = {}
+            self.por_codigo_barras = {}
+            self.muertos = 0
+
+            self.vocabulario = {}
+            self.tokens = []
+            self.postings = []
+            self._blob = None
+            self._inicios = []
+            self._cache_tokens = {}
+
+            self._ids_ordenados = None
+            self._orden_id = None
+
+            self._aplicar_filas(filas)
+            self.sincronizado_hasta = inicio_sync
+            self.politica_stock = politica_stock or "LIMITAR"
+
+            self.ultima_carga = time.monotonic()
+            self.ultimo_refresco = self.ultima_carga
+
+    def refrescar(self):
+        """Trae solo los productos modificados desde la última sincronización."""
+        if not self._lock_refresco.acquire(blocking=False):
+            return  # otra sesión ya está refrescando
+        try:
+            if time.monotonic() - self.ultima_carga > RECARGA_COMPLETA_SEGUNDOS:
+                self._cargar_todo()
+                return
+
+            conn = get_connection()
+            try:
+                cursor = conn.cursor()
+                # La marca se toma del reloj de la BD antes de leer: lo que se
+                # confirme durante la lectura entra en el próximo refresco
+                cursor.execute(SQL_ESTADO)
+                inicio_sync, total_bd, politica_stock = cursor.fetchone()
+                cursor.execute(SQL_CAMBIOS, (self.sincronizado_hasta - SOLAPE,))
+                filas = cursor.fetchall()
+
+                with self._lock:
+                    self._aplicar_filas(filas)
+                    self.sincronizado_hasta = inicio_sync
+                    self.politica_stock = politica_stock or "LIMITAR"
+                    self.ultimo_refresco = time.monotonic()
+                    vivos = len(self.vivo) - self.muertos
+
+                # Un borrado no cambia updated_at: si sobran productos en
+                # memoria, se comparan los ids con los de la BD
+                if vivos != total_bd:
+                    cursor.execute("SELECT id FROM producto")
+                    self._quitar_eliminados({fila[0] for fila in cursor.fetchall()})
+                cursor.close()
+            finally:
+                conn.close()
+
+            # Muchas posiciones obsoletas: reconstruir compacto
+            if self.muertos > len(self.vivo) // 4:
+                self._cargar_todo()
+        finally:
+            self._lock_refresco.release()
+
+    def _refrescar_si_corresponde(self):
+        if time.monotonic() - self.ultimo_refresco > REFRESCO_SEGUNDOS:
+            self.refrescar()
+
+    def _quitar_eliminados(self, ids_bd):
+        with self._lock:
+            for id_producto in [i for i in self.posicion if i not in ids_bd]:
+                pos = self.posicion.pop(id_producto)
+                if self.vivo[pos]:
+                    self.vivo[pos] = False
+                    self.muertos += 1
+            self._ids_ordenados = None
+
+    def _aplicar_filas(self, filas):
+        n = len(COLUMNAS)
+        for fila in filas:
+            valores, texto = fila[:n], fila[n] or ""
+            pos = self.posicion.get(valores[0])
+
+            if pos is not None and self.textos[pos] == texto:
+                # Mismo texto de búsqueda: basta con actualizar las columnas
+                anterior = self.columnas["codigo_barras"][pos]
+                if self.por_codigo_barras.get(anterior) == pos:
+                    del self.por_codigo_barras[anterior]
+                for c, v in zip(COLUMNAS, valores):
+                    self.columnas[c][pos] = v
+                self._indexar_codigo_barras(pos)
+            else:
+                if pos is not None:
+                    self.vivo[pos] = False
+                    self.muertos += 1
+                self._agregar(valores, texto)
+
+    def _agregar(self, valores, texto):
+        pos = len(self.textos)
+        for c, v in zip(COLUMNAS, valores):
+            self.columnas[c].append(v)
+        self.textos.append(texto)
+        self.vivo.append(True)
+        self.posicion[valores[0]] = pos
+        self._indexar_codigo_barras(pos)
+
+        for token in set(texto.split()):
+            if token == "|":
+                continue
+            tid = self.vocabulario.get(token)
+            if tid is None:
+                tid = len(self.tokens)
+                self.vocabulario[token] = tid
+                self.tokens.append(token)
+                self.postings.append([])
+                self._blob = None
+                self._cache_tokens.clear()
+            self.postings[tid].append(pos)
+
+        self._ids_ordenados = None
+
+    def _indexar_codigo_barras(self, pos):
+        codigo = self.columnas["codigo_barras"][pos]
+        if codigo:
+            self.por_codigo_barras[codigo] = pos
+
+    # -------------------------
+    # 🔎 Búsqueda
+    # -------------------------
+    def _tokens_que_contienen(self, palabra):
+        """ids de token que contienen `palabra`."""
+        tids = self._cache_tokens.get(palabra)
+        if tids is not None:
+            return tids
+
+        previo = self._cache_tokens.get(palabra[:-1])
+        if previo is not None:
+            # Escribiendo letra a letra: solo se revisan los tokens que ya
+            # contenían la búsqueda anterior
+            tokens = self.tokens
+            tids = [t for t in previo if palabra in tokens[t]]
+        else:
+            tids = self._buscar_en_vocabulario(palabra)
+
+        if len(self._cache_tokens) >= 512:
+            self._cache_tokens.clear()
+        self._cache_tokens[palabra] = tids
+        return tids
+
+    def _buscar_en_vocabulario(self, palabra):
+        """Búsqueda en C (str.find) sobre todo el vocabulario unido por saltos de línea."""
+        if self._blob is None:
+            self._blob = "\n".join(self.tokens) + "\n"
+            self._inicios = []
+            inicio = 0
+            for token in self.tokens:
+                self._inicios.append(inicio)
+                inicio += len(token) + 1
+
+        encontrados = []
+        i = self._blob.find(palabra)
+        while i != -1:
+            tid = bisect.bisect_right(self._inicios, i) - 1
+            encontrados.append(tid)
+            if tid + 1 >= len(self._inicios):
+                break
+            i = self._blob.find(palabra, self._inicios[tid + 1])
+        return encontrados
+
+    def _posiciones_palabra(self, palabra):
+        """Posiciones cuyo texto contiene `palabra` (como busqueda LIKE '%palabra%')."""
+        piezas = palabra.split()
+        base = max(piezas, key=len)
+
+        posiciones = set()
+        for tid in self._tokens_que_contienen(base):
+            posiciones.update(self.postings[tid])
+
+        # Sin espacios la palabra cae dentro de un solo token: el índice es
+        # exacto. Con espacios se verifica contra el texto completo.
+        if len(piezas) > 1:
+            textos = self.textos
+            posiciones = {p for p in posiciones if palabra in textos[p]}
+        return posiciones
+
+    def _candidatos(self, palabras):
+        """Posiciones vivas cuyo texto contiene todas las palabras."""
+        if not palabras:
+            return [p for p, v in enumerate(self.vivo) if v]
+
+        conjuntos = sorted((self._posiciones_palabra(w) for w in palabras), key=len)
+        vivo = self.vivo
+        return [p for p in conjuntos[0].intersection(*conjuntos[1:]) if vivo[p]]
+
+    def _filtrar(self, posiciones, marca, categoria, stock):
+        col = self.columnas
+        if marca and marca != "Todos":
+            posiciones = [p for p in posiciones if col["marca"][p] == marca]
+        if categoria and categoria != "Todos":
+            posiciones = [p for p in posiciones if col["categoria"][p] == categoria]
+        if stock == "Con stock":
+            posiciones = [p for p in posiciones if (col["stock_actual"][p] or 0) > 0]
+        elif stock == "Sin stock":
+            posiciones = [
+                p for p in posiciones
+                if col["stock_actual"][p] is not None and col["stock_actual"][p] == 0
+            ]
+        return posiciones
+
+    def _dataframe(self, posiciones):
+        return pd.DataFrame({
+            c: [self.columnas[c][p] for p in posiciones] for c in COLUMNAS
+        }, columns=COLUMNAS)
+
+    def buscar(self, criterio=None, marca=None, categoria=None, stock=None, limit=20):
+        """
+        Mismo contrato y orden que producto_service.buscar_productos
+        (sin facetas): {"productos": DataFrame, "total": int, "facetas": None}
+        """
+        self._refrescar_si_corresponde()
+        palabras = procesar_criterio_comodin(criterio)
+
+        with self._lock:
+            posiciones = self._filtrar(self._candidatos(palabras), marca, categoria, stock)
+            ids = self.columnas["id"]
+
+            if palabras:
+                w = palabras[0]
+                catalogos = self.columnas["catalogo"]
+
+                def clave(p):
+                    exacto = ids[p].lower() == w or (catalogos[p] or "").lower() == w
+                    return (not exacto, self.textos[p].find(w), ids[p])
+            else:
+                def clave(p):
+                    return ids[p]
+
+            pagina = heapq.nsmallest(limit, posiciones, key=clave)
+            return {
+                "productos": self._dataframe(pagina),
+                "total": len(posiciones),
+                "facetas": None
+            }
+
+    def listar_pagina(self, criterio=None, marca=None, categoria=None, stock=None,
+                      despues_de=None, tamano=20):
+        """Mismo contrato que producto_service.listar_productos_pagina (orden por id)."""
+        self._refrescar_si_corresponde()
+        palabras = procesar_criterio_comodin(criterio)
+
+        with self._lock:
+            if self._ids_ordenados is None:
+                self._orden_id = sorted(
+                    (p for p, v in enumerate(self.vivo) if v),
+                    key=self.columnas["id"].__getitem__
+                )
+                self._ids_ordenados = [self.columnas["id"][p] for p in self._orden_id]
+
+            coinciden = set(self._filtrar(self._candidatos(palabras), marca, categoria, stock))
+
+            inicio = 0
+            if despues_de is not None:
+                inicio = bisect.bisect_right(self._ids_ordenados, despues_de)
+
+            pagina = []
+            for p in self._orden_id[inicio:]:
+                if p in coinciden and self.vivo[p]:
+                    pagina.append(p)
+                    if len(pagina) > tamano:
+                        break
+
+            siguiente = None
+            if len(pagina) > tamano:
+                pagina = pagina[:tamano]
+                siguiente = self.columnas["id"][pagina[-1]]
+
+            return {"productos": self._dataframe(pagina), "siguiente": siguiente}
+
+    def obtener(self, id_producto):
+        """Fila del producto como dict, o None si no está en el catálogo."""
+        with self._lock:
+            pos = self.posicion.get(id_producto)
+            if pos is None or not self.vivo[pos]:
+                return None
+            return {c: self.columnas[c][pos] for c in COLUMNAS}
+
+    def obtener_por_codigo_barras(self, codigo):
+        """Producto por código de barras exacto, o None si no está en el catálogo."""
+        with self._lock:
+            pos = self.por_codigo_barras.get(codigo)
+            if pos is None or not self.vivo[pos] or self.columnas["codigo_barras"][pos] != codigo:
+                return None
+            return {c: self.columnas[c][pos] for c in COLUMNAS}
+
+    # -------------------------
+    # 📦 Deltas de stock
+    # -------------------------
+    def aplicar_deltas_stock(self, deltas, minimo_cero=True):
+        """
+        deltas: {id_producto: cantidad (+ entrada / - salida)}.
+        Ajuste inmediato tras una venta o compra; el próximo refresco trae
+        de todos modos el valor confirmado en la BD. minimo_cero: el stock
+        no baja de 0, como en la BD, salvo con la política NEGATIVO.
+        """
+        with self._lock:
+            minimo_cero = minimo_cero and self.politica_stock != "NEGATIVO"
+            stock = self.columnas["stock_actual"]
+            for id_producto, delta in deltas.items():
+                pos = self.posicion.get(id_producto)
+                if pos is None:
+                    continue
+                nuevo = Decimal(stock[pos] or 0) + Decimal(str(delta))
+                if minimo_cero and nuevo < 0:
+                    nuevo = Decimal("0")
+                stock[pos] = nuevo
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "productos": len(self.vivo) - self.muertos,
+                "tokens": len(self.tokens),
+                "sincronizado_hasta": self.sincronizado_hasta,
+                "segundos_desde_refresco": time.monotonic() - self.ultimo_refresco,
+            }
+
+
+@st.cache_resource(show_spinner="Cargando catálogo...")
+def obtener_catalogo():
+    """Un solo índice por proceso, compartido por todas las sesiones."""
+    return IndiceCatalogo()
+
+
+def buscar_codigo_barras(codigo):
+    """
+    Resuelve un código escaneado: primero en el catálogo en memoria (sin ir a
+    la BD); si no está (p. ej. asignado hace segundos en otro proceso), una
+    consulta exacta por el índice UNIQUE de codigo_barras.
+    """
+    codigo = normalizar_codigo_barras(codigo)
+    if codigo is None:
+        return None
+
+    producto = obtener_catalogo().obtener_por_codigo_barras(codigo)
+    if producto is None:
+        producto = buscar_por_codigo_barras(codigo)
+    return producto
+
+
+def descontar_stock_catalogo(items):
+    """items: [(id_producto, cantidad)] vendidos."""
+    deltas = {}
+    for id_producto, cantidad in items:
+        deltas[id_producto] = deltas.get(id_producto, 0) - Decimal(str(cantidad))
+    obtener_catalogo().aplicar_deltas_stock(deltas)
+
+
+def sumar_stock_catalogo(items):
+    """items: [(id_producto, cantidad)] comprados."""
+    deltas = {}
+    for id_producto, cantidad in items:
+        deltas[id_producto] = deltas.get(id_producto, 0) + Decimal(str(cantidad))
+    obtener_catalogo().aplicar_deltas_stock(deltas, minimo_cero=False)
@@ -0,0 +1,413 @@
+# services/cola_ventas.py
+"""
+Cola local de ventas del POS (SQLite en modo WAL), para vender aunque la
+conexión con la BD se corte o se ponga lenta.
+
+- encolar_venta confirma la venta en el disco local (fsync) y vuelve: el
+  cobro ya no espera a la red. Una venta confirmada no se pierde.
+- Los comprobantes salen de un bloque de números reservado de antemano en la
+  BD (reservar_bloque_comprobantes). Si el bloque se acaba sin conexión, la
+  venta se encola sin número y la BD lo asigna al sincronizar.
+- Un hilo por proceso envía las pendientes en orden con registrar_venta.
+  Cada venta lleva un id_externo (uuid): reenviarla es idempotente.
+- Un error de conexión detiene el envío y se reintenta con espera creciente;
+  un rechazo de la BD (stock, comprobante ya emitido, caja cerrada...) deja
+  la venta en CONFLICTO y el envío sigue con las demás.
+
+Se activa con COLA_VENTAS_DB (ruta del archivo SQLite); sin ella el POS
+registra directo en la BD como siempre.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+import psycopg2
+import streamlit as st
+
+from db import get_connection
+from db_pool import PoolAgotadoError
+from services.catalogo_cache import descontar_stock_catalogo
+from services.venta_service import armar_venta, registrar_venta_en_bd, venta_por_id_externo
+
+RUTA_COLA = os.getenv("COLA_VENTAS_DB")
+TAMANO_BLOQUE = int(os.getenv("COLA_VENTAS_BLOQUE", "50"))
+INTERVALO_SEGUNDOS = float(os.getenv("COLA_VENTAS_INTERVALO_SEG", "5"))
+ESPERA_MAXIMA_SEGUNDOS = 60
+
+# Sin conexión (o conexión ocupada): se reintenta la misma venta más tarde.
+ERRORES_DE_CONEXION = (
+    psycopg2.OperationalError,
+    psycopg2.InterfaceError,
+    PoolAgotadoError,
+)
+
+# Índice único de venta.id_externo (migración 0018)
+INDICE_ID_EXTERNO = "venta_id_externo_key"
+
+ESQUEMA = """
+    CREATE TABLE IF NOT EXISTS venta_pendiente (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_externo TEXT NOT NULL UNIQUE,
+        creada TEXT NOT NULL,
+        id_caja INTEGER,
+        nro_comprobante TEXT,
+        importe TEXT,
+        venta TEXT NOT NULL,
+        items TEXT NOT NULL,
+        estado TEXT NOT NULL DEFAULT 'PENDIENTE',
+        intentos INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        id_venta INTEGER,
+        sincronizada TEXT
+    );
+    CREATE INDEX IF NOT EXISTS ix_venta_pendiente_estado ON venta_pendiente (estado, id);
+
+    CREATE TABLE IF NOT EXISTS bloque_comprobante (
+        tipo TEXT NOT NULL,
+        serie TEXT NOT NULL,
+        siguiente INTEGER NOT NULL,
+        hasta INTEGER NOT NULL,
+        PRIMARY KEY (tipo, serie)
+    );
+"""
+
+
+def _json(valor):
+    # Decimal y datetime como texto, igual que al enviarlos a la BD
+    return json.dumps(valor, default=str)
+
+
+def _ahora():
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _mensaje(error):
+    if isinstance(error, psycopg2.errors.RaiseException):
+        return error.diag.message_primary
+    return (str(error).strip().splitlines() or [type(error).__name__])[0]
+
+
+class ColaVentas:
+    def __init__(self, ruta, tamano_bloque=TAMANO_BLOQUE, intervalo=INTERVALO_SEGUNDOS):
+        self.ruta = ruta
+        self.tamano_bloque = tamano_bloque
+        self.intervalo = intervalo
+        self.ultimo_error = None
+        self._despertar = threading.Event()
+        self._lock_envio = threading.Lock()
+        self._hilo = None
+
+        with self._sqlite() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(ESQUEMA)
+
+    @contextmanager
+    def _sqlite(self):
+        # synchronous=FULL: al volver del COMMIT la venta ya está en disco
+        conn = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA synchronous=FULL")
+            yield conn
+        finally:
+            conn.close()
+
+    # -------------------------
+    # 🧾 Encolar (en la caja)
+    # -------------------------
+    def encolar(self, venta, items):
+        """
+        Guarda la venta en la cola local con su número del bloque reservado.
+        Devuelve (id_externo, nro_comprobante); el número es None si el bloque
+        se acabó y se asignará al sincronizar.
+        """
+        venta = dict(venta, id_externo=str(uuid.uuid4()))
+        importe = sum(item["subtotal"] for item in items)
+
+        with self._sqlite() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if venta["numero"] is None:
+                    numero = self._tomar_numero(conn, venta["tipo_comprobante"].upper(), venta["serie"])
+                    if numero is not None:
+                        venta["numero"] = numero
+                        venta["nro_comprobante"] = f"{venta['serie']}-{numero:06d}"
+
+                conn.execute("""
+                    INSERT INTO venta_pendiente (
+                        id_externo, creada, id_caja, nro_comprobante, importe, venta, items
+                    )
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    venta["id_externo"], _ahora(), venta["id_caja"], venta["nro_comprobante"],
+                    str(importe), _json(venta), _json(items)
+                ))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        self._despertar.set()
+        return venta["id_externo"], venta["nro_comprobante"]
+
+    def _tomar_numero(self, conn, tipo, serie):
+        fila = conn.execute(
+            "SELECT siguiente, hasta FROM bloque_comprobante WHERE tipo = ? AND serie = ?",
+            (tipo, serie)
+        ).fetchone()
+        if fila is None:
+            # Serie nueva: bloque vacío que el sincronizador repone
+            conn.execute(
+                "INSERT INTO bloque_comprobante (tipo, serie, siguiente, hasta) VALUES (?, ?, 1, 0)",
+                (tipo, serie)
+            )
+            return None
+
+        siguiente, hasta = fila
+        if siguiente > hasta:
+            return None
+        conn.execute(
+            "UPDATE bloque_comprobante SET siguiente = siguiente + 1 WHERE tipo = ? AND serie = ?",
+            (tipo, serie)
+        )
+        return siguiente
+
+    def siguiente_comprobante(self, tipo, serie):
+        """Vista previa del número que tomará la próxima venta (o None)."""
+        with self._sqlite() as conn:
+            fila = conn.execute(
+                "SELECT siguiente, hasta FROM bloque_comprobante WHERE tipo = ? AND serie = ?",
+                (tipo.upper(), serie)
+            ).fetchone()
+        if fila is None or fila[0] > fila[1]:
+            return None
+        return f"{serie}-{fila[0]:06d}"
+
+    # -------------------------
+    # 🔄 Sincronización (hilo de fondo)
+    # -------------------------
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._trabajar, name="cola_ventas", daemon=True)
+            self._hilo.start()
+        return self
+
+    def despertar(self):
+        self._despertar.set()
+
+    def _trabajar(self):
+        espera = 0
+        while True:
+            self._despertar.wait(espera)
+            self._despertar.clear()
+            try:
+                self.sincronizar()
+                self.reponer_bloques()
+                self.ultimo_error = None
+                espera = self.intervalo
+            except ERRORES_DE_CONEXION as e:
+                self.ultimo_error = _mensaje(e)
+                espera = min(max(espera, 1) * 2, ESPERA_MAXIMA_SEGUNDOS)
+            except Exception as e:
+                self.ultimo_error = _mensaje(e)
+                espera = ESPERA_MAXIMA_SEGUNDOS
+
+    def sincronizar(self):
+        """
+        Envía las ventas pendientes en el orden en que se cobraron.
+        Devuelve cuántas se registraron; un error de conexión se propaga.
+        """
+        enviadas = 0
+        with self._lock_envio:
+            while True:
+                with self._sqlite() as conn:
+                    fila = conn.execute("""
+                        SELECT id, venta, items FROM venta_pendiente
+                        WHERE estado = 'PENDIENTE'
+                        ORDER BY id
+                        LIMIT 1
+                    """).fetchone()
+                if fila is None:
+                    return enviadas
+
+                id_local, venta, items = fila
+                venta = json.loads(venta)
+                items = json.loads(items)
+                try:
+                    id_venta, nro_comprobante = registrar_venta_en_bd(venta, items)
+                except ERRORES_DE_CONEXION as e:
+                    self._actualizar(id_local, "PENDIENTE", error=_mensaje(e))
+                    raise
+                except psycopg2.errors.UniqueViolation as e:
+                    # Con el mismo id_externo: la venta llegó a la vez por otro
+                    # camino y ya está en la BD. Otro duplicado (p. ej. un
+                    # comprobante ya emitido) no se arregla reintentando.
+                    registrada = None
+                    if e.diag.constraint_name == INDICE_ID_EXTERNO:
+                        registrada = venta_por_id_externo(venta["id_externo"])
+                    if registrada is None:
+                        self._conflicto(id_local, items, e)
+                        continue
+                    id_venta, nro_comprobante = registrada
+                except psycopg2.Error as e:
+                    self._conflicto(id_local, items, e)
+                    continue
+
+                self._actualizar(
+                    id_local, "SINCRONIZADA",
+                    id_venta=id_venta, nro_comprobante=nro_comprobante
+                )
+                enviadas += 1
+
+    def _conflicto(self, id_local, items, error):
+        self._actualizar(id_local, "CONFLICTO", error=_mensaje(error))
+        # El stock del catálogo en memoria vuelve a lo que hay en la BD
+        descontar_stock_catalogo(
+            [(item["id_producto"], -float(item["cantidad"])) for item in items]
+        )
+
+    def _actualizar(self, id_local, estado, error=None, id_venta=None, nro_comprobante=None):
+        with self._sqlite() as conn:
+            conn.execute("""
+                UPDATE venta_pendiente
+                SET estado = ?,
+                    intentos = intentos + 1,
+                    error = ?,
+                    id_venta = COALESCE(?, id_venta),
+                    nro_comprobante = COALESCE(?, nro_comprobante),
+                    sincronizada = CASE WHEN ? = 'SINCRONIZADA' THEN ? END
+                WHERE id = ?
+            """, (estado, error, id_venta, nro_comprobante, estado, _ahora(), id_local))
+
+    def reponer_bloques(self):
+        """Reserva en la BD un bloque nuevo para cada serie que se quedó sin números."""
+        with self._sqlite() as conn:
+            agotadas = conn.execute(
+                "SELECT tipo, serie FROM bloque_comprobante WHERE siguiente > hasta"
+            ).fetchall()
+
+        for tipo, serie in agotadas:
+            conn = get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT reservar_bloque_comprobantes(%s, %s, %s)",
+                    (tipo, serie, self.tamano_bloque)
+                )
+                desde = cursor.fetchone()[0]
+                conn.commit()
+            finally:
+                conn.close()
+
+            with self._sqlite() as conn:
+                conn.execute("""
+                    UPDATE bloque_comprobante
+                    SET siguiente = ?, hasta = ?
+                    WHERE tipo = ? AND serie = ? AND siguiente > hasta
+                """, (desde, desde + self.tamano_bloque - 1, tipo, serie))
+
+    # -------------------------
+    # 📋 Estado y conflictos
+    # -------------------------
+    def resumen(self):
+        with self._sqlite() as conn:
+            pendientes, conflictos, mas_antigua = conn.execute("""
+                SELECT
+                    SUM(estado = 'PENDIENTE'),
+                    SUM(estado = 'CONFLICTO'),
+                    MIN(CASE WHEN estado = 'PENDIENTE' THEN creada END)
+                FROM venta_pendiente
+                WHERE estado IN ('PENDIENTE', 'CONFLICTO')
+            """).fetchone()
+        return {
+            "pendientes": pendientes or 0,
+            "conflictos": conflictos or 0,
+            "mas_antigua": mas_antigua,
+            "ultimo_error": self.ultimo_error,
+        }
+
+    def listar(self, estados=("PENDIENTE", "CONFLICTO")):
+        with self._sqlite() as conn:
+            marcas = ", ".join("?" * len(estados))
+            return pd.read_sql_query(f"""
+                SELECT id, creada, id_caja, nro_comprobante, importe, estado, intentos, error
+                FROM venta_pendiente
+                WHERE estado IN ({marcas})
+                ORDER BY id
+            """, conn, params=list(estados))
+
+    def pendientes_de_caja(self, id_caja):
+        with self._sqlite() as conn:
+            return conn.execute("""
+                SELECT COUNT(*) FROM venta_pendiente
+                WHERE id_caja = ? AND estado IN ('PENDIENTE', 'CONFLICTO')
+            """, (id_caja,)).fetchone()[0]
+
+    def id_venta(self, id_externo):
+        """Id en la BD de una venta encolada (None mientras no se sincronice)."""
+        with self._sqlite() as conn:
+            fila = conn.execute(
+                "SELECT id_venta FROM venta_pendiente WHERE id_externo = ?",
+                (id_externo,)
+            ).fetchone()
+        return fila[0] if fila else None
+
+    def reintentar(self, id_local):
+        """Vuelve a enviar una venta en conflicto (p. ej. tras reponer stock)."""
+        with self._sqlite() as conn:
+            conn.execute("""
+                UPDATE venta_pendiente SET estado = 'PENDIENTE', error = NULL
+                WHERE id = ? AND estado = 'CONFLICTO'
+            """, (id_local,))
+        self._despertar.set()
+
+    def descartar(self, id_local):
+        """Da por perdida una venta en conflicto (queda en la cola como DESCARTADA)."""
+        with self._sqlite() as conn:
+            conn.execute("""
+                UPDATE venta_pendiente SET estado = 'DESCARTADA'
+                WHERE id = ? AND estado = 'CONFLICTO'
+            """, (id_local,))
+
+
+@st.cache_resource
+def obtener_cola():
+    """Una cola (y un sincronizador) por proceso; None si COLA_VENTAS_DB no está definida."""
+    if not RUTA_COLA:
+        return None
+    return ColaVentas(RUTA_COLA).iniciar()
+
+
+def encolar_venta(
+    cliente,
+    regimen,
+    tipo_comprobante,
+    metodo_pago,
+    nro_comprobante,
+    placa_vehiculo,
+    pago_cliente,
+    vuelto,
+    carrito,
+    usuario,
+    id_caja,
+    serie=None
+):
+    """
+    Venta POS confirmada en la cola local; la BD la recibe en segundo plano.
+    Devuelve (id_externo, nro_comprobante).
+    """
+    venta, items = armar_venta(
+        cliente, regimen, tipo_comprobante, metodo_pago, nro_comprobante,
+        placa_vehiculo, pago_cliente, vuelto, carrito, usuario, id_caja,
+        serie=serie
+    )
+    id_externo, nro = obtener_cola().encolar(venta, items)
+
+    descontar_stock_catalogo(
+        [(item["ID Producto"], item["Cantidad"]) for item in carrito]
+    )
+    return id_externo, nro
@@ -0,0 +1,145 @@
+# services/compra_service.py
+from datetime import datetime
+from decimal import Decimal
+import json
+import psycopg2
+from psycopg2.extras import Json
+from db import get_connection
+from services.catalogo_cache import sumar_stock_catalogo
+from services.lista_precios import presentaciones_proveedor
+
+
+def calcular_totales_compra(suma_total: Decimal, descuento: Decimal, tipo_doc: str):
+    """
+    Totales según el documento del proveedor. Los subtotales del carrito
+    están sin IGV en la factura y con IGV incluido en la boleta.
+    """
+    if tipo_doc == "Factura":
+        op_gravada = suma_total - descuento
+        igv = (op_gravada * Decimal("0.18")).quantize(Decimal("0.01"))
+        total = op_gravada + igv
+    elif tipo_doc == "Boleta":
+        op_gravada = (suma_total / Decimal("1.18")).quantize(Decimal("0.01"))
+        igv = (op_gravada * Decimal("0.18")).quantize(Decimal("0.01"))
+        total = suma_total
+    else:  # Nota: no incluye IGV
+        op_gravada = suma_total
+        igv = Decimal("0.00")
+        total = suma_total
+
+    return {
+        "suma_total": suma_total,
+        "descuento": descuento,
+        "op_gravada": op_gravada,
+        "op_gratuita": Decimal("0.00"),
+        "igv": igv,
+        "total": total
+    }
+
+def costo_unitario_entrada(precio_unitario, regimen, tipo_doc):
+    """Costo con que la línea entra al inventario (Nuevo RUS no recupera el IGV)."""
+    precio = Decimal(str(precio_unitario))
+    if regimen == "Nuevo RUS" and tipo_doc == "Factura":
+        return precio * Decimal("1.18")
+    return precio
+
+def armar_compra(
+    fecha,
+    id_proveedor,
+    nombre_proveedor,
+    nro_doc,
+    tipo_doc,
+    metodo_pago,
+    regimen,
+    descuento,
+    carrito
+):
+    """(compra, items) tal como los recibe la función registrar_compra de la BD."""
+    suma_total = Decimal(str(sum(Decimal(str(item["Subtotal"])) for item in carrito)))
+    totales = calcular_totales_compra(suma_total, Decimal(str(descuento)), tipo_doc)
+
+    compra = dict(
+        totales,
+        fecha=fecha,
+        id_proveedor=id_proveedor,
+        nro_doc=nro_doc,
+        tipo_doc=tipo_doc,
+        metodo_pago=metodo_pago,
+        motivo=f"Compra {nombre_proveedor}",
+        fecha_historial=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    )
+
+    items = [
+        {
+            "id_producto": item["ID Producto"],
+            "cantidad_compra": Decimal(str(item["Cantidad Compra"])),
+            "unidad_compra": item["Unidad Compra"],
+            "factor": Decimal(str(item["Factor"])),
+            "cantidad_final": Decimal(str(item["Cantidad Final"])),
+            "precio_unitario": Decimal(str(item["Precio U. Compra"])),
+            "subtotal": Decimal(str(item["Subtotal"])),
+            "costo_unitario": costo_unitario_entrada(item["Precio U. Compra"], regimen, tipo_doc),
+            # Solo en líneas importadas de la factura del proveedor
+            "codigo_proveedor": item.get("Código Proveedor"),
+        }
+        for item in carrito
+    ]
+    return compra, items
+
+def registrar_compra_en_bd(compra, items):
+    """
+    Un solo viaje de ida y vuelta y una sola transacción: registrar_compra.
+    Devuelve el id de la compra. Los errores de psycopg2 se propagan.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT registrar_compra(%s, %s)",
+            (Json(compra, dumps=_json_dumps), Json(items, dumps=_json_dumps))
+        )
+        id_compra = cursor.fetchone()[0]
+        conn.commit()
+    finally:
+        conn.close()
+    return id_compra
+
+def registrar_compra(
+    fecha,
+    id_proveedor,
+    nombre_proveedor,
+    nro_doc,
+    tipo_doc,
+    metodo_pago,
+    regimen,
+    descuento,
+    carrito
+):
+    """
+    Registra la compra: cabecera, detalle, stock y costo promedio, precios de
+    venta, historial de precios y kardex de todas las líneas, en la función
+    registrar_compra de la BD (todo o nada). Devuelve el id de la compra.
+    """
+    if not carrito:
+        raise ValueError("El carrito de compras está vacío")
+
+    compra, items = armar_compra(
+        fecha, id_proveedor, nombre_proveedor, nro_doc, tipo_doc,
+        metodo_pago, regimen, descuento, carrito
+    )
+
+    try:
+        id_compra = registrar_compra_en_bd(compra, items)
+    except psycopg2.errors.RaiseException as e:
+        # Validaciones de la función (producto inexistente, margen inválido)
+        raise ValueError(e.diag.message_primary) from None
+
+    sumar_stock_catalogo([(item["ID Producto"], item["Cantidad Final"]) for item in carrito])
+    if any(item["codigo_proveedor"] for item in items):
+        # registrar_compra pudo agregar presentaciones del proveedor
+        presentaciones_proveedor.clear()
+    return id_compra
+
+def _json_dumps(valor):
+    # Decimal y fechas viajan como texto: sin pérdida de precisión
+    return json.dumps(valor, default=str)
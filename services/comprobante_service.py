@@ -11,21 +11,22 @@ config = obtener_configuracion()
 def registrar_reimpresion(venta_id, usuario):
     conn = get_connection()
     cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE venta
+            SET reimpresiones = reimpresiones + 1
+            WHERE id = %s
+        """, (venta_id,))
 
-    cursor.execute("""
-        UPDATE venta
-        SET reimpresiones = reimpresiones + 1
-        WHERE id = %s
-    """, (venta_id,))
-
-    cursor.execute("""
-        INSERT INTO venta_evento
-        (id_venta, tipo, fecha, usuario)
-        VALUES (%s, 'REIMPRESION', NOW(), %s)
-    """, (venta_id, usuario["nombre"]))
+        cursor.execute("""
+            INSERT INTO venta_evento
+            (id_venta, tipo, fecha, usuario)
+            VALUES (%s, 'REIMPRESION', NOW(), %s)
+        """, (venta_id, usuario["nombre"]))
 
-    conn.commit()
-    conn.close()
+        conn.commit()
+    finally:
+        conn.close()
 
 def wrap_text(c, text, max_width, font="Courier", size=9):
     c.setFont(font, size)
@@ -46,22 +47,28 @@ def wrap_text(c, text, max_width, font="Courier", size=9):
 
     return lines
 
+SQL_SIGUIENTE_CORRELATIVO = """
+    SELECT COALESCE(
+        (SELECT ultimo_numero FROM serie_comprobante WHERE tipo = %s AND serie = %s),
+        (SELECT MAX(numero) FROM correlativo_comprobante WHERE tipo = %s AND serie = %s),
+        0
+    )
+"""
+
 def obtener_siguiente_correlativo(tipo, serie):
-    """Solo obtiene el siguiente número, no actualiza la tabla."""
+    """
+    Vista previa del siguiente número (no bloquea ni reserva nada).
+    El número definitivo lo asigna registrar_venta al confirmar la venta.
+    """
     conn = get_connection()
     cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT numero 
-        FROM correlativo_comprobante 
-        WHERE tipo = %s AND serie = %s
-        ORDER BY numero DESC
-        LIMIT 1
-    """, (tipo, serie))
-    row = cursor.fetchone()
-    conn.close()
-
-    siguiente = 1 if not row else row[0] + 1
+    try:
+        cursor.execute(SQL_SIGUIENTE_CORRELATIVO, (tipo, serie, tipo, serie))
+        ultimo = cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+    siguiente = ultimo + 1
     nro_comprobante = f"{serie}-{siguiente:06d}"
     return nro_comprobante, siguiente
 
@@ -377,40 +384,43 @@ def generar_ticket_html(venta_id: int, ancho_mm: int = 80) -> str:
     </html>
     """
 
+SQL_COMPROBANTE_EXACTO = """
+    SELECT v.id,
+           v.nro_comprobante,
+           v.fecha,
+           v.total
+    FROM venta v
+    WHERE v.nro_comprobante = %s
+      AND v.estado = 'EMITIDA'
+    LIMIT 1
+"""
+
 def buscar_comprobantes(nro_comprobante):
     conn = get_connection()
     cur = conn.cursor()
+    try:
+        nro = nro_comprobante.strip().upper()
+
+        if "*" in nro:
+            patron = nro.replace("*", "%")
+
+            cur.execute("""
+                SELECT v.id,
+                       v.nro_comprobante,
+                       v.fecha,
+                       v.total
+                FROM venta v
+                WHERE v.nro_comprobante LIKE %s
+                  AND v.estado = 'EMITIDA'
+                ORDER BY v.fecha DESC
+            """, (patron,))
+            rows = cur.fetchall()
+        else:
+            cur.execute(SQL_COMPROBANTE_EXACTO, (nro,))
+            rows = cur.fetchall()
 
-    nro = nro_comprobante.strip().upper()
-
-    if "*" in nro:
-        patron = nro.replace("*", "%")
-
-        cur.execute("""
-            SELECT v.id,
-                   v.nro_comprobante,
-                   v.fecha,
-                   v.total
-            FROM venta v
-            WHERE v.nro_comprobante LIKE %s
-              AND v.estado = 'EMITIDA'
-            ORDER BY v.fecha DESC
-        """, (patron,))
-        rows = cur.fetchall()
-    else:
-        cur.execute("""
-            SELECT v.id,
-                   v.nro_comprobante,
-                   v.fecha,
-                   v.total
-            FROM venta v
-            WHERE v.nro_comprobante = %s
-              AND v.estado = 'EMITIDA'
-            LIMIT 1
-        """, (nro,))
-        rows = cur.fetchall()
-
-    cur.close()
-    conn.close()
+        cur.close()
+    finally:
+        conn.close()
 
     return rows
\ No newline at end of file
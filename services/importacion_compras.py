@@ -0,0 +1,320 @@
+# services/importacion_compras.py
+"""
+Importación de facturas de proveedor (CSV o XML UBL 2.1 de SUNAT).
+
+1. leer_factura: lee el archivo línea a línea (el XML con iterparse, sin
+   cargar el documento entero) y devuelve la cabecera y las líneas.
+2. emparejar_lineas: copia las líneas con COPY a una tabla temporal y las
+   empareja con producto en una sola consulta, en este orden:
+   código del proveedor (producto_proveedor.codigo_proveedor), código de
+   barras, id del producto y número de catálogo (solo si es único).
+3. carrito_desde_importacion: las líneas emparejadas como el carrito de
+   compras_app, que se registra con compra_service.registrar_compra (una
+   transacción; los códigos del proveedor quedan anotados para la próxima).
+
+CSV: primera fila con los nombres de columna (separador , ; o tab):
+    codigo, descripcion, cantidad, precio   (obligatorias)
+    codigo_barras, unidad                   (opcionales)
+"""
+import csv
+import io
+import xml.etree.ElementTree as ET
+from decimal import Decimal, InvalidOperation
+
+import pandas as pd
+
+from db import get_connection, transaccion
+from services.producto_service import normalizar_codigo_barras
+
+COLUMNAS_CSV = {
+    "codigo": ("codigo", "código", "cod", "sku", "item"),
+    "codigo_barras": ("codigo_barras", "código_barras", "ean", "gtin", "barras"),
+    "descripcion": ("descripcion", "descripción", "producto", "detalle"),
+    "unidad": ("unidad", "unidad_compra", "um", "und"),
+    "cantidad": ("cantidad", "cant"),
+    "precio": ("precio", "precio_unitario", "p_unitario", "valor_unitario"),
+}
+
+NS_UBL = {
+    "cac": "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2",
+    "cbc": "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2",
+}
+
+# Catálogo 01 de SUNAT (tipo de documento)
+TIPOS_DOC_UBL = {"01": "Factura", "03": "Boleta"}
+
+COLUMNAS_EMPAREJADO = [
+    "Línea", "Código", "Código Barras", "Descripción Factura", "Unidad", "Cantidad", "Precio",
+    "ID Producto", "Producto", "Emparejado por", "Unidad Compra", "Factor"
+]
+
+# -------------------------
+# Lectura del archivo
+# -------------------------
+def leer_numero(texto, linea, campo, opcional=False):
+    """
+    '1,234.50' / '1234,50' / '12' -> Decimal mayor que cero. ValueError con
+    la línea si no lo es; con opcional, vacío -> None y se admite el cero.
+    """
+    texto = (texto or "").strip().replace(" ", "")
+    if opcional and not texto:
+        return None
+    if "," in texto and "." in texto:
+        texto = texto.replace(",", "")
+    elif "," in texto:
+        texto = texto.replace(",", ".")
+    try:
+        valor = Decimal(texto)
+    except InvalidOperation:
+        raise ValueError(f"Línea {linea}: {campo} inválido ({texto or 'vacío'})") from None
+    if valor < 0 or (valor == 0 and not opcional):
+        raise ValueError(f"Línea {linea}: {campo} debe ser mayor que cero")
+    return valor
+
+def filas_csv(archivo, columnas, obligatorias):
+    """
+    Recorre un CSV con encabezado sin cargarlo entero: (número de línea,
+    {campo: texto}) por fila no vacía. columnas: {campo: nombres aceptados};
+    obligatorias: grupos de campos de los que debe venir al menos uno.
+    """
+    texto = archivo
+    if not isinstance(archivo, io.TextIOBase):
+        texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        muestra = texto.read(4096)
+        texto.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.reader(texto, dialecto)
+
+        encabezado = [c.strip().lower().replace(" ", "_") for c in next(lector, [])]
+        posicion = {}
+        for campo, nombres in columnas.items():
+            for nombre in nombres:
+                if nombre in encabezado:
+                    posicion[campo] = encabezado.index(nombre)
+                    break
+        faltantes = [grupo[0] for grupo in obligatorias if not any(c in posicion for c in grupo)]
+        if faltantes:
+            raise ValueError(f"Faltan columnas en el CSV: {', '.join(faltantes)}")
+
+        for n, fila in enumerate(lector, start=2):
+            if not any(c.strip() for c in fila):
+                continue
+            yield n, {
+                campo: fila[i] if i < len(fila) else None
+                for campo, i in posicion.items()
+            }
+    finally:
+        if texto is not archivo:
+            # Sin cerrar el archivo original (p. ej. el de st.file_uploader)
+            texto.detach()
+
+def _linea(n, codigo, codigo_barras, descripcion, unidad, cantidad, precio):
+    codigo = (codigo or "").strip() or None
+    codigo_barras = normalizar_codigo_barras(codigo_barras)
+    if codigo is None and codigo_barras is None:
+        raise ValueError(f"Línea {n}: sin código ni código de barras")
+    return {
+        "linea": n,
+        "codigo": codigo,
+        "codigo_barras": codigo_barras,
+        "descripcion": (descripcion or "").strip() or None,
+        "unidad": (unidad or "").strip() or None,
+        "cantidad": leer_numero(cantidad, n, "cantidad"),
+        "precio": leer_numero(precio, n, "precio"),
+    }
+
+def leer_factura_csv(archivo):
+    """archivo: binario o texto. Devuelve ({}, lineas)."""
+    obligatorias = [("codigo", "codigo_barras"), ("cantidad",), ("precio",)]
+    lineas = [
+        _linea(
+            n, fila.get("codigo"), fila.get("codigo_barras"), fila.get("descripcion"),
+            fila.get("unidad"), fila.get("cantidad"), fila.get("precio")
+        )
+        for n, fila in filas_csv(archivo, COLUMNAS_CSV, obligatorias)
+    ]
+    return {}, lineas
+
+def leer_factura_ubl(archivo):
+    """
+    Factura o boleta electrónica UBL 2.1 (SUNAT). Cabecera: nro_doc,
+    tipo_doc, fecha y ruc del emisor. Precio: cac:Price (valor unitario sin IGV).
+    """
+    cabecera, lineas = {}, []
+    ruta = []
+    for evento, elem in ET.iterparse(archivo, events=("start", "end")):
+        nombre = elem.tag.rsplit("}", 1)[-1]
+        if evento == "start":
+            ruta.append(nombre)
+            continue
+        ruta.pop()
+
+        if nombre == "InvoiceLine":
+            cantidad = elem.find("cbc:InvoicedQuantity", NS_UBL)
+            lineas.append(_linea(
+                len(lineas) + 1,
+                elem.findtext("cac:Item/cac:SellersItemIdentification/cbc:ID", namespaces=NS_UBL),
+                elem.findtext("cac:Item/cac:StandardItemIdentification/cbc:ID", namespaces=NS_UBL),
+                elem.findtext("cac:Item/cbc:Description", namespaces=NS_UBL),
+                cantidad.get("unitCode") if cantidad is not None else None,
+                cantidad.text if cantidad is not None else None,
+                elem.findtext("cac:Price/cbc:PriceAmount", namespaces=NS_UBL),
+            ))
+            elem.clear()
+        elif len(ruta) == 1:
+            # Hijos directos de Invoice
+            if nombre == "ID":
+                cabecera["nro_doc"] = (elem.text or "").strip()
+            elif nombre == "IssueDate":
+                cabecera["fecha"] = (elem.text or "").strip()
+            elif nombre == "InvoiceTypeCode":
+                cabecera["tipo_doc"] = TIPOS_DOC_UBL.get((elem.text or "").strip())
+            elif nombre == "AccountingSupplierParty":
+                cabecera["ruc"] = (elem.findtext(
+                    "cac:Party/cac:PartyIdentification/cbc:ID", namespaces=NS_UBL
+                ) or "").strip() or None
+                elem.clear()
+
+    if not lineas:
+        raise ValueError("El XML no tiene líneas (cac:InvoiceLine)")
+    return cabecera, lineas
+
+def leer_factura(nombre_archivo, archivo):
+    """(cabecera, lineas) según la extensión: .csv o .xml."""
+    try:
+        if nombre_archivo.lower().endswith(".xml"):
+            return leer_factura_ubl(archivo)
+        return leer_factura_csv(archivo)
+    except ET.ParseError as e:
+        raise ValueError(f"XML inválido: {e}") from None
+
+# -------------------------
+# Emparejar con producto
+# -------------------------
+# Producto de cada fila `i` (con columnas codigo, codigo_barras y unidad)
+# por orden de prioridad; m.unidad_compra/m.factor solo vienen del código
+# del proveedor. Lo usa también services/lista_precios.
+EMPAREJAR_PRODUCTO = """
+    LEFT JOIN LATERAL (
+        SELECT e.id_producto, e.criterio, e.unidad_compra, e.factor
+        FROM (
+            -- Con varias presentaciones del mismo código, la de la unidad de la fila
+            SELECT pp.id_producto, 'Código proveedor' AS criterio,
+                   pp.unidad_compra, pp.factor, 1 AS prioridad,
+                   pp.unidad_compra IS DISTINCT FROM i.unidad AS otra_unidad
+            FROM producto_proveedor pp
+            WHERE pp.id_proveedor = %(proveedor)s
+              AND pp.codigo_proveedor = i.codigo
+            UNION ALL
+            SELECT p.id, 'Código de barras', NULL, NULL, 2, false
+            FROM producto p
+            WHERE p.codigo_barras IN (i.codigo_barras, i.codigo)
+            UNION ALL
+            SELECT p.id, 'ID producto', NULL, NULL, 3, false
+            FROM producto p
+            WHERE p.id = i.codigo
+            UNION ALL
+            SELECT min(p.id), 'Catálogo', NULL, NULL, 4, false
+            FROM producto p
+            WHERE p.catalogo = i.codigo
+            HAVING count(*) = 1
+        ) e
+        ORDER BY e.prioridad, e.otra_unidad
+        LIMIT 1
+    ) m ON true
+"""
+
+# Las líneas de la factura van por COPY a esta tabla (ON COMMIT DROP: no
+# queda en la conexión que vuelve al pool)
+SQL_TABLA_IMPORTACION = """
+    CREATE TEMP TABLE compra_importacion (
+        linea integer,
+        codigo text,
+        codigo_barras text,
+        descripcion text,
+        unidad text,
+        cantidad numeric,
+        precio numeric
+    ) ON COMMIT DROP
+"""
+
+SQL_EMPAREJAR = f"""
+    SELECT i.linea, i.codigo, i.codigo_barras, i.descripcion, i.unidad,
+           i.cantidad, i.precio,
+           m.id_producto, p.descripcion, m.criterio,
+           COALESCE(m.unidad_compra, pr.unidad_compra, i.unidad, p.unidad_base),
+           COALESCE(m.factor, pr.factor, 1)
+    FROM compra_importacion i
+    {EMPAREJAR_PRODUCTO}
+    LEFT JOIN producto p ON p.id = m.id_producto
+    -- Presentación del proveedor con la unidad de la factura (su factor)
+    LEFT JOIN LATERAL (
+        SELECT pp.unidad_compra, pp.factor
+        FROM producto_proveedor pp
+        WHERE pp.id_producto = m.id_producto
+          AND pp.id_proveedor = %(proveedor)s
+          AND pp.unidad_compra = i.unidad
+        ORDER BY pp.id
+        LIMIT 1
+    ) pr ON m.unidad_compra IS NULL
+    ORDER BY i.linea
+"""
+
+def _copy_csv(lineas):
+    """Las líneas en el formato de COPY ... FROM STDIN (FORMAT csv)."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for l in lineas:
+        escritor.writerow([
+            l["linea"], l["codigo"], l["codigo_barras"], l["descripcion"],
+            l["unidad"], l["cantidad"], l["precio"]
+        ])
+    buffer.seek(0)
+    return buffer
+
+def emparejar_lineas(id_proveedor, lineas):
+    """
+    DataFrame con una fila por línea (COLUMNAS_EMPAREJADO); "ID Producto"
+    vacío = sin emparejar. Tres viajes a la BD sin importar el número de
+    líneas: tabla temporal, COPY y la consulta que empareja.
+    """
+    if not lineas:
+        return pd.DataFrame(columns=COLUMNAS_EMPAREJADO)
+
+    conn = get_connection()
+    try:
+        with transaccion(conn) as cursor:
+            cursor.execute(SQL_TABLA_IMPORTACION)
+            cursor.copy_expert(
+                "COPY compra_importacion FROM STDIN WITH (FORMAT csv)",
+                _copy_csv(lineas)
+            )
+            cursor.execute(SQL_EMPAREJAR, {"proveedor": id_proveedor})
+            filas = cursor.fetchall()
+    finally:
+        conn.close()
+
+    df = pd.DataFrame(filas, columns=COLUMNAS_EMPAREJADO)
+    return df.astype({"Cantidad": float, "Precio": float, "Factor": float})
+
+def carrito_desde_importacion(df_emparejado):
+    """Líneas emparejadas -> ítems del carrito de compras_app."""
+    carrito = []
+    for fila in df_emparejado[df_emparejado["ID Producto"].notna()].to_dict("records"):
+        cantidad, precio, factor = fila["Cantidad"], fila["Precio"], fila["Factor"]
+        carrito.append({
+            "ID Producto": fila["ID Producto"],
+            "Descripción": fila["Producto"],
+            "Unidad Compra": fila["Unidad Compra"],
+            "Factor": factor,
+            "Cantidad Compra": cantidad,
+            "Cantidad Final": cantidad * factor,
+            "Precio U. Compra": round(precio, 2),
+            "Subtotal": round(precio * cantidad, 2),
+            "Código Proveedor": fila["Código"],
+        })
+    return carrito
@@ -0,0 +1,246 @@
+# services/lista_precios.py
+"""
+Listas de precios de proveedor -> producto_proveedor.
+
+1. cargar_lista_precios: recorre el CSV del proveedor (decenas de miles de
+   filas), lo copia con COPY a una tabla temporal y en una sola sentencia
+   empareja cada fila con su producto (mismas reglas que la importación de
+   facturas) y actualiza o inserta la presentación (producto, unidad).
+   Todo en una transacción. Devuelve cada fila con el precio anterior y el
+   nuevo, y resumen_variaciones calcula las variaciones sobre las columnas.
+2. presentaciones_proveedor: todas las presentaciones de un proveedor en
+   memoria (st.cache_resource), para que compras_app no consulte la BD por
+   cada producto elegido. Se descarta al cargar una lista o al registrar
+   una compra que agrega presentaciones.
+
+CSV: primera fila con los nombres de columna (separador , ; o tab):
+    codigo (o codigo_barras), precio                  (obligatorias)
+    descripcion, unidad, factor, lote_min, tiempo_entrega   (opcionales)
+"""
+import csv
+import io
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from db import get_connection, transaccion
+from services.importacion_compras import EMPAREJAR_PRODUCTO, filas_csv, leer_numero
+from services.producto_service import normalizar_codigo_barras
+
+COLUMNAS_LISTA = {
+    "codigo": ("codigo", "código", "cod", "sku", "item"),
+    "codigo_barras": ("codigo_barras", "código_barras", "ean", "gtin", "barras"),
+    "descripcion": ("descripcion", "descripción", "producto", "detalle"),
+    "unidad": ("unidad", "unidad_compra", "um", "und"),
+    "factor": ("factor", "factor_conversion", "contenido"),
+    "precio": ("precio", "precio_compra", "precio_unitario", "costo"),
+    "lote_min": ("lote_min", "lote_minimo", "minimo"),
+    "tiempo_entrega": ("tiempo_entrega", "dias_entrega", "entrega"),
+}
+
+COLUMNAS_RESULTADO = [
+    "Línea", "Código", "Descripción Lista", "ID Producto", "Emparejado por",
+    "Unidad Compra", "Factor", "Precio Anterior", "Precio Nuevo", "Estado"
+]
+
+# -------------------------
+# Carga de la lista
+# -------------------------
+def _copy_lista(archivo):
+    """CSV del proveedor -> (buffer para COPY, número de filas), validando fila a fila."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    filas = 0
+    for n, fila in filas_csv(archivo, COLUMNAS_LISTA, [("codigo", "codigo_barras"), ("precio",)]):
+        codigo = (fila.get("codigo") or "").strip() or None
+        codigo_barras = normalizar_codigo_barras(fila.get("codigo_barras"))
+        if codigo is None and codigo_barras is None:
+            raise ValueError(f"Línea {n}: sin código ni código de barras")
+        escritor.writerow([
+            n, codigo, codigo_barras,
+            (fila.get("descripcion") or "").strip() or None,
+            (fila.get("unidad") or "").strip() or None,
+            leer_numero(fila.get("factor"), n, "factor", opcional=True),
+            leer_numero(fila.get("precio"), n, "precio"),
+            leer_numero(fila.get("lote_min"), n, "lote_min", opcional=True),
+            leer_numero(fila.get("tiempo_entrega"), n, "tiempo_entrega", opcional=True),
+        ])
+        filas += 1
+    buffer.seek(0)
+    return buffer, filas
+
+def cargar_lista_precios(id_proveedor, archivo):
+    """
+    Carga la lista de precios del proveedor. DataFrame con una fila por línea
+    del archivo (COLUMNAS_RESULTADO). Estado: Nueva, Actualizada, Repetida
+    (la presentación vuelve a aparecer más abajo: vale la última) o Sin
+    emparejar. Las presentaciones que no vienen en la lista no se tocan.
+    """
+    buffer, filas = _copy_lista(archivo)
+    if not filas:
+        raise ValueError("La lista de precios está vacía")
+
+    conn = get_connection()
+    try:
+        with transaccion(conn) as cursor:
+            cursor.execute("""
+                CREATE TEMP TABLE lista_precios_importacion (
+                    linea integer,
+                    codigo text,
+                    codigo_barras text,
+                    descripcion text,
+                    unidad text,
+                    factor numeric,
+                    precio numeric,
+                    lote_min numeric,
+                    tiempo_entrega numeric
+                ) ON COMMIT DROP
+            """)
+            cursor.copy_expert("COPY lista_precios_importacion FROM STDIN WITH (FORMAT csv)", buffer)
+
+            # Una carga a la vez, y sin compras insertando presentaciones a la par
+            cursor.execute("LOCK TABLE producto_proveedor IN SHARE ROW EXCLUSIVE MODE")
+            cursor.execute(f"""
+                WITH lista AS (
+                    SELECT i.*, m.id_producto, m.criterio,
+                           -- Sin unidad en la lista: la única presentación que ya tenía
+                           COALESCE(
+                               i.unidad, m.unidad_compra,
+                               (SELECT min(pp.unidad_compra) FROM producto_proveedor pp
+                                WHERE pp.id_producto = m.id_producto AND pp.id_proveedor = %(proveedor)s
+                                HAVING count(*) = 1),
+                               p.unidad_base
+                           ) AS unidad_compra,
+                           m.factor AS factor_codigo
+                    FROM lista_precios_importacion i
+                    {EMPAREJAR_PRODUCTO}
+                    LEFT JOIN producto p ON p.id = m.id_producto
+                ),
+                vigentes AS (
+                    SELECT DISTINCT ON (l.id_producto, l.unidad_compra) l.*
+                    FROM lista l
+                    WHERE l.id_producto IS NOT NULL
+                    ORDER BY l.id_producto, l.unidad_compra, l.linea DESC
+                ),
+                anteriores AS (
+                    SELECT DISTINCT ON (v.linea) v.linea, pp.factor, pp.precio_compra
+                    FROM vigentes v
+                    JOIN producto_proveedor pp
+                      ON pp.id_proveedor = %(proveedor)s
+                     AND pp.id_producto = v.id_producto
+                     AND pp.unidad_compra IS NOT DISTINCT FROM v.unidad_compra
+                    ORDER BY v.linea, pp.id
+                ),
+                actualizados AS (
+                    UPDATE producto_proveedor pp
+                    SET factor = COALESCE(v.factor, pp.factor),
+                        precio_compra = v.precio,
+                        lote_min = COALESCE(v.lote_min, pp.lote_min),
+                        tiempo_entrega = COALESCE(v.tiempo_entrega, pp.tiempo_entrega),
+                        codigo_proveedor = COALESCE(v.codigo, pp.codigo_proveedor)
+                    FROM vigentes v
+                    WHERE pp.id_proveedor = %(proveedor)s
+                      AND pp.id_producto = v.id_producto
+                      AND pp.unidad_compra IS NOT DISTINCT FROM v.unidad_compra
+                    RETURNING pp.id
+                ),
+                insertados AS (
+                    INSERT INTO producto_proveedor (
+                        id_producto, id_proveedor, unidad_compra, factor,
+                        precio_compra, lote_min, tiempo_entrega, codigo_proveedor
+                    )
+                    SELECT v.id_producto, %(proveedor)s, v.unidad_compra,
+                           COALESCE(v.factor, v.factor_codigo, 1),
+                           v.precio, v.lote_min, v.tiempo_entrega, v.codigo
+                    FROM vigentes v
+                    WHERE NOT EXISTS (SELECT 1 FROM anteriores a WHERE a.linea = v.linea)
+                    RETURNING id
+                )
+                SELECT l.linea, l.codigo, l.descripcion, l.id_producto, l.criterio,
+                       l.unidad_compra, COALESCE(l.factor, a.factor, l.factor_codigo, 1),
+                       a.precio_compra, l.precio,
+                       CASE
+                           WHEN l.id_producto IS NULL THEN 'Sin emparejar'
+                           WHEN v.linea IS NULL THEN 'Repetida'
+                           WHEN a.linea IS NULL THEN 'Nueva'
+                           ELSE 'Actualizada'
+                       END
+                FROM lista l
+                LEFT JOIN vigentes v ON v.linea = l.linea
+                LEFT JOIN anteriores a ON a.linea = l.linea
+                ORDER BY l.linea
+            """, {"proveedor": id_proveedor})
+            filas = cursor.fetchall()
+    finally:
+        conn.close()
+
+    presentaciones_proveedor.clear()
+
+    df = pd.DataFrame(filas, columns=COLUMNAS_RESULTADO)
+    return df.astype({"Factor": float, "Precio Anterior": float, "Precio Nuevo": float})
+
+def resumen_variaciones(df_lista):
+    """
+    Variación de precio de las presentaciones actualizadas (columnas
+    "Variación" y "Variación %" agregadas a df_lista) y un resumen en dict.
+    """
+    anterior = df_lista["Precio Anterior"].to_numpy(dtype=float)
+    nuevo = df_lista["Precio Nuevo"].to_numpy(dtype=float)
+    actualizada = (df_lista["Estado"] == "Actualizada").to_numpy()
+
+    variacion = np.where(actualizada, nuevo - anterior, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        porcentaje = np.where(actualizada & (anterior > 0), variacion / anterior * 100, np.nan)
+    df_lista["Variación"] = variacion.round(4)
+    df_lista["Variación %"] = porcentaje.round(2)
+
+    conocidas = porcentaje[~np.isnan(porcentaje)]
+    estados = df_lista["Estado"].value_counts()
+    return {
+        "filas": len(df_lista),
+        "nuevas": int(estados.get("Nueva", 0)),
+        "actualizadas": int(estados.get("Actualizada", 0)),
+        "repetidas": int(estados.get("Repetida", 0)),
+        "sin_emparejar": int(estados.get("Sin emparejar", 0)),
+        "suben": int((variacion > 0).sum()),
+        "bajan": int((variacion < 0).sum()),
+        "sin_cambio": int((variacion == 0).sum()),
+        "variacion_mediana": float(np.median(conocidas)) if conocidas.size else 0.0,
+        "variacion_p90": float(np.percentile(conocidas, 90)) if conocidas.size else 0.0,
+        "variacion_promedio": float(conocidas.mean()) if conocidas.size else 0.0,
+    }
+
+# -------------------------
+# Presentaciones en memoria
+# -------------------------
+SQL_PRESENTACIONES_PROVEEDOR = """
+    SELECT id_producto, unidad_compra, factor, precio_compra
+    FROM producto_proveedor
+    WHERE id_proveedor = %s
+    ORDER BY id_producto, unidad_compra, id
+"""
+
+@st.cache_resource(ttl=300, show_spinner=False)
+def presentaciones_proveedor(id_proveedor):
+    """{id_producto: [(unidad_compra, factor, precio_compra), ...]} del proveedor."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SQL_PRESENTACIONES_PROVEEDOR, (id_proveedor,))
+        filas = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+    por_producto = {}
+    for id_producto, unidad_compra, factor, precio_compra in filas:
+        por_producto.setdefault(id_producto, []).append((unidad_compra, factor, precio_compra))
+    return por_producto
+
+def presentaciones_producto(id_proveedor, id_producto):
+    """DataFrame (unidad_compra, factor, precio_compra), como lo leía compras_app."""
+    return pd.DataFrame(
+        presentaciones_proveedor(id_proveedor).get(id_producto, []),
+        columns=["unidad_compra", "factor", "precio_compra"]
+    )
@@ -1,15 +1,19 @@
 # services/producto_service.py
 import pandas as pd
-from db import get_connection
+import psycopg2
+from psycopg2.extras import execute_values
+from db import get_connection, transaccion
 from streamlit import cache_data
 
 def obtener_valores_unicos(columna):
     conn = get_connection()
-    df = pd.read_sql_query(
-        f"SELECT DISTINCT {columna} FROM producto WHERE {columna} IS NOT NULL",
-        conn
-    )
-    conn.close()
+    try:
+        df = pd.read_sql_query(
+            f"SELECT DISTINCT {columna} FROM producto WHERE {columna} IS NOT NULL",
+            conn
+        )
+    finally:
+        conn.close()
     return df[columna].dropna().sort_values().tolist()
 
 def procesar_criterio_comodin(criterio: str):
@@ -28,42 +32,45 @@ def procesar_criterio_comodin(criterio: str):
     return palabras
 
 
-def buscar_producto_avanzado(
-    criterio=None,
-    marca=None,
-    categoria=None,
-    stock=None,
-    limit=20
-):
-    conn = get_connection()
-    cursor = conn.cursor()
+def filtro_criterio(palabras):
+    """
+    Una condición por palabra sobre la columna `busqueda`
+    (id, descripción, catálogo, marca y modelo en minúsculas).
+    El índice trigram (idx_producto_busqueda_trgm) resuelve el LIKE '%...%'.
+    """
+    query = ""
+    params = []
+    for palabra in palabras:
+        query += " AND p.busqueda LIKE %s"
+        params.append(f"%{palabra}%")
+    return query, params
+
 
+COLUMNAS_PRODUCTO = """
+    p.id, p.descripcion, p.id_categoria, c.nombre as categoria,
+    p.catalogo, p.marca, p.modelo, p.ubicacion, p.precio_venta,
+    p.costo_promedio, p.margen_utilidad, p.stock_actual, p.imagen, p.activo, p.unidad_base,
+    p.codigo_barras
+"""
+
+
+def filtros_producto(criterio=None, marca=None, categoria=None, stock=None):
+    """
+    FROM + WHERE compartido por todas las búsquedas de productos
+    (POS, Compras y Productos). Devuelve (sql, params, orden, orden_params).
+    """
     query = """
-        SELECT p.id, p.descripcion, p.id_categoria, c.nombre as categoria, 
-               p.catalogo, p.marca, p.modelo, p.ubicacion, p.precio_venta,
-               p.costo_promedio,p.margen_utilidad, p.stock_actual, p.imagen, p.activo, p.unidad_base
-        FROM producto p 
-        LEFT JOIN categoria c ON p.id_categoria = c.id 
+        FROM producto p
+        LEFT JOIN categoria c ON p.id_categoria = c.id
         WHERE 1=1
     """
     params = []
+    palabras = procesar_criterio_comodin(criterio)
 
-    if criterio:
-        palabras = procesar_criterio_comodin(criterio)
-
-        for palabra in palabras:
-            like = f"%{palabra}%"
-
-            query += """
-                AND (
-                    LOWER(CAST(p.id AS TEXT)) LIKE %s OR
-                    LOWER(p.descripcion) LIKE %s OR
-                    LOWER(p.catalogo) LIKE %s OR
-                    LOWER(p.marca) LIKE %s OR
-                    LOWER(p.modelo) LIKE %s
-                )
-            """
-            params.extend([like] * 5)
+    if palabras:
+        filtro, filtro_params = filtro_criterio(palabras)
+        query += filtro
+        params.extend(filtro_params)
 
     if marca and marca != "Todos":
         query += " AND p.marca = %s"
@@ -78,83 +85,270 @@ def buscar_producto_avanzado(
     elif stock == "Sin stock":
         query += " AND p.stock_actual = 0"
 
-    query += " ORDER BY p.id LIMIT %s"
-    params.append(limit)
+    if palabras:
+        # Relevancia: coincidencia exacta de código/catálogo primero, luego
+        # donde aparece la primera palabra (código y descripción van al inicio
+        # de `busqueda`; catálogo, marca y modelo después)
+        orden = """
+            (LOWER(p.id) = %s OR LOWER(p.catalogo) = %s) DESC,
+            strpos(p.busqueda, %s),
+            p.id
+        """
+        orden_params = [palabras[0]] * 3
+    else:
+        orden = "p.id"
+        orden_params = []
 
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
+    return query, params, orden, orden_params
 
-    df = pd.DataFrame(rows, columns=[col[0] for col in cursor.description])
-    conn.close()
-    return df
+
+def consulta_buscar_productos(
+    criterio=None,
+    marca=None,
+    categoria=None,
+    stock=None,
+    limit=20,
+    facetas=False
+):
+    """(sql, params) de buscar_productos; benchmarks/verificar_planes la explica."""
+    filtros, params, orden, orden_params = filtros_producto(criterio, marca, categoria, stock)
+
+    if facetas:
+        sql_facetas = """
+            json_build_object(
+                'marca', (
+                    SELECT COALESCE(json_object_agg(marca, n), '{}')
+                    FROM (SELECT marca, COUNT(*) AS n FROM coincidencias
+                          WHERE marca IS NOT NULL GROUP BY marca) m
+                ),
+                'categoria', (
+                    SELECT COALESCE(json_object_agg(categoria, n), '{}')
+                    FROM (SELECT categoria, COUNT(*) AS n FROM coincidencias
+                          WHERE categoria IS NOT NULL GROUP BY categoria) k
+                )
+            )
+        """
+    else:
+        sql_facetas = "NULL::json"
+
+    # `coincidencias` (solo columnas livianas) se calcula una vez y alimenta
+    # la página, el total y las facetas. Las columnas completas se leen solo
+    # para los productos de la página. El LEFT JOIN desde `resumen` garantiza
+    # una fila aunque no haya resultados, para poder leer el total.
+    query = f"""
+        WITH coincidencias AS MATERIALIZED (
+            SELECT p.id, p.catalogo, p.busqueda, p.marca, c.nombre AS categoria
+            {filtros}
+        ),
+        pagina AS (
+            SELECT p.id FROM coincidencias p
+            ORDER BY {orden}
+            LIMIT %s
+        )
+        SELECT {COLUMNAS_PRODUCTO}, resumen.total, resumen.facetas
+        FROM (
+            SELECT (SELECT COUNT(*) FROM coincidencias) AS total,
+                   {sql_facetas} AS facetas
+        ) resumen
+        LEFT JOIN (
+            pagina
+            JOIN producto p ON p.id = pagina.id
+            LEFT JOIN categoria c ON p.id_categoria = c.id
+        ) ON TRUE
+        ORDER BY {orden}
+    """
+    return query, params + orden_params + [limit] + orden_params
 
 
-def contar_productos(
+def buscar_productos(
     criterio=None,
     marca=None,
     categoria=None,
-    stock=None
+    stock=None,
+    limit=20,
+    facetas=False
 ):
+    """
+    Página de resultados + total de coincidencias en una sola consulta.
+    Con facetas=True también trae cuántos productos hay por marca y por
+    categoría dentro de las coincidencias.
+
+    Devuelve {"productos": DataFrame, "total": int, "facetas": dict | None}
+    """
+    query, params = consulta_buscar_productos(criterio, marca, categoria, stock, limit, facetas)
+
     conn = get_connection()
     cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        columnas = [col[0] for col in cursor.description]
+    finally:
+        conn.close()
 
-    query = """
-        SELECT COUNT(*)
-        FROM producto p
-        LEFT JOIN categoria c ON p.id_categoria = c.id
-        WHERE 1=1
+    df = pd.DataFrame(rows, columns=columnas)
+    total = int(df["total"].iloc[0])
+    facetas_dict = df["facetas"].iloc[0] if facetas else None
+
+    df = df[df["id"].notna()].drop(columns=["total", "facetas"])
+    df = df.reset_index(drop=True)
+
+    return {"productos": df, "total": total, "facetas": facetas_dict}
+
+
+def listar_productos_pagina(
+    criterio=None,
+    marca=None,
+    categoria=None,
+    stock=None,
+    despues_de=None,
+    tamano=20
+):
     """
-    params = []
+    Paginación keyset por id: la página siguiente empieza en `p.id > despues_de`
+    (el id del último producto de la página anterior), así cualquier página
+    cuesta lo mismo sin importar cuántos productos coincidan.
 
-    # 🔎 MISMA LÓGICA QUE buscar_producto_avanzado
-    if criterio:
-        palabras = procesar_criterio_comodin(criterio)
+    Devuelve {"productos": DataFrame, "siguiente": id | None}
+    """
+    filtros, params, _, _ = filtros_producto(criterio, marca, categoria, stock)
 
-        for palabra in palabras:
-            like = f"%{palabra}%"
+    if despues_de is not None:
+        filtros += " AND p.id > %s"
+        params.append(despues_de)
 
-            query += """
-                AND (
-                    LOWER(CAST(p.id AS TEXT)) LIKE %s OR
-                    LOWER(p.descripcion) LIKE %s OR
-                    LOWER(p.catalogo) LIKE %s OR
-                    LOWER(p.marca) LIKE %s OR
-                    LOWER(p.modelo) LIKE %s
-                )
-            """
-            params.extend([like] * 5)
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        # Se pide una fila de más para saber si hay página siguiente
+        cursor.execute(
+            f"SELECT {COLUMNAS_PRODUCTO} {filtros} ORDER BY p.id LIMIT %s",
+            params + [tamano + 1]
+        )
+        rows = cursor.fetchall()
+        columnas = [col[0] for col in cursor.description]
+    finally:
+        conn.close()
 
-    if marca and marca != "Todos":
-        query += " AND p.marca = %s"
-        params.append(marca)
+    siguiente = None
+    if len(rows) > tamano:
+        rows = rows[:tamano]
+        siguiente = rows[-1][0]
 
-    if categoria and categoria != "Todos":
-        query += " AND c.nombre = %s"
-        params.append(categoria)
+    return {"productos": pd.DataFrame(rows, columns=columnas), "siguiente": siguiente}
 
-    if stock == "Con stock":
-        query += " AND p.stock_actual > 0"
-    elif stock == "Sin stock":
-        query += " AND p.stock_actual = 0"
 
-    cursor.execute(query, params)
-    total = cursor.fetchone()[0]
+def normalizar_codigo_barras(codigo):
+    """Quita espacios y saltos que agregan algunos lectores; '' -> None."""
+    codigo = (codigo or "").strip()
+    return codigo or None
+
+
+SQL_POR_CODIGO_BARRAS = f"""
+    SELECT {COLUMNAS_PRODUCTO}
+    FROM producto p
+    LEFT JOIN categoria c ON p.id_categoria = c.id
+    WHERE p.codigo_barras = %s
+"""
+
+
+def buscar_por_codigo_barras(codigo):
+    """Producto por código de barras exacto (índice UNIQUE). dict o None."""
+    codigo = normalizar_codigo_barras(codigo)
+    if codigo is None:
+        return None
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SQL_POR_CODIGO_BARRAS, (codigo,))
+        row = cursor.fetchone()
+        columnas = [col[0] for col in cursor.description]
+    finally:
+        conn.close()
+
+    return dict(zip(columnas, row)) if row else None
+
+
+RESTRICCION_CODIGO_BARRAS = "producto_codigo_barras_key"
+
+
+def _codigos_ajenos(cursor, pares):
+    """[(codigo, id)] de los códigos del lote que ya son de otro producto."""
+    cursor.execute("""
+        SELECT p.codigo_barras, p.id
+        FROM producto p
+        JOIN unnest(%s::text[], %s::text[]) AS v(id, codigo)
+          ON p.codigo_barras = v.codigo AND p.id <> v.id
+    """, ([i for i, _ in pares], [c for _, c in pares]))
+    conflictos = cursor.fetchall()
+    if conflictos:
+        detalle = ", ".join(f"{c} (ya es de {i})" for c, i in conflictos)
+        raise ValueError(f"Códigos ya asignados a otros productos: {detalle}")
+
+
+def asignar_codigos_barras(pares):
+    """
+    Asigna códigos de barras en lote: pares = [(id_producto, codigo)].
+    Un código vacío limpia el del producto. Verificación y un solo
+    UPDATE ... FROM (VALUES ...) en una transacción: todo o nada.
+
+    Lanza ValueError si un código se repite en el lote o ya pertenece a otro
+    producto. Devuelve (actualizados, ids_inexistentes).
+    """
+    pares = [(str(i).strip(), normalizar_codigo_barras(c)) for i, c in pares if str(i).strip()]
+    if not pares:
+        return 0, []
+
+    vistos, repetidos = set(), set()
+    for _, c in pares:
+        if c and c in vistos:
+            repetidos.add(c)
+        vistos.add(c)
+    repetidos = sorted(repetidos)
+    if repetidos:
+        raise ValueError(f"Códigos repetidos en el lote: {', '.join(repetidos)}")
+
+    conn = get_connection()
+    try:
+        with transaccion(conn) as cursor:
+            _codigos_ajenos(cursor, pares)
+            # page_size = todo el lote: una sola sentencia
+            filas = execute_values(cursor, """
+                UPDATE producto p
+                SET codigo_barras = v.codigo
+                FROM (VALUES %s) AS v(id, codigo)
+                WHERE p.id = v.id
+                RETURNING p.id
+            """, pares, template="(%s, %s::text)", page_size=len(pares), fetch=True)
+    except psycopg2.errors.UniqueViolation as e:
+        if e.diag.constraint_name != RESTRICCION_CODIGO_BARRAS:
+            raise
+        # Otra asignación tomó el código entre la verificación y el UPDATE
+        _codigos_ajenos(conn.cursor(), pares)
+        raise ValueError("Códigos ya asignados a otros productos") from None
+    finally:
+        conn.close()
+
+    actualizados = {f[0] for f in filas}
+    inexistentes = [i for i, _ in pares if i not in actualizados]
+    return len(actualizados), inexistentes
 
-    conn.close()
-    return total
 
 @cache_data(ttl=300)
 def obtener_filtros_productos():
     conn = get_connection()
-    df = pd.read_sql_query("""
-        SELECT DISTINCT
-            p.marca,
-            c.nombre AS categoria
-        FROM producto p
-        LEFT JOIN categoria c ON p.id_categoria = c.id
-        WHERE p.activo = 1
-    """, conn)
-    conn.close()
+    try:
+        df = pd.read_sql_query("""
+            SELECT DISTINCT
+                p.marca,
+                c.nombre AS categoria
+            FROM producto p
+            LEFT JOIN categoria c ON p.id_categoria = c.id
+            WHERE p.activo = 1
+        """, conn)
+    finally:
+        conn.close()
     return df
 
 def to_float(value, default=0.0):
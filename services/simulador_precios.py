@@ -0,0 +1,272 @@
+# services/simulador_precios.py
+"""
+Simulador de precios: qué pasa con los precios, los ingresos y la utilidad
+si cambia el margen de una categoría, una marca o todo el catálogo, antes
+de guardar nada.
+
+- cargar_productos: una consulta; costo, margen, precios y unidades
+  vendidas quedan en arreglos de NumPy (una posición por producto).
+- simular / impacto: cada escenario se calcula sobre los arreglos
+  completos, sin ir a la BD (100 000 productos en milisegundos).
+- aplicar_simulacion: los precios que cambian, en una llamada a la función
+  aplicar_precios de la BD (migración 0017).
+
+Los montos se manejan como enteros exactos (costo, márgenes e IGV en
+diezmilésimos, como NUMERIC(12,4) / NUMERIC(5,4); precios en céntimos),
+así el redondeo es idéntico al de recalcular_precios en la BD: valor_venta
+a 2 decimales y precio con IGV al múltiplo de 0.50, mitad al par.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+from db import get_connection, transaccion
+
+ESCALA = 10_000
+
+# Variación de precio (%) para la distribución del impacto
+TRAMOS_VARIACION = [-np.inf, -20, -10, -5, -1, 0, 1, 5, 10, 20, np.inf]
+ETIQUETAS_TRAMOS = [
+    "≤ -20%", "-20% a -10%", "-10% a -5%", "-5% a -1%", "-1% a 0%",
+    "0% a 1%", "1% a 5%", "5% a 10%", "10% a 20%", "≥ 20%"
+]
+
+
+def a_diezmilesimos(valor):
+    """0.25 -> 2500 (exacto, vía Decimal)."""
+    return int((Decimal(str(valor)) * ESCALA).to_integral_value())
+
+# -------------------------
+# Reglas de precio (las de la BD)
+# -------------------------
+def dividir_al_par(numerador, denominador):
+    """Cociente entero de arreglos int64 redondeado mitad al par (denominador > 0)."""
+    cociente, resto = np.divmod(numerador, denominador)
+    doble = 2 * resto
+    return cociente + ((doble > denominador) | ((doble == denominador) & (cociente % 2 == 1)))
+
+def precios_propuestos(costo, margen, igv):
+    """
+    costo, margen: arreglos int64 en diezmilésimos; igv: entero en diezmilésimos.
+    (valor_venta, precio_venta) en céntimos, como recalcular_precios:
+        valor_venta  = redondeo(costo / (1 - margen), 2)
+        precio_venta = redondeo(costo / (1 - margen) * (1 + igv) * 2, 0) / 2
+    Con margen >= 1 el resultado no vale (ver simular).
+    """
+    costo = np.asarray(costo, dtype=np.int64)
+    base = np.maximum(ESCALA - np.asarray(margen, dtype=np.int64), 1)
+    valor = dividir_al_par(costo * 100, base)
+    medios = dividir_al_par(costo * (ESCALA + igv) * 2, base * ESCALA)
+    return valor, medios * 50
+
+# -------------------------
+# Carga
+# -------------------------
+def cargar_productos(categoria=None, marca=None, dias_ventas=90):
+    """
+    Productos activos con costo del alcance (None = todos), en arreglos:
+    id, descripcion, costo y margen_propio (diezmilésimos; 0 = usa el
+    global), valor y precio actuales (céntimos; -1 = sin precio), vendidas
+    (unidades en los últimos dias_ventas días). Más igv y margen_global.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT igv, margen_utilidad FROM configuracion WHERE id = 1")
+        config = cursor.fetchone()
+        if not config:
+            raise ValueError("No hay configuración (IGV y margen global)")
+
+        cursor.execute("""
+            SELECT p.id, p.descripcion,
+                   (p.costo_promedio * 10000)::bigint,
+                   COALESCE((p.margen_utilidad * 10000)::bigint, 0),
+                   COALESCE((p.valor_venta * 100)::bigint, -1),
+                   COALESCE((p.precio_venta * 100)::bigint, -1),
+                   COALESCE(v.vendidas, 0)::float8
+            FROM producto p
+            LEFT JOIN categoria c ON c.id = p.id_categoria
+            LEFT JOIN (
+                SELECT d.id_producto, SUM(d.cantidad) AS vendidas
+                FROM venta_detalle d
+                JOIN venta v ON v.id = d.id_venta
+                WHERE v.estado = 'EMITIDA'
+                  AND v.fecha >= now() - make_interval(days => %(dias)s)
+                GROUP BY d.id_producto
+            ) v ON v.id_producto = p.id
+            WHERE p.activo = 1
+              AND p.costo_promedio IS NOT NULL
+              AND (%(categoria)s::text IS NULL OR c.nombre = %(categoria)s)
+              AND (%(marca)s::text IS NULL OR p.marca = %(marca)s)
+            ORDER BY p.id
+        """, {"categoria": categoria, "marca": marca, "dias": int(dias_ventas)})
+        filas = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    columnas = list(zip(*filas)) or [()] * 7
+    return {
+        "id": np.array(columnas[0], dtype=object),
+        "descripcion": np.array(columnas[1], dtype=object),
+        "costo": np.array(columnas[2], dtype=np.int64),
+        "margen_propio": np.array(columnas[3], dtype=np.int64),
+        "valor": np.array(columnas[4], dtype=np.int64),
+        "precio": np.array(columnas[5], dtype=np.int64),
+        "vendidas": np.array(columnas[6], dtype=np.float64),
+        "igv": a_diezmilesimos(config[0]),
+        "margen_global": a_diezmilesimos(config[1]),
+    }
+
+# -------------------------
+# Escenarios
+# -------------------------
+def simular(datos, margen=None):
+    """
+    Precios propuestos. margen (decimal, p. ej. 0.30): el mismo para todos
+    los productos; None: el de cada producto o el global. Devuelve
+    {margen, valor, precio, validos}; validos = margen < 1.
+    """
+    if margen is None:
+        margen_uso = np.where(datos["margen_propio"] != 0, datos["margen_propio"], datos["margen_global"])
+    else:
+        margen_uso = np.full(len(datos["id"]), a_diezmilesimos(margen), dtype=np.int64)
+
+    valor, precio = precios_propuestos(datos["costo"], margen_uso, datos["igv"])
+    return {
+        "margen": margen_uso,
+        "margen_fijado": margen is not None,
+        "valor": valor,
+        "precio": precio,
+        "validos": margen_uso < ESCALA,
+    }
+
+def _cambios(datos, simulacion):
+    cambia = (simulacion["precio"] != datos["precio"]) | (simulacion["valor"] != datos["valor"])
+    if simulacion["margen_fijado"]:
+        cambia |= simulacion["margen"] != datos["margen_propio"]
+    return cambia & simulacion["validos"]
+
+def impacto(datos, simulacion, top=50):
+    """
+    Resumen del escenario contra los precios actuales: cuántos suben o
+    bajan, ingresos y utilidad (sin IGV) con las unidades vendidas del
+    período, distribución de variaciones y márgenes, y los mayores cambios.
+    """
+    validos = simulacion["validos"]
+    con_precio = validos & (datos["precio"] > 0)
+    actual = datos["precio"] / 100
+    nuevo = simulacion["precio"] / 100
+    costo = datos["costo"] / ESCALA
+    divisor_igv = 1 + datos["igv"] / ESCALA
+    vendidas = datos["vendidas"]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variacion = np.where(con_precio, (nuevo - actual) / actual * 100, np.nan)
+        margen_actual = np.where(con_precio, 1 - costo * divisor_igv / actual, np.nan) * 100
+        margen_nuevo = np.where(validos & (nuevo > 0), 1 - costo * divisor_igv / nuevo, np.nan) * 100
+
+    vendidos = con_precio & (vendidas > 0)
+    ingresos_actuales = float(np.sum(vendidas[vendidos] * actual[vendidos]))
+    ingresos_nuevos = float(np.sum(vendidas[vendidos] * nuevo[vendidos]))
+    utilidad_actual = float(np.sum(vendidas[vendidos] * (actual[vendidos] / divisor_igv - costo[vendidos])))
+    utilidad_nueva = float(np.sum(vendidas[vendidos] * (nuevo[vendidos] / divisor_igv - costo[vendidos])))
+
+    cambia = _cambios(datos, simulacion)
+    distintos = con_precio & (simulacion["precio"] != datos["precio"])
+    conteo, _ = np.histogram(variacion[distintos], bins=TRAMOS_VARIACION)
+    distribucion = pd.DataFrame({"Productos": conteo}, index=pd.Index(ETIQUETAS_TRAMOS, name="Variación"))
+
+    def percentiles(valores):
+        valores = valores[~np.isnan(valores)]
+        if not valores.size:
+            return [np.nan] * 3
+        return np.percentile(valores, [10, 50, 90]).round(2).tolist()
+
+    margenes = pd.DataFrame(
+        [percentiles(margen_actual), percentiles(margen_nuevo)],
+        index=["Actual", "Propuesto"], columns=["p10 %", "Mediana %", "p90 %"]
+    )
+
+    orden = np.argsort(-np.nan_to_num(np.abs(variacion), nan=-1))[:top]
+    orden = orden[distintos[orden]]
+    mayores = pd.DataFrame({
+        "ID": datos["id"][orden],
+        "Descripción": datos["descripcion"][orden],
+        "Costo": costo[orden].round(4),
+        "Margen %": (simulacion["margen"][orden] / ESCALA * 100).round(2),
+        "Precio Actual": actual[orden],
+        "Precio Propuesto": nuevo[orden],
+        "Variación %": variacion[orden].round(2),
+        "Vendidas": vendidas[orden],
+    })
+
+    return {
+        "productos": len(datos["id"]),
+        "cambian": int(cambia.sum()),
+        "suben": int((distintos & (nuevo > actual)).sum()),
+        "bajan": int((distintos & (nuevo < actual)).sum()),
+        "margen_invalido": int((~validos).sum()),
+        "variacion_mediana": float(np.nanmedian(variacion[distintos])) if distintos.any() else 0.0,
+        "ingresos_actuales": ingresos_actuales,
+        "ingresos_nuevos": ingresos_nuevos,
+        "utilidad_actual": utilidad_actual,
+        "utilidad_nueva": utilidad_nueva,
+        "distribucion": distribucion,
+        "margenes": margenes,
+        "mayores": mayores,
+    }
+
+# -------------------------
+# Guardar
+# -------------------------
+def _decimales(enteros, posiciones):
+    return [Decimal(int(v)).scaleb(-posiciones) for v in enteros]
+
+APLICAR_PRECIOS = (
+    "SELECT * FROM aplicar_precios(%s::text[], %s::numeric[], %s::numeric[], "
+    "%s::numeric[], %s::numeric[], %s::numeric[], %s)"
+)
+
+def parametros_aplicar(datos, simulacion):
+    """Arreglos para aplicar_precios con los productos que cambian (None si ninguno)."""
+    cambia = _cambios(datos, simulacion)
+    if not cambia.any():
+        return None
+
+    margenes_uso = _decimales(simulacion["margen"][cambia], 4)
+    return (
+        datos["id"][cambia].tolist(),
+        _decimales(datos["costo"][cambia], 4),
+        margenes_uso if simulacion["margen_fijado"] else [None] * len(margenes_uso),
+        margenes_uso,
+        _decimales(simulacion["valor"][cambia], 2),
+        _decimales(simulacion["precio"][cambia], 2),
+        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    )
+
+def aplicar_simulacion(datos, simulacion):
+    """
+    Guarda los precios (y el margen, si el escenario lo fija) de los
+    productos que cambian, en una llamada a aplicar_precios: una
+    transacción. Los productos cuyo costo cambió desde la carga se omiten.
+    Devuelve {"actualizados", "cambios_precio", "omitidos"}.
+    """
+    parametros = parametros_aplicar(datos, simulacion)
+    if parametros is None:
+        return {"actualizados": 0, "cambios_precio": 0, "omitidos": 0}
+
+    conn = get_connection()
+    try:
+        with transaccion(conn) as cursor:
+            cursor.execute(APLICAR_PRECIOS, parametros)
+            actualizados, cambios_precio, omitidos = cursor.fetchone()
+    except psycopg2.errors.RaiseException as e:
+        raise ValueError(e.diag.message_primary) from None
+    finally:
+        conn.close()
+
+    return {"actualizados": actualizados, "cambios_precio": cambios_precio, "omitidos": omitidos}
@@ -2,7 +2,12 @@
 import streamlit as st
 from datetime import datetime, date
 from decimal import Decimal
-from db import get_connection, registrar_salida_por_venta, obtener_fecha_lima, query_df
+import json
+import psycopg2
+from psycopg2.extras import Json
+from db import get_connection, obtener_fecha_lima, query_df
+from services.carrito_taller import dataframe_detalle, obtener_carritos_taller
+from services.catalogo_cache import buscar_codigo_barras, descontar_stock_catalogo
 
 def f(value):
     return float(value) if value is not None else None
@@ -47,7 +52,7 @@ def venta_ya_cerrada(id_venta):
         df.iloc[0]["estado"] in ("EMITIDA", "CERRADA")
     )
 
-def guardar_venta(
+def armar_venta(
     cliente,
     regimen,
     tipo_comprobante,
@@ -59,207 +64,124 @@ def guardar_venta(
     carrito,
     usuario,
     id_caja,
-    id_venta_existente=None
+    id_venta_existente=None,
+    serie=None
 ):
-    # 🔒 Protección backend
-    if id_venta_existente:
-        if venta_ya_cerrada(id_venta_existente):
-            raise Exception("La venta ya fue cerrada previamente")
-        
-    fecha = obtener_fecha_lima()
+    """(venta, items) tal como los recibe la función registrar_venta de la BD."""
+    if nro_comprobante:
+        serie, numero = parsear_comprobante(nro_comprobante)
+    elif serie:
+        numero = None
+    else:
+        raise Exception("Indique la serie o el número del comprobante")
+
+    venta = {
+        "id_venta": id_venta_existente,
+        "fecha": obtener_fecha_lima(),
+        "id_cliente": cliente["id"],
+        "id_usuario": int(usuario["id"]),
+        "usuario": usuario["username"],
+        "id_caja": id_caja,
+        "incluye_igv": "Nuevo RUS" not in regimen,
+        "tipo_comprobante": tipo_comprobante,
+        "serie": serie,
+        "numero": numero,
+        "nro_comprobante": nro_comprobante or None,
+        "metodo_pago": metodo_pago,
+        "placa_vehiculo": placa_vehiculo,
+        "pago_cliente": pago_cliente,
+        "vuelto": vuelto,
+    }
 
+    # Taller: el detalle ya está en venta_detalle
+    items = [] if id_venta_existente else [
+        {
+            "id_producto": item["ID Producto"],
+            "cantidad": Decimal(str(item["Cantidad"])),
+            "precio_unitario": Decimal(str(item["Precio Unitario"])),
+            "subtotal": Decimal(str(item["Subtotal"])),
+        }
+        for item in carrito
+    ]
+    return venta, items
+
+def registrar_venta_en_bd(venta, items):
+    """
+    Un solo viaje de ida y vuelta y una sola transacción: registrar_venta.
+    Devuelve (id_venta, nro_comprobante). Los errores de psycopg2 se propagan.
+    """
     conn = get_connection()
     cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT id_venta, nro_comprobante FROM registrar_venta(%s, %s)",
+            (Json(venta, dumps=_json_dumps), Json(items, dumps=_json_dumps))
+        )
+        fila = cursor.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+    return fila
 
-    def to_decimal(value):
-        if value is None:
-            return None
-        return Decimal(str(value))
+SQL_VENTA_POR_ID_EXTERNO = "SELECT id, nro_comprobante FROM venta WHERE id_externo = %s"
 
-    # Calcular totales correctamente
-    if id_venta_existente:
-        df = query_df(
-            "SELECT COALESCE(SUM(sub_total),0) total FROM venta_detalle WHERE id_venta=%s",
-            (id_venta_existente,)
-        )
-        valor_venta = Decimal(str(df.iloc[0]["total"]))
-    else:
-        valor_venta = sum(
-            (Decimal(str(i["Subtotal"])) for i in carrito),
-            Decimal("0.00")
-        )
-    tot = calcular_totales(valor_venta, regimen)
-
-    # 🔒 Normalizar totales (evita np.float64)
-    tot = {
-        "valor_venta": to_decimal(tot["valor_venta"]),
-        "op_gravada": to_decimal(tot["op_gravada"]),
-        "igv": to_decimal(tot["igv"]),
-        "total": to_decimal(tot["total"]),
-    }
+def venta_por_id_externo(id_externo):
+    """(id_venta, nro_comprobante) de la venta registrada con ese id_externo, o None."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SQL_VENTA_POR_ID_EXTERNO, (id_externo,))
+        return cursor.fetchone()
+    finally:
+        conn.close()
 
-    # Validar caja abierta
-    cursor.execute("SELECT estado FROM caja WHERE id = %s", (id_caja,))
-    estado = cursor.fetchone()
-    if not estado or estado[0] != "ABIERTA":
-        raise Exception("No hay caja abierta")
+def guardar_venta(
+    cliente,
+    regimen,
+    tipo_comprobante,
+    metodo_pago,
+    nro_comprobante,
+    placa_vehiculo,
+    pago_cliente,
+    vuelto,
+    carrito,
+    usuario,
+    id_caja,
+    id_venta_existente=None,
+    serie=None
+):
+    """
+    Registra la venta (POS) o cierra la orden de taller `id_venta_existente`.
+    Todo corre en la función registrar_venta de la BD: un solo viaje de ida y
+    vuelta y una sola transacción. Devuelve el id de la venta.
 
-    pago_cliente_db = (
-        to_decimal(pago_cliente)
-        if metodo_pago == "Efectivo" and pago_cliente is not None
-        else None
+    Sin nro_comprobante, la BD asigna el siguiente número de `serie` al
+    confirmar (sin huecos ni duplicados entre cajas).
+    """
+    venta, items = armar_venta(
+        cliente, regimen, tipo_comprobante, metodo_pago, nro_comprobante,
+        placa_vehiculo, pago_cliente, vuelto, carrito, usuario, id_caja,
+        id_venta_existente, serie
     )
 
-    vuelto_db = (
-        to_decimal(vuelto)
-        if metodo_pago == "Efectivo" and vuelto is not None
-        else None
-    )
+    try:
+        id_venta, _ = registrar_venta_en_bd(venta, items)
+    except psycopg2.errors.RaiseException as e:
+        # Validaciones de la función (caja cerrada, venta ya cerrada...)
+        raise Exception(e.diag.message_primary) from None
 
-    # ----------------------
-    # Insertar venta
-    # ----------------------
     if id_venta_existente:
-        cursor.execute("""
-            UPDATE venta
-            SET
-                suma_total = %s,
-                op_gravada = %s,
-                igv = %s,
-                total = %s,
-                tipo_comprobante = %s,
-                metodo_pago = %s,
-                nro_comprobante = %s,
-                pago_cliente = %s,
-                vuelto = %s,
-                estado = 'EMITIDA'
-            WHERE id = %s
-            RETURNING id
-        """, (
-            tot["valor_venta"],
-            tot["op_gravada"],
-            tot["igv"],
-            tot["total"],
-            tipo_comprobante,
-            metodo_pago,
-            nro_comprobante,
-            pago_cliente_db,
-            vuelto_db,
-            id_venta_existente
-        ))
+        obtener_carritos_taller().invalidar(id_venta_existente)
     else:
-        cursor.execute("""
-            INSERT INTO venta (
-                fecha, id_cliente, id_usuario,
-                suma_total, op_gravada, igv, total,
-                tipo_comprobante, metodo_pago, nro_comprobante,
-                placa_vehiculo, pago_cliente, vuelto, id_caja, estado
-            )
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,'EMITIDA')
-            RETURNING id
-        """, (
-            fecha,
-            cliente["id"],
-            int(usuario["id"]),
-            tot["valor_venta"],
-            tot["op_gravada"],
-            tot["igv"],
-            tot["total"],
-            tipo_comprobante,
-            metodo_pago,
-            nro_comprobante,
-            placa_vehiculo,
-            pago_cliente_db,
-            vuelto_db,
-            id_caja
-        ))
-
-    row = cursor.fetchone()
-    if row is None:
-        raise Exception("No se obtuvo resultado de la consulta")
-    id_venta = row[0]
-
-    # ----------------------
-    # Actualizar correlativo
-    # ----------------------
-    # Insertar/actualizar correlativo **solo después de guardar la venta**
-    serie, numero = parsear_comprobante(nro_comprobante)
-
-    cursor.execute("""
-        INSERT INTO correlativo_comprobante (
-            tipo, serie, numero, estado, fecha, id_venta
+        descontar_stock_catalogo(
+            [(item["ID Producto"], item["Cantidad"]) for item in carrito]
         )
-        VALUES (%s, %s, %s, 'EMITIDO', %s, %s)
-        ON CONFLICT (tipo, serie, numero)
-        DO UPDATE SET
-            id_venta = EXCLUDED.id_venta,
-            estado = 'EMITIDO',
-            fecha = EXCLUDED.fecha
-    """, (
-        tipo_comprobante.upper(),
-        serie,
-        numero,
-        fecha,
-        id_venta
-    ))
-
-    # ----------------------
-    # Insertar detalle de venta y registrar salidas
-    # ----------------------
-    if not id_venta_existente:
-        for item in carrito:
-            cantidad = Decimal(str(item["Cantidad"]))
-            precio_unit = Decimal(str(item["Precio Unitario"]))
-
-            if "Nuevo RUS" not in regimen:
-                precio_unit = (precio_unit / Decimal("1.18")).quantize(Decimal("0.01"))
-
-            subtotal = (precio_unit * cantidad).quantize(Decimal("0.01"))
-
-            cursor.execute("""
-                INSERT INTO venta_detalle
-                (id_venta, id_producto, cantidad, precio_unitario, sub_total, precio_final)
-                VALUES (%s,%s,%s,%s,%s,%s)
-            """, (
-                id_venta,
-                item["ID Producto"],
-                cantidad,
-                precio_unit,
-                subtotal,
-                subtotal
-            ))
-
-            registrar_salida_por_venta(
-                cursor,
-                item["ID Producto"],
-                cantidad,
-                fecha,
-                f"Venta {nro_comprobante}"
-            )
-
-    # ----------------------
-    # Registrar ingreso en caja
-    # ----------------------
-    if metodo_pago == "Efectivo":
-        cursor.execute("""
-            INSERT INTO caja_movimiento (
-                id_caja, fecha, tipo, metodo_pago,
-                monto, referencia, id_venta, usuario
-            )
-            VALUES (%s,%s,'INGRESO','Efectivo',%s,%s,%s,%s)
-        """, (
-            id_caja,
-            fecha,
-            tot["total"],
-            f"Venta {nro_comprobante}",
-            id_venta,
-            usuario["username"]
-        ))
-
-    conn.commit()
-    conn.close()
     return id_venta
 
+def _json_dumps(valor):
+    # Decimal y datetime viajan como texto: sin pérdida de precisión
+    return json.dumps(valor, default=str)
+
 def inicializar_estado_venta(state):
     state.setdefault("carrito_ventas", [])
     state.setdefault("venta_guardada", False)
@@ -270,166 +192,101 @@ def precio_valido(precio, costo):
     return precio >= 0
 
 def anular_venta(venta_id, motivo, usuario):
-    conn = get_connection()
-    cursor = conn.cursor()
+    anular_ventas([venta_id], motivo, usuario)
 
-    cursor.execute("""
-        SELECT estado, reimpresiones, total, metodo_pago, id_caja, nro_comprobante
-        FROM venta
-        WHERE id = %s
-    """, (venta_id,))
-    row = cursor.fetchone()
-
-    if not row:
-        raise ValueError("Venta no encontrada")
-
-    estado, reimp, total, metodo_pago, id_caja, nro = row
-
-    if estado == "ANULADA":
-        raise ValueError("La venta ya está anulada")
-
-    if reimp > 0:
-        raise ValueError("No se puede anular una venta reimpresa")
-
-    fecha = obtener_fecha_lima()
-
-    # Anular venta
-    cursor.execute("""
-        UPDATE venta
-        SET estado='ANULADA',
-            motivo_anulacion=%s,
-            fecha_anulacion=%s,
-            usuario_anulacion=%s
-        WHERE id=%s
-    """, (motivo, fecha, usuario["nombre"], venta_id))
-
-    # Detalles
-    cursor.execute("""
-        SELECT id_producto, cantidad
-        FROM venta_detalle
-        WHERE id_venta = %s
-    """, (venta_id,))
-    detalles = cursor.fetchall()
-
-    for id_producto, cantidad in detalles:
-        # devolver stock
-        cursor.execute("""
-            UPDATE producto
-            SET stock_actual = stock_actual + %s
-            WHERE id = %s
-        """, (cantidad, id_producto))
-
-        # registrar kardex
-        cursor.execute("""
-            SELECT costo_promedio
-            FROM producto
-            WHERE id = %s
-        """, (id_producto,))
-
-        row = cursor.fetchone()
-        if row is None:
-            raise Exception("No se pudo obtener el costo")
-        costo = row[0]
+def anular_ventas(ids_venta, motivo, usuario):
+    """
+    Anula una o varias ventas en una sola llamada a la BD (anular_ventas):
+    devuelve el stock y el valor de inventario, escribe el kardex de reversión
+    y el egreso de caja. Si alguna no se puede anular, no se anula ninguna.
+    """
+    ids = sorted({int(i) for i in ids_venta})
+    if not ids:
+        raise ValueError("Seleccione al menos una venta")
 
-        cursor.execute("""
-            INSERT INTO movimientos
-            (id_producto, tipo, cantidad, fecha, motivo, referencia, costo_unitario, valor_total)
-            VALUES (%s,'entrada',%s,%s,'Anulación de venta',%s,%s,%s)
-        """, (
-            id_producto,
-            cantidad,
-            fecha,
-            f"Venta {nro}",
-            costo,
-            cantidad * costo
-        ))
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT id_producto, cantidad FROM anular_ventas(%s, %s, %s, %s)",
+            (ids, motivo, usuario["nombre"], obtener_fecha_lima())
+        )
+        repuestos = cursor.fetchall()
+        conn.commit()
+    except psycopg2.errors.RaiseException as e:
+        raise ValueError(e.diag.message_primary) from None
+    finally:
+        conn.close()
+
+    descontar_stock_catalogo(
+        [(id_producto, -cantidad) for id_producto, cantidad in repuestos]
+    )
 
-    # Correlativo
-    cursor.execute("""
-        UPDATE correlativo_comprobante
-        SET estado='ANULADO'
-        WHERE id_venta=%s
-    """, (venta_id,))
-
-    # Evento
-    cursor.execute("""
-        INSERT INTO venta_evento
-        (id_venta, tipo, fecha, usuario, observacion)
-        VALUES (%s,'ANULACION',%s,%s,%s)
-    """, (venta_id, fecha, usuario["nombre"], motivo))
-
-    # Caja: EGRESO
-    if metodo_pago == "Efectivo":
-        cursor.execute("""
-            INSERT INTO caja_movimiento
-            (id_caja, fecha, tipo, metodo_pago, monto, referencia, id_venta, usuario)
-            VALUES (%s,%s,'EGRESO','Efectivo',%s,%s,%s,%s)
-        """, (
-            id_caja,
-            fecha,
-            total,
-            f"Anulación {nro}",
-            venta_id,
-            usuario["nombre"]
-        ))
+def cerrar_caja(id_caja, monto, usuario):
+    from services.cola_ventas import obtener_cola  # evita imports circulares
 
-    conn.commit()
-    conn.close()
+    cola = obtener_cola()
+    if cola and cola.pendientes_de_caja(id_caja):
+        raise Exception("Hay ventas de la caja sin sincronizar con la BD")
 
-def cerrar_caja(id_caja, monto, usuario):
     conn = get_connection()
     cursor = conn.cursor()
+    try:
+        fecha = obtener_fecha_lima()
 
-    fecha = obtener_fecha_lima()
-
-    cursor.execute("""
-        UPDATE caja
-        SET
-            fecha_cierre = %s,
-            monto_cierre = %s,
-            usuario_cierre = %s,
-            estado = 'CERRADA'
-        WHERE id = %s
-    """, (fecha, monto, usuario["username"], id_caja))
+        cursor.execute("""
+            UPDATE caja
+            SET
+                fecha_cierre = %s,
+                monto_cierre = %s,
+                usuario_cierre = %s,
+                estado = 'CERRADA'
+            WHERE id = %s
+        """, (fecha, monto, usuario["username"], id_caja))
 
-    conn.commit()
-    conn.close()
+        conn.commit()
+    finally:
+        conn.close()
 
 def abrir_caja(monto, usuario):
     conn = get_connection()
     cursor = conn.cursor()
+    try:
+        fecha = obtener_fecha_lima()
 
-    fecha = obtener_fecha_lima()
-
-    cursor.execute("""
-        INSERT INTO caja (fecha_apertura, monto_apertura, usuario_apertura, estado)
-        VALUES (%s, %s, %s, 'ABIERTA')
-        RETURNING id
-    """, (fecha, monto, usuario["username"]))
+        cursor.execute("""
+            INSERT INTO caja (fecha_apertura, monto_apertura, usuario_apertura, estado)
+            VALUES (%s, %s, %s, 'ABIERTA')
+            RETURNING id
+        """, (fecha, monto, usuario["username"]))
 
-    row = cursor.fetchone()
-    if row is None:
-        raise Exception("No hay caja abierta para el usuario")
-    caja_id = row[0] 
+        row = cursor.fetchone()
+        if row is None:
+            raise Exception("No hay caja abierta para el usuario")
+        caja_id = row[0] 
     
-    conn.commit()
-    conn.close()
+        conn.commit()
+    finally:
+        conn.close()
     return caja_id
 
+SQL_CAJA_ABIERTA = """
+    SELECT id, monto_apertura, fecha_apertura, usuario_apertura
+    FROM caja
+    WHERE estado = 'ABIERTA'
+    ORDER BY fecha_apertura DESC
+    LIMIT 1
+"""
+
 def obtener_caja_abierta():
     conn = get_connection()
     cursor = conn.cursor()
+    try:
+        cursor.execute(SQL_CAJA_ABIERTA)
 
-    cursor.execute("""
-        SELECT id, monto_apertura, fecha_apertura, usuario_apertura
-        FROM caja
-        WHERE estado = 'ABIERTA'
-        ORDER BY fecha_apertura DESC
-        LIMIT 1
-    """)
-
-    row = cursor.fetchone()
-    conn.close()
+        row = cursor.fetchone()
+    finally:
+        conn.close()
 
     if row:
         return {
@@ -444,62 +301,123 @@ def obtener_caja_abierta():
 def crear_venta_abierta(cliente_id, placa_vehiculo, usuario_id, id_caja):
     conn = get_connection()
     cursor = conn.cursor()
-    fecha = obtener_fecha_lima()
+    try:
+        fecha = obtener_fecha_lima()
 
-    cursor.execute("""
-        INSERT INTO venta (
-            fecha, id_cliente, id_usuario,
-            suma_total, op_gravada, igv, total,
-            estado, placa_vehiculo, id_caja
-        )
-        VALUES (%s,%s,%s,0,0,0,0,'ABIERTA',%s,%s)
-        RETURNING id
-    """, (
-        fecha,
-        cliente_id,
-        usuario_id,
-        placa_vehiculo,
-        id_caja
-    ))
-
-    id_venta = cursor.fetchone()[0]
-    conn.commit()
-    conn.close()
+        cursor.execute("""
+            INSERT INTO venta (
+                fecha, id_cliente, id_usuario,
+                suma_total, op_gravada, igv, total,
+                estado, placa_vehiculo, id_caja
+            )
+            VALUES (%s,%s,%s,0,0,0,0,'ABIERTA',%s,%s)
+            RETURNING id
+        """, (
+            fecha,
+            cliente_id,
+            usuario_id,
+            placa_vehiculo,
+            id_caja
+        ))
+
+        id_venta = cursor.fetchone()[0]
+        conn.commit()
+    finally:
+        conn.close()
     return id_venta
 
 def agregar_item_venta(id_venta, id_producto, cantidad, precio_unit):
+    """
+    Agrega la línea y actualiza el total, el número de líneas y la versión
+    del detalle de la orden en la misma sentencia. Falla si la orden ya no
+    está abierta.
+    """
     conn = get_connection()
     cursor = conn.cursor()
+    try:
+        subtotal = Decimal(str(cantidad)) * Decimal(str(precio_unit))
 
-    subtotal = Decimal(str(cantidad)) * Decimal(str(precio_unit))
-
-    cursor.execute("""
-        INSERT INTO venta_detalle
-        (id_venta, id_producto, cantidad, precio_unitario, sub_total, precio_final)
-        VALUES (%s,%s,%s,%s,%s,%s)
-    """, (
-        id_venta,
-        id_producto,
-        cantidad,
-        precio_unit,
-        subtotal,
-        subtotal
-    ))
-    conn.commit()
-    conn.close()
+        cursor.execute("""
+            WITH orden AS (
+                UPDATE venta
+                SET suma_total = suma_total + %(subtotal)s,
+                    nro_lineas = nro_lineas + 1,
+                    version_detalle = version_detalle + 1
+                WHERE id = %(id_venta)s AND estado = 'ABIERTA'
+                RETURNING id, suma_total, version_detalle
+            ),
+            nueva AS (
+                INSERT INTO venta_detalle
+                (id_venta, id_producto, cantidad, precio_unitario, sub_total, precio_final)
+                SELECT o.id, %(id_producto)s, %(cantidad)s, %(precio)s, %(subtotal)s, %(subtotal)s
+                FROM orden o
+                RETURNING id, id_producto, cantidad, precio_unitario, sub_total
+            )
+            SELECT n.id, n.id_producto, p.descripcion, n.cantidad, n.precio_unitario,
+                   n.sub_total, o.suma_total, o.version_detalle
+            FROM nueva n
+            CROSS JOIN orden o
+            JOIN producto p ON p.id = n.id_producto
+        """, {
+            "id_venta": id_venta,
+            "id_producto": id_producto,
+            "cantidad": cantidad,
+            "precio": precio_unit,
+            "subtotal": subtotal
+        })
+        fila = cursor.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+
+    if fila is None:
+        raise ValueError("La orden ya no está abierta")
+    obtener_carritos_taller().agregar_linea(id_venta, fila[7], fila[6], fila[:6])
+
+def editar_carrito_taller(id_venta, cambios):
+    """
+    Aplica un lote de cambios a la orden de taller en un solo viaje y una sola
+    transacción (función editar_orden_taller de la BD), en el orden dado:
+    {"accion": "agregar", "id_producto", "cantidad", "precio_unitario"},
+    {"accion": "quitar", "id_producto"} o
+    {"accion": "cantidad", "id_producto", "cantidad"}.
+    Devuelve el detalle nuevo de la orden.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT * FROM editar_orden_taller(%s, %s)",
+            (id_venta, Json(cambios, dumps=_json_dumps))
+        )
+        filas = cursor.fetchall()
+        conn.commit()
+    except psycopg2.errors.RaiseException as e:
+        raise ValueError(e.diag.message_primary) from None
+    finally:
+        conn.close()
+
+    lineas = [f[:6] for f in filas if f[0] is not None]
+    obtener_carritos_taller().guardar(id_venta, filas[0][7], lineas, filas[0][6])
+    return dataframe_detalle([l[1:] for l in lineas])
+
+SQL_VENTAS_ABIERTAS = """
+    SELECT
+        v.id AS orden,
+        c.nombre AS cliente,
+        v.placa_vehiculo AS placa,
+        v.fecha,
+        v.nro_lineas AS items,
+        v.suma_total AS total,
+        v.version_detalle AS version
+    FROM venta v
+    JOIN cliente c ON c.id = v.id_cliente
+    WHERE v.estado = 'ABIERTA'
+    ORDER BY v.fecha
+"""
 
 def obtener_ventas_abiertas():
-    return query_df("""
-        SELECT 
-            v.id AS orden,
-            c.nombre AS cliente,
-            v.placa_vehiculo AS placa,
-            v.fecha
-        FROM venta v
-        JOIN cliente c ON c.id = v.id_cliente
-        WHERE v.estado = 'ABIERTA'
-        ORDER BY v.fecha
-    """)
+    return query_df(SQL_VENTAS_ABIERTAS)
 
 def obtener_valor_venta(carrito=None, id_venta=None):
     if carrito is not None:
@@ -509,27 +427,52 @@ def obtener_valor_venta(carrito=None, id_venta=None):
         )
 
     if id_venta is not None:
-        df = query_df(
-            "SELECT COALESCE(SUM(sub_total),0) total FROM venta_detalle WHERE id_venta=%s",
-            (id_venta,)
-        )
+        # Total acumulado en la orden: no se suma el detalle
+        copia = obtener_carritos_taller().obtener(id_venta)
+        if copia is not None:
+            return Decimal(str(copia[1]))
+        df = query_df("SELECT suma_total AS total FROM venta WHERE id=%s", (id_venta,))
+        if df.empty:
+            return Decimal("0.00")
         return Decimal(str(df.iloc[0]["total"]))
 
     return Decimal("0.00")
 
-def obtener_detalle_venta(id_venta):
-    return query_df("""
-        SELECT
-            d.id_producto AS "ID Producto",
-            p.descripcion AS "Descripción",
-            d.cantidad AS "Cantidad",
-            d.precio_unitario AS "Precio Unitario",
-            d.sub_total AS "Subtotal"
-        FROM venta_detalle d
-        JOIN producto p ON p.id = d.id_producto
-        WHERE d.id_venta = %s
-        ORDER BY d.id
-    """, (id_venta,))
+SQL_DETALLE_VENTA = """
+    SELECT v.version_detalle, v.suma_total,
+           d.id, d.id_producto, p.descripcion, d.cantidad,
+           d.precio_unitario, d.sub_total
+    FROM venta v
+    LEFT JOIN venta_detalle d ON d.id_venta = v.id
+    LEFT JOIN producto p ON p.id = d.id_producto
+    WHERE v.id = %s
+    ORDER BY d.id
+"""
+
+def obtener_detalle_venta(id_venta, version=None):
+    """
+    Detalle de la orden. Con `version` (la de obtener_ventas_abiertas) se
+    responde desde la copia en memoria si está al día; si no, una sola
+    consulta trae las líneas junto con la versión y el total.
+    """
+    carritos = obtener_carritos_taller()
+    copia = carritos.obtener(id_venta, version)
+    if version is not None and copia is not None:
+        return copia[0]
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SQL_DETALLE_VENTA, (id_venta,))
+        filas = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+    lineas = [f[2:] for f in filas if f[2] is not None]
+    if filas:
+        carritos.guardar(id_venta, filas[0][0], lineas, filas[0][1])
+    return dataframe_detalle([l[1:] for l in lineas])
 
 def puede_guardar_venta(
     carrito,
@@ -557,33 +500,81 @@ def puede_guardar_venta(
 def eliminar_items_servicio(id_venta):
     conn = get_connection()
     cursor = conn.cursor()
-
-    cursor.execute("""
-        DELETE FROM venta_detalle
-        WHERE id_venta = %s
-    """, (id_venta,))
-
-    conn.commit()
-    conn.close()
+    try:
+        # La orden se bloquea primero (no se cruza con su cierre) y se resta lo
+        # borrado en lugar de poner cero: una línea agregada a la vez por otra
+        # caja sigue contada
+        cursor.execute("""
+            WITH orden AS (
+                SELECT id FROM venta
+                WHERE id = %(id_venta)s AND estado = 'ABIERTA'
+                FOR UPDATE
+            ),
+            borradas AS (
+                DELETE FROM venta_detalle
+                WHERE id_venta IN (SELECT id FROM orden)
+                RETURNING sub_total
+            )
+            UPDATE venta v
+            SET suma_total = v.suma_total - b.total,
+                nro_lineas = v.nro_lineas - b.lineas,
+                version_detalle = v.version_detalle + 1
+            FROM (SELECT COALESCE(SUM(sub_total), 0) AS total, COUNT(*) AS lineas FROM borradas) b
+            WHERE v.id = %(id_venta)s AND b.lineas > 0
+            RETURNING v.suma_total, v.nro_lineas, v.version_detalle
+        """, {"id_venta": id_venta})
+        fila = cursor.fetchone()
+
+        conn.commit()
+    finally:
+        conn.close()
+
+    if fila is None:
+        return
+    carritos = obtener_carritos_taller()
+    if fila[1] == 0:
+        carritos.vaciar(id_venta, fila[2], fila[0])
+    else:
+        carritos.invalidar(id_venta)
 
 def eliminar_item_servicio(id_venta, id_producto):
     conn = get_connection()
     cursor = conn.cursor()
-
-    cursor.execute("""
-        DELETE FROM venta_detalle
-        WHERE ctid IN (
-            SELECT ctid
-            FROM venta_detalle
-            WHERE id_venta = %s
-              AND id_producto = %s
-            ORDER BY ctid
-            LIMIT 1
-        )
-    """, (id_venta, id_producto))
-
-    conn.commit()
-    conn.close()
+    try:
+        cursor.execute("""
+            WITH orden AS (
+                SELECT id FROM venta
+                WHERE id = %(id_venta)s AND estado = 'ABIERTA'
+                FOR UPDATE
+            ),
+            borrada AS (
+                DELETE FROM venta_detalle
+                WHERE id = (
+                    SELECT d.id
+                    FROM venta_detalle d
+                    WHERE d.id_venta IN (SELECT id FROM orden)
+                      AND d.id_producto = %(id_producto)s
+                    ORDER BY d.id
+                    LIMIT 1
+                )
+                RETURNING id, sub_total
+            )
+            UPDATE venta v
+            SET suma_total = v.suma_total - b.sub_total,
+                nro_lineas = v.nro_lineas - 1,
+                version_detalle = v.version_detalle + 1
+            FROM borrada b
+            WHERE v.id = %(id_venta)s
+            RETURNING b.id, v.suma_total, v.version_detalle
+        """, {"id_venta": id_venta, "id_producto": id_producto})
+        fila = cursor.fetchone()
+
+        conn.commit()
+    finally:
+        conn.close()
+
+    if fila is not None:
+        obtener_carritos_taller().quitar_linea(id_venta, fila[2], fila[1], fila[0])
 
 def eliminar_venta_abierta(venta_id):
     """
@@ -591,40 +582,153 @@ def eliminar_venta_abierta(venta_id):
     """
     conn = get_connection()
     cursor = conn.cursor()
-
-    # Verificar si existe y está abierta
-    cursor.execute("SELECT estado FROM venta WHERE id = %s", (venta_id,))
-    row = cursor.fetchone()
-    if not row:
-        raise ValueError("Venta no encontrada")
-    estado = row[0]
-
-    if estado != "ABIERTA":
-        raise ValueError("Solo se pueden eliminar ventas abiertas")
-
-    # Eliminar detalle
-    cursor.execute("DELETE FROM venta_detalle WHERE id_venta = %s", (venta_id,))
-    # Eliminar venta
-    cursor.execute("DELETE FROM venta WHERE id = %s", (venta_id,))
-
-    conn.commit()
-    conn.close()
+    try:
+        # Verificar si existe y está abierta
+        cursor.execute("SELECT estado FROM venta WHERE id = %s", (venta_id,))
+        row = cursor.fetchone()
+        if not row:
+            raise ValueError("Venta no encontrada")
+        estado = row[0]
+
+        if estado != "ABIERTA":
+            raise ValueError("Solo se pueden eliminar ventas abiertas")
+
+        # Eliminar detalle
+        cursor.execute("DELETE FROM venta_detalle WHERE id_venta = %s", (venta_id,))
+        # Eliminar venta
+        cursor.execute("DELETE FROM venta WHERE id = %s", (venta_id,))
+
+        conn.commit()
+    finally:
+        conn.close()
+    obtener_carritos_taller().invalidar(venta_id)
+
+# -------------------------
+# 🛠 Cambios de la orden de taller pendientes de guardar (por sesión)
+# -------------------------
+def cambios_taller(id_venta):
+    """Cambios aún no enviados a la BD para la orden (en el orden en que se hicieron)."""
+    return st.session_state.setdefault("cambios_taller", {}).setdefault(id_venta, [])
+
+def anotar_cambio_taller(id_venta, accion, id_producto, cantidad=None, precio_unitario=None,
+                         descripcion=None):
+    """
+    Anota el cambio sin ir a la BD. Agregar otra vez el mismo producto con el
+    mismo precio suma al cambio anterior si nada lo tocó después.
+    """
+    cambios = cambios_taller(id_venta)
+    ultimo = next((c for c in reversed(cambios) if c["id_producto"] == id_producto), None)
+
+    if (
+        accion == "agregar" and ultimo and ultimo["accion"] == "agregar"
+        and ultimo["precio_unitario"] == precio_unitario
+    ):
+        ultimo["cantidad"] += cantidad
+        return
+    if accion == "cantidad" and ultimo and ultimo["accion"] == "cantidad":
+        ultimo["cantidad"] = cantidad
+        return
+    if accion == "quitar":
+        # Quitar borra todas las líneas del producto: lo anotado antes sobra
+        cambios[:] = [c for c in cambios if c["id_producto"] != id_producto]
+
+    cambio = {"accion": accion, "id_producto": id_producto}
+    if cantidad is not None:
+        cambio["cantidad"] = cantidad
+    if precio_unitario is not None:
+        cambio["precio_unitario"] = precio_unitario
+    if descripcion is not None:
+        cambio["descripcion"] = descripcion
+    cambios.append(cambio)
+
+def guardar_cambios_taller(id_venta):
+    """Envía los cambios anotados en un solo viaje. Si la BD los rechaza, quedan anotados."""
+    cambios = cambios_taller(id_venta)
+    if not cambios:
+        return None
+    df = editar_carrito_taller(id_venta, cambios)
+    st.session_state["cambios_taller"].pop(id_venta, None)
+    return df
+
+def descartar_cambios_taller(id_venta):
+    st.session_state.setdefault("cambios_taller", {}).pop(id_venta, None)
 
 def placa_a_mayusculas():
     if st.session_state.get("placa_vehiculo"):
         st.session_state["placa_vehiculo"] = st.session_state["placa_vehiculo"].upper()
 
+def procesar_codigo_escaneado(tipo_venta, permite_negativo=False):
+    """
+    Callback del lector de código de barras: agrega 1 unidad del producto
+    escaneado al carrito POS (sin ir a la BD si está en el catálogo en
+    memoria) o a los cambios anotados de la orden de taller abierta.
+    Con permite_negativo (política de stock NEGATIVO) no se valida el stock.
+    """
+    codigo = st.session_state.get("codigo_escaneado", "")
+    st.session_state["codigo_escaneado"] = ""
+    if not codigo.strip():
+        return
+
+    producto = buscar_codigo_barras(codigo)
+    if producto is None:
+        st.session_state["_mensaje_escaneo"] = ("error", f"❌ Código {codigo.strip()} no registrado")
+        return
+
+    id_producto = producto["id"]
+    stock = f(producto["stock_actual"]) or 0.0
+    precio = max(f(producto["precio_venta"]) or 0.0, 0.0)
+
+    if tipo_venta == "Taller":
+        if not st.session_state.get("venta_abierta_id"):
+            st.session_state["_mensaje_escaneo"] = ("error", "❌ Primero debes abrir una orden de servicio")
+            return
+        if stock < 1 and not permite_negativo:
+            st.session_state["_mensaje_escaneo"] = ("error", f"❌ {id_producto} sin stock disponible")
+            return
+
+        anotar_cambio_taller(
+            st.session_state["venta_abierta_id"], "agregar", id_producto,
+            cantidad=1.0, precio_unitario=precio, descripcion=producto["descripcion"]
+        )
+    else:
+        carrito = st.session_state.setdefault("carrito_ventas", [])
+        en_carrito = sum(i["Cantidad"] for i in carrito if i["ID Producto"] == id_producto)
+        if en_carrito + 1 > stock and not permite_negativo:
+            st.session_state["_mensaje_escaneo"] = ("error", f"❌ {id_producto} sin stock suficiente ({stock:.2f})")
+            return
+
+        # Escanear de nuevo el mismo producto suma a su línea
+        linea = next(
+            (i for i in carrito if i["ID Producto"] == id_producto and i["Precio Unitario"] == precio),
+            None
+        )
+        if linea:
+            linea["Cantidad"] += 1.0
+            linea["Subtotal"] = round(linea["Cantidad"] * precio, 2)
+        else:
+            carrito.append({
+                "ID Producto": id_producto,
+                "Descripción": producto["descripcion"],
+                "Cantidad": 1.0,
+                "Precio Unitario": precio,
+                "Subtotal": round(precio, 2)
+            })
+
+    st.session_state["_mensaje_escaneo"] = ("ok", f"✅ {id_producto} | {producto['descripcion']} agregado")
+
 def resetear_modulo_ventas():
     claves_ventas = [
         # Venta / estado general
         "venta_guardada",
         "venta_actual_id",
+        "venta_encolada",
         "venta_abierta_id",
         "pdf_generado",
         "ruta_pdf",
 
         # Carrito y pagos
         "carrito_ventas",
+        "cambios_taller",
         "metodo_pago_select",
         "pago_cliente",
 
@@ -633,6 +737,7 @@ def resetear_modulo_ventas():
 
         # Búsqueda y filtros
         "criterio_busqueda",
+        "codigo_escaneado",
         "filtro_marca",
         "filtro_categoria",
         "filtro_stock",
@@ -11,23 +11,24 @@ def iniciar_sesion(user, cookies):
 
     conn = get_connection()
     cur = conn.cursor()
-
-    # Cerrar cualquier sesión previa del usuario
-    cur.execute(
-        "UPDATE usuarios SET token_sesion=NULL WHERE id=%s",
-        (user["id"],)
-    )
-
-     # Crear nueva sesión
-    cur.execute("""
-        UPDATE usuarios
-        SET token_sesion=%s,
-            login_time=%s,
-            last_login=NOW()
-        WHERE id=%s
-    """, (token, login_time, user["id"]))
-    conn.commit()
-    conn.close()
+    try:
+        # Cerrar cualquier sesión previa del usuario
+        cur.execute(
+            "UPDATE usuarios SET token_sesion=NULL WHERE id=%s",
+            (user["id"],)
+        )
+
+         # Crear nueva sesión
+        cur.execute("""
+            UPDATE usuarios
+            SET token_sesion=%s,
+                login_time=%s,
+                last_login=NOW()
+            WHERE id=%s
+        """, (token, login_time, user["id"]))
+        conn.commit()
+    finally:
+        conn.close()
 
     cookies["token"] = token
     cookies.save()
@@ -39,6 +40,12 @@ def iniciar_sesion(user, cookies):
     }
 
 
+SQL_USUARIO_POR_TOKEN = """
+    SELECT id, username, rol, nombre, login_time, password_updated_at
+    FROM usuarios
+    WHERE token_sesion = %s
+"""
+
 def obtener_usuario_sesion(cookies):
     if "usuario" in st.session_state:
         return st.session_state["usuario"]
@@ -49,13 +56,11 @@ def obtener_usuario_sesion(cookies):
 
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("""
-        SELECT id, username, rol, nombre, login_time, password_updated_at
-        FROM usuarios
-        WHERE token_sesion = %s
-    """, (token,))
-    row = cur.fetchone()
-    conn.close()
+    try:
+        cur.execute(SQL_USUARIO_POR_TOKEN, (token,))
+        row = cur.fetchone()
+    finally:
+        conn.close()
 
     if not row:
         return None
@@ -82,12 +87,14 @@ def obtener_usuario_sesion(cookies):
 def cerrar_sesion(id_user, cookies):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute(
-        "UPDATE usuarios SET token_sesion = NULL WHERE id = %s",
-        (id_user,)
-    )
-    conn.commit()
-    conn.close()
+    try:
+        cur.execute(
+            "UPDATE usuarios SET token_sesion = NULL WHERE id = %s",
+            (id_user,)
+        )
+        conn.commit()
+    finally:
+        conn.close()
 
     cookies["token"] = ""
     cookies.save()
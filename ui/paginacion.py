@@ -0,0 +1,46 @@
+import math
+
+import streamlit as st
+
+
+def paginador(clave, filtros, cargar_pagina, total=None, tamano=20):
+    """
+    Widget de paginación keyset (Anterior / Siguiente).
+
+    Guarda en session_state[clave] la pila de cursores de las páginas
+    visitadas; si cambian los `filtros` vuelve a la primera página.
+    `cargar_pagina(despues_de, tamano)` debe devolver
+    {"productos": DataFrame, "siguiente": cursor | None}.
+    """
+    estado = st.session_state.get(clave)
+    if not estado or estado["filtros"] != filtros:
+        estado = {"filtros": filtros, "cursores": [None]}
+        st.session_state[clave] = estado
+
+    cursores = estado["cursores"]
+    pagina = cargar_pagina(cursores[-1], tamano)
+    siguiente = pagina["siguiente"]
+
+    # Los callbacks corren antes del rerun: la página nueva se carga una sola vez
+    def _anterior():
+        if len(cursores) > 1:
+            cursores.pop()
+
+    def _siguiente():
+        if siguiente is not None:
+            cursores.append(siguiente)
+
+    col_ant, col_info, col_sig = st.columns([1, 2, 1])
+    with col_ant:
+        st.button("⬅️ Anterior", key=f"{clave}_anterior",
+                  on_click=_anterior, disabled=len(cursores) == 1)
+    with col_info:
+        if total:
+            st.caption(f"Página {len(cursores)} de {math.ceil(total / tamano)} · {total} resultados")
+        else:
+            st.caption(f"Página {len(cursores)}")
+    with col_sig:
+        st.button("Siguiente ➡️", key=f"{clave}_siguiente",
+                  on_click=_siguiente, disabled=siguiente is None)
+
+    return pagina["productos"]